@@ -116,6 +116,37 @@ class BaseSoC(SoCCore):
                 size                    = 0x40000000,
             )
 
+            # Count the commands sent to the DRAM during the row hammer attack
+            self.rh_test.add_cmd_counters(self.sdram.dfii.master)
+
+            # Hammer path sending ACT/RD/PRE straight on the DFI, at the minimum DRAM timings
+            self.rh_test.add_dfi_hammer(self.sdram.dfii, self.ddrphy.settings, self.sdram.controller.settings.timing, sys_clk_freq)
+
+            # Per row flip histogram of the row hammer test, read in one bulk transfer
+            self.bus.add_slave("rh_row_histogram", slave=self.rh_test.row_histogram.bus, region=SoCRegion(size=self.rh_test.row_histogram.size, cached=False))
+
+            # Flips of every data bit of the row hammer test, read in one bulk transfer
+            self.bus.add_slave("rh_bit_histogram", slave=self.rh_test.bit_histogram.bus, region=SoCRegion(size=self.rh_test.bit_histogram.size, cached=False))
+
+            # Aggressor table of the row hammer test, set with plain bulk stores
+            self.bus.add_slave("rh_aggressor_table", slave=self.rh_test.aggressor_table.bus, region=SoCRegion(size=self.rh_test.aggressor_table.size, cached=False))
+
+            # Same table set as (bank, row, offset, column) tuples, mapped to addresses by the gateware
+            self.bus.add_slave("rh_aggressor_tuples", slave=self.rh_test.aggressor_table.tuple_bus, region=SoCRegion(size=self.rh_test.aggressor_table.tuple_size, cached=False))
+
+            # Results of every step of a row sweep, read in one bulk transfer
+            self.bus.add_slave("rh_sweep_log", slave=self.rh_test.sweep_log.bus, region=SoCRegion(size=self.rh_test.sweep_log.size, cached=False))
+
+            # Head of the error FIFO, popped by reading it, many records in one bulk transfer
+            self.bus.add_slave("rh_error_records", slave=self.rh_test.error_records.bus, region=SoCRegion(size=self.rh_test.error_records.size, cached=False))
+
+            # State changes of the row hammer FSM with their cycle, read after the run
+            self.bus.add_slave("rh_state_trace", slave=self.rh_test.state_trace.bus, region=SoCRegion(size=self.rh_test.state_trace.size, cached=False))
+
+            # Events of the row hammer test (state change, errors waiting, done), the BIOS sleeps on them
+            if self.irq.enabled:
+                self.irq.add("rh_test", use_loc_if_exists=True)
+
         # HyperRAM ---------------------------------------------------------------------------------
         if with_hyperram:
             self.hyperram = HyperRAM(platform.request("hyperram"), sys_clk_freq=sys_clk_freq)
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+#
+# Row hammer tester on the LiteX simulation SoC (litex_sim), run with Verilator.
+#
+# The SoC is the litex_sim one with an SDRAM model: add_sdram puts the row
+# hammer tester on the native port as on the boards, and the BIOS gets the
+# commands of rh_test.c. Nothing needs Vivado or a board.
+#
+
+import sys
+import time
+import termios
+import argparse
+import subprocess
+
+from migen import *
+
+from litex.build.sim              import SimPlatform
+from litex.build.sim.config       import SimConfig
+
+from litex.soc.integration.soc_core import *
+from litex.soc.integration.soc      import SoCRegion
+from litex.soc.integration.builder  import *
+
+from litex.tools.litex_sim import SimSoC, sim_args
+
+# Simulation SoC with the row hammer tester --------------------------------------------------------
+
+class RowHammerSimSoC(SimSoC):
+    def __init__(self, **kwargs):
+        # Uptime timer, the BIOS times the test and the error readout with it
+        kwargs["timer_uptime"] = True
+        SimSoC.__init__(self, with_sdram=True, **kwargs)
+
+        # The tester is added by add_sdram of the litex fork (dependencies/litex)
+        if not hasattr(self, "rh_test"):
+            raise RuntimeError("add_sdram did not add the row hammer tester, build with the litex of dependencies/litex")
+
+        # Same bus slaves as the board targets
+
+        # Count the commands sent to the DRAM during the row hammer attack
+        self.rh_test.add_cmd_counters(self.sdram.dfii.master)
+
+        # Per row flip histogram of the row hammer test, read in one bulk transfer
+        self.bus.add_slave("rh_row_histogram", slave=self.rh_test.row_histogram.bus, region=SoCRegion(size=self.rh_test.row_histogram.size, cached=False))
+
+        # Flips of every data bit of the row hammer test, read in one bulk transfer
+        self.bus.add_slave("rh_bit_histogram", slave=self.rh_test.bit_histogram.bus, region=SoCRegion(size=self.rh_test.bit_histogram.size, cached=False))
+
+        # Aggressor table of the row hammer test, set with plain bulk stores
+        self.bus.add_slave("rh_aggressor_table", slave=self.rh_test.aggressor_table.bus, region=SoCRegion(size=self.rh_test.aggressor_table.size, cached=False))
+
+        # Same table set as (bank, row, offset, column) tuples, mapped to addresses by the gateware
+        self.bus.add_slave("rh_aggressor_tuples", slave=self.rh_test.aggressor_table.tuple_bus, region=SoCRegion(size=self.rh_test.aggressor_table.tuple_size, cached=False))
+
+        # Results of every step of a row sweep, read in one bulk transfer
+        self.bus.add_slave("rh_sweep_log", slave=self.rh_test.sweep_log.bus, region=SoCRegion(size=self.rh_test.sweep_log.size, cached=False))
+
+        # Head of the error FIFO, popped by reading it, many records in one bulk transfer
+        self.bus.add_slave("rh_error_records", slave=self.rh_test.error_records.bus, region=SoCRegion(size=self.rh_test.error_records.size, cached=False))
+
+        # State changes of the row hammer FSM with their cycle, read after the run
+        self.bus.add_slave("rh_state_trace", slave=self.rh_test.state_trace.bus, region=SoCRegion(size=self.rh_test.state_trace.size, cached=False))
+
+        # Events of the row hammer test (state change, errors waiting, done), the BIOS sleeps on them
+        if self.irq.enabled:
+            self.irq.add("rh_test", use_loc_if_exists=True)
+
+# Build --------------------------------------------------------------------------------------------
+
+def main():
+    from litex.build.parser import LiteXArgumentParser
+    parser = LiteXArgumentParser(description="Row hammer tester on the LiteX simulation SoC")
+    parser.set_platform(SimPlatform)
+    sim_args(parser)
+    parser.set_defaults(sdram_module="MT41K128M16", sdram_data_width=16)
+    args = parser.parse_args()
+
+    soc_kwargs = soc_core_argdict(args)
+
+    sys_clk_freq = int(1e6)
+    sim_config   = SimConfig()
+    sim_config.add_clocker("sys_clk", freq_hz=sys_clk_freq)
+
+    # UART.
+    if soc_kwargs["uart_name"] == "serial":
+        soc_kwargs["uart_name"] = "sim"
+        sim_config.add_module("serial2console", "serial")
+
+    # Etherbone, to drive the tester from the host (rowhammer_host) through litex_server.
+    if args.with_etherbone:
+        sim_config.add_module("ethernet", "eth", args={"interface": "tap0", "ip": args.remote_ip})
+
+    soc_kwargs["integrated_main_ram_size"] = 0
+    soc = RowHammerSimSoC(
+        sdram_module       = args.sdram_module,
+        sdram_data_width   = int(args.sdram_data_width),
+        sdram_verbosity    = int(args.sdram_verbosity),
+        with_etherbone     = args.with_etherbone,
+        ethernet_local_ip  = args.local_ip,
+        ethernet_remote_ip = args.remote_ip,
+        **soc_kwargs)
+
+    # Build the gateware, the BIOS and the Verilator model, untimed.
+    builder = Builder(soc, **parser.builder_argdict)
+    builder.build(
+        sim_config = sim_config,
+        run        = False,
+        **parser.toolchain_argdict,
+    )
+    if not builder.compile_gateware:
+        return
+    subprocess.check_call(["bash", "build_" + soc.build_name + ".sh"], cwd=builder.gateware_dir)
+
+    # Run, the BIOS prints the cycles of every phase of the test, the
+    # wall-clock time of the run alone is printed when it ends.
+    run_as_root = sim_config.has_module("ethernet")
+    interactive = not args.non_interactive and sys.stdin.isatty()
+    if interactive:
+        termios_settings = termios.tcgetattr(sys.stdin.fileno())
+    started = time.monotonic()
+    try:
+        subprocess.call((["sudo"] if run_as_root else []) + ["obj_dir/Vsim"], cwd=builder.gateware_dir)
+    finally:
+        print("\nSimulation wall-clock: {:.1f} s (run only)".format(time.monotonic() - started))
+        if interactive:
+            termios.tcsetattr(sys.stdin.fileno(), termios.TCSAFLUSH, termios_settings)
+
+if __name__ == "__main__":
+    main()
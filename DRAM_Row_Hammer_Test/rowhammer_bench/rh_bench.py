@@ -0,0 +1,546 @@
+#!/usr/bin/env python3
+
+"""
+Cycle-accurate benchmarks of Row_Hammer_Test with run_simulation.
+
+Every case runs one whole test (fill, check, attack, check) against the
+native port model with its own latency, cmd.ready backpressure and reorder
+depth, and reports cycles per filled and per checked word, hammer commands
+per cycle and the cycles every FSM spends in each state. Results are JSON,
+and compared against a baseline to catch throughput regressions before a
+Vivado build. The counts are also checked against the behavioral model
+(rowhammer_model), which has to agree with the gateware on what was done.
+Some cases flip bits in the port model with the flip rule of the behavioral
+model, their error records, histograms, sweep log and HC_first have to
+match it too.
+"""
+
+
+import os
+import sys
+import json
+import argparse
+from types import SimpleNamespace
+
+import numpy as np
+
+from migen import *
+
+from litedram.common import LiteDRAMNativePort
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "rowhammer_state_machine"))
+from rh_test import (Row_Hammer_Test, AGGRESSOR_TABLE_ENTRY_WORDS, SWEEP_LOG_WORDS, SWEEP_LOG_ENTRY_WORDS, ERROR_RECORD_WORDS, ERROR_RECORD_WINDOW_RECORDS,
+                     ERROR_RECORD_FIELD_MASK, ERROR_RECORD_POPCOUNT_SHIFT, ERROR_RECORD_AFTER_RH_BIT, ERROR_RECORD_VALID_BIT)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from rowhammer_model import Row_Hammer_Model, Model_Config, Threshold_Flips, FILL_CHECK_NEIGHBORHOOD, HC_SEARCH_BINARY
+
+from rh_port_model import Native_Port_Model
+
+
+
+"""
+Constants
+"""
+
+BENCH_VERSION = 1
+
+# Tester geometry, small enough for the simulation
+DEFAULT_ADDRESS_WIDTH = 8
+DEFAULT_DATA_WIDTH = 64
+DEFAULT_BANK_BITS = 1
+DEFAULT_COL_BITS = 2
+BENCH_SYS_CLK_FREQ = 100e6
+BENCH_TREFI = 782
+BENCH_NUM_AGGRESSORS = 16
+BENCH_TIMEOUT_CYCLES = 200000
+
+# Attack, two aggressors around a victim row
+BENCH_VICTIM_ROW = 4
+BENCH_HAMMER_COUNT = 4
+BENCH_TABLE_CYCLES = 16
+BENCH_PATTERN_1 = 0xAAAAAAAA
+BENCH_PATTERN_2 = 0x55555555
+
+# Flips, victim rows get the mask once their neighbors were read the threshold
+# times in a test (3 plays of the table for the victim between the aggressors)
+BENCH_FLIP_THRESHOLD = 24
+BENCH_FLIP_MASK = (1 << 40) | 0x3  # Bits in both 32-bit lanes
+BENCH_WEAK_ADDR = (2 << (DEFAULT_BANK_BITS + DEFAULT_COL_BITS)) | 1  # Row 2, column 1
+BENCH_WEAK_MASK = 0x10
+
+# Port models, from a perfect port to a busy controller
+BENCH_CASES = {
+    "ideal":           dict(latency=4, row_miss_latency=0, reorder_depth=64, ready_prob=1.0),
+    "controller":      dict(latency=8, row_miss_latency=8, reorder_depth=16, ready_prob=1.0),
+    "backpressure":    dict(latency=8, row_miss_latency=8, reorder_depth=16, ready_prob=0.5),
+    "shallow_reorder": dict(latency=8, row_miss_latency=8, reorder_depth=4, ready_prob=1.0),
+    "flips":           dict(latency=8, row_miss_latency=8, reorder_depth=16, ready_prob=0.5),
+    "hc_search_sweep": dict(latency=8, row_miss_latency=8, reorder_depth=16, ready_prob=0.5),
+}
+
+# Settings (Model_Config fields) and flips of the cases that have some. A check
+# of the search stops at the first error, the reads in flight can find more,
+# so its cases only flip one word per check. The weak bit is in the rows of the
+# first step of the sweep only, that step is stopped before its attack.
+BENCH_SCENARIOS = {
+    "flips": dict(flip_threshold=BENCH_FLIP_THRESHOLD),
+    "hc_search_sweep": dict(
+        flip_threshold=BENCH_FLIP_THRESHOLD,
+        flips_before={BENCH_WEAK_ADDR: BENCH_WEAK_MASK},
+        config=dict(sweep=True, sweep_end_row=2, hc_search_mode=HC_SEARCH_BINARY, hc_search_max=8,
+                    fill_check_mode=FILL_CHECK_NEIGHBORHOOD),
+    ),
+}
+
+# Bank-parallel attack on DDR4 (4 bank groups of 4 banks): banks of the entries
+# below the victim, consecutive entries in different bank groups while there are
+BENCH_DDR4_BANK_BITS = 4
+BENCH_DDR4_BA_BITS = 2
+BENCH_BANK_PARALLEL_BANKS = {
+    2: [0, 4],
+    4: [0, 4, 8, 12],
+    8: [0, 4, 8, 12, 1, 5, 9, 13],
+}
+
+# Settings written to the CSR of the same name
+BENCH_CONFIG_CSRS = [
+    "fill_check_mode", "fill_check_neighborhood_rows",
+    "sweep_base_row", "sweep_stride", "sweep_end_row", "sweep_hammer_count",
+    "hc_search_mode", "hc_search_min", "hc_search_max",
+]
+
+# Metrics compared with the baseline, True when higher is better
+REGRESSION_METRICS = {
+    "fill_cycles_per_word": False,
+    "check_cycles_per_word": False,
+    "hammer_cmds_per_cycle": True,
+    "test_cycles": False,
+}
+DEFAULT_TOLERANCE = 0.05
+
+# States of the row hammer FSM that move no data
+RH_CONFIG_STATES = ["RH_STEP_START", "RH_SEARCH_NEXT", "RH_STEP_INIT", "RH_INIT_SETTINGS", "READ_FINISH", "RH_STEP_DONE"]
+
+
+
+"""
+Flips
+"""
+
+class Bench_Flips:
+    """
+    flip_hook of the port model giving the flips the behavioral model
+    predicts: rule (a Threshold_Flips) is applied to the attack reads of
+    every row since the last fill, as counted by the monitor, and
+    flips_before are in the DRAM from the fill on. A flip is XORed into the
+    word when it is read, once per fill.
+    """
+
+    def __init__(self, reference, rule, flips_before=None):
+        self.reference = reference
+        self.rule = rule
+        self.flips_before = flips_before or {}
+        self.fill()
+
+    def fill(self):
+        self.reads = {}
+        self.applied = {}
+
+    def hammer(self, addr):
+        row = addr >> self.reference.col_bits
+        self.reads[row] = self.reads.get(row, 0) + 1
+
+    def flips(self):
+        flips = dict(self.flips_before)
+        if self.reads:
+            rows = np.array(sorted(self.reads), dtype=np.int64)
+            reads = np.array([self.reads[row] for row in rows], dtype=np.uint64)
+            for addr, mask in self.rule(self.reference, rows, reads).items():
+                flips[addr] = flips.get(addr, 0) | mask
+        return flips
+
+    def __call__(self, model, addr):
+        mask = self.flips().get(addr, 0) & ~self.applied.get(addr, 0)
+        if mask:
+            model.mem[addr] = model.mem.get(addr, 0) ^ mask
+            self.applied[addr] = self.applied.get(addr, 0) | mask
+
+
+
+"""
+Benchmark of one case
+"""
+
+class Bench_Case:
+    """
+    One Row_Hammer_Test against one port model, run() gives the metrics
+    """
+
+    def __init__(self, address_width=DEFAULT_ADDRESS_WIDTH, data_width=DEFAULT_DATA_WIDTH, bank_bits=DEFAULT_BANK_BITS,
+                 col_bits=DEFAULT_COL_BITS, seed=0, scenario=None, **port_settings):
+        self.address_width = address_width
+        self.data_width = data_width
+        self.bank_bits = bank_bits
+        self.col_bits = col_bits
+
+        # Double-sided attack, aggressors above and below the victim row
+        scenario = scenario or {}
+        self.table = [(self.row_addr(BENCH_VICTIM_ROW - 1), BENCH_HAMMER_COUNT, 0), (self.row_addr(BENCH_VICTIM_ROW + 1), BENCH_HAMMER_COUNT, 1)]
+        self.config = Model_Config(aggressors=self.table, table_cycles=BENCH_TABLE_CYCLES, pattern_1=BENCH_PATTERN_1, pattern_2=BENCH_PATTERN_2,
+                                   **scenario.get("config", {}))
+        self.reference = Row_Hammer_Model(address_width, data_width, bank_bits, col_bits, num_aggressors=BENCH_NUM_AGGRESSORS)
+        self.flips_before = scenario.get("flips_before")
+        self.rule = Threshold_Flips(scenario["flip_threshold"], BENCH_FLIP_MASK) if "flip_threshold" in scenario else None
+        self.flips = Bench_Flips(self.reference, self.rule, self.flips_before) if (self.rule or self.flips_before) else None
+
+        self.port = LiteDRAMNativePort("both", address_width, data_width)
+        self.dut = Row_Hammer_Test(self.port, BENCH_SYS_CLK_FREQ, Signal(32), Signal(reset=1), Signal(), bank_bits, col_bits, BENCH_TREFI,
+                                   num_aggressors=BENCH_NUM_AGGRESSORS)
+        self.model = Native_Port_Model(self.port, bank_bits, col_bits, seed=seed, flip_hook=self.flips, **port_settings)
+
+        # Filled in by the generators
+        self.fsms = {
+            "rh_fsm": self.dut.rh_fsm,
+            "fill_range_fsm": self.dut.fill_engine.addrs.range_fsm,
+            "check_range_fsm": self.dut.read_checker.addrs.range_fsm,
+        }
+        self.state_cycles = {name: {} for name in self.fsms}
+        self.hammer_reads = 0
+        self.drain_cycles = 0
+        self.histogram_clear_wait_cycles = 0
+        self.first_cmd_latency = {"fill": [], "check": []}
+        self.metrics = {}
+        self.readout = {}
+
+    def row_addr(self, row):
+        return row << (self.bank_bits + self.col_bits)
+
+    @passive
+    def monitor(self):
+        """
+        Cycles in every state of every FSM, hammer reads, the cycles from
+        the end of an attack till its reads are answered, the cycles the
+        check after the attack waits only for the row histogram clear, and
+        the cycles from the start of a fill or check pass to its first
+        command
+        """
+        dut, port = self.dut, self.port
+        pass_start = {"fill": None, "check": None}
+        last_rh_state = None
+        draining = False
+        while True:
+            states = {}
+            for name, fsm in self.fsms.items():
+                state = fsm.decoding[(yield fsm.state)]
+                states[name] = state
+                self.state_cycles[name][state] = self.state_cycles[name].get(state, 0) + 1
+
+            # Drain from the end of the attack till the port answered all its reads
+            if last_rh_state == "RH_ATTACK" and states["rh_fsm"] != "RH_ATTACK":
+                draining = True
+            if draining:
+                if (yield dut.rowhammer_port_wready_rvalid_counter) == 0:
+                    draining = False
+                else:
+                    self.drain_cycles += 1
+            last_rh_state = states["rh_fsm"]
+
+            # Check after the attack held by the row histogram clear alone
+            if (states["rh_fsm"] == "RH_RESET_SETTINGS" and (yield dut.histogram_clear_sig)
+                    and (yield dut.rowhammer_port_wready_rvalid_counter) == 0 and not (yield dut.dfi_hammer_busy_sig)):
+                self.histogram_clear_wait_cycles += 1
+
+            cmd = (yield port.cmd.valid) and (yield port.cmd.ready)
+            if cmd and states["rh_fsm"] == "RH_ATTACK":
+                self.hammer_reads += 1
+                if self.flips is not None:
+                    self.flips.hammer((yield port.cmd.addr))
+            if self.flips is not None and (yield dut.fill_engine.start):
+                self.flips.fill()
+
+            for engine, start in [("fill", dut.fill_engine.start), ("check", dut.read_checker.start)]:
+                if (yield start):
+                    pass_start[engine] = 0
+                elif pass_start[engine] is not None:
+                    pass_start[engine] += 1
+                    if cmd:
+                        self.first_cmd_latency[engine].append(pass_start[engine])
+                        pass_start[engine] = None
+            yield
+
+    def read_results(self):
+        """
+        Error records, histograms and sweep log of the test, as the host reads
+        them once it is done
+        """
+        dut = self.dut
+
+        # Records popped by reading them from the bus, till one is not valid
+        records = []
+        valid = True
+        while valid:
+            for record in range(ERROR_RECORD_WINDOW_RECORDS):
+                words = []
+                for word in range(ERROR_RECORD_WORDS):
+                    words.append((yield from dut.error_records.bus.read((record * ERROR_RECORD_WORDS) + word)))
+                addr, xor, up, flags = words
+                valid = (flags >> ERROR_RECORD_VALID_BIT) & 1
+                if not valid:
+                    break
+                records.append((addr, flags & ERROR_RECORD_FIELD_MASK, xor, up, (flags >> ERROR_RECORD_POPCOUNT_SHIFT) & ERROR_RECORD_FIELD_MASK,
+                                (flags >> ERROR_RECORD_AFTER_RH_BIT) & 1))
+
+        row_histogram = []
+        for row in range(self.reference.max_row + 1):
+            row_histogram.append((yield from dut.row_histogram.bus.read(row)))
+        bit_histogram = []
+        for bit in range(self.data_width):
+            bit_histogram.append((yield from dut.bit_histogram.bus.read(bit)))
+
+        steps = []
+        for step in range(min((yield dut.sweep_log.steps_csr.status), dut.sweep_log.depth)):
+            words = []
+            for word in range(SWEEP_LOG_WORDS):
+                words.append((yield from dut.sweep_log.bus.read((step * SWEEP_LOG_ENTRY_WORDS) + word)))
+            row, errors_before, errors_after, cycles, hc_first, tests, invalid = words
+            steps.append(SimpleNamespace(row=row, errors_before=errors_before, errors_after=errors_after, cycles=cycles, hc_first=hc_first,
+                                         tests=tests, invalid=bool(invalid)))
+
+        self.readout = {
+            "error_records": records,
+            "row_histogram": row_histogram,
+            "out_of_window": (yield dut.row_histogram.out_of_window_csr.status),
+            "bit_histogram": bit_histogram,
+            "steps": steps,
+        }
+
+    def test(self):
+        dut = self.dut
+        config = self.config
+
+        for entry, words in enumerate(self.table):
+            for word, value in enumerate(words):
+                yield from dut.aggressor_table.bus.write((entry * AGGRESSOR_TABLE_ENTRY_WORDS) + word, value)
+        yield dut.aggressor_count_csr.storage.eq(len(self.table))
+        yield dut.input_data_pattern_1_csr.storage.eq(config.pattern_1)
+        yield dut.input_data_pattern_2_csr.storage.eq(config.pattern_2)
+        yield dut.rowhammer_state_cycle_counter_csr.storage.eq(config.table_cycles)
+        yield dut.sweep_enable_csr.storage.eq(config.sweep)
+        for name in BENCH_CONFIG_CSRS:
+            yield getattr(dut, name + "_csr").storage.eq(getattr(config, name))
+
+        # Settings applied by a commit while idle
+        yield dut.config_commit_csr.re.eq(1)
+        yield
+        yield dut.config_commit_csr.re.eq(0)
+        commit_cycles = 1
+        while (yield dut.config_commit_pending_csr.status):
+            commit_cycles += 1
+            yield
+
+        for fsm in self.state_cycles.values():
+            fsm.clear()
+        start_cycle = self.model.cycle
+        yield dut.rowhammer_start_fsm_csr.storage.eq(1)
+        while (yield dut.feedback_state_csr.status) != 0x8000:
+            if self.model.cycle - start_cycle > BENCH_TIMEOUT_CYCLES:
+                raise RuntimeError("Test not done after {} cycles".format(BENCH_TIMEOUT_CYCLES))
+            yield
+        test_cycles = self.model.cycle - start_cycle
+
+        fill_words = (yield dut.fill_engine.words_csr.status)
+        fill_cycles = (yield dut.fill_engine.cycles_csr.status)
+        check_words = (yield dut.read_checker.words_csr.status)
+        check_cycles = (yield dut.read_checker.cycles_csr.status)
+        attack_cycles = self.state_cycles["rh_fsm"].get("RH_ATTACK", 0)
+
+        self.metrics = {
+            "test_cycles": test_cycles,
+            "commit_latency_cycles": commit_cycles,
+            "fill_words": fill_words,
+            "fill_cycles": fill_cycles,
+            "fill_cycles_per_word": fill_cycles / max(fill_words, 1),
+            "check_words": check_words,
+            "check_cycles": check_cycles,
+            "check_cycles_per_word": check_cycles / max(check_words, 1),
+            "hammer_cmds": self.hammer_reads,
+            "hammer_cycles": attack_cycles,
+            "hammer_cmds_per_cycle": self.hammer_reads / max(attack_cycles, 1),
+            "hammer_drain_cycles": self.drain_cycles,
+            "histogram_clear_wait_cycles": self.histogram_clear_wait_cycles,
+            "cmd_stalls": self.model.cmd_stalls,
+            "wdata_stalls": self.model.wdata_stalls,
+            "errors_before": (yield dut.rowhammer_initial_err_cnt_csr.status),
+            "errors_after": (yield dut.rowhammer_err_cnt_csr.status),
+            "hc_first": (yield dut.hc_first_csr.status),
+            "config_latency_cycles": {
+                "rh_fsm": sum(self.state_cycles["rh_fsm"].get(state, 0) for state in RH_CONFIG_STATES),
+                "fill_range_fsm": max(self.first_cmd_latency["fill"], default=0),
+                "check_range_fsm": max(self.first_cmd_latency["check"], default=0),
+            },
+            "fsm_state_cycles": self.state_cycles,
+        }
+        yield from self.read_results()
+        self.metrics["model_mismatches"] = self.model_mismatches()
+
+        yield dut.rowhammer_start_fsm_csr.storage.eq(0)
+        yield
+
+    def model_mismatches(self):
+        """
+        Counts, error records, histograms and sweep log of the test that
+        differ from the behavioral model
+        """
+        reference = self.reference
+        predicted = reference.run(self.config, self.flips_before, self.rule)
+        gateware = SimpleNamespace(
+            errors_before=self.metrics["errors_before"],
+            errors_after=self.metrics["errors_after"],
+            fill_words=self.metrics["fill_words"],
+            read_words=self.metrics["check_words"],
+            hc_first=self.metrics["hc_first"],
+            steps=self.readout["steps"],
+        )
+        mismatches = predicted.compare(gateware)
+        if self.metrics["hammer_cmds"] != predicted.hammer_cmds:
+            mismatches.append("hammer_cmds: model {}, gateware {}".format(predicted.hammer_cmds, self.metrics["hammer_cmds"]))
+
+        # Histograms count the flipped bits found after the attacks, of bank 0
+        records = [(error.addr, error.lane, error.xor, error.up, error.popcount, int(error.after_attack)) for error in predicted.errors]
+        row_histogram = [0] * (reference.max_row + 1)
+        out_of_window = 0
+        bit_histogram = [0] * self.data_width
+        for error in predicted.errors:
+            if not error.after_attack:
+                continue
+            if (error.addr >> self.col_bits) & ((1 << self.bank_bits) - 1) == 0:
+                row_histogram[error.addr >> reference.row_shift] += error.popcount
+            else:
+                out_of_window += error.popcount
+            for bit in range(32):
+                if (error.xor >> bit) & 1:
+                    bit_histogram[(error.lane * 32) + bit] += 1
+
+        expected = {
+            "error_records": records,
+            "row_histogram": row_histogram,
+            "out_of_window": out_of_window,
+            "bit_histogram": bit_histogram,
+        }
+        for name, value in expected.items():
+            if self.readout[name] != value:
+                mismatches.append("{}: model {}, gateware {}".format(name, value, self.readout[name]))
+        return mismatches
+
+    def run(self, vcd_name=None):
+        run_simulation(self.dut, [self.test(), self.monitor(), self.model.gen()], vcd_name=vcd_name)
+        return self.metrics
+
+
+
+"""
+Suite
+"""
+
+def run_suite(cases, geometry, seed=0):
+    results = {
+        "version": BENCH_VERSION,
+        "geometry": geometry,
+        "cases": {},
+    }
+    for name in cases:
+        print("Running {}...".format(name), file=sys.stderr)
+        bench = Bench_Case(seed=seed, scenario=BENCH_SCENARIOS.get(name), **geometry, **BENCH_CASES[name])
+        results["cases"][name] = {
+            "port": BENCH_CASES[name],
+            "metrics": bench.run(),
+        }
+        for mismatch in results["cases"][name]["metrics"]["model_mismatches"]:
+            print("{}: model mismatch {}".format(name, mismatch), file=sys.stderr)
+    return results
+
+
+def bank_parallel_mismatches():
+    """
+    Bank sequences of the bank-parallel attack table (as set by
+    sdram_set_bank_parallel_attack) that differ from BENCH_BANK_PARALLEL_BANKS
+    """
+    mismatches = []
+    model = Row_Hammer_Model(DEFAULT_ADDRESS_WIDTH + BENCH_DDR4_BANK_BITS, DEFAULT_DATA_WIDTH, BENCH_DDR4_BANK_BITS, DEFAULT_COL_BITS)
+    for num_banks, expected in BENCH_BANK_PARALLEL_BANKS.items():
+        entries = model.bank_parallel_aggressors(BENCH_VICTIM_ROW, num_banks, BENCH_DDR4_BA_BITS, BENCH_HAMMER_COUNT)
+        banks = [(addr >> DEFAULT_COL_BITS) & ((1 << BENCH_DDR4_BANK_BITS) - 1) for addr, _, _ in entries]
+        if banks != expected + expected:
+            mismatches.append("{} banks: expected {}, table {}".format(num_banks, expected + expected, banks))
+    return mismatches
+
+
+def find_regressions(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Metrics worse than the baseline by more than the tolerance (a fraction)
+    """
+    regressions = []
+    for name, case in results["cases"].items():
+        if name not in baseline.get("cases", {}):
+            continue
+        for metric, higher_is_better in REGRESSION_METRICS.items():
+            new = case["metrics"][metric]
+            old = baseline["cases"][name]["metrics"][metric]
+            if higher_is_better:
+                worse = new < old * (1 - tolerance)
+            else:
+                worse = new > old * (1 + tolerance)
+            if worse:
+                regressions.append("{}: {} {:.4g} -> {:.4g}".format(name, metric, old, new))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Row_Hammer_Test simulation benchmarks")
+    parser.add_argument("--case", action="append", choices=sorted(BENCH_CASES), help="Case to run (default: all), can be repeated")
+    parser.add_argument("--address-width", type=int, default=DEFAULT_ADDRESS_WIDTH, help="Port address width (words filled and checked: 2**address_width)")
+    parser.add_argument("--data-width", type=int, default=DEFAULT_DATA_WIDTH, help="Port data width")
+    parser.add_argument("--bank-bits", type=int, default=DEFAULT_BANK_BITS)
+    parser.add_argument("--col-bits", type=int, default=DEFAULT_COL_BITS)
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the cmd.ready backpressure")
+    parser.add_argument("--output", help="Write the results to this JSON file (default: stdout)")
+    parser.add_argument("--baseline", help="JSON results to compare with, exits with 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Fraction a metric can get worse than the baseline")
+    args = parser.parse_args()
+
+    geometry = {
+        "address_width": args.address_width,
+        "data_width": args.data_width,
+        "bank_bits": args.bank_bits,
+        "col_bits": args.col_bits,
+    }
+    results = run_suite(args.case or list(BENCH_CASES), geometry, args.seed)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    # The gateware not doing what the model says fails as a regression does
+    failed = any(case["metrics"]["model_mismatches"] for case in results["cases"].values())
+
+    for mismatch in bank_parallel_mismatches():
+        print("Bank-parallel attack: " + mismatch, file=sys.stderr)
+        failed = True
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print("Regression " + regression, file=sys.stderr)
+        if regressions:
+            failed = True
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Behavioral model of a LiteDRAM native port for run_simulation.
+"""
+
+
+import random
+
+from migen import *
+
+
+
+"""
+Constants
+"""
+
+DEFAULT_LATENCY = 8          # Cycles from a read command to its data, open row
+DEFAULT_ROW_MISS_LATENCY = 8 # Extra cycles when the row of the bank is not open
+DEFAULT_REORDER_DEPTH = 16   # Reads in flight the controller can complete out of order
+
+
+
+"""
+Native port model
+"""
+
+class Native_Port_Model:
+    """
+    Memory behind a LiteDRAM native port. Commands are taken when a random
+    draw is below ready_prob (cmd.ready backpressure), write data is taken
+    in command order. Reads complete after latency cycles, plus
+    row_miss_latency when another row of the bank is open, so reads to
+    different banks complete out of order. As the native port gives the
+    read data back in command order, completed reads wait in a reorder
+    buffer of reorder_depth reads behind the oldest one, and no command is
+    taken while it is full.
+
+    flip_hook(model, addr) is called for every read command taken, it can
+    flip bits in model.mem to stand in for the DRAM.
+    """
+
+    def __init__(self, port, bank_bits, col_bits, latency=DEFAULT_LATENCY, row_miss_latency=DEFAULT_ROW_MISS_LATENCY,
+                 reorder_depth=DEFAULT_REORDER_DEPTH, ready_prob=1.0, seed=0, flip_hook=None):
+        self.port = port
+        self.bank_bits = bank_bits
+        self.col_bits = col_bits
+        self.latency = latency
+        self.row_miss_latency = row_miss_latency
+        self.reorder_depth = reorder_depth
+        self.ready_prob = ready_prob
+        self.rng = random.Random(seed)
+        self.flip_hook = flip_hook
+
+        self.mem = {}
+        self.open_rows = {}
+        self.reads = []   # [due cycle, address] in command order
+        self.writes = []  # Addresses waiting for their data
+        self.cycle = 0
+
+        # Counts of the commands taken, the benchmark reads them between phases
+        self.read_cmds = 0
+        self.write_cmds = 0
+        self.cmd_stalls = 0   # cmd.valid & ~cmd.ready
+        self.wdata_stalls = 0 # wdata.valid & ~wdata.ready
+
+    def read_latency(self, addr):
+        bank = (addr >> self.col_bits) & ((1 << self.bank_bits) - 1)
+        row = addr >> (self.bank_bits + self.col_bits)
+        latency = self.latency
+        if self.open_rows.get(bank) != row:
+            latency += self.row_miss_latency
+            self.open_rows[bank] = row
+        return latency
+
+    @passive
+    def gen(self):
+        port = self.port
+        mask = (1 << port.data_width) - 1
+        while True:
+            ready = int((len(self.reads) < self.reorder_depth) and (self.rng.random() < self.ready_prob))
+            yield port.cmd.ready.eq(ready)
+            wready = int(len(self.writes) > 0)
+            yield port.wdata.ready.eq(wready)
+
+            # Oldest read first, once it is complete
+            if self.reads and self.reads[0][0] <= self.cycle:
+                yield port.rdata.valid.eq(1)
+                yield port.rdata.data.eq(self.mem.get(self.reads[0][1], 0))
+            else:
+                yield port.rdata.valid.eq(0)
+
+            yield
+            self.cycle += 1
+
+            # Handshakes of the cycle that just ended
+            cmd_valid = (yield port.cmd.valid)
+            if cmd_valid and ready:
+                addr = (yield port.cmd.addr)
+                if (yield port.cmd.we):
+                    self.writes.append(addr)
+                    self.write_cmds += 1
+                else:
+                    self.reads.append([self.cycle + self.read_latency(addr), addr])
+                    self.read_cmds += 1
+                    if self.flip_hook is not None:
+                        self.flip_hook(self, addr)
+            elif cmd_valid:
+                self.cmd_stalls += 1
+
+            wdata_valid = (yield port.wdata.valid)
+            if wdata_valid and wready:
+                self.mem[self.writes.pop(0)] = (yield port.wdata.data) & mask
+            elif wdata_valid:
+                self.wdata_stalls += 1
+
+            # LiteDRAM does not wait on rdata.ready
+            if (yield port.rdata.valid):
+                self.reads.pop(0)
@@ -2,6 +2,9 @@
 
 #include <stdio.h>
 #include <generated/csr.h>
+#include <generated/mem.h>
+#include <generated/soc.h>
+#include <irq.h>
 #include <liblitedram/rh_test.h>
 
 uint32_t extract_bank_from_addr(uint32_t addr, uint32_t bankbits, uint32_t colbits) {
@@ -21,174 +24,218 @@ uint32_t extract_row_from_addr(uint32_t addr, uint32_t bankbits, uint32_t colbit
     return addr >> (bankbits + colbits);
 }
 
-uint32_t sdram_get_num_addrs_attack_sig(void) {
-
-	// We want to get data, not send it
-	rh_test_addr_to_set_set_not_get_csr_write(FALSE_CONST);
-
-	// Access the signal holding the number of sets of addresses/freqs already set
-	rh_test_addr_to_set_sel_val_csr_write(NUM_SETS_ATTACK_ADDR);
-
-	// Start the process of getting data into CSR register
-	rh_test_addr_to_set_start_fsm_csr_write(TRUE_CONST);
-
-	// Wait for fsm to start
-	while (rh_test_addr_to_set_start_prev_csr_read() == FALSE_CONST) {};
-
-	// Finish it
-	rh_test_addr_to_set_start_fsm_csr_write(FALSE_CONST);
+#ifdef RH_AGGRESSOR_TABLE_BASE
+// The aggressor table on the bus, AGGRESSOR_TABLE_ENTRY_WORDS words per entry
+static volatile uint32_t *sdram_aggressor_table_entry(uint32_t input_addr) {
+    return (volatile uint32_t *)RH_AGGRESSOR_TABLE_BASE + (input_addr * AGGRESSOR_TABLE_ENTRY_WORDS);
+}
+#else
+// No table on the bus, point the table CSRs at the entry
+static void sdram_aggressor_table_select(uint32_t input_addr) {
+    rh_test_aggressor_table_entry_csr_write(input_addr);
+}
+#endif
 
-	// Wait for fsm to finish. Data should now be in addr_to_set_freq_out_csr
-	while (rh_test_addr_to_set_start_prev_csr_read() == TRUE_CONST) {};
+uint32_t sdram_get_num_addrs_attack_sig(void) {
 
-	// Obtain value
-	return rh_test_addr_to_set_freq_out_csr_read();
+    // Shadow value, applied on the next commit
+    return rh_test_aggressor_count_csr_read();
 
 }
 
 void sdram_set_num_addrs_attack_sig(uint32_t new_val) {
 
-    // Change new val
-    rh_test_addr_to_set_freq_csr_write(new_val);
-
-	// We want to send address and freq count data to set number.
-	rh_test_addr_to_set_set_not_get_csr_write(TRUE_CONST);
+    // Shadow value, applied on the next commit
+    rh_test_aggressor_count_csr_write(new_val);
 
-	// Access the signal holding the number of sets of addresses/freqs already set
-	rh_test_addr_to_set_sel_val_csr_write(NUM_SETS_ATTACK_ADDR);
+}
 
-	// Start the process of getting data into CSR register
-	rh_test_addr_to_set_start_fsm_csr_write(TRUE_CONST);
+uint32_t sdram_get_value_addr_sig(uint32_t input_addr) {
+#ifdef RH_AGGRESSOR_TABLE_BASE
+    return sdram_aggressor_table_entry(input_addr)[AGGRESSOR_TABLE_FREQ_WORD];
+#else
+    sdram_aggressor_table_select(input_addr);
+    return rh_test_aggressor_table_freq_out_csr_read();
+#endif
+}
 
-	// Wait for fsm to start
-	while (rh_test_addr_to_set_start_prev_csr_read() == FALSE_CONST) {};
+uint32_t sdram_get_addr_val_sig(uint32_t input_addr) {
+#ifdef RH_AGGRESSOR_TABLE_BASE
+    return sdram_aggressor_table_entry(input_addr)[AGGRESSOR_TABLE_ADDR_WORD];
+#else
+    sdram_aggressor_table_select(input_addr);
+    return rh_test_aggressor_table_addr_out_csr_read();
+#endif
+}
 
-	// Finish it
-	rh_test_addr_to_set_start_fsm_csr_write(FALSE_CONST);
+void sdram_set_order_addr_sig(uint32_t order_count, uint32_t addr_to_set, uint32_t freq_count) {
 
-	// Wait for fsm to finish. Data should now be in addr_to_set_freq_out_csr
-	while (rh_test_addr_to_set_start_prev_csr_read() == TRUE_CONST) {};
+    // Keep the loop count already stored for this entry
+    sdram_set_order_addr_loop_sig(order_count, addr_to_set, freq_count, sdram_get_loop_addr_sig(order_count));
 
 }
 
-uint32_t sdram_get_value_addr_sig(uint32_t input_addr) {
+void sdram_set_order_addr_loop_sig(uint32_t order_count, uint32_t addr_to_set, uint32_t freq_count, uint32_t loop_count) {
 
-	// We want to get data, not send it
-	rh_test_addr_to_set_set_not_get_csr_write(FALSE_CONST);
+    // Plain stores into the table on the bus, or the table CSRs
+    sdram_write_aggressor_table(order_count, &addr_to_set, &freq_count, &loop_count, 1);
 
-	// Access the signal holding the number of sets of addresses/freqs already set
-	rh_test_addr_to_set_sel_val_csr_write(input_addr);
+}
 
-	// Start the process of getting data into CSR register
-	rh_test_addr_to_set_start_fsm_csr_write(TRUE_CONST);
+uint32_t sdram_get_loop_addr_sig(uint32_t input_addr) {
+#ifdef RH_AGGRESSOR_TABLE_BASE
+    return sdram_aggressor_table_entry(input_addr)[AGGRESSOR_TABLE_LOOP_WORD];
+#else
+    sdram_aggressor_table_select(input_addr);
+    return rh_test_aggressor_table_loop_out_csr_read();
+#endif
+}
 
-	// Wait for fsm to start
-	while (rh_test_addr_to_set_start_prev_csr_read() == FALSE_CONST) {};
+uint32_t sdram_get_aggressor_table_depth(void) {
+    return rh_test_aggressor_table_depth_csr_read();
+}
 
-	// Finish it
-	rh_test_addr_to_set_start_fsm_csr_write(FALSE_CONST);
+// Set data or timers
+// Set the bank, row and column of the address map
+static void sdram_set_address_map(uint32_t bank, uint32_t row, int32_t row_offset, uint32_t col) {
+    rh_test_address_map_bank_csr_write(bank);
+    rh_test_address_map_row_csr_write(row);
+    rh_test_address_map_row_offset_csr_write((uint32_t)row_offset);
+    rh_test_address_map_col_csr_write(col);
+}
 
-	// Wait for fsm to finish. Data should now be in addr_to_set_freq_out_csr
-	while (rh_test_addr_to_set_start_prev_csr_read() == TRUE_CONST) {};
+// Get the port address of a bank, row and column
+uint32_t sdram_map_addr(uint32_t bank, uint32_t row, int32_t row_offset, uint32_t col) {
+    sdram_set_address_map(bank, row, row_offset, col);
+    return rh_test_address_map_addr_csr_read();
+}
 
-	// Obtain value
-	return rh_test_addr_to_set_freq_out_csr_read();
+// Set an entry of the aggressor table from a bank, row and column
+void sdram_set_order_bank_row_col(uint32_t order_count, uint32_t bank, uint32_t row, int32_t row_offset, uint32_t col, uint32_t freq_count) {
 
+    // The loop count already stored for this entry is kept
+    sdram_write_aggressor_tuples(order_count, &bank, &row, &row_offset, &col, &freq_count, NULL, 1);
 }
 
-void sdram_set_order_addr_sig(uint32_t order_count, uint32_t addr_to_set, uint32_t freq_count) {
-
-    rh_test_addr_to_set_val_csr_write(addr_to_set);
+// Write count table entries from bank, row and column tuples starting at first_entry, NULL loops keeps the loop counts
+int sdram_write_aggressor_tuples(uint32_t first_entry, const uint32_t *banks, const uint32_t *rows, const int32_t *row_offsets, const uint32_t *cols, const uint32_t *freqs, const uint32_t *loops, uint32_t count) {
 
-    // Whatever value the freq csr will be written to even if 
-    // the addr_to_set was 10 or above will be ignored anyways,
-    // as the freq is hard coded to 1. Below 'if' statement is 
-    // possibly redundant.
-    if (order_count < MAX_ADDR_TO_SET_FREQ) {
-        rh_test_addr_to_set_freq_csr_write(freq_count);
+    if (first_entry + count > sdram_get_aggressor_table_depth()) {
+        printf("Aggressor table holds %ld entries\n", sdram_get_aggressor_table_depth());
+        return FALSE_CONST;
     }
 
-	// We want to send address and freq count data to set number.
-	rh_test_addr_to_set_set_not_get_csr_write(TRUE_CONST);
+#ifdef RH_AGGRESSOR_TUPLES_BASE
+    // The gateware maps the address as the column word is written, it goes after the bank, row and offset
+    volatile uint32_t *tuple = (volatile uint32_t *)RH_AGGRESSOR_TUPLES_BASE + (first_entry * AGGRESSOR_TUPLE_ENTRY_WORDS);
+
+    for (uint32_t i = 0; i < count; ++i) {
+        tuple[AGGRESSOR_TUPLE_BANK_WORD] = banks[i];
+        tuple[AGGRESSOR_TUPLE_ROW_WORD] = rows[i];
+        tuple[AGGRESSOR_TUPLE_ROW_OFFSET_WORD] = (uint32_t)row_offsets[i];
+        tuple[AGGRESSOR_TUPLE_COL_WORD] = cols[i];
+        tuple[AGGRESSOR_TUPLE_FREQ_WORD] = freqs[i];
+        if (loops != NULL) {
+            tuple[AGGRESSOR_TUPLE_LOOP_WORD] = loops[i];
+        }
+        tuple += AGGRESSOR_TUPLE_ENTRY_WORDS;
+    }
+#else
+    // No tuples on the bus, map every entry through the address map CSRs
+    uint32_t addr;
+    uint32_t loop;
+
+    for (uint32_t i = 0; i < count; ++i) {
+        addr = sdram_map_addr(banks[i], rows[i], row_offsets[i], cols[i]);
+        loop = (loops != NULL) ? loops[i] : sdram_get_loop_addr_sig(first_entry + i);
+        sdram_write_aggressor_table(first_entry + i, &addr, &freqs[i], &loop, 1);
+    }
+#endif
 
-	// Access the signal holding the number of sets of addrs/freqs already set
-	rh_test_addr_to_set_sel_val_csr_write(order_count);
+    return TRUE_CONST;
+}
 
-	// Start the process of getting data into CSR register
-	rh_test_addr_to_set_start_fsm_csr_write(TRUE_CONST);
+// Write count table entries starting at first_entry, NULL loops keeps the loop counts
+int sdram_write_aggressor_table(uint32_t first_entry, const uint32_t *addrs, const uint32_t *freqs, const uint32_t *loops, uint32_t count) {
 
-	// Wait for fsm to start
-	while (rh_test_addr_to_set_start_prev_csr_read() == FALSE_CONST) {};
+    if (first_entry + count > sdram_get_aggressor_table_depth()) {
+        printf("Aggressor table holds %ld entries\n", sdram_get_aggressor_table_depth());
+        return FALSE_CONST;
+    }
 
-	// Finish it
-	rh_test_addr_to_set_start_fsm_csr_write(FALSE_CONST);
+#ifdef RH_AGGRESSOR_TABLE_BASE
+    volatile uint32_t *table = sdram_aggressor_table_entry(first_entry);
 
-	// Wait for fsm to finish. Data should now be in addr_to_set_freq_out_csr
-	while (rh_test_addr_to_set_start_prev_csr_read() == TRUE_CONST) {};
+    for (uint32_t i = 0; i < count; ++i) {
+        table[AGGRESSOR_TABLE_ADDR_WORD] = addrs[i];
+        table[AGGRESSOR_TABLE_FREQ_WORD] = freqs[i];
+        if (loops != NULL) {
+            table[AGGRESSOR_TABLE_LOOP_WORD] = loops[i];
+        }
+        table += AGGRESSOR_TABLE_ENTRY_WORDS;
+    }
+#else
+    // No table on the bus, one CSR write of the three fields per entry
+    for (uint32_t i = 0; i < count; ++i) {
+        sdram_aggressor_table_select(first_entry + i);
+        rh_test_aggressor_table_addr_csr_write(addrs[i]);
+        rh_test_aggressor_table_freq_csr_write(freqs[i]);
+        if (loops != NULL) {
+            rh_test_aggressor_table_loop_csr_write(loops[i]);
+        } else {
+            rh_test_aggressor_table_loop_csr_write(rh_test_aggressor_table_loop_out_csr_read());
+        }
+        rh_test_aggressor_table_write_csr_write(TRUE_CONST);
+    }
+#endif
 
+    return TRUE_CONST;
 }
 
-// Set data or timers
 void sdram_set_timer_sigs(uint32_t input_val, uint32_t addr_to_set) {
 
+    uint32_t pair_first_entry;
+
     // Assert only timers 2-7 are to be set.
     if ((addr_to_set < MIN_TIMER_ADDRESS) || (addr_to_set > MAX_TIMER_ADDRESS)) {
-        printf("\nValue of timer should be in range %d - %d\n\n", MIN_TIMER_ADDRESS, MAX_ADDR_TO_SET_FREQ);
+        printf("\nValue of timer should be in range %d - %d\n\n", MIN_TIMER_ADDRESS, MAX_TIMER_ADDRESS);
         return;
     }
 
-    // Set the timer or data address we want to set
-    rh_test_input_data_sel_val_csr_write(addr_to_set);
+    // Pair timers repeat two entries of the aggressor table: the first entry
+    // chains to the second, the second closes the pair with the loop count.
+    if (addr_to_set < TIMER_CYCLES_ADDR) {
+        pair_first_entry = (addr_to_set - TIMER_1_ADDR) * 2;
+        sdram_set_order_addr_loop_sig(pair_first_entry, sdram_get_addr_val_sig(pair_first_entry), sdram_get_value_addr_sig(pair_first_entry), 0);
+        sdram_set_order_addr_loop_sig(pair_first_entry + 1, sdram_get_addr_val_sig(pair_first_entry + 1), sdram_get_value_addr_sig(pair_first_entry + 1), input_val);
+        return;
+    }
 
-    // Set the address of the timer
+    // Set the cycles of all addresses combined, applied on the next commit
     rh_test_rowhammer_state_cycle_counter_csr_write(input_val);
-
-    // We want to set the timer
-    rh_test_input_data_set_not_get_csr_write(TRUE_CONST);
-
-    // Start the fsm
-    rh_test_input_data_to_set_start_fsm_csr_write(TRUE_CONST);
-
-    // Wait for the fsm to start
-    while (rh_test_input_data_set_start_prev_csr_read() == FALSE_CONST) {};
-
-    // Finish it
-    rh_test_input_data_to_set_start_fsm_csr_write(FALSE_CONST);
-
-    // Wait for fsm to finish
-    while (rh_test_input_data_set_start_prev_csr_read() == TRUE_CONST) {};
 }
 
 
 // Set data or timers
 uint32_t sdram_get_timer_sigs(uint32_t addr_to_set) {
 
+    uint32_t loop_count;
+
     // Assert only timers 2-7 are to be set.
     if ((addr_to_set < MIN_TIMER_ADDRESS) || (addr_to_set > MAX_TIMER_ADDRESS)) {
         printf("\nValue of timer should be in range %d - %d\n\n", MIN_TIMER_ADDRESS, MAX_TIMER_ADDRESS);
         return ERROR_VAL_RETURN;
     }
 
-    // Set the timer or data address we want to get
-    rh_test_input_data_sel_val_csr_write(addr_to_set);
-
-    // We want to get the timer
-    rh_test_input_data_set_not_get_csr_write(FALSE_CONST);
-
-    // Start the fsm
-    rh_test_input_data_to_set_start_fsm_csr_write(TRUE_CONST);
-
-    // Wait for the fsm to start
-    while (rh_test_input_data_set_start_prev_csr_read() == FALSE_CONST) {};
-
-    // Finish it
-    rh_test_input_data_to_set_start_fsm_csr_write(FALSE_CONST);
-
-    // Wait for fsm to finish
-    while (rh_test_input_data_set_start_prev_csr_read() == TRUE_CONST) {};
+    // Pair timers are the loop count of the second entry of the pair,
+    // a chained entry is played once.
+    if (addr_to_set < TIMER_CYCLES_ADDR) {
+        loop_count = sdram_get_loop_addr_sig(((addr_to_set - TIMER_1_ADDR) * 2) + 1);
+        return (loop_count == 0) ? 1 : loop_count;
+    }
 
     // Return the value
-    return rh_test_rowhammer_state_cycle_counter_val_output_csr_read();
+    return rh_test_rowhammer_state_cycle_counter_csr_read();
 }
 
 
@@ -206,14 +253,14 @@ void sdram_rhtest_ref_rate_display(void) {
 // Set the address and frequency as desired by User
 void sdram_set_addr_freq(uint32_t order_count, uint32_t addr_to_set, uint32_t freq_count, uint32_t num_addrs_attack_sig_val) {
 
-    if ((order_count > num_addrs_attack_sig_val) || (order_count >= NUM_SETS_ATTACK_ADDR)) {
+    uint32_t table_depth = sdram_get_aggressor_table_depth();
+
+    if ((order_count > num_addrs_attack_sig_val) || (order_count >= table_depth)) {
         printf("Option for order value not available. Available options are:\n");
-        printf("Modify order values: ");
-		for (int i = 0; ((i < num_addrs_attack_sig_val) && (i < NUM_SETS_ATTACK_ADDR)); ++i) {
-			printf("%d ", i);
-		}
-		printf("\n");
-		if (num_addrs_attack_sig_val < NUM_SETS_ATTACK_ADDR) {
+        if (num_addrs_attack_sig_val > 0) {
+            printf("Modify order values: 0 - %ld\n", num_addrs_attack_sig_val - 1);
+        }
+		if (num_addrs_attack_sig_val < table_depth) {
 			printf("Add new order value: %ld\n", num_addrs_attack_sig_val);
 		}
         
@@ -253,77 +300,113 @@ void sdram_show_addr_freq(void) {
     printf("Addresses to be attacked: \n");
 
     uint32_t num_addrs_attack_sig_val;
-    uint32_t timer_addr;
+    uint32_t table_depth;
+    uint32_t loop_count;
+    uint32_t addr_val;
 
 	// Obtain value
 	num_addrs_attack_sig_val = sdram_get_num_addrs_attack_sig();
+    table_depth = sdram_get_aggressor_table_depth();
 
-    // Should not occur for num_addrs_attack_sig_val to be above 20
-    if (num_addrs_attack_sig_val > NUM_SETS_ATTACK_ADDR) {
-        printf("Not sure what happened here, \nnum_addrs_attack_sig_val is greater than 20, val: %ld\n", num_addrs_attack_sig_val);
-        return;
+    // Entries past the end of the table are never attacked
+    if (num_addrs_attack_sig_val > table_depth) {
+        printf("Number of addresses (%ld) is greater than the aggressor table (%ld), only the table is attacked\n", num_addrs_attack_sig_val, table_depth);
+        num_addrs_attack_sig_val = table_depth;
     }
-
-    timer_addr = TIMER_1_ADDR;
-    int helper_index = 0;
 	
     // Display all the sets of addresses with frequencies being used
-    printf("\nNumber of addresses, frequencies being used: %ld\n\n", num_addrs_attack_sig_val);
+    printf("\nNumber of addresses, frequencies being used: %ld (table holds %ld)\n\n", num_addrs_attack_sig_val, table_depth);
     for (int i = 0; i < num_addrs_attack_sig_val; ++i) {
 
-        // Run a sequence to get data in output CSRs first
-        sdram_get_value_addr_sig(i);
-
-        // Now we have csrs, display them
-        if (i < MAX_ADDR_TO_SET_FREQ) {
-            printf("Address set: 0x%07lx ROW: %ld BANK: %ld COL: %ld, freq: %ld\n", 
-                rh_test_addr_to_set_val_out_csr_read(), 
-                extract_row_from_addr(rh_test_addr_to_set_val_out_csr_read(), rh_test_bank_width_csr_read(), rh_test_col_width_csr_read()),
-                extract_bank_from_addr(rh_test_addr_to_set_val_out_csr_read(), rh_test_bank_width_csr_read(), rh_test_col_width_csr_read()),
-                extract_col_from_addr(rh_test_addr_to_set_val_out_csr_read(), rh_test_col_width_csr_read()),
-                rh_test_addr_to_set_freq_out_csr_read()
-            );
+        // Read the entry from the table on the bus
+        addr_val = sdram_get_addr_val_sig(i);
+        loop_count = sdram_get_loop_addr_sig(i);
+
+        printf("%3d: Address set: 0x%07lx ROW: %ld BANK: %ld COL: %ld, freq: %ld", 
+            i,
+            addr_val, 
+            extract_row_from_addr(addr_val, rh_test_bank_width_csr_read(), rh_test_col_width_csr_read()),
+            extract_bank_from_addr(addr_val, rh_test_bank_width_csr_read(), rh_test_col_width_csr_read()),
+            extract_col_from_addr(addr_val, rh_test_col_width_csr_read()),
+            sdram_get_value_addr_sig(i)
+        );
+
+        if (loop_count == 0) {
+            printf("\n");
+        } else {
+            printf(", loop: %ld\n", loop_count);
         }
+    }
 
-        if (((i + 1) % 2 == 0) && (i < MAX_ADDR_TO_SET_FREQ)) {
-            printf("\nTimer %d: Cycles for above two addresses: %ld\n\n", ((i / 2) + 1), sdram_get_timer_sigs(timer_addr));
-            timer_addr += 1;
-        }
 
-        helper_index = i + 1;
-    }
+    // Anything else that contributes to cycles of sets of addresses/freqs being accessed
 
-    // Display data for the rest of the timers
-    for (int i = helper_index; i < MAX_ADDR_TO_SET_FREQ; ++i) {
-        
-        if ((i + 1) % 2 == 0) {
-            printf("\nTimer %d: Cycles for above two addresses: %ld\n\n", ((i / 2) + 1), sdram_get_timer_sigs(timer_addr));
-            timer_addr += 1;
-        }
+    printf("\nNumber of cycles to repeat sequence of addr and freq accesses: %ld\n", sdram_get_timer_sigs(MAX_TIMER_ADDRESS));
 
+    if (rh_test_hammer_interleave_csr_read()) {
+        printf("Interleaved: the entries of every group are read in turn, one read each\n\n");
+    } else {
+        printf("Every entry is read freq times in a row\n\n");
     }
+}
+
+// Read the entries of every group in turn, one read each, instead of freq reads in a row
+void sdram_set_hammer_interleave(uint32_t enable) {
+    rh_test_hammer_interleave_csr_write(enable);
+}
 
-    // Display all the sets of addresses/freqs with a frequency of one being used
-    for (int i = MAX_ADDR_TO_SET_FREQ; i < num_addrs_attack_sig_val; ++i) {
+// Double-sided attack of victim_row in the first num_banks banks at once. The
+// entries are interleaved, and consecutive entries are in different bank groups
+// (the bank group is above the ba_bits bank address bits, as on DDR4), so the
+// controller can overlap their ACTs.
+int sdram_set_bank_parallel_attack(uint32_t victim_row, uint32_t num_banks, uint32_t ba_bits, uint32_t hammer_count) {
+
+    uint32_t banks[2 * MAX_PARALLEL_BANKS];
+    uint32_t rows[2 * MAX_PARALLEL_BANKS];
+    int32_t row_offsets[2 * MAX_PARALLEL_BANKS];
+    uint32_t cols[2 * MAX_PARALLEL_BANKS];
+    uint32_t freqs[2 * MAX_PARALLEL_BANKS];
+    uint32_t loops[2 * MAX_PARALLEL_BANKS];
+    uint32_t num_groups;
+    uint32_t entry = 0;
+
+    if ((num_banks == 0) || (num_banks > MAX_PARALLEL_BANKS) || (num_banks > (1 << rh_test_bank_width_csr_read()))) {
+        printf("Number of banks must be 1 to %ld\n", (uint32_t)MAX_PARALLEL_BANKS);
+        return FALSE_CONST;
+    }
 
-        // Run a sequence to get data in output CSRs first
-        sdram_get_value_addr_sig(i);
+    // Bank groups above the ba_bits bank address bits, one entry in each in turn
+    num_groups = 1;
+    if (ba_bits < rh_test_bank_width_csr_read()) {
+        num_groups = 1 << (rh_test_bank_width_csr_read() - ba_bits);
+    }
+    if (num_groups > num_banks) {
+        num_groups = num_banks;
+    }
 
-        // Now we have csrs, display them
-        if (i < NUM_SETS_ATTACK_ADDR) {
-            printf("Address set: 0x%07lx ROW: %ld BANK: %ld COL: %ld, freq of one\n", 
-                rh_test_addr_to_set_val_out_csr_read(),
-                extract_row_from_addr(rh_test_addr_to_set_val_out_csr_read(), rh_test_bank_width_csr_read(), rh_test_col_width_csr_read()),
-                extract_bank_from_addr(rh_test_addr_to_set_val_out_csr_read(), rh_test_bank_width_csr_read(), rh_test_col_width_csr_read()),
-                extract_col_from_addr(rh_test_addr_to_set_val_out_csr_read(), rh_test_col_width_csr_read())
-            );
+    // Aggressors below the victim in every bank, then above it
+    for (int32_t row_offset = -1; row_offset <= 1; row_offset += 2) {
+        for (uint32_t i = 0; i < num_banks; ++i) {
+            banks[entry] = ((i % num_groups) << ba_bits) | (i / num_groups);
+            rows[entry] = victim_row;
+            row_offsets[entry] = row_offset;
+            cols[entry] = 0;
+            freqs[entry] = hammer_count;
+            loops[entry] = 0;
+            entry++;
         }
     }
 
+    // One group, played once per play of the table
+    loops[entry - 1] = 1;
 
-    // Anything else that contributes to cycles of sets of addresses/freqs being accessed
+    if (sdram_write_aggressor_tuples(0, banks, rows, row_offsets, cols, freqs, loops, entry) == FALSE_CONST) {
+        return FALSE_CONST;
+    }
+    sdram_set_num_addrs_attack_sig(entry);
+    sdram_set_hammer_interleave(TRUE_CONST);
 
-    printf("\nNumber of cycles to repeat sequence of addr and freq accesses: %ld\n\n", sdram_get_timer_sigs(MAX_TIMER_ADDRESS));
+    return TRUE_CONST;
 }
 
 void sdram_set_data_pattern(uint32_t input_pattern, uint32_t data_sel) {
@@ -334,80 +417,84 @@ void sdram_set_data_pattern(uint32_t input_pattern, uint32_t data_sel) {
         return;
     }
 
-    // Choose which data val to set
-    rh_test_input_data_sel_val_csr_write(data_sel);
-
-    // Set the input data
-    rh_test_input_data_pattern_csr_write(input_pattern);
-
-    // We want to set the data, not get it
-    rh_test_input_data_set_not_get_csr_write(TRUE_CONST);
+    // Set the chosen data val, applied on the next commit
+    if (data_sel == 0) {
+        rh_test_input_data_pattern_1_csr_write(input_pattern);
+    } else {
+        rh_test_input_data_pattern_2_csr_write(input_pattern);
+    }
+}
 
-    // Start the fsm to get data
-    rh_test_input_data_to_set_start_fsm_csr_write(TRUE_CONST);
+// Use PRBS data seeded from the address, or go back to the patterns
+void sdram_set_prbs_pattern(uint32_t enable, uint32_t seed) {
+    rh_test_input_data_prbs_seed_csr_write(seed);
+    rh_test_input_data_prbs_setting_csr_write(enable);
+}
 
-    // Wait for FSM to start
-    while (rh_test_input_data_set_start_prev_csr_read() == FALSE_CONST) {};
+// Choose how the patterns are laid out per row
+void sdram_set_pattern_mode(uint32_t mode) {
 
-    // Finish it
-    rh_test_input_data_to_set_start_fsm_csr_write(FALSE_CONST);
+    if (mode > PATTERN_CHECKERBOARD) {
+        printf("\nPattern mode should be %d or less\n\n", PATTERN_CHECKERBOARD);
+        return;
+    }
 
-    // Wait for FSM to finish
-    while (rh_test_input_data_set_start_prev_csr_read() == TRUE_CONST) {};
+    rh_test_input_data_pattern_mode_csr_write(mode);
 }
 
 // Show data pattern 
 void show_data_pattern(void) {
 
-    // Get first data val
-    rh_test_input_data_sel_val_csr_write(0);
-
-    // We want to get the data to show, not set it
-    rh_test_input_data_set_not_get_csr_write(FALSE_CONST);
-
-    // Start the fsm to get data
-    rh_test_input_data_to_set_start_fsm_csr_write(TRUE_CONST);
-
-    // Wait for FSM to start
-    while (rh_test_input_data_set_start_prev_csr_read() == FALSE_CONST) {};
-
-    // Finish it
-    rh_test_input_data_to_set_start_fsm_csr_write(FALSE_CONST);
-
-    // Wait for FSM to finish
-    while (rh_test_input_data_set_start_prev_csr_read() == TRUE_CONST) {};
-
     // Output data
     printf("Pattern set to:\n\n");
-    printf(" %08lx x%ld for all rows, or even rows with double setting\n", rh_test_input_data_pattern_output_csr_read(), (rh_test_data_width_csr_read()/DATA_WIDTH_32_BIT));
-
-    // Get second data val
-    rh_test_input_data_sel_val_csr_write(1);
-
-    // We want to get the data to show, not set it
-    rh_test_input_data_set_not_get_csr_write(FALSE_CONST);
+    printf(" %08lx x%ld for all rows, or even rows with double setting\n", rh_test_input_data_pattern_1_csr_read(), (rh_test_data_width_csr_read()/DATA_WIDTH_32_BIT));
+
+    printf(" %08lx x%ld for odd rows with double setting\n\n", rh_test_input_data_pattern_2_csr_read(), (rh_test_data_width_csr_read()/DATA_WIDTH_32_BIT));
+
+    if (rh_test_input_data_prbs_setting_csr_read()) {
+		printf("PRBS data enabled (patterns not used), seed: 0x%08lx\n\n", rh_test_input_data_prbs_seed_csr_read());
+	} else if (rh_test_input_data_pattern_mode_csr_read() == PATTERN_ROLE) {
+		printf("First pattern in aggressor rows (first %ld table entries), second pattern in the other rows\n\n", rh_test_input_data_role_aggressors_csr_read());
+	} else if (rh_test_input_data_pattern_mode_csr_read() == PATTERN_ROW_STRIPE) {
+		printf("Row stripe: first pattern in even rows, inverted in odd rows\n\n");
+	} else if (rh_test_input_data_pattern_mode_csr_read() == PATTERN_COLUMN_STRIPE) {
+		printf("Column stripe: first pattern with every other bit inverted\n\n");
+	} else if (rh_test_input_data_pattern_mode_csr_read() == PATTERN_CHECKERBOARD) {
+		printf("Checkerboard: column stripe, inverted in odd rows\n\n");
+	} else if (rh_test_input_data_double_pattern_setting_csr_read()) {
+		printf("Two-pattern enabled, val: %ld\n\n", rh_test_input_data_double_pattern_setting_csr_read());
+	} else {
+		printf("One-pattern enabled, val: %ld\n\n", rh_test_input_data_double_pattern_setting_csr_read());
+	}
 
-    // Start the fsm to get data
-    rh_test_input_data_to_set_start_fsm_csr_write(TRUE_CONST);
+    return;
+}
 
-    // Wait for FSM to start
-    while (rh_test_input_data_set_start_prev_csr_read() == FALSE_CONST) {};
+// Send the attack straight on the DFI (ACT/RD/PRE at the minimum DRAM timings) instead of through the port
+void sdram_set_dfi_hammer(uint32_t enable) {
 
-    // Finish it
-    rh_test_input_data_to_set_start_fsm_csr_write(FALSE_CONST);
+#ifdef CSR_RH_TEST_DFI_HAMMER_HAMMERS_CSR_ADDR
+    rh_test_dfi_hammer_enable_csr_write(enable);
+#else
+    if (enable) {
+        printf("DFI hammer path not in this SoC\n");
+    }
+#endif
 
-    // Wait for FSM to finish
-    while (rh_test_input_data_set_start_prev_csr_read() == TRUE_CONST) {};
+}
 
-    printf(" %08lx x%ld for odd rows with double setting\n\n", rh_test_input_data_pattern_output_csr_read(), (rh_test_data_width_csr_read()/DATA_WIDTH_32_BIT));
+// Show the path the attack goes through
+void show_hammer_path(void) {
 
-    if (rh_test_input_data_double_pattern_setting_csr_read()) {
-		printf("Two-pattern enabled, val: %ld\n\n", rh_test_input_data_double_pattern_setting_csr_read());
-	} else {
-		printf("One-pattern enabled, val: %ld\n\n", rh_test_input_data_double_pattern_setting_csr_read());
-	}
+#ifdef CSR_RH_TEST_DFI_HAMMER_HAMMERS_CSR_ADDR
+    if (rh_test_dfi_hammer_enable_csr_read()) {
+        printf("DFI hammer path, bypassing the controller: one ACT every %ld cycles\n", rh_test_dfi_hammer_act_interval_csr_read());
+        printf("The REFs are sent with the hammers at the refresh rate of the test\n\n");
+        return;
+    }
+#endif
+    printf("Native port, through the controller\n\n");
 
-    return;
 }
 
 // Show auto precharge setting
@@ -422,6 +509,453 @@ void show_auto_precharge(void) {
 
 }
 
+// Fill and check the whole DRAM
+void sdram_set_fill_check_all(void) {
+    rh_test_fill_check_mode_csr_write(FILL_CHECK_ALL);
+}
+
+// Fill and check only an address window
+void sdram_set_fill_check_window(uint32_t start_addr, uint32_t end_addr) {
+
+    if (start_addr > end_addr) {
+        printf("Start address 0x%07lx is after end address 0x%07lx\n\n", start_addr, end_addr);
+        return;
+    }
+
+    rh_test_fill_check_window_start_csr_write(start_addr);
+    rh_test_fill_check_window_end_csr_write(end_addr);
+    rh_test_fill_check_mode_csr_write(FILL_CHECK_WINDOW);
+}
+
+// Fill and check only the rows around the aggressors
+void sdram_set_fill_check_neighborhood(uint32_t num_rows) {
+    rh_test_fill_check_neighborhood_rows_csr_write(num_rows);
+    rh_test_fill_check_mode_csr_write(FILL_CHECK_NEIGHBORHOOD);
+}
+
+// Show the part of the DRAM filled and checked
+void show_fill_check(void) {
+
+    switch (rh_test_fill_check_mode_csr_read()) {
+        case FILL_CHECK_WINDOW:
+            printf("Addresses 0x%07lx to 0x%07lx\n\n", rh_test_fill_check_window_start_csr_read(), rh_test_fill_check_window_end_csr_read());
+            break;
+        case FILL_CHECK_NEIGHBORHOOD:
+            printf("Rows within %ld of every aggressor (all banks)\n\n", rh_test_fill_check_neighborhood_rows_csr_read());
+            break;
+        default:
+            printf("Whole DRAM\n\n");
+            break;
+    }
+
+}
+
+// Sweep the aggressor table over the rows, from base_row to end_row every stride rows
+void sdram_set_sweep(uint32_t enable, uint32_t base_row, uint32_t stride, uint32_t end_row, uint32_t hammer_count) {
+    rh_test_sweep_base_row_csr_write(base_row);
+    rh_test_sweep_stride_csr_write(stride);
+    rh_test_sweep_end_row_csr_write(end_row);
+    rh_test_sweep_hammer_count_csr_write(hammer_count);
+    rh_test_sweep_enable_csr_write(enable);
+}
+
+// Show the row sweep settings
+void show_sweep(void) {
+
+    if (rh_test_sweep_enable_csr_read() == FALSE_CONST) {
+        printf("Row sweep disabled, one test with the aggressor table as set\n\n");
+        return;
+    }
+
+    printf("Aggressor table moved by rows %ld to %ld, every %ld rows\n", 
+        rh_test_sweep_base_row_csr_read(), 
+        rh_test_sweep_end_row_csr_read(), 
+        rh_test_sweep_stride_csr_read()
+    );
+    if (rh_test_sweep_hammer_count_csr_read() > 0) {
+        printf("Hammer count of every entry: %ld\n\n", rh_test_sweep_hammer_count_csr_read());
+    } else {
+        printf("Hammer counts of the table\n\n");
+    }
+
+}
+
+// Search HC_first from min_plays to max_plays plays of the aggressor table
+void sdram_set_hc_search(uint32_t mode, uint32_t min_plays, uint32_t max_plays) {
+    // No plays at all never flips a bit
+    if (min_plays == 0) {
+        min_plays = 1;
+    }
+    rh_test_hc_search_min_csr_write(min_plays);
+    rh_test_hc_search_max_csr_write(max_plays);
+    rh_test_hc_search_mode_csr_write(mode);
+}
+
+// Show the HC_first search settings
+void show_hc_search(void) {
+
+    switch (rh_test_hc_search_mode_csr_read()) {
+        case HC_SEARCH_BINARY:
+            printf("Binary search");
+            break;
+        case HC_SEARCH_EXPONENTIAL:
+            printf("Exponential then binary search");
+            break;
+        default:
+            printf("HC_first search disabled, the aggressor table is played as set by the timers\n\n");
+            return;
+    }
+
+    printf(" of HC_first from %ld to %ld plays of the aggressor table\n", 
+        rh_test_hc_search_min_csr_read(), 
+        rh_test_hc_search_max_csr_read()
+    );
+    printf("Only the rows around the aggressors are filled and checked, checks stop at the first error\n\n");
+
+}
+
+// Show the HC_first found in every step of the last test
+void show_hc_first(void) {
+
+#ifdef RH_SWEEP_LOG_BASE
+    volatile uint32_t *sweep_log = (volatile uint32_t *)RH_SWEEP_LOG_BASE;
+    uint32_t steps = rh_test_sweep_log_steps_csr_read();
+    uint32_t hammer_count = rh_test_sweep_enable_live_csr_read() ? rh_test_sweep_hammer_count_live_csr_read() : 0;
+    uint32_t invalid_steps = 0;
+
+    if (steps > rh_test_sweep_log_depth_csr_read()) {
+        printf("%ld steps run, only the first %ld are logged\n\n", steps, rh_test_sweep_log_depth_csr_read());
+        steps = rh_test_sweep_log_depth_csr_read();
+    }
+
+    printf("ROW      HC_FIRST (PLAYS)   HAMMERS PER ENTRY   TESTS\n");
+    for (int i = 0; i < steps; ++i) {
+        uint32_t hc_first = sweep_log[(i * SWEEP_LOG_ENTRY_WORDS) + SWEEP_LOG_HC_FIRST_WORD];
+
+        printf("%7ld ", sweep_log[(i * SWEEP_LOG_ENTRY_WORDS) + SWEEP_LOG_ROW_WORD]);
+        if (sweep_log[(i * SWEEP_LOG_ENTRY_WORDS) + SWEEP_LOG_INVALID_WORD]) {
+            invalid_steps += 1;
+            printf("%17s %19s", "invalid", "-");
+        } else if (hc_first == 0) {
+            printf("%17s %19s", "none", "-");
+        } else if (hammer_count > 0) {
+            printf("%17ld %19llu", hc_first, (unsigned long long)hc_first * hammer_count);
+        } else {
+            printf("%17ld %19s", hc_first, "table");
+        }
+        printf(" %7ld\n", sweep_log[(i * SWEEP_LOG_ENTRY_WORDS) + SWEEP_LOG_TESTS_WORD]);
+    }
+    printf("\n");
+    if (invalid_steps > 0) {
+        printf("%ld steps invalid: the check before the attack found errors, their search was stopped\n\n", invalid_steps);
+    }
+#else
+    if (rh_test_hc_search_invalid_csr_read()) {
+        printf("Row sweep log not on the bus of this SoC, the last step is invalid: the check before the attack found errors\n\n");
+    } else {
+        printf("Row sweep log not on the bus of this SoC, HC_first of the last step: %ld plays\n\n", rh_test_hc_first_csr_read());
+    }
+#endif
+
+}
+
+// Show the steps of the last row sweep with errors after the attack
+void show_sweep_log(void) {
+
+#ifdef RH_SWEEP_LOG_BASE
+    volatile uint32_t *sweep_log = (volatile uint32_t *)RH_SWEEP_LOG_BASE;
+    uint32_t steps = rh_test_sweep_log_steps_csr_read();
+    uint32_t steps_with_errors = 0;
+
+    if (steps > rh_test_sweep_log_depth_csr_read()) {
+        printf("%ld steps run, only the first %ld are logged\n\n", steps, rh_test_sweep_log_depth_csr_read());
+        steps = rh_test_sweep_log_depth_csr_read();
+    }
+
+    printf("ROW     ERRORS BEFORE  ERRORS AFTER      CYCLES\n");
+    for (int i = 0; i < steps; ++i) {
+        if (sweep_log[(i * SWEEP_LOG_ENTRY_WORDS) + SWEEP_LOG_ERRORS_AFTER_WORD] > 0) {
+            steps_with_errors += 1;
+            printf("%7ld %13ld %13ld %11ld\n", 
+                sweep_log[(i * SWEEP_LOG_ENTRY_WORDS) + SWEEP_LOG_ROW_WORD],
+                sweep_log[(i * SWEEP_LOG_ENTRY_WORDS) + SWEEP_LOG_ERRORS_BEFORE_WORD],
+                sweep_log[(i * SWEEP_LOG_ENTRY_WORDS) + SWEEP_LOG_ERRORS_AFTER_WORD],
+                sweep_log[(i * SWEEP_LOG_ENTRY_WORDS) + SWEEP_LOG_CYCLES_WORD]
+            );
+        }
+    }
+
+    printf("\n%ld of %ld steps with errors after the attack\n\n", steps_with_errors, steps);
+#else
+    printf("Row sweep log not on the bus of this SoC\n\n");
+#endif
+
+}
+
+// Show the bandwidth of a pass over the DRAM from the words moved and the cycles taken
+void show_bandwidth(const char *pass_name, uint32_t words, uint64_t cycles) {
+
+    uint64_t bytes = (uint64_t)words * (rh_test_data_width_csr_read() / 8);
+    uint32_t mbytes_per_sec;
+
+    if (cycles == 0) {
+        printf("%s: nothing done\n", pass_name);
+        return;
+    }
+
+    mbytes_per_sec = (uint32_t)((bytes * rh_test_sys_clk_freq_csr_read()) / cycles / 1000000);
+    printf("%s: %ld words in %llu cycles, %ld.%03ld GB/s\n", 
+        pass_name, 
+        words, 
+        (unsigned long long)cycles, 
+        mbytes_per_sec / 1000, 
+        mbytes_per_sec % 1000
+    );
+
+}
+
+// Cycles of the uptime timer, 0 when the SoC has none
+uint64_t sdram_uptime_cycles(void) {
+
+#ifdef CSR_TIMER0_UPTIME_CYCLES_ADDR
+    timer0_uptime_latch_write(TRUE_CONST);
+    return timer0_uptime_cycles_read();
+#else
+    return 0;
+#endif
+
+}
+
+// Print one phase of the test in cycles and in microseconds at the system clock
+void show_phase_time(const char *phase_name, uint64_t cycles) {
+
+    uint64_t usecs = (cycles * 1000000) / rh_test_sys_clk_freq_csr_read();
+
+    printf("%-28s %12llu cycles, %10llu us\n", phase_name, (unsigned long long)cycles, (unsigned long long)usecs);
+
+}
+
+// Show where the time of the last test went
+void show_timing(uint64_t test_cycles, uint64_t readout_cycles) {
+
+    show_phase_time("Fill", rh_test_fill_engine_cycles_csr_read());
+    show_phase_time("Read check (after attack)", rh_test_read_checker_cycles_csr_read());
+#ifdef CSR_RH_TEST_CMD_COUNTERS_BANK_SEL_CSR_ADDR
+    show_phase_time("Row hammer attack", rh_test_cmd_counters_cycles_csr_read());
+#endif
+
+#ifdef CSR_TIMER0_UPTIME_CYCLES_ADDR
+    show_phase_time("Error readout", readout_cycles);
+    show_phase_time("Whole test", test_cycles);
+#else
+    printf("No uptime timer, build with timer_uptime to time the whole test\n");
+#endif
+    printf("\n");
+
+}
+
+// Name of the row hammer FSM state of a feedback state value
+const char *rh_state_name(uint32_t state) {
+
+    switch (state) {
+        case RH_IDLE_STATE: return "RH_IDLE";
+        case RH_WRITE_FILL_INIT_STATE | RH_THIRD_STATE: return "RH_STEP_START";
+        case RH_INIT_SETTINGS_STATE | RH_SECOND_STATE: return "RH_SEARCH_NEXT";
+        case RH_WRITE_FILL_INIT_STATE | RH_SECOND_STATE: return "RH_STEP_INIT";
+        case RH_WRITE_FILL_INIT_STATE | RH_FIRST_STATE: return "RH_FILL";
+        case RH_INIT_SETTINGS_STATE: return "RH_INIT_SETTINGS";
+        case RH_ROWHAMMER_STATE | RH_FIRST_STATE: return "RH_ATTACK";
+        case RH_RESET_SETTNGS_STATE: return "RH_RESET_SETTINGS";
+        case RH_READ_CHECK_STATE | RH_FIFTH_STATE: return "RH_STEP_DONE";
+        case RH_FINAL_CHECK: return "RH_FINAL_CHECK";
+        case RH_READ_CHECK_STATE | RH_FIRST_STATE: return "READ_CHECK";
+        case RH_READ_CHECK_STATE | RH_FOURTH_STATE: return "READ_FINISH";
+        default: return "UNKNOWN";
+    }
+
+}
+
+// Show the state changes of the last test, every state with the cycles
+// from the first change kept and the cycles spent in it
+void show_state_trace(void) {
+
+#ifdef RH_STATE_TRACE_BASE
+    volatile uint32_t *state_trace = (volatile uint32_t *)RH_STATE_TRACE_BASE;
+    uint32_t depth = rh_test_state_trace_depth_csr_read();
+    uint32_t transitions = rh_test_state_trace_transitions_csr_read();
+    uint32_t kept = transitions;
+    uint32_t first = 0;
+    uint64_t start = 0;
+    uint64_t cycle;
+    uint64_t next;
+    volatile uint32_t *entry;
+    volatile uint32_t *next_entry;
+
+    if (transitions > depth) {
+        printf("%ld state changes, only the last %ld are kept\n\n", transitions, depth);
+        kept = depth;
+        first = transitions % depth;
+    }
+
+    printf("CYCLE            CYCLES IN STATE  STATE              ADDRESS\n");
+    for (uint32_t i = 0; i < kept; ++i) {
+        entry = &state_trace[((first + i) % depth) * STATE_TRACE_ENTRY_WORDS];
+        cycle = ((uint64_t)entry[STATE_TRACE_CYCLE_HIGH_WORD] << 32) | entry[STATE_TRACE_CYCLE_LOW_WORD];
+        if (i == 0) {
+            start = cycle;
+        }
+
+        printf("%12llu ", (unsigned long long)(cycle - start));
+        if (i + 1 < kept) {
+            next_entry = &state_trace[((first + i + 1) % depth) * STATE_TRACE_ENTRY_WORDS];
+            next = ((uint64_t)next_entry[STATE_TRACE_CYCLE_HIGH_WORD] << 32) | next_entry[STATE_TRACE_CYCLE_LOW_WORD];
+            printf("%18llu  ", (unsigned long long)(next - cycle));
+        } else {
+            printf("%18s  ", "-");
+        }
+        printf("%-18s 0x%07lx\n", rh_state_name(entry[STATE_TRACE_STATE_WORD]), entry[STATE_TRACE_ADDR_WORD]);
+    }
+    printf("\n");
+#else
+    printf("State trace not on the bus of this SoC\n\n");
+#endif
+
+}
+
+// Copy all the performance counters at once, then read them
+void sdram_perf_snapshot(uint64_t *counters) {
+
+    rh_test_perf_counters_snapshot_csr_write(TRUE_CONST);
+
+    counters[PERF_CYCLES] = rh_test_perf_counters_cycles_csr_read();
+    counters[PERF_FILL] = rh_test_perf_counters_fill_cycles_csr_read();
+    counters[PERF_INITIAL_CHECK] = rh_test_perf_counters_initial_check_cycles_csr_read();
+    counters[PERF_INIT] = rh_test_perf_counters_init_cycles_csr_read();
+    counters[PERF_ATTACK] = rh_test_perf_counters_attack_cycles_csr_read();
+    counters[PERF_DRAIN] = rh_test_perf_counters_drain_cycles_csr_read();
+    counters[PERF_POST_CHECK] = rh_test_perf_counters_post_check_cycles_csr_read();
+    counters[PERF_READOUT] = rh_test_perf_counters_readout_cycles_csr_read();
+    counters[PERF_CMD_STALL] = rh_test_perf_counters_cmd_stall_cycles_csr_read();
+    counters[PERF_WDATA_STALL] = rh_test_perf_counters_wdata_stall_cycles_csr_read();
+
+}
+
+// Show the cycles of every phase and the port stalls between two snapshots,
+// with the share of the cycles counted from the first snapshot
+void show_perf_counters(const uint64_t *before, const uint64_t *after) {
+
+    static const char *names[NUM_PERF_COUNTERS] = {
+        "Whole test",
+        "Fill",
+        "Initial check",
+        "Test and attack setup",
+        "Row hammer attack",
+        "Drain and reset settings",
+        "Check after attack",
+        "Error readout",
+        "Command stalls",
+        "Write data stalls",
+    };
+    uint64_t total = after[PERF_CYCLES] - before[PERF_CYCLES];
+    uint64_t cycles;
+
+    if (total == 0) {
+        printf("Nothing counted\n\n");
+        return;
+    }
+
+    for (int i = 0; i < NUM_PERF_COUNTERS; ++i) {
+        cycles = after[i] - before[i];
+        printf("%-28s %12llu cycles, %10llu us, %3ld%%\n", 
+            names[i], 
+            (unsigned long long)cycles, 
+            (unsigned long long)((cycles * 1000000) / rh_test_sys_clk_freq_csr_read()), 
+            (uint32_t)((cycles * 100) / total)
+        );
+    }
+    printf("\n");
+
+}
+
+// Show the reads of the last attack sent to every bank
+void show_bank_hammers(void) {
+
+    uint32_t total = 0;
+
+    printf("BANK      READS\n");
+    for (int i = 0; i < rh_test_bank_hammers_num_banks_csr_read(); ++i) {
+        rh_test_bank_hammers_bank_sel_csr_write(i);
+        if (rh_test_bank_hammers_reads_csr_read() > 0) {
+            printf("%4d %10ld\n", i, rh_test_bank_hammers_reads_csr_read());
+        }
+        total += rh_test_bank_hammers_reads_csr_read();
+    }
+    printf("\nReads of the attack (all banks): %ld\n\n", total);
+
+}
+
+// Show what the DFI hammer path sent during the last attack
+void show_dfi_hammer(void) {
+
+#ifdef CSR_RH_TEST_DFI_HAMMER_HAMMERS_CSR_ADDR
+    uint32_t hammers = rh_test_dfi_hammer_hammers_csr_read();
+    uint32_t held_cycles = rh_test_dfi_hammer_held_cycles_csr_read();
+
+    printf("ACT/RD/PRE sequences: %ld, REF: %ld\n", hammers, rh_test_dfi_hammer_refreshes_csr_read());
+    printf("DFI held for %ld cycles, after waiting %ld cycles for a controller refresh\n",
+        held_cycles,
+        rh_test_dfi_hammer_sync_cycles_csr_read()
+    );
+    if (hammers > 0) {
+        printf("Cycles per hammer: %ld (minimum %ld)\n\n", held_cycles / hammers, rh_test_dfi_hammer_act_interval_csr_read());
+    }
+    if (rh_test_dfi_hammer_dropped_cmds_csr_read() > 0) {
+        printf("WARNING: %ld controller commands dropped, another port used the DRAM during the attack\n\n", rh_test_dfi_hammer_dropped_cmds_csr_read());
+    }
+#else
+    printf("DFI hammer path not in this SoC\n\n");
+#endif
+
+}
+
+// Show the DRAM commands counted during the last attack
+void show_cmd_counters(void) {
+
+#ifdef CSR_RH_TEST_CMD_COUNTERS_BANK_SEL_CSR_ADDR
+    uint32_t cycles = rh_test_cmd_counters_cycles_csr_read();
+    uint32_t act_window = rh_test_cmd_counters_act_window_csr_read();
+
+    printf("BANK        ACT        PRE       READ\n");
+    for (int i = 0; i < rh_test_cmd_counters_num_banks_csr_read(); ++i) {
+        rh_test_cmd_counters_bank_sel_csr_write(i);
+        printf("%4d %10ld %10ld %10ld\n", i,
+            rh_test_cmd_counters_act_count_csr_read(),
+            rh_test_cmd_counters_pre_count_csr_read(),
+            rh_test_cmd_counters_read_count_csr_read()
+        );
+    }
+
+    printf("\nREF: %ld, ACT (all banks): %ld over %ld cycles\n", 
+        rh_test_cmd_counters_ref_count_csr_read(), 
+        rh_test_cmd_counters_act_total_csr_read(), 
+        cycles
+    );
+
+    // Average and peak hammering rate
+    if (cycles > 0) {
+        printf("ACTs per %ld cycles (tREFI): average %ld, last %ld, max %ld\n\n", 
+            act_window,
+            (uint32_t)(((uint64_t)rh_test_cmd_counters_act_total_csr_read() * act_window) / cycles),
+            rh_test_cmd_counters_act_per_window_last_csr_read(),
+            rh_test_cmd_counters_act_per_window_max_csr_read()
+        );
+    }
+#else
+    printf("DRAM command counters not in this SoC\n\n");
+#endif
+
+}
+
 // // Show read or write setting
 // void write_not_read_decide(void) {
 
@@ -443,6 +977,18 @@ void sdram_rhtest_summarize_test_params(void) {
 
     printf(OUTPUT_SEPARATER_TITLE_STR, "Auto Precharge");
     show_auto_precharge();
+
+    printf(OUTPUT_SEPARATER_TITLE_STR, "Hammer Path");
+    show_hammer_path();
+
+    printf(OUTPUT_SEPARATER_TITLE_STR, "Filled/Checked Addresses");
+    show_fill_check();
+
+    printf(OUTPUT_SEPARATER_TITLE_STR, "Row Sweep");
+    show_sweep();
+
+    printf(OUTPUT_SEPARATER_TITLE_STR, "HC_first Search");
+    show_hc_search();
 }
 
 // Print out info about addresses
@@ -463,30 +1009,318 @@ void rh_test_addr_info(void) {
 
 }
 
-// All data output csr registers
-typedef uint32_t(*IntFuncVoid)(void);
-IntFuncVoid data_output[] = {
-    rh_test_output_data_pattern1_csr_read,
-    rh_test_output_data_pattern2_csr_read,
-    rh_test_output_data_pattern3_csr_read,
-    rh_test_output_data_pattern4_csr_read,
-    rh_test_output_data_pattern5_csr_read,
-    rh_test_output_data_pattern6_csr_read,
-    rh_test_output_data_pattern7_csr_read,
-    rh_test_output_data_pattern8_csr_read,
-    rh_test_output_data_pattern9_csr_read,
-    rh_test_output_data_pattern10_csr_read,
-    rh_test_output_data_pattern11_csr_read,
-    rh_test_output_data_pattern12_csr_read,
-    rh_test_output_data_pattern13_csr_read,
-    rh_test_output_data_pattern14_csr_read,
-    rh_test_output_data_pattern15_csr_read,
-    rh_test_output_data_pattern16_csr_read,
-    rh_test_output_data_pattern17_csr_read,
-    rh_test_output_data_pattern18_csr_read
-};
+// Count the bits set in a 32-bit value
+uint32_t count_bits(uint32_t val) {
+    uint32_t count = 0;
+    while (val) {
+        val &= val - 1;
+        count += 1;
+    }
+    return count;
+}
+
+// Show the flips of every data bit found after the attack, summed per DQ, byte lane and chip
+void show_bit_histogram(void) {
+
+    uint32_t num_bits = rh_test_bit_histogram_num_bits_csr_read();
+    uint32_t num_dq = num_bits / BURST_LENGTH;
+    uint32_t dq_flips[MAX_DQ] = {0};
+    uint32_t count;
+#ifdef RH_BIT_HISTOGRAM_BASE
+    volatile uint32_t *bit_histogram = (volatile uint32_t *)RH_BIT_HISTOGRAM_BASE;
+#endif
+
+    if (num_dq > MAX_DQ) {
+        printf("More DQs (%ld) than can be shown (%d)\n\n", num_dq, MAX_DQ);
+        return;
+    }
+
+    // Data bit i of the port is DQ (i % num_dq) of the burst, one bus word per bit
+    // or one CSR select per bit on SoCs without the region
+    for (int i = 0; i < num_bits; ++i) {
+#ifdef RH_BIT_HISTOGRAM_BASE
+        count = bit_histogram[i];
+#else
+        rh_test_bit_histogram_sel_csr_write(i);
+        count = rh_test_bit_histogram_count_csr_read();
+#endif
+        dq_flips[i % num_dq] += count;
+    }
+
+    printf("DQ     FLIPS\n");
+    for (int i = 0; i < num_dq; ++i) {
+        if (dq_flips[i] > 0) {
+            printf("%2d %9ld\n", i, dq_flips[i]);
+        }
+    }
+
+    printf("\nBYTE LANE  FLIPS\n");
+    for (int i = 0; i < num_dq / DQ_PER_BYTE; ++i) {
+        count = 0;
+        for (int j = 0; j < DQ_PER_BYTE; ++j) {
+            count += dq_flips[(i * DQ_PER_BYTE) + j];
+        }
+        printf("%9d %6ld\n", i, count);
+    }
+
+    printf("\nCHIP (x%d)  FLIPS\n", DQ_PER_CHIP);
+    for (int i = 0; i < num_dq / DQ_PER_CHIP; ++i) {
+        count = 0;
+        for (int j = 0; j < DQ_PER_CHIP; ++j) {
+            count += dq_flips[(i * DQ_PER_CHIP) + j];
+        }
+        printf("%9d %6ld\n", i, count);
+    }
+    printf("\n");
+}
+
+// Show the flips found in every row of the histogram after the attack
+void show_row_histogram(void) {
 
+#ifdef RH_ROW_HISTOGRAM_BASE
+    volatile uint32_t *row_histogram = (volatile uint32_t *)RH_ROW_HISTOGRAM_BASE;
+    uint32_t rows_per_entry = 1 << rh_test_row_histogram_row_shift_csr_read();
 
+    if (rh_test_row_histogram_all_banks_csr_read()) {
+        printf("All banks, ");
+    } else {
+        printf("Bank %ld, ", rh_test_row_histogram_bank_csr_read());
+    }
+    printf("%ld row(s) per entry, starting at row %ld\n\n", rows_per_entry, rh_test_row_histogram_base_row_csr_read());
+
+    printf("ROW        FLIPS\n");
+    for (int i = 0; i < rh_test_row_histogram_depth_csr_read(); ++i) {
+        if (row_histogram[i] > 0) {
+            printf("%7ld %8ld\n", rh_test_row_histogram_base_row_csr_read() + (i * rows_per_entry), row_histogram[i]);
+        }
+    }
+
+    printf("\nFlips outside of the histogram rows: %ld\n\n", rh_test_row_histogram_out_of_window_csr_read());
+#else
+    printf("Row histogram not on the bus of this SoC\n\n");
+#endif
+
+}
+
+// Title of the errors of the read before or after the attack, when they change
+static void print_error_title(int *error_phase, int after_rh) {
+
+    if (after_rh != *error_phase) {
+        *error_phase = after_rh;
+
+        printf("\n");
+        if (*error_phase == 0) {
+            printf(OUTPUT_SEPARATER_TITLE_STR, "Initial Read Errors           ");
+        } else {
+            printf(OUTPUT_SEPARATER_TITLE_STR, "Row Hammer Test Errors        ");
+        }
+        printf("ADDRESS                                  LANE  FLIPPED   0->1  1->0\n");
+    }
+}
+
+// Address of an error with its row, bank and column
+static void print_error_addr(uint32_t addr) {
+
+    printf(" 0x%07lx, ROW: %ld, BANK: %ld, COL: %ld:\n", 
+        addr, 
+        extract_row_from_addr(addr, rh_test_bank_width_csr_read(), rh_test_col_width_csr_read()),
+        extract_bank_from_addr(addr, rh_test_bank_width_csr_read(), rh_test_col_width_csr_read()),
+        extract_col_from_addr(addr, rh_test_col_width_csr_read())
+    );
+}
+
+// Print and remove all errors waiting in the error FIFO.
+// Each error is read as one record per 32-bit lane with flipped bits.
+void sdram_drain_error_fifo(int *error_phase) {
+
+    uint32_t up_flips;
+
+#ifdef RH_ERROR_RECORDS_BASE
+    // Reading the flags word of the window pops the record, the next one comes out at the same words
+    volatile uint32_t *error_records = (volatile uint32_t *)RH_ERROR_RECORDS_BASE;
+    uint32_t addr, xor_bits, up_bits, flags;
+    int first_record = TRUE_CONST;
+
+    while (TRUE_CONST) {
+        addr = error_records[ERROR_RECORD_ADDR_WORD];
+        xor_bits = error_records[ERROR_RECORD_XOR_WORD];
+        up_bits = error_records[ERROR_RECORD_UP_WORD];
+        flags = error_records[ERROR_RECORD_FLAGS_WORD];
+        if (((flags >> ERROR_RECORD_VALID_BIT) & 1) == 0) {
+            break;
+        }
+
+        if (first_record) {
+            print_error_title(error_phase, (flags >> ERROR_RECORD_AFTER_RH_BIT) & 1);
+            print_error_addr(addr);
+        }
+
+        up_flips = count_bits(up_bits);
+        printf("%44ld  %08lx  %4ld  %4ld\n", 
+            flags & ERROR_RECORD_FIELD_MASK, 
+            xor_bits,
+            up_flips,
+            ((flags >> ERROR_RECORD_POPCOUNT_SHIFT) & ERROR_RECORD_FIELD_MASK) - up_flips
+        );
+
+        // The last record of an error is followed by the first of the next one
+        first_record = (flags >> ERROR_RECORD_LAST_BIT) & 1;
+    }
+#else
+    while (rh_test_error_fifo_level_csr_read() > 0) {
+
+        // Print out the title when reaching errors of the next read
+        print_error_title(error_phase, rh_test_error_fifo_after_rh_csr_read());
+        print_error_addr(rh_test_error_fifo_addr_csr_read());
+
+        // One record per lane with flips, the last one moves on to the next error
+        while (TRUE_CONST) {
+            up_flips = count_bits(rh_test_error_record_up_csr_read());
+            printf("%44ld  %08lx  %4ld  %4ld\n", 
+                rh_test_error_record_lane_csr_read(), 
+                rh_test_error_record_xor_csr_read(),
+                up_flips,
+                rh_test_error_record_popcount_csr_read() - up_flips
+            );
+
+            if (rh_test_error_record_last_csr_read()) {
+                rh_test_error_fifo_pop_csr_write(TRUE_CONST);
+                break;
+            }
+            rh_test_error_fifo_pop_csr_write(TRUE_CONST);
+        }
+    }
+#endif
+}
+
+#if defined(CONFIG_CPU_HAS_INTERRUPT) && defined(RH_TEST_INTERRUPT)
+// Events taken by the interrupt handler, cleared by sdram_wait_rh_events
+static volatile uint32_t rh_test_events = 0;
+
+// The error events are levels, they stay disabled till the error FIFO has been read
+static void rh_test_isr(void) {
+
+    uint32_t pending = rh_test_ev_pending_read();
+
+    rh_test_events |= pending;
+    rh_test_ev_enable_write(rh_test_ev_enable_read() & ~(pending & (RH_EV_ERRORS | RH_EV_ERRORS_HALF)));
+    rh_test_ev_pending_write(pending);
+
+}
+#endif
+
+// Take the events of the tester, through its interrupt when the SoC has one
+void sdram_start_rh_events(void) {
+
+    rh_test_ev_enable_write(0);
+    rh_test_ev_pending_write(RH_EV_ALL);
+
+#if defined(CONFIG_CPU_HAS_INTERRUPT) && defined(RH_TEST_INTERRUPT)
+    rh_test_events = 0;
+    irq_attach(RH_TEST_INTERRUPT, rh_test_isr);
+    irq_setmask(irq_getmask() | (1 << RH_TEST_INTERRUPT));
+    rh_test_ev_enable_write(RH_EV_ALL);
+#endif
+
+}
+
+// Stop taking the events of the tester
+void sdram_stop_rh_events(void) {
+
+    rh_test_ev_enable_write(0);
+
+#if defined(CONFIG_CPU_HAS_INTERRUPT) && defined(RH_TEST_INTERRUPT)
+    irq_setmask(irq_getmask() & ~(1 << RH_TEST_INTERRUPT));
+    irq_detach(RH_TEST_INTERRUPT);
+#endif
+
+}
+
+// Enable the error events again once the error FIFO has been read
+void sdram_rearm_rh_events(void) {
+
+#if defined(CONFIG_CPU_HAS_INTERRUPT) && defined(RH_TEST_INTERRUPT)
+    rh_test_ev_enable_write(RH_EV_ALL);
+#endif
+
+}
+
+// Sleep until the tester raises an event, returns the events raised (RH_EV_*).
+// Without the interrupt, the pending events are polled with one CSR read per loop.
+uint32_t sdram_wait_rh_events(void) {
+
+    uint32_t events;
+
+#if defined(CONFIG_CPU_HAS_INTERRUPT) && defined(RH_TEST_INTERRUPT)
+    while (TRUE_CONST) {
+        // Interrupts are off from the check to the sleep so no event is missed,
+        // the pending interrupt still wakes the CPU and is taken right after
+        irq_setie(0);
+        events = rh_test_events;
+        rh_test_events = 0;
+        if (events == 0) {
+#if defined(__riscv)
+            __asm__ volatile ("wfi");
+#endif
+        }
+        irq_setie(1);
+
+        if (events != 0) {
+            return events;
+        }
+    }
+#else
+    do {
+        events = rh_test_ev_pending_read();
+    } while (events == 0);
+    rh_test_ev_pending_write(events);
+    return events;
+#endif
+
+}
+
+// Print the state of the test, at most every PROGRESS_INTERVAL_MS when the
+// SoC has the uptime timer, at every call otherwise
+void show_progress(uint64_t *last_progress) {
+
+    uint64_t now = sdram_uptime_cycles();
+    uint32_t state;
+
+    if ((now != 0) && ((now - *last_progress) < ((uint64_t)(rh_test_sys_clk_freq_csr_read() / 1000) * PROGRESS_INTERVAL_MS))) {
+        return;
+    }
+    *last_progress = now;
+
+    state = rh_test_feedback_state_csr_read();
+    if ((state & RH_WRITE_FILL_INIT_STATE) == RH_WRITE_FILL_INIT_STATE) {
+        if (rh_test_sweep_enable_live_csr_read()) {
+            printf("\rSweep step at row %ld                  ", rh_test_sweep_row_csr_read());
+        } else {
+            printf("\rFilling memory with data              ");
+        }
+    } else if ((state & RH_READ_CHECK_STATE) == RH_READ_CHECK_STATE) {
+        printf("\rReading/Checking memory for errors    ");
+    } else if ((state & RH_INIT_SETTINGS_STATE) == RH_INIT_SETTINGS_STATE) {
+        if (rh_test_hc_search_mode_live_csr_read() != HC_SEARCH_OFF) {
+            printf("\rSearching HC_first, testing %ld plays   ", rh_test_hc_search_plays_csr_read());
+        } else {
+            printf("\rReadying for Row Hammer Attack        , val: %ld ", state);
+        }
+    } else if ((state & RH_ROWHAMMER_STATE) == RH_ROWHAMMER_STATE) {
+        printf("\rRunning Row Hammer Attack, val: %ld ", state);
+    } else if ((state & RH_RESET_SETTNGS_STATE) == RH_RESET_SETTNGS_STATE) {
+        printf("\rResetting after rowhammer attack, val: %ld ", state);
+    } else {
+        printf("\rValue of test feedback state csr: %ld", state);
+    }
+
+}
+
+// Apply all the shadow settings at once, waits until they are live
+void sdram_config_commit(void) {
+    rh_test_config_commit_csr_write(TRUE_CONST);
+    while (rh_test_config_commit_pending_csr_read() == TRUE_CONST) {};
+}
 
 // Run the rowhammer test!
 void run_rowhammer_test(void) {
@@ -497,84 +1331,115 @@ void run_rowhammer_test(void) {
 
     printf("%ld\n", rh_test_feedback_state_csr_read());
 
+    // Apply all the settings at once before starting
+    sdram_config_commit();
+
+    // The aggressor/victim pattern only knows the first table entries as aggressor rows
+    if (rh_test_input_data_role_overflow_csr_read() == TRUE_CONST) {
+        printf("Aggressor/victim pattern with %ld table entries, only the first %ld are known as aggressor rows, test not started\n\n", rh_test_aggressor_count_live_csr_read(), rh_test_input_data_role_aggressors_csr_read());
+        return;
+    }
+
+    // Cycles of every phase are the difference of two snapshots of the performance counters
+    uint64_t perf_before[NUM_PERF_COUNTERS];
+    uint64_t perf_after[NUM_PERF_COUNTERS];
+    sdram_perf_snapshot(perf_before);
+
+    // Take the events of the tester from the start
+    sdram_start_rh_events();
+
     // Start the row hammer fsm
     rh_test_rowhammer_start_fsm_csr_write(TRUE_CONST);
     while (rh_test_rowhammer_start_prev_fsm_csr_read() == FALSE_CONST) {}
 
-    // Print errors only on the reads
-    int first_error = TRUE_CONST;
+    // Print the error title again whenever the errors move from before to after the attack
+    int error_phase = ERROR_PHASE_NONE;
 
-    while ((rh_test_feedback_state_csr_read() & RH_FINAL_CHECK) != RH_FINAL_CHECK) {
+    // Time of the whole test, and of the error readout within it
+    uint64_t test_start = sdram_uptime_cycles();
+    uint64_t readout_start;
+    uint64_t readout_cycles = 0;
 
-        // printf("%ld\n", rh_test_feedback_state_csr_read());
+    // Sleep till the tester raises an event: a state change, errors waiting or the end of the test
+    uint64_t last_progress = 0;
+    uint32_t events = 0;
 
-        // Print feedback
-        if ((rh_test_feedback_state_csr_read() & RH_WRITE_FILL_INIT_STATE) == RH_WRITE_FILL_INIT_STATE) {
-            printf("\rFilling memory with data              ");
-        } else if ((rh_test_feedback_state_csr_read() & RH_READ_CHECK_STATE) == RH_READ_CHECK_STATE) {
-            printf("\rReading/Checking memory for errors    ");
-        } else if ((rh_test_feedback_state_csr_read() & RH_READ_SEND_ERRORS_STATE) == RH_READ_SEND_ERRORS_STATE) {
-
-            while ((rh_test_feedback_state_csr_read() & RH_READ_SEND_ERRORS_STATE) == RH_READ_SEND_ERRORS_STATE) {
-                if (rh_test_error_found_flag_csr_read()) {
-
-                    // Print out all title and number of errors found
-                    if (first_error) {
-
-                        // Check where reader is (before or after rh test)
-                        printf("\n");
-                        if (rh_test_before_after_rh_csr_read() == 0) {
-                            printf(OUTPUT_SEPARATER_TITLE_STR, "Initial Read Errors           ");
-                        } else {
-                            printf(OUTPUT_SEPARATER_TITLE_STR, "Row Hammer Test Errors        ");
-                        }
-
-                        printf("\rNumber of addresses with errors found: %ld            \n", rh_test_rowhammer_err_cnt_csr_read());
-                        printf("ADDRESS     DATA\n");
-                        first_error = FALSE_CONST;
-                    }
-
-                    printf(" 0x%07lx, ROW: %ld, BANK: %ld, COL: %ld:  ", 
-                        rh_test_address_csr_read(), 
-                        extract_row_from_addr(rh_test_address_csr_read(), rh_test_bank_width_csr_read(), rh_test_col_width_csr_read()),
-                        extract_bank_from_addr(rh_test_address_csr_read(), rh_test_bank_width_csr_read(), rh_test_col_width_csr_read()),
-                        extract_col_from_addr(rh_test_address_csr_read(), rh_test_col_width_csr_read())
-                    );
-
-                    for (int i = 0; i < sizeof(data_output) / sizeof(*data_output); i++) {
-
-                        if (rh_test_data_width_csr_read() >= ((i * BYTE_INTERVALS) + BYTE_INTERVALS)) {
-                            printf("%8lx ", data_output[i]());
-                        }
-                    }
-                    rh_test_error_ack_csr_write(TRUE_CONST);
-                    while (rh_test_error_ack_prev_csr_read() == FALSE_CONST) {}
-                    rh_test_error_ack_csr_write(FALSE_CONST);
-                    while (rh_test_error_ack_prev_csr_read() == TRUE_CONST) {}
-                    // while loop here for err
-
-                    printf("\n");
-                    
-                }
-            }
+    while ((events & RH_EV_DONE) == 0) {
 
-            // Print title again when entering this state
-            printf("\n\n");
-            first_error = TRUE_CONST;
+        events = sdram_wait_rh_events();
 
-        } else if ((rh_test_feedback_state_csr_read() & RH_INIT_SETTINGS_STATE) == RH_INIT_SETTINGS_STATE) {
-            printf("\rReadying for Row Hammer Attack        , val: %ld ", rh_test_feedback_state_csr_read());
-        } else if ((rh_test_feedback_state_csr_read() & RH_ROWHAMMER_STATE) == RH_ROWHAMMER_STATE) {
-            printf("\rRunning Row Hammer Attack, val: %ld ", rh_test_feedback_state_csr_read());
-        } else if ((rh_test_feedback_state_csr_read() & RH_RESET_SETTNGS_STATE) == RH_RESET_SETTNGS_STATE) {
-            printf("\rResetting after rowhammer attack, val: %ld ", rh_test_feedback_state_csr_read());
-        } else {
-            printf("\rValue of test feedback state csr: %ld", rh_test_feedback_state_csr_read());
+        // Errors are found while the test keeps going, print them as they come
+        if (events & (RH_EV_ERRORS | RH_EV_ERRORS_HALF)) {
+            readout_start = sdram_uptime_cycles();
+            sdram_drain_error_fifo(&error_phase);
+            readout_cycles += sdram_uptime_cycles() - readout_start;
+            sdram_rearm_rh_events();
+        }
+
+        if (events & RH_EV_PHASE) {
+            show_progress(&last_progress);
         }
     }
+    sdram_stop_rh_events();
     
+    // Errors found at the very end of the last read
+    readout_start = sdram_uptime_cycles();
+    sdram_drain_error_fifo(&error_phase);
+    readout_cycles += sdram_uptime_cycles() - readout_start;
+    uint64_t test_cycles = sdram_uptime_cycles() - test_start;
+    sdram_perf_snapshot(perf_after);
+
+    printf("\n\nNumber of addresses with errors found: %ld before, %ld after the row hammer attack\n", 
+        rh_test_rowhammer_initial_err_cnt_csr_read(), 
+        rh_test_rowhammer_err_cnt_csr_read()
+    );
+    if (rh_test_error_fifo_overflow_csr_read() > 0) {
+        printf("%ld errors were not printed, the error FIFO was full\n", rh_test_error_fifo_overflow_csr_read());
+    }
+
     printf("\n\nRow hammer test executed, finishing\n\n");
 
+    printf(OUTPUT_SEPARATER_TITLE_STR, "Bandwidth");
+    show_bandwidth("Fill", rh_test_fill_engine_words_csr_read(), rh_test_fill_engine_cycles_csr_read());
+    show_bandwidth("Read check (after attack)", rh_test_read_checker_words_csr_read(), rh_test_read_checker_cycles_csr_read());
+    printf("\n");
+
+    printf(OUTPUT_SEPARATER_TITLE_STR, "Timing");
+    show_timing(test_cycles, readout_cycles);
+
+    printf(OUTPUT_SEPARATER_TITLE_STR, "Cycles Per Phase");
+    show_perf_counters(perf_before, perf_after);
+
+    printf(OUTPUT_SEPARATER_TITLE_STR, "State Changes");
+    show_state_trace();
+
+    printf(OUTPUT_SEPARATER_TITLE_STR, "Hammer Reads Per Bank");
+    show_bank_hammers();
+
+    if (rh_test_dfi_hammer_enable_live_csr_read()) {
+        printf(OUTPUT_SEPARATER_TITLE_STR, "DFI Hammer Path");
+        show_dfi_hammer();
+    }
+
+    printf(OUTPUT_SEPARATER_TITLE_STR, "DRAM Commands During Attack");
+    show_cmd_counters();
+
+    printf(OUTPUT_SEPARATER_TITLE_STR, "Flips Per Data Bit");
+    show_bit_histogram();
+
+    printf(OUTPUT_SEPARATER_TITLE_STR, "Flips Per Row");
+    show_row_histogram();
+
+    if (rh_test_sweep_enable_live_csr_read()) {
+        printf(OUTPUT_SEPARATER_TITLE_STR, "Row Sweep Steps");
+        show_sweep_log();
+    }
+
+    if (rh_test_hc_search_mode_live_csr_read() != HC_SEARCH_OFF) {
+        printf(OUTPUT_SEPARATER_TITLE_STR, "HC_first Per Step");
+        show_hc_first();
+    }
+
     // Stop the row hammer fsm (final step)
     rh_test_rowhammer_start_fsm_csr_write(FALSE_CONST);
     while (rh_test_rowhammer_start_prev_fsm_csr_read() == TRUE_CONST) {}
@@ -13,21 +13,87 @@
 #define OUTPUT_ADDR_DATA_WIDTH_INFO "\n\nAddress width: %ld, Data width: %ld\n\n"
 
 // Constants
-#define NUM_SETS_ATTACK_ADDR 20
+#define AGGRESSOR_TABLE_ENTRY_WORDS 4 // 32-bit words per entry of the aggressor table on the bus
+#define AGGRESSOR_TABLE_ADDR_WORD 0
+#define AGGRESSOR_TABLE_FREQ_WORD 1
+#define AGGRESSOR_TABLE_LOOP_WORD 2
+#define AGGRESSOR_TUPLE_ENTRY_WORDS 8 // 32-bit words per entry of the aggressor table set as tuples on the bus
+#define AGGRESSOR_TUPLE_BANK_WORD 0
+#define AGGRESSOR_TUPLE_ROW_WORD 1
+#define AGGRESSOR_TUPLE_ROW_OFFSET_WORD 2
+#define AGGRESSOR_TUPLE_COL_WORD 3 // Stores the mapped address, written after the bank, row and offset
+#define AGGRESSOR_TUPLE_FREQ_WORD 4
+#define AGGRESSOR_TUPLE_LOOP_WORD 5
 #define DATA_WIDTH_32_BIT 32
-#define MAX_ADDR_TO_SET_FREQ 10
 #define MIN_TIMER_ADDRESS 2
 #define MAX_TIMER_ADDRESS 7
 #define TRUE_CONST 1
 #define FALSE_CONST 0
-#define BYTE_INTERVALS 32
 #define TIMER_1_ADDR 2 // Rowhammer cycle counter addr for hammer states 1-2
 #define TIMER_2_ADDR 3 // Rowhammer cycle counter addr for hammer states 3-4
 #define TIMER_3_ADDR 4 // Rowhammer cycle counter addr for hammer states 5-6
 #define TIMER_4_ADDR 5 // Rowhammer cycle counter addr for hammer states 7-8
 #define TIMER_5_ADDR 6 // Rowhammer cycle counter addr for hammer states 9-10
-#define TIMER_CYCLES_ADDR 7 // All 20 states cycle counter addr
+#define TIMER_CYCLES_ADDR 7 // Whole aggressor table cycle counter addr
+#define NUM_PAIR_TIMERS 5 // Pair timers map onto the loop counts of the first 10 entries
 #define ERROR_VAL_RETURN 0xffffffff
+#define BURST_LENGTH 8 // Beats of a burst in a port data word
+#define MAX_DQ 72 // Largest number of DQs shown (x72 RDIMM)
+#define DQ_PER_BYTE 8
+#define DQ_PER_CHIP 4 // x4 chips on the MTA18ASF2G72PZ RDIMM
+#define ERROR_PHASE_NONE -1 // No error printed yet, error FIFO phases are 0 (before) and 1 (after attack)
+#define SWEEP_LOG_ENTRY_WORDS 8 // 32-bit words per step of the row sweep log on the bus
+#define SWEEP_LOG_ROW_WORD 0
+#define SWEEP_LOG_ERRORS_BEFORE_WORD 1
+#define SWEEP_LOG_ERRORS_AFTER_WORD 2
+#define SWEEP_LOG_CYCLES_WORD 3
+#define SWEEP_LOG_HC_FIRST_WORD 4
+#define SWEEP_LOG_TESTS_WORD 5
+#define SWEEP_LOG_INVALID_WORD 6 // 1: the check before the attack found errors, the search of the step stopped
+#define STATE_TRACE_ENTRY_WORDS 4 // 32-bit words per state change of the state trace on the bus
+#define STATE_TRACE_CYCLE_LOW_WORD 0
+#define STATE_TRACE_CYCLE_HIGH_WORD 1
+#define STATE_TRACE_STATE_WORD 2
+#define STATE_TRACE_ADDR_WORD 3
+#define ERROR_RECORD_WORDS 4 // 32-bit words of the head record of the error FIFO on the bus
+#define ERROR_RECORD_ADDR_WORD 0
+#define ERROR_RECORD_XOR_WORD 1
+#define ERROR_RECORD_UP_WORD 2
+#define ERROR_RECORD_FLAGS_WORD 3 // Reading it pops the record
+#define ERROR_RECORD_FIELD_MASK 0xff // Lane and popcount in the flags word
+#define ERROR_RECORD_POPCOUNT_SHIFT 8
+#define ERROR_RECORD_AFTER_RH_BIT 16
+#define ERROR_RECORD_LAST_BIT 17
+#define ERROR_RECORD_VALID_BIT 31 // 0: the error FIFO was empty, nothing popped
+#define RH_EV_PHASE (1 << CSR_RH_TEST_EV_PENDING_PHASE_OFFSET) // Events of the tester, bits of ev_pending
+#define RH_EV_ERRORS (1 << CSR_RH_TEST_EV_PENDING_ERRORS_OFFSET)
+#define RH_EV_ERRORS_HALF (1 << CSR_RH_TEST_EV_PENDING_ERRORS_HALF_OFFSET)
+#define RH_EV_DONE (1 << CSR_RH_TEST_EV_PENDING_DONE_OFFSET)
+#define RH_EV_ALL (RH_EV_PHASE | RH_EV_ERRORS | RH_EV_ERRORS_HALF | RH_EV_DONE)
+#define PROGRESS_INTERVAL_MS 250 // Shortest time between two progress lines during a test
+#define HC_SEARCH_OFF 0 // Hammer with the cycle counter as set
+#define HC_SEARCH_BINARY 1 // Binary search of HC_first from min to max plays
+#define HC_SEARCH_EXPONENTIAL 2 // Double the plays from min till a flip, then binary search
+#define FILL_CHECK_ALL 0 // Fill and check the whole DRAM
+#define FILL_CHECK_WINDOW 1 // Fill and check an address window
+#define FILL_CHECK_NEIGHBORHOOD 2 // Fill and check the rows around the aggressors
+#define PATTERN_ROW_PARITY 0 // Pattern 1, or pattern 2 in odd rows with the double pattern setting
+#define PATTERN_ROLE 1 // Pattern 1 in aggressor rows, pattern 2 in the other rows (victims)
+#define PATTERN_ROW_STRIPE 2 // Pattern 1 in even rows, inverted in odd rows
+#define PATTERN_COLUMN_STRIPE 3 // Pattern 1 with every other bit inverted
+#define PATTERN_CHECKERBOARD 4 // Column stripe, inverted in odd rows
+#define MAX_PARALLEL_BANKS 16 // Banks a bank-parallel attack can hammer at once
+#define PERF_CYCLES 0 // Performance counters, in the order of a snapshot
+#define PERF_FILL 1
+#define PERF_INITIAL_CHECK 2
+#define PERF_INIT 3
+#define PERF_ATTACK 4
+#define PERF_DRAIN 5
+#define PERF_POST_CHECK 6
+#define PERF_READOUT 7
+#define PERF_CMD_STALL 8
+#define PERF_WDATA_STALL 9
+#define NUM_PERF_COUNTERS 10
 
 
 // Feedback State Sections
@@ -89,20 +155,86 @@ Set the new number of attacked addresses
 void sdram_set_num_addrs_attack_sig(uint32_t new_val);
 
 /*
-Get values in CSR registers from a certain rowhammer address
+Get the frequency of a certain rowhammer address
 */
 uint32_t sdram_get_value_addr_sig(uint32_t input_addr);
 
+/*
+Get the address of a certain rowhammer address (table entry)
+*/
+uint32_t sdram_get_addr_val_sig(uint32_t input_addr);
+
 /*
 Set of commands to set address and frequency for rowhammer test
 */
 void sdram_set_order_addr_sig(uint32_t order_count, uint32_t addr_to_set, uint32_t freq_count);
 
+/*
+Set of commands to set address, frequency and loop count for rowhammer test.
+Loop count 0 chains the entry to the next one, loop count N plays all entries 
+since the previous entry with a loop count N times.
+*/
+void sdram_set_order_addr_loop_sig(uint32_t order_count, uint32_t addr_to_set, uint32_t freq_count, uint32_t loop_count);
+
+/*
+Get the loop count of a certain rowhammer address
+*/
+uint32_t sdram_get_loop_addr_sig(uint32_t input_addr);
+
+/*
+Get the number of entries the aggressor table can hold
+*/
+uint32_t sdram_get_aggressor_table_depth(void);
+
+/*
+Get the port address of a bank, row (plus a row offset, can be negative) and column
+from the address map of the gateware
+*/
+uint32_t sdram_map_addr(uint32_t bank, uint32_t row, int32_t row_offset, uint32_t col);
+
+/*
+Set an entry of the aggressor table from a bank, row (plus a row offset, can be negative)
+and column, the address is made by the address map of the gateware
+*/
+void sdram_set_order_bank_row_col(uint32_t order_count, uint32_t bank, uint32_t row, int32_t row_offset, uint32_t col, uint32_t freq_count);
+
+/*
+Write count entries of the aggressor table starting at first_entry from bank, row (plus a row
+offset, can be negative) and column tuples, with plain stores on the bus: the gateware maps
+every tuple to its address as it is written (loops can be NULL to keep the loop counts).
+Returns FALSE_CONST if the entries do not fit in the table.
+*/
+int sdram_write_aggressor_tuples(uint32_t first_entry, const uint32_t *banks, const uint32_t *rows, const int32_t *row_offsets, const uint32_t *cols, const uint32_t *freqs, const uint32_t *loops, uint32_t count);
+
+/*
+Write count entries of the aggressor table starting at first_entry with plain stores on the bus
+(loops can be NULL to keep the loop counts). Returns FALSE_CONST if the entries do not fit in
+the table.
+*/
+int sdram_write_aggressor_table(uint32_t first_entry, const uint32_t *addrs, const uint32_t *freqs, const uint32_t *loops, uint32_t count);
+
 /*
 Method to show address and frequency of all sets being used
 */
 void sdram_show_addr_freq(void);
 
+/*
+Send the attack straight on the DFI, ACT/RD/PRE at the minimum DRAM timings bypassing
+the controller (enable 1), or through the native port (enable 0). Needs the DFI hammer
+path in the SoC.
+*/
+void sdram_set_dfi_hammer(uint32_t enable);
+
+/*
+Show the path the attack goes through
+*/
+void show_hammer_path(void);
+
+/*
+Show the sequences, REFs and cycles of the DFI hammer path during the last attack
+*/
+void show_dfi_hammer(void);
+
 /*
 Pop an address at the end of the row hammer attack sequence
 */
@@ -113,6 +245,16 @@ Set data pattern
 */
 void sdram_set_data_pattern(uint32_t input_pattern, uint32_t data_sel);
 
+/*
+Use PRBS data seeded from the address of every word mixed with seed instead of the patterns (enable 1), or go back to the patterns (enable 0)
+*/
+void sdram_set_prbs_pattern(uint32_t enable, uint32_t seed);
+
+/*
+Choose how the patterns are laid out per row (PATTERN_ROW_PARITY, PATTERN_ROLE, PATTERN_ROW_STRIPE, PATTERN_COLUMN_STRIPE, PATTERN_CHECKERBOARD)
+*/
+void sdram_set_pattern_mode(uint32_t mode);
+
 /*
 Return timer info (timers are 2-6: pair timers 1-5 respectively, 7: entire cycle counter)
 */
@@ -133,6 +275,174 @@ Display the auto precharge setting
 */
 void show_auto_precharge(void);
 
+/*
+Fill and check the whole DRAM (default)
+*/
+void sdram_set_fill_check_all(void);
+
+/*
+Fill and check only the addresses from start_addr to end_addr (included)
+*/
+void sdram_set_fill_check_window(uint32_t start_addr, uint32_t end_addr);
+
+/*
+Fill and check only the rows within num_rows of every aggressor in the table
+*/
+void sdram_set_fill_check_neighborhood(uint32_t num_rows);
+
+/*
+Display the part of the DRAM filled and checked
+*/
+void show_fill_check(void);
+
+/*
+Sweep the aggressor table over the rows: one test per step, the table moved by base_row,
+base_row + stride, ... up to end_row rows. hammer_count sets the hammer count of every
+entry (0 keeps the counts of the table)
+*/
+void sdram_set_sweep(uint32_t enable, uint32_t base_row, uint32_t stride, uint32_t end_row, uint32_t hammer_count);
+
+/*
+Display the row sweep settings
+*/
+void show_sweep(void);
+
+/*
+Display the steps of the last row sweep with errors after the attack
+*/
+void show_sweep_log(void);
+
+/*
+Search HC_first, the fewest plays of the aggressor table flipping a bit, from min_plays
+to max_plays in every step (mode HC_SEARCH_OFF, HC_SEARCH_BINARY or HC_SEARCH_EXPONENTIAL).
+Only the rows around the aggressors are filled and checked while searching.
+*/
+void sdram_set_hc_search(uint32_t mode, uint32_t min_plays, uint32_t max_plays);
+
+/*
+Display the HC_first search settings
+*/
+void show_hc_search(void);
+
+/*
+Display the HC_first found in every step of the last test
+*/
+void show_hc_first(void);
+
+/*
+Display the bandwidth of a pass over the DRAM (fill or read check)
+*/
+void show_bandwidth(const char *pass_name, uint32_t words, uint64_t cycles);
+
+/*
+Read the cycles of the uptime timer, 0 when the SoC is built without it
+*/
+uint64_t sdram_uptime_cycles(void);
+
+/*
+Display the time of one phase of the test, in cycles and microseconds
+*/
+void show_phase_time(const char *phase_name, uint64_t cycles);
+
+/*
+Display the time of every phase of the last test, the whole test and the error readout are timed by the firmware
+*/
+void show_timing(uint64_t test_cycles, uint64_t readout_cycles);
+
+/*
+Read the entries of every group of the aggressor table in turn, one read each (1), or each entry freq times in a row (0)
+*/
+void sdram_set_hammer_interleave(uint32_t enable);
+
+/*
+Set the aggressor table to a double-sided attack of victim_row in num_banks banks at once, interleaved across the bank groups above the ba_bits bank address bits
+*/
+int sdram_set_bank_parallel_attack(uint32_t victim_row, uint32_t num_banks, uint32_t ba_bits, uint32_t hammer_count);
+
+/*
+Display the reads of the last row hammer attack sent to every bank
+*/
+void show_bank_hammers(void);
+
+/*
+Name of the row hammer FSM state of a feedback state value
+*/
+const char *rh_state_name(uint32_t state);
+
+/*
+Show the state changes of the last test kept by the state trace, with the
+cycles spent in every state
+*/
+void show_state_trace(void);
+
+/*
+Copy all the performance counters at once and read them into counters
+(NUM_PERF_COUNTERS, indexed by PERF_*)
+*/
+void sdram_perf_snapshot(uint64_t *counters);
+
+/*
+Show the cycles of every phase and the port stalls between two snapshots
+*/
+void show_perf_counters(const uint64_t *before, const uint64_t *after);
+
+/*
+Display the DRAM commands counted during the last row hammer attack
+*/
+void show_cmd_counters(void);
+
+/*
+Show the flips of every data bit found after the attack, per DQ, byte lane and chip
+*/
+void show_bit_histogram(void);
+
+/*
+Show the flips found in every row of the histogram after the attack
+*/
+void show_row_histogram(void);
+
+/*
+Count the bits set in a 32-bit value
+*/
+uint32_t count_bits(uint32_t val);
+
+/*
+Print and remove all errors waiting in the error FIFO, error_phase keeps
+track of the last title printed (ERROR_PHASE_NONE at first). The records
+are read from the rh_error_records bus window when the SoC has it (four
+loads per record), else through the CSRs.
+*/
+void sdram_drain_error_fifo(int *error_phase);
+
+/*
+Take the events of the tester (state change, errors waiting, error FIFO half
+full, test done), through its interrupt when the SoC has one
+*/
+void sdram_start_rh_events(void);
+void sdram_stop_rh_events(void);
+
+/*
+Enable the error events again once the error FIFO has been read
+*/
+void sdram_rearm_rh_events(void);
+
+/*
+Sleep until the tester raises events, returns them (RH_EV_*)
+*/
+uint32_t sdram_wait_rh_events(void);
+
+/*
+Print the state of the running test, rate limited, last_progress keeps the
+time of the last line printed
+*/
+void show_progress(uint64_t *last_progress);
+
+/*
+Apply all the shadow settings (patterns, timers, number of addresses, refresh,
+fill/check addresses) at once, the live values are in the *_live_csr registers
+*/
+void sdram_config_commit(void);
+
 /*
 Run the row hammer test
 */
@@ -0,0 +1,8 @@
+from .rh_host import (
+    Row_Hammer_Host, CSR_Batch,
+    Aggressor_Entry, Aggressor_Tuple, Test_Config, Test_Result, Error_Record, Sweep_Step, State_Change,
+    state_trace_events, RH_STATE_NAMES,
+    FILL_CHECK_ALL, FILL_CHECK_WINDOW, FILL_CHECK_NEIGHBORHOOD,
+    PATTERN_ROW_PARITY, PATTERN_ROLE, PATTERN_ROW_STRIPE, PATTERN_COLUMN_STRIPE, PATTERN_CHECKERBOARD,
+    HC_SEARCH_OFF, HC_SEARCH_BINARY, HC_SEARCH_EXPONENTIAL,
+)
@@ -0,0 +1,824 @@
+"""
+Host side control of the rowhammer tester over Etherbone.
+
+The rh_test_* CSRs and the rh_* bus regions of a SoC built with Etherbone
+are reached through LiteX's RemoteClient, with litex_server in between.
+Reads and writes are gathered into Etherbone records, so a whole test
+configuration, a status snapshot or the aggressor table takes one or two
+packets instead of one round trip per 32-bit word.
+"""
+
+
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from litex.tools.litex_client import RemoteClient
+from litex.tools.remote.etherbone import EtherbonePacket, EtherboneRecord
+from litex.tools.remote.etherbone import EtherboneReads, EtherboneWrites
+
+
+
+"""
+Constants
+"""
+
+# Same values as rh_test.py and rh_test.h
+CSR_PREFIX = "rh_test_"
+WORD_BYTES = 4
+ETHERBONE_MAX_RECORD_WORDS = 255  # Read and write counts of a record are 8 bits
+
+# Aggressor table, rh_aggressor_table region
+AGGRESSOR_TABLE_REGION = "rh_aggressor_table"
+AGGRESSOR_TABLE_ENTRY_WORDS = 4  # Address, hammer count, loop count, unused
+
+# Aggressor table set as (bank, row, ...) tuples, rh_aggressor_tuples region
+AGGRESSOR_TUPLES_REGION = "rh_aggressor_tuples"
+AGGRESSOR_TUPLE_ENTRY_WORDS = 8  # Bank, row, row offset, column, hammer count, loop count, unused, unused
+
+# Row sweep log, rh_sweep_log region
+SWEEP_LOG_REGION = "rh_sweep_log"
+SWEEP_LOG_ENTRY_WORDS = 8  # Row, errors before/after the attack, cycles, HC_first, tests run, invalid, unused
+
+# State trace, rh_state_trace region
+STATE_TRACE_REGION = "rh_state_trace"
+STATE_TRACE_ENTRY_WORDS = 4  # Timestamp (low, high word), state entered, address_csr
+
+# Row histogram, rh_row_histogram region
+ROW_HISTOGRAM_REGION = "rh_row_histogram"
+
+# Flips per data bit, rh_bit_histogram region
+BIT_HISTOGRAM_REGION = "rh_bit_histogram"
+
+# Head record of the error FIFO, rh_error_records region, reading the flags word pops it
+ERROR_RECORDS_REGION = "rh_error_records"
+ERROR_RECORD_WORDS = 4  # Address, flipped bits, bits flipped up, flags
+ERROR_RECORD_WINDOW_RECORDS = 64  # Times the head record repeats in the region
+ERROR_RECORD_FIELD_MASK = 0xff  # Lane and popcount in the flags word
+ERROR_RECORD_POPCOUNT_SHIFT = 8
+ERROR_RECORD_AFTER_RH_BIT = 16
+ERROR_RECORD_LAST_BIT = 17
+ERROR_RECORD_VALID_BIT = 31
+
+# Filled and checked addresses
+FILL_CHECK_ALL = 0
+FILL_CHECK_WINDOW = 1
+FILL_CHECK_NEIGHBORHOOD = 2
+
+# Data pattern layouts
+PATTERN_ROW_PARITY = 0
+PATTERN_ROLE = 1
+PATTERN_ROW_STRIPE = 2
+PATTERN_COLUMN_STRIPE = 3
+PATTERN_CHECKERBOARD = 4
+
+# HC_first search modes
+HC_SEARCH_OFF = 0
+HC_SEARCH_BINARY = 1
+HC_SEARCH_EXPONENTIAL = 2
+
+# Performance counters, perf_counters_<name>_csr, copied at once by a snapshot
+PERF_COUNTERS = ["cycles", "fill_cycles", "initial_check_cycles", "init_cycles", "attack_cycles", "drain_cycles",
+                 "post_check_cycles", "readout_cycles", "cmd_stall_cycles", "wdata_stall_cycles"]
+
+# Feedback state sections
+RH_IDLE_STATE = 0x100
+RH_FINAL_CHECK = 0x8000
+
+# Row hammer FSM state of every feedback state value
+RH_STATE_NAMES = {
+    0x100: "RH_IDLE",
+    0x202: "RH_STEP_START",
+    0x1001: "RH_SEARCH_NEXT",
+    0x201: "RH_STEP_INIT",
+    0x200: "RH_FILL",
+    0x1000: "RH_INIT_SETTINGS",
+    0x2000: "RH_ATTACK",
+    0x4000: "RH_RESET_SETTINGS",
+    0x404: "RH_STEP_DONE",
+    0x8000: "RH_FINAL_CHECK",
+    0x400: "READ_CHECK",
+    0x403: "READ_FINISH",
+}
+
+DEFAULT_POLL_INTERVAL = 0.01  # Seconds between two status snapshots while a test runs
+
+
+
+"""
+Settings and results
+"""
+
+@dataclass
+class Aggressor_Entry:
+    """
+    Entry of the aggressor table: a port address, read freq times in a row.
+    A loop count of 0 chains the entry to the next one, N plays all entries
+    since the previous entry with a loop count N times.
+    """
+    addr: int
+    freq: int = 1
+    loop: int = 0
+
+
+@dataclass
+class Aggressor_Tuple:
+    """
+    Entry of the aggressor table given as a bank, row (plus an offset, can
+    be negative) and column, the address map of the gateware makes the port
+    address as the entry is written. freq and loop as in Aggressor_Entry.
+    """
+    bank: int
+    row: int
+    row_offset: int = 0
+    col: int = 0
+    freq: int = 1
+    loop: int = 0
+
+
+@dataclass
+class Test_Config:
+    """
+    Settings of a test, None keeps the setting of the tester. These are the
+    shadow registers, applied together by commit().
+    """
+    aggressors: Optional[List[Aggressor_Entry]] = None  # Or a list of Aggressor_Tuple
+    table_cycles: Optional[int] = None  # Plays of the whole aggressor table
+    pattern_1: Optional[int] = None
+    pattern_2: Optional[int] = None
+    double_pattern: Optional[bool] = None
+    pattern_mode: Optional[int] = None
+    prbs: Optional[bool] = None
+    prbs_seed: Optional[int] = None
+    refresh_rate: Optional[int] = None  # 0 disables the refresh during the attack
+    auto_precharge: Optional[bool] = None
+    hammer_interleave: Optional[bool] = None  # Read the entries of every group in turn
+    dfi_hammer: Optional[bool] = None  # Send the attack straight on the DFI (needs the DFI hammer path)
+    fill_check_mode: Optional[int] = None
+    fill_check_window_start: Optional[int] = None
+    fill_check_window_end: Optional[int] = None
+    fill_check_neighborhood_rows: Optional[int] = None
+    sweep: Optional[bool] = None
+    sweep_base_row: Optional[int] = None
+    sweep_stride: Optional[int] = None
+    sweep_end_row: Optional[int] = None
+    sweep_hammer_count: Optional[int] = None
+    hc_search_mode: Optional[int] = None
+    hc_search_min: Optional[int] = None
+    hc_search_max: Optional[int] = None
+
+    def csr_values(self) -> Dict[str, int]:
+        """
+        CSRs (without the rh_test_ prefix) and values of the settings given
+        """
+        fields = {
+            "rowhammer_state_cycle_counter_csr": self.table_cycles,
+            "input_data_pattern_1_csr": self.pattern_1,
+            "input_data_pattern_2_csr": self.pattern_2,
+            "input_data_double_pattern_setting_csr": self.double_pattern,
+            "input_data_pattern_mode_csr": self.pattern_mode,
+            "input_data_prbs_setting_csr": self.prbs,
+            "input_data_prbs_seed_csr": self.prbs_seed,
+            "auto_precharge_csr": self.auto_precharge,
+            "hammer_interleave_csr": self.hammer_interleave,
+            "dfi_hammer_enable_csr": self.dfi_hammer,
+            "fill_check_mode_csr": self.fill_check_mode,
+            "fill_check_window_start_csr": self.fill_check_window_start,
+            "fill_check_window_end_csr": self.fill_check_window_end,
+            "fill_check_neighborhood_rows_csr": self.fill_check_neighborhood_rows,
+            "sweep_enable_csr": self.sweep,
+            "sweep_base_row_csr": self.sweep_base_row,
+            "sweep_stride_csr": self.sweep_stride,
+            "sweep_end_row_csr": self.sweep_end_row,
+            "sweep_hammer_count_csr": self.sweep_hammer_count,
+            "hc_search_mode_csr": self.hc_search_mode,
+            "hc_search_min_csr": self.hc_search_min,
+            "hc_search_max_csr": self.hc_search_max,
+        }
+        values = {name: int(value) for name, value in fields.items() if value is not None}
+
+        # Same as sdram_set_ref_rate_rhtest, a rate of 0 disables the refresh
+        if self.refresh_rate is not None:
+            values["refresh_enable_csr"] = int(self.refresh_rate != 0)
+            if self.refresh_rate != 0:
+                values["refresh_rate_csr"] = self.refresh_rate
+
+        if self.aggressors is not None:
+            values["aggressor_count_csr"] = len(self.aggressors)
+
+        return values
+
+
+@dataclass
+class Error_Record:
+    """
+    Flipped bits of one 32-bit lane of a word with errors
+    """
+    addr: int
+    lane: int
+    xor: int
+    up: int  # Bits flipped from 0 to 1
+    popcount: int
+    after_attack: bool
+
+
+@dataclass
+class Sweep_Step:
+    """
+    Result of one step of a row sweep (or of the only step of a test)
+    """
+    row: int
+    errors_before: int
+    errors_after: int
+    cycles: int
+    hc_first: int  # 0: no flip found by the search
+    tests: int
+    invalid: bool = False  # The check before the attack found errors, the search of the step stopped
+
+
+@dataclass
+class State_Change:
+    """
+    Row hammer FSM state entered at a cycle, from the state trace
+    """
+    cycle: int
+    state: int  # Feedback state value, RH_STATE_NAMES has the name
+    addr: int   # address_csr at that cycle
+
+    @property
+    def name(self) -> str:
+        return RH_STATE_NAMES.get(self.state, hex(self.state))
+
+
+@dataclass
+class Test_Result:
+    """
+    Result of a test run by run()
+    """
+    errors_before: int
+    errors_after: int
+    errors_not_kept: int
+    fill_words: int
+    fill_cycles: int
+    read_words: int
+    read_cycles: int
+    hc_first: int
+    hc_search_invalid: bool = False  # The search of the last step stopped on errors before the attack
+    errors: List[Error_Record] = field(default_factory=list)
+    steps: List[Sweep_Step] = field(default_factory=list)
+    bank_reads: List[int] = field(default_factory=list)  # Reads of the last attack per bank
+    dfi_hammer: Dict[str, int] = field(default_factory=dict)  # Counts of the DFI hammer path, empty without it
+    perf: Dict[str, int] = field(default_factory=dict)  # Cycles of every phase and port stalls during the test (PERF_COUNTERS)
+    trace: List[State_Change] = field(default_factory=list)  # State changes of the test, oldest first
+    seconds: float = 0.0
+
+
+
+"""
+Batched CSR access
+"""
+
+class CSR_Batch:
+    """
+    CSR reads and writes gathered and sent at once by flush(). The writes
+    go out first in the order given, one record per run of consecutive
+    words, then all the reads in records of up to ETHERBONE_MAX_RECORD_WORDS
+    words, before any answer is waited for.
+    """
+
+    def __init__(self, host: "Row_Hammer_Host"):
+        self.host = host
+        self.writes: Dict[int, int] = {}
+        self.reads: Dict[str, object] = {}
+
+    def write(self, name: str, value: int) -> "CSR_Batch":
+        reg = self.host.reg(name)
+        for i in range(reg.length):
+            self.writes[reg.addr + (WORD_BYTES * i)] = (value >> ((reg.length - 1 - i) * reg.data_width)) & ((1 << reg.data_width) - 1)
+        return self
+
+    def read(self, name: str) -> "CSR_Batch":
+        self.reads[name] = self.host.reg(name)
+        return self
+
+    def flush(self) -> Dict[str, int]:
+        self.host.write_words(self.writes)
+        addrs = [reg.addr + (WORD_BYTES * i) for reg in self.reads.values() for i in range(reg.length)]
+        words = iter(self.host.read_words(addrs))
+
+        # Multi-word CSRs come most significant word first
+        values = {}
+        for name, reg in self.reads.items():
+            value = 0
+            for i in range(reg.length):
+                value = (value << reg.data_width) | next(words)
+            values[name] = value
+
+        self.writes = {}
+        self.reads = {}
+        return values
+
+
+
+"""
+Row hammer tester on the host
+"""
+
+class Row_Hammer_Host:
+    """
+    Rowhammer tester of a SoC reached through litex_server. The csr.csv of
+    the build gives the CSR and region addresses. CSR names are given
+    without the rh_test_ prefix, e.g. "feedback_state_csr".
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 1234, csr_csv: str = "csr.csv", debug: bool = False):
+        self.client = RemoteClient(host=host, port=port, csr_csv=csr_csv, debug=debug)
+        self.client.open()
+        self.addr_size = self.client.csr_bus_address_width // 8
+
+    def close(self):
+        self.client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    ###########################################################################
+
+    """
+    Raw access
+    """
+
+    def reg(self, name: str):
+        try:
+            return getattr(self.client.regs, CSR_PREFIX + name)
+        except AttributeError:
+            raise KeyError("No CSR " + CSR_PREFIX + name + " in the csr.csv of this SoC") from None
+
+    def has_csr(self, name: str) -> bool:
+        return hasattr(self.client.regs, CSR_PREFIX + name)
+
+    def has_region(self, name: str) -> bool:
+        return name in self.client.mems.d
+
+    def region_base(self, name: str) -> int:
+        try:
+            return getattr(self.client.mems, name).base
+        except AttributeError:
+            raise KeyError("No " + name + " region on the bus of this SoC") from None
+
+    def write_words(self, words: Dict[int, int]):
+        """
+        Write bus words (address: value) in the order given, consecutive
+        words share a record. Writes are not acknowledged, nothing is waited
+        for.
+        """
+        runs = []
+        for addr in words:
+            if runs and addr == runs[-1][0] + (WORD_BYTES * len(runs[-1][1])) and len(runs[-1][1]) < ETHERBONE_MAX_RECORD_WORDS:
+                runs[-1][1].append(words[addr])
+            else:
+                runs.append((addr, [words[addr]]))
+
+        for base, datas in runs:
+            record = EtherboneRecord(self.addr_size)
+            record.writes = EtherboneWrites(base_addr=self.client.base_address + base, addr_size=self.addr_size, datas=datas)
+            record.wcount = len(datas)
+            self.send_record(record)
+
+    def read_words(self, addrs: Sequence[int]) -> List[int]:
+        """
+        Read bus words at any addresses, every record is sent before the
+        answers are received
+        """
+        chunks = [addrs[i:i + ETHERBONE_MAX_RECORD_WORDS] for i in range(0, len(addrs), ETHERBONE_MAX_RECORD_WORDS)]
+        for chunk in chunks:
+            record = EtherboneRecord(self.addr_size)
+            record.reads = EtherboneReads(addr_size=self.addr_size, addrs=[self.client.base_address + addr for addr in chunk])
+            record.rcount = len(chunk)
+            self.send_record(record)
+
+        words = []
+        for chunk in chunks:
+            response = self.client.receive_packet(self.client.socket, self.addr_size)
+            if response == 0:
+                raise TimeoutError("No answer from litex_server")
+            packet = EtherbonePacket(addr_width=self.client.csr_bus_address_width, init=response)
+            packet.decode()
+            words += packet.records.pop().writes.get_datas()
+        return words
+
+    def send_record(self, record: EtherboneRecord):
+        packet = EtherbonePacket(self.client.csr_bus_address_width)
+        packet.records = [record]
+        packet.encode()
+        self.client.send_packet(self.client.socket, packet)
+
+    def batch(self) -> CSR_Batch:
+        return CSR_Batch(self)
+
+    def read_csrs(self, names: Iterable[str]) -> Dict[str, int]:
+        """
+        Snapshot of many CSRs in one round trip
+        """
+        batch = self.batch()
+        for name in names:
+            batch.read(name)
+        return batch.flush()
+
+    def write_csrs(self, values: Dict[str, int]):
+        batch = self.batch()
+        for name, value in values.items():
+            batch.write(name, value)
+        batch.flush()
+
+    def read_csr(self, name: str) -> int:
+        return self.read_csrs([name])[name]
+
+    def write_csr(self, name: str, value: int):
+        self.write_csrs({name: value})
+
+    ###########################################################################
+
+    """
+    Aggressor table and address map
+    """
+
+    def aggressor_table_depth(self) -> int:
+        return self.read_csr("aggressor_table_depth_csr")
+
+    def write_aggressor_table(self, entries: Sequence[Aggressor_Entry], first_entry: int = 0):
+        """
+        Write entries of the aggressor table, in bursts on the bus, or
+        through the table CSRs on SoCs without the bus region. Only write
+        the table while no test is running.
+        """
+        if first_entry + len(entries) > self.aggressor_table_depth():
+            raise ValueError("{} entries from entry {} do not fit in the aggressor table".format(len(entries), first_entry))
+
+        if not self.has_region(AGGRESSOR_TABLE_REGION):
+            # One batch per entry, the write strobe goes last
+            for i, entry in enumerate(entries):
+                self.batch() \
+                    .write("aggressor_table_entry_csr", first_entry + i) \
+                    .write("aggressor_table_addr_csr", entry.addr) \
+                    .write("aggressor_table_freq_csr", entry.freq) \
+                    .write("aggressor_table_loop_csr", entry.loop) \
+                    .write("aggressor_table_write_csr", 1) \
+                    .flush()
+            return
+
+        # The unused word is written too, so the entries make one run of words
+        base = self.region_base(AGGRESSOR_TABLE_REGION) + (first_entry * AGGRESSOR_TABLE_ENTRY_WORDS * WORD_BYTES)
+        words = {}
+        for i, entry in enumerate(entries):
+            for word, value in enumerate([entry.addr, entry.freq, entry.loop, 0]):
+                words[base + (((i * AGGRESSOR_TABLE_ENTRY_WORDS) + word) * WORD_BYTES)] = value
+        self.write_words(words)
+
+    def read_aggressor_table(self, count: Optional[int] = None) -> List[Aggressor_Entry]:
+        """
+        Entries of the aggressor table, the entries attacked by default
+        """
+        if count is None:
+            count = self.read_csr("aggressor_count_csr")
+
+        if not self.has_region(AGGRESSOR_TABLE_REGION):
+            entries = []
+            for i in range(count):
+                values = self.batch() \
+                    .write("aggressor_table_entry_csr", i) \
+                    .read("aggressor_table_addr_out_csr") \
+                    .read("aggressor_table_freq_out_csr") \
+                    .read("aggressor_table_loop_out_csr") \
+                    .flush()
+                entries.append(Aggressor_Entry(values["aggressor_table_addr_out_csr"], values["aggressor_table_freq_out_csr"], values["aggressor_table_loop_out_csr"]))
+            return entries
+
+        base = self.region_base(AGGRESSOR_TABLE_REGION)
+        words = self.read_words([base + (i * WORD_BYTES) for i in range(count * AGGRESSOR_TABLE_ENTRY_WORDS)])
+        return [Aggressor_Entry(*words[i:i + 3]) for i in range(0, len(words), AGGRESSOR_TABLE_ENTRY_WORDS)]
+
+    def write_aggressor_tuples(self, tuples: Sequence[Aggressor_Tuple], first_entry: int = 0):
+        """
+        Write entries of the aggressor table from (bank, row, ...) tuples,
+        the gateware maps every tuple to its port address as it is written,
+        so the whole table goes out in bursts. SoCs without the bus region
+        map every tuple through the address map CSRs first.
+        """
+        if not self.has_region(AGGRESSOR_TUPLES_REGION):
+            self.write_aggressor_table([Aggressor_Entry(self.map_addr(t.bank, t.row, t.col, t.row_offset), t.freq, t.loop) for t in tuples], first_entry)
+            return
+
+        if first_entry + len(tuples) > self.aggressor_table_depth():
+            raise ValueError("{} entries from entry {} do not fit in the aggressor table".format(len(tuples), first_entry))
+
+        # The column word stores the address, it goes after the bank, row and offset of its entry.
+        # The unused words are written too, so the entries make one run of words.
+        base = self.region_base(AGGRESSOR_TUPLES_REGION) + (first_entry * AGGRESSOR_TUPLE_ENTRY_WORDS * WORD_BYTES)
+        words = {}
+        for i, t in enumerate(tuples):
+            for word, value in enumerate([t.bank, t.row, t.row_offset & 0xffffffff, t.col, t.freq, t.loop, 0, 0]):
+                words[base + (((i * AGGRESSOR_TUPLE_ENTRY_WORDS) + word) * WORD_BYTES)] = value
+        self.write_words(words)
+
+    def map_addr(self, bank: int, row: int, col: int = 0, row_offset: int = 0) -> int:
+        """
+        Port address of a bank, row (plus an offset, can be negative) and
+        column from the address map of the gateware
+        """
+        batch = self.batch()
+        batch.write("address_map_bank_csr", bank)
+        batch.write("address_map_row_csr", row)
+        batch.write("address_map_row_offset_csr", row_offset & 0xffffffff)
+        batch.write("address_map_col_csr", col)
+        batch.read("address_map_addr_csr")
+        return batch.flush()["address_map_addr_csr"]
+
+    ###########################################################################
+
+    """
+    Running a test
+    """
+
+    def configure(self, config: Test_Config):
+        """
+        Write the settings of a test in one batch, they are not in use till commit()
+        """
+        if config.aggressors and isinstance(config.aggressors[0], Aggressor_Tuple):
+            self.write_aggressor_tuples(config.aggressors)
+        elif config.aggressors is not None:
+            self.write_aggressor_table(config.aggressors)
+        self.write_csrs(config.csr_values())
+
+    def commit(self, timeout: float = 1.0):
+        """
+        Apply all the shadow settings at once, waits until they are live
+        """
+        self.write_csr("config_commit_csr", 1)
+        deadline = time.monotonic() + timeout
+        while self.read_csr("config_commit_pending_csr"):
+            if time.monotonic() > deadline:
+                raise TimeoutError("Settings not applied, is a test running?")
+
+    def start(self, timeout: float = 1.0):
+        """
+        Commit the settings and start a test, the tester does not start the
+        aggressor/victim pattern with more entries than it knows as
+        aggressor rows
+        """
+        self.commit(timeout)
+        if self.read_csr("input_data_role_overflow_csr"):
+            counts = self.read_csrs(["aggressor_count_live_csr", "input_data_role_aggressors_csr"])
+            raise ValueError("Aggressor/victim pattern with {} table entries, only the first {} are known as aggressor rows".format(
+                counts["aggressor_count_live_csr"], counts["input_data_role_aggressors_csr"]))
+        self.write_csr("rowhammer_start_fsm_csr", 1)
+        deadline = time.monotonic() + timeout
+        while not self.read_csr("rowhammer_start_prev_fsm_csr"):
+            if time.monotonic() > deadline:
+                raise TimeoutError("Tester not started")
+
+    def stop(self, timeout: float = 1.0):
+        """
+        Stop the tester, a sweep stops after the step running
+        """
+        self.write_csr("rowhammer_start_fsm_csr", 0)
+        deadline = time.monotonic() + timeout
+        while self.read_csr("rowhammer_start_prev_fsm_csr"):
+            if time.monotonic() > deadline:
+                raise TimeoutError("Tester not stopped")
+
+    def status(self) -> Dict[str, int]:
+        return self.read_csrs(["feedback_state_csr", "error_fifo_level_csr", "sweep_row_csr", "hc_search_plays_csr"])
+
+    def drain_errors(self, level: Optional[int] = None) -> List[Error_Record]:
+        """
+        Remove all errors waiting in the error FIFO, one record per lane with
+        flips. From the rh_error_records region, reads pop the records, as
+        many as the errors waiting in one bulk transfer. Without it, the pop
+        of a record and the read of the next go in the same round trip.
+        """
+        records = []
+        fields = ["error_fifo_level_csr", "error_fifo_addr_csr", "error_fifo_after_rh_csr", "error_record_lane_csr",
+                  "error_record_xor_csr", "error_record_up_csr", "error_record_popcount_csr", "error_record_last_csr"]
+
+        if level == 0:
+            return records
+
+        if self.has_region(ERROR_RECORDS_REGION):
+            base = self.region_base(ERROR_RECORDS_REGION)
+            if level is None:
+                level = self.read_csr("error_fifo_level_csr")
+            while level > 0:
+                # Every error has a record or more, reads of an empty FIFO give records not valid
+                words = self.read_words([base + ((i % (ERROR_RECORD_WINDOW_RECORDS * ERROR_RECORD_WORDS)) * WORD_BYTES)
+                                         for i in range(level * ERROR_RECORD_WORDS)])
+                for i in range(0, len(words), ERROR_RECORD_WORDS):
+                    addr, xor, up, flags = words[i:i + ERROR_RECORD_WORDS]
+                    if (flags >> ERROR_RECORD_VALID_BIT) & 1:
+                        records.append(Error_Record(
+                            addr=addr,
+                            lane=flags & ERROR_RECORD_FIELD_MASK,
+                            xor=xor,
+                            up=up,
+                            popcount=(flags >> ERROR_RECORD_POPCOUNT_SHIFT) & ERROR_RECORD_FIELD_MASK,
+                            after_attack=bool((flags >> ERROR_RECORD_AFTER_RH_BIT) & 1),
+                        ))
+                level = self.read_csr("error_fifo_level_csr")
+            return records
+
+        snapshot = self.read_csrs(fields)
+        while snapshot["error_fifo_level_csr"] > 0:
+            records.append(Error_Record(
+                addr=snapshot["error_fifo_addr_csr"],
+                lane=snapshot["error_record_lane_csr"],
+                xor=snapshot["error_record_xor_csr"],
+                up=snapshot["error_record_up_csr"],
+                popcount=snapshot["error_record_popcount_csr"],
+                after_attack=bool(snapshot["error_fifo_after_rh_csr"]),
+            ))
+            batch = self.batch().write("error_fifo_pop_csr", 1)
+            for name in fields:
+                batch.read(name)
+            snapshot = batch.flush()
+
+        return records
+
+    def read_sweep_log(self) -> List[Sweep_Step]:
+        """
+        Steps of the last test, in bursts from the sweep log region
+        """
+        counts = self.read_csrs(["sweep_log_steps_csr", "sweep_log_depth_csr"])
+        steps = min(counts["sweep_log_steps_csr"], counts["sweep_log_depth_csr"])
+        base = self.region_base(SWEEP_LOG_REGION)
+        words = self.read_words([base + (i * WORD_BYTES) for i in range(steps * SWEEP_LOG_ENTRY_WORDS)])
+        return [Sweep_Step(*words[i:i + 6], invalid=bool(words[i + 6])) for i in range(0, len(words), SWEEP_LOG_ENTRY_WORDS)]
+
+    def read_bank_hammers(self) -> List[int]:
+        """
+        Reads of the last attack sent to every bank. The count of a bank is
+        read through the bank_sel selector, and a batch sends all its writes
+        before any read, so every bank takes its own round trip.
+        """
+        reads = []
+        for bank in range(self.read_csr("bank_hammers_num_banks_csr")):
+            reads.append(self.batch().write("bank_hammers_bank_sel_csr", bank).read("bank_hammers_reads_csr").flush()["bank_hammers_reads_csr"])
+        return reads
+
+    def read_dfi_hammer(self) -> Dict[str, int]:
+        """
+        Sequences, REFs and cycles of the DFI hammer path in the last attack
+        """
+        counts = self.read_csrs(["dfi_hammer_hammers_csr", "dfi_hammer_refreshes_csr", "dfi_hammer_held_cycles_csr",
+                                 "dfi_hammer_sync_cycles_csr", "dfi_hammer_act_interval_csr", "dfi_hammer_dropped_cmds_csr"])
+        return {name[len("dfi_hammer_"):-len("_csr")]: value for name, value in counts.items()}
+
+    def read_perf_counters(self) -> Dict[str, int]:
+        """
+        Snapshot of the performance counters, all copied in the same cycle
+        then read in one round trip. They never reset, time a test by the
+        difference of two snapshots.
+        """
+        batch = self.batch().write("perf_counters_snapshot_csr", 1)
+        for name in PERF_COUNTERS:
+            batch.read("perf_counters_" + name + "_csr")
+        return {name[len("perf_counters_"):-len("_csr")]: value for name, value in batch.flush().items()}
+
+    def read_state_trace(self) -> List[State_Change]:
+        """
+        State changes of the row hammer FSM kept by the state trace, oldest
+        first. The trace is a ring, only the last depth changes are kept.
+        """
+        counts = self.read_csrs(["state_trace_transitions_csr", "state_trace_depth_csr"])
+        depth = counts["state_trace_depth_csr"]
+        kept = min(counts["state_trace_transitions_csr"], depth)
+        first = (counts["state_trace_transitions_csr"] - kept) % depth
+        base = self.region_base(STATE_TRACE_REGION)
+        addrs = []
+        for i in range(kept):
+            entry = base + (((first + i) % depth) * STATE_TRACE_ENTRY_WORDS * WORD_BYTES)
+            addrs += [entry + (w * WORD_BYTES) for w in range(STATE_TRACE_ENTRY_WORDS)]
+        words = self.read_words(addrs)
+        return [State_Change(words[i] | (words[i + 1] << 32), words[i + 2], words[i + 3]) for i in range(0, len(words), STATE_TRACE_ENTRY_WORDS)]
+
+    def export_state_trace(self, path: str, trace: Optional[List[State_Change]] = None):
+        """
+        Write a state trace (read from the tester if not given) as Chrome
+        trace JSON, for chrome://tracing or ui.perfetto.dev
+        """
+        if trace is None:
+            trace = self.read_state_trace()
+        with open(path, "w") as f:
+            json.dump(state_trace_events(trace, self.read_csr("sys_clk_freq_csr")), f)
+
+    def read_row_histogram(self) -> List[int]:
+        """
+        Flips found in every row of the row histogram window after the attack
+        """
+        depth = self.read_csr("row_histogram_depth_csr")
+        base = self.region_base(ROW_HISTOGRAM_REGION)
+        return self.read_words([base + (i * WORD_BYTES) for i in range(depth)])
+
+    def read_bit_histogram(self) -> List[int]:
+        """
+        Flips found in every data bit of the port, bit i is DQ i % (data
+        width / 8) of the burst. One counter per batch through the CSRs on
+        SoCs without the bus region.
+        """
+        num_bits = self.read_csr("bit_histogram_num_bits_csr")
+        if not self.has_region(BIT_HISTOGRAM_REGION):
+            return [self.batch().write("bit_histogram_sel_csr", i).read("bit_histogram_count_csr").flush()["bit_histogram_count_csr"]
+                    for i in range(num_bits)]
+
+        base = self.region_base(BIT_HISTOGRAM_REGION)
+        return self.read_words([base + (i * WORD_BYTES) for i in range(num_bits)])
+
+    def run(self, config: Optional[Test_Config] = None, poll_interval: float = DEFAULT_POLL_INTERVAL) -> Test_Result:
+        """
+        Configure (if given), run a test till the end and stop the tester,
+        also when the run fails. Errors are removed from the FIFO while the
+        test keeps going.
+        """
+        if config is not None:
+            self.configure(config)
+
+        perf_before = self.read_perf_counters()
+        started = time.monotonic()
+        self.start()
+
+        errors = []
+        try:
+            while True:
+                status = self.status()
+                errors += self.drain_errors(status["error_fifo_level_csr"])
+                if (status["feedback_state_csr"] & RH_FINAL_CHECK) == RH_FINAL_CHECK:
+                    break
+                time.sleep(poll_interval)
+
+            # Errors found at the very end of the last read
+            errors += self.drain_errors()
+            seconds = time.monotonic() - started
+            perf_after = self.read_perf_counters()
+
+            totals = self.read_csrs(["rowhammer_initial_err_cnt_csr", "rowhammer_err_cnt_csr", "error_fifo_overflow_csr",
+                                     "fill_engine_words_csr", "fill_engine_cycles_csr", "read_checker_words_csr",
+                                     "read_checker_cycles_csr", "hc_first_csr", "hc_search_invalid_csr"])
+            steps = self.read_sweep_log() if self.has_region(SWEEP_LOG_REGION) else []
+            bank_reads = self.read_bank_hammers()
+            dfi_hammer = self.read_dfi_hammer() if self.has_csr("dfi_hammer_hammers_csr") else {}
+            trace = self.read_state_trace() if self.has_region(STATE_TRACE_REGION) else []
+        finally:
+            self.stop()
+
+        return Test_Result(
+            errors_before=totals["rowhammer_initial_err_cnt_csr"],
+            errors_after=totals["rowhammer_err_cnt_csr"],
+            errors_not_kept=totals["error_fifo_overflow_csr"],
+            fill_words=totals["fill_engine_words_csr"],
+            fill_cycles=totals["fill_engine_cycles_csr"],
+            read_words=totals["read_checker_words_csr"],
+            read_cycles=totals["read_checker_cycles_csr"],
+            hc_first=totals["hc_first_csr"],
+            hc_search_invalid=bool(totals["hc_search_invalid_csr"]),
+            errors=errors,
+            steps=steps,
+            bank_reads=bank_reads,
+            dfi_hammer=dfi_hammer,
+            perf={name: perf_after[name] - perf_before[name] for name in PERF_COUNTERS},
+            trace=trace,
+            seconds=seconds,
+        )
+
+
+
+"""
+Timeline export
+"""
+
+def state_trace_events(trace: Sequence[State_Change], sys_clk_freq: int) -> Dict[str, object]:
+    """
+    Chrome trace (Trace Event Format) of a state trace: one complete event
+    per state, from the cycle it was entered to the next change, times in
+    microseconds at the system clock. The last state has no end and is an
+    instant event.
+    """
+    def usecs(cycle):
+        return (cycle * 1e6) / sys_clk_freq
+
+    events = []
+    for i, change in enumerate(trace):
+        event = {"name": change.name, "cat": "rh_fsm", "pid": 0, "tid": 0, "ts": usecs(change.cycle),
+                 "args": {"cycle": change.cycle, "address": hex(change.addr)}}
+        if i + 1 < len(trace):
+            event["ph"] = "X"
+            event["dur"] = usecs(trace[i + 1].cycle - change.cycle)
+            event["args"]["cycles"] = trace[i + 1].cycle - change.cycle
+        else:
+            event["ph"] = "i"
+            event["s"] = "t"
+        events.append(event)
+
+    return {"traceEvents": events, "displayTimeUnit": "ns"}
@@ -0,0 +1,309 @@
+"""
+Tests of the batched Etherbone access of rh_host.py, against a litex_server
+stand-in: a loopback socket that decodes every Etherbone packet, applies its
+writes to a word memory and answers its reads, as litex_server and the SoC
+would. Run from DRAM_Row_Hammer_Test with:
+
+    python -m unittest rowhammer_host.test_rh_host
+"""
+
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from litex.tools.litex_client import RemoteClient
+from litex.tools.remote.etherbone import EtherbonePacket, EtherboneRecord, EtherboneWrites
+
+from rowhammer_host import rh_host
+from rowhammer_host.rh_host import Row_Hammer_Host, Aggressor_Entry, Aggressor_Tuple, Error_Record, ETHERBONE_MAX_RECORD_WORDS, WORD_BYTES
+from rowhammer_host.rh_host import (ERROR_RECORD_WORDS, ERROR_RECORD_WINDOW_RECORDS, ERROR_RECORD_POPCOUNT_SHIFT, ERROR_RECORD_AFTER_RH_BIT,
+                                    ERROR_RECORD_LAST_BIT, ERROR_RECORD_VALID_BIT)
+
+
+
+"""
+Constants
+"""
+
+CSR_BASE = 0x1000
+AGGRESSOR_TABLE_BASE = 0x40000000
+AGGRESSOR_TABLE_DEPTH = 16
+AGGRESSOR_TUPLES_BASE = 0x50000000
+BIT_HISTOGRAM_BASE = 0x60000000
+ERROR_RECORDS_BASE = 0x70000000
+
+# Registers of the stand-in SoC: name, address, words
+CSRS = [
+    ("rh_test_aggressor_count_csr", CSR_BASE + 0x00, 1),
+    ("rh_test_aggressor_table_depth_csr", CSR_BASE + 0x04, 1),
+    ("rh_test_perf_cycles_csr", CSR_BASE + 0x08, 2),
+    ("rh_test_address_map_row_csr", CSR_BASE + 0x10, 1),
+    ("rh_test_bit_histogram_num_bits_csr", CSR_BASE + 0x14, 1),
+    ("rh_test_config_commit_csr", CSR_BASE + 0x18, 1),
+    ("rh_test_config_commit_pending_csr", CSR_BASE + 0x1c, 1),
+    ("rh_test_input_data_role_overflow_csr", CSR_BASE + 0x20, 1),
+    ("rh_test_aggressor_count_live_csr", CSR_BASE + 0x24, 1),
+    ("rh_test_input_data_role_aggressors_csr", CSR_BASE + 0x28, 1),
+    ("rh_test_rowhammer_start_fsm_csr", CSR_BASE + 0x2c, 1),
+    ("rh_test_error_fifo_level_csr", CSR_BASE + 0x30, 1),
+    ("rh_test_rowhammer_start_prev_fsm_csr", CSR_BASE + 0x34, 1),
+]
+
+
+
+"""
+litex_server stand-in
+"""
+
+class Loopback_Socket:
+    """
+    Socket of a RemoteClient, every packet sent is decoded and executed at
+    once, the answers of its reads wait in rx till they are received.
+    """
+
+    def __init__(self, addr_width=32):
+        self.addr_width = addr_width
+        self.mem = {}
+        self.read_hooks = {}  # Address: function giving the word, for reads with side effects
+        self.records = []  # (base address, write words, read addresses) of every record, in order
+        self.rx = bytes()
+        self.answers_waiting = 0
+        self.answers_waiting_max = 0  # Most read records sent before their answers were taken
+
+    def sendall(self, data):
+        packet = EtherbonePacket(addr_width=self.addr_width, init=data)
+        packet.decode()
+        for record in packet.records:
+            writes = record.writes.get_datas() if record.writes is not None else []
+            base = record.writes.base_addr if record.writes is not None else None
+            addrs = record.reads.get_addrs() if record.reads is not None else []
+            self.records.append((base, writes, addrs))
+            for i, value in enumerate(writes):
+                self.mem[base + (i * WORD_BYTES)] = value
+            if addrs:
+                self.answer(record.reads.base_ret_addr, [self.read(addr) for addr in addrs])
+
+    def read(self, addr):
+        if addr in self.read_hooks:
+            return self.read_hooks[addr]()
+        return self.mem.get(addr, 0)
+
+    def answer(self, base_ret_addr, datas):
+        record = EtherboneRecord(self.addr_width // 8)
+        record.writes = EtherboneWrites(base_addr=base_ret_addr, addr_size=self.addr_width // 8, datas=datas)
+        record.wcount = len(datas)
+        packet = EtherbonePacket(self.addr_width)
+        packet.records = [record]
+        packet.encode()
+        self.rx += packet.bytes
+        self.answers_waiting += 1
+        self.answers_waiting_max = max(self.answers_waiting_max, self.answers_waiting)
+
+    def recv(self, n):
+        data, self.rx = self.rx[:n], self.rx[n:]
+        return data
+
+    def answer_taken(self):
+        self.answers_waiting -= 1
+
+
+class Loopback_Client(RemoteClient):
+    """
+    RemoteClient on a Loopback_Socket instead of litex_server
+    """
+
+    def __init__(self, host="localhost", port=1234, csr_csv=None, debug=False):
+        RemoteClient.__init__(self, host=host, port=port, csr_csv=csr_csv, debug=debug)
+        self.socket = Loopback_Socket(self.csr_bus_address_width)
+        self.binded = True
+
+    def receive_packet(self, socket, addr_size):
+        packet = RemoteClient.receive_packet(self, socket, addr_size)
+        socket.answer_taken()
+        return packet
+
+    def close(self):
+        self.binded = False
+
+
+
+"""
+Tests
+"""
+
+class Test_Row_Hammer_Host(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.csr_csv = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(fd, "w") as f:
+            f.write("csr_base,rh_test,0x{:08x},,\n".format(CSR_BASE))
+            for name, addr, length in CSRS:
+                f.write("csr_register,{},0x{:08x},{},rw\n".format(name, addr, length))
+            f.write("constant,config_csr_data_width,32,,\n")
+            f.write("constant,config_bus_address_width,32,,\n")
+            f.write("memory_region,rh_aggressor_table,0x{:08x},{},io\n".format(AGGRESSOR_TABLE_BASE, AGGRESSOR_TABLE_DEPTH * 16))
+            f.write("memory_region,rh_aggressor_tuples,0x{:08x},{},io\n".format(AGGRESSOR_TUPLES_BASE, AGGRESSOR_TABLE_DEPTH * 32))
+            f.write("memory_region,rh_bit_histogram,0x{:08x},{},io\n".format(BIT_HISTOGRAM_BASE, 1024 * 4))
+            f.write("memory_region,rh_error_records,0x{:08x},{},io\n".format(ERROR_RECORDS_BASE, ERROR_RECORD_WINDOW_RECORDS * ERROR_RECORD_WORDS * WORD_BYTES))
+
+        with mock.patch.object(rh_host, "RemoteClient", Loopback_Client):
+            self.host = Row_Hammer_Host(csr_csv=self.csr_csv)
+        self.server = self.host.client.socket
+
+    def tearDown(self):
+        self.host.close()
+        os.remove(self.csr_csv)
+
+    def test_batch_word_order(self):
+        # Multi-word CSRs go out and come back most significant word first
+        self.host.batch() \
+            .write("perf_cycles_csr", 0x1122334455667788) \
+            .write("address_map_row_csr", 0xabcd) \
+            .flush()
+        self.assertEqual(self.server.mem[CSR_BASE + 0x08], 0x11223344)
+        self.assertEqual(self.server.mem[CSR_BASE + 0x0c], 0x55667788)
+        self.assertEqual(self.server.mem[CSR_BASE + 0x10], 0xabcd)
+
+        # One run of consecutive words, one record
+        self.assertEqual(self.server.records, [(CSR_BASE + 0x08, [0x11223344, 0x55667788, 0xabcd], [])])
+
+        values = self.host.read_csrs(["perf_cycles_csr", "address_map_row_csr"])
+        self.assertEqual(values, {"perf_cycles_csr": 0x1122334455667788, "address_map_row_csr": 0xabcd})
+
+    def test_batch_writes_before_reads(self):
+        values = self.host.batch() \
+            .write("aggressor_count_csr", 7) \
+            .read("aggressor_count_csr") \
+            .flush()
+        self.assertEqual(values, {"aggressor_count_csr": 7})
+        self.assertEqual([bool(writes) for base, writes, addrs in self.server.records], [True, False])
+
+    def test_write_words_runs(self):
+        # Runs are split at ETHERBONE_MAX_RECORD_WORDS words and at gaps
+        base = 0x10000
+        words = {base + (i * WORD_BYTES): i for i in range(600)}
+        words[0x20000] = 0xdead
+        self.host.write_words(words)
+
+        self.assertEqual([(record_base, len(writes)) for record_base, writes, addrs in self.server.records], [
+            (base, ETHERBONE_MAX_RECORD_WORDS),
+            (base + (ETHERBONE_MAX_RECORD_WORDS * WORD_BYTES), ETHERBONE_MAX_RECORD_WORDS),
+            (base + (2 * ETHERBONE_MAX_RECORD_WORDS * WORD_BYTES), 600 - (2 * ETHERBONE_MAX_RECORD_WORDS)),
+            (0x20000, 1),
+        ])
+        self.assertEqual(self.server.mem, words)
+
+    def test_read_words_pipelined(self):
+        addrs = [0x30000 + (((i * 7) % 600) * WORD_BYTES) for i in range(600)]
+        for addr in addrs:
+            self.server.mem[addr] = addr ^ 0x5a5a5a5a
+
+        words = self.host.read_words(addrs)
+        self.assertEqual(words, [addr ^ 0x5a5a5a5a for addr in addrs])
+
+        # Every record was sent before the first answer was taken
+        self.assertEqual([len(addrs) for base, writes, addrs in self.server.records], [ETHERBONE_MAX_RECORD_WORDS, ETHERBONE_MAX_RECORD_WORDS, 90])
+        self.assertEqual(self.server.answers_waiting_max, 3)
+
+    def test_aggressor_table(self):
+        self.server.mem[CSR_BASE + 0x04] = AGGRESSOR_TABLE_DEPTH
+        entries = [Aggressor_Entry(addr=0x100 + i, freq=1000 + i, loop=i % 3) for i in range(5)]
+        self.host.write_aggressor_table(entries, first_entry=2)
+
+        # Address, hammer count, loop count and unused word of every entry, in one run of words
+        base = AGGRESSOR_TABLE_BASE + (2 * 16)
+        self.assertEqual([self.server.mem[base + (i * 4)] for i in range(4)], [0x100, 1000, 0, 0])
+        self.assertEqual([(record_base, len(writes)) for record_base, writes, addrs in self.server.records if writes], [(base, 5 * 4)])
+
+        self.assertEqual(self.host.read_aggressor_table(7)[2:], entries)
+
+        with self.assertRaises(ValueError):
+            self.host.write_aggressor_table(entries, first_entry=AGGRESSOR_TABLE_DEPTH - 2)
+
+    def test_aggressor_tuples(self):
+        self.server.mem[CSR_BASE + 0x04] = AGGRESSOR_TABLE_DEPTH
+        tuples = [Aggressor_Tuple(bank=i, row=1000, row_offset=(2 * (i % 2)) - 1, freq=100 + i) for i in range(4)]
+        self.host.write_aggressor_tuples(tuples, first_entry=1)
+
+        # Bank, row, offset, column, hammer count, loop count of every entry, in one run of words
+        base = AGGRESSOR_TUPLES_BASE + 32
+        self.assertEqual([self.server.mem[base + (i * 4)] for i in range(8)], [0, 1000, 0xffffffff, 0, 100, 0, 0, 0])
+        self.assertEqual(self.server.mem[base + 32 + 8], 1)
+        self.assertEqual([(record_base, len(writes)) for record_base, writes, addrs in self.server.records if writes], [(base, 4 * 8)])
+
+        with self.assertRaises(ValueError):
+            self.host.write_aggressor_tuples(tuples, first_entry=AGGRESSOR_TABLE_DEPTH - 2)
+
+    def test_bit_histogram(self):
+        # 576 counters read in three records, not one CSR round trip each
+        self.server.mem[CSR_BASE + 0x14] = 576
+        for i in range(576):
+            self.server.mem[BIT_HISTOGRAM_BASE + (i * 4)] = i % 7
+        self.assertEqual(self.host.read_bit_histogram(), [i % 7 for i in range(576)])
+        self.assertEqual([len(addrs) for base, writes, addrs in self.server.records], [1, ETHERBONE_MAX_RECORD_WORDS, ETHERBONE_MAX_RECORD_WORDS, 66])
+
+    def test_start_role_overflow(self):
+        # More entries than the aggressor/victim pattern knows, the test is not started
+        self.server.mem[CSR_BASE + 0x20] = 1
+        self.server.mem[CSR_BASE + 0x24] = 20
+        self.server.mem[CSR_BASE + 0x28] = 16
+        with self.assertRaises(ValueError):
+            self.host.start()
+        self.assertEqual(self.server.mem.get(CSR_BASE + 0x2c, 0), 0)
+
+    def test_start_timeout(self):
+        # The start is never seen by the tester
+        with self.assertRaises(TimeoutError):
+            self.host.start(timeout=0.01)
+
+    def test_run_stops_on_error(self):
+        # The tester follows the start register, the link fails during the run
+        self.server.read_hooks[CSR_BASE + 0x34] = lambda: self.server.mem.get(CSR_BASE + 0x2c, 0)
+        with mock.patch.object(self.host, "read_perf_counters", return_value={}), \
+                mock.patch.object(self.host, "status", side_effect=TimeoutError):
+            with self.assertRaises(TimeoutError):
+                self.host.run()
+        self.assertEqual(self.server.mem[CSR_BASE + 0x2c], 0)
+
+    def test_error_records(self):
+        # Three errors, the first with flips in two lanes: (addr, xor, up, flags) of every record
+        valid = 1 << ERROR_RECORD_VALID_BIT
+        last = 1 << ERROR_RECORD_LAST_BIT
+        after = 1 << ERROR_RECORD_AFTER_RH_BIT
+        fifo = [
+            [0x100, 0x3, 0x1, valid | (2 << ERROR_RECORD_POPCOUNT_SHIFT) | 0],
+            [0x100, 0x10, 0x10, valid | last | (1 << ERROR_RECORD_POPCOUNT_SHIFT) | 1],
+            [0x200, 0x1, 0x0, valid | last | after | (1 << ERROR_RECORD_POPCOUNT_SHIFT) | 0],
+            [0x300, 0x80, 0x80, valid | last | after | (1 << ERROR_RECORD_POPCOUNT_SHIFT) | 1],
+        ]
+
+        # Reading the flags word pops the head record, every record of the window gives the head
+        def window_word(word):
+            def read():
+                if not fifo:
+                    return 0
+                value = fifo[0][word]
+                if word == ERROR_RECORD_WORDS - 1:
+                    fifo.pop(0)
+                return value
+            return read
+        for record in range(ERROR_RECORD_WINDOW_RECORDS):
+            for word in range(ERROR_RECORD_WORDS):
+                self.server.read_hooks[ERROR_RECORDS_BASE + (((record * ERROR_RECORD_WORDS) + word) * WORD_BYTES)] = window_word(word)
+        self.server.read_hooks[CSR_BASE + 0x30] = lambda: sum(1 for record in fifo if record[3] & last)
+
+        self.assertEqual(self.host.drain_errors(), [
+            Error_Record(0x100, 0, 0x3, 0x1, 2, False),
+            Error_Record(0x100, 1, 0x10, 0x10, 1, False),
+            Error_Record(0x200, 0, 0x1, 0x0, 1, True),
+            Error_Record(0x300, 1, 0x80, 0x80, 1, True),
+        ])
+
+        # One burst of a record per error waiting, then one for the record left
+        self.assertEqual([len(addrs) for base, writes, addrs in self.server.records if len(addrs) > 1], [3 * ERROR_RECORD_WORDS, ERROR_RECORD_WORDS])
+
+
+if __name__ == "__main__":
+    unittest.main()
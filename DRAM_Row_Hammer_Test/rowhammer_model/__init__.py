@@ -0,0 +1,7 @@
+from .rh_model import (
+    Row_Hammer_Model, Threshold_Flips,
+    Model_Config, Model_Rates, Model_Result, Model_Step, Model_Test, Model_Error,
+    FILL_CHECK_ALL, FILL_CHECK_WINDOW, FILL_CHECK_NEIGHBORHOOD,
+    PATTERN_ROW_PARITY, PATTERN_ROLE, PATTERN_ROW_STRIPE, PATTERN_COLUMN_STRIPE, PATTERN_CHECKERBOARD,
+    HC_SEARCH_OFF, HC_SEARCH_BINARY, HC_SEARCH_EXPONENTIAL,
+)
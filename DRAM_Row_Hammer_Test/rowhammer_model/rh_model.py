@@ -0,0 +1,723 @@
+"""
+Behavioral model of Row_Hammer_Test, vectorized with NumPy.
+
+The model follows the row hammer FSM one test at a time: the addresses
+filled and checked, the data pattern of every word, the walk of the
+aggressor table (hammer counts, loop groups, plays of the whole table),
+the row sweep and the HC_first search. Nothing is simulated cycle by
+cycle: the fill and check passes are handled as address ranges, the data
+of any set of addresses is made in one go, and errors only come from the
+bit flips given to the model. It predicts the commands sent and the
+cycles taken, and the error counts the tester should report, at millions
+of words per second.
+"""
+
+
+from dataclasses import dataclass, field, fields
+from functools import reduce
+from operator import xor
+from typing import List, Optional
+
+import numpy as np
+
+
+
+"""
+Constants
+"""
+
+# Same values as rh_test.py
+DEFAULT_AGGRESSOR_TABLE_DEPTH = 512
+NUM_ROLE_AGGRESSORS = 16
+LANE_BITS = 32
+LANE_MASK = 0xFFFFFFFF
+COUNTER_WRAP = 2 ** 32  # A count of 0 is played 2**32 times, the counters wrap
+
+# Same value as rh_test.h
+MAX_PARALLEL_BANKS = 16  # Banks a bank-parallel attack can hammer at once
+
+# Filled and checked addresses
+FILL_CHECK_ALL = 0
+FILL_CHECK_WINDOW = 1
+FILL_CHECK_NEIGHBORHOOD = 2
+
+# Data pattern layouts
+PATTERN_ROW_PARITY = 0
+PATTERN_ROLE = 1
+PATTERN_ROW_STRIPE = 2
+PATTERN_COLUMN_STRIPE = 3
+PATTERN_CHECKERBOARD = 4
+COLUMN_STRIPE_LANE = 0xAAAAAAAA  # COLUMN_STRIPE_BITS replicated over a lane
+
+# HC_first search modes
+HC_SEARCH_OFF = 0
+HC_SEARCH_BINARY = 1
+HC_SEARCH_EXPONENTIAL = 2
+
+# PRBS data
+PRBS_WIDTH = 32
+PRBS_TAPS = [32, 22, 2, 1]
+PRBS_SKIP_BITS = 64
+PRBS_MIX_ROUNDS = [(13, 16), (7, 8)]
+
+# Cycles of a test outside of the passes and the attack (FSM states, range setup)
+TEST_FIXED_CYCLES = 12
+
+
+
+"""
+Settings and results
+"""
+
+@dataclass
+class Model_Config:
+    """
+    Live settings of the tester, defaults are the reset values of the CSRs.
+    Aggressors are (addr, freq, loop) tuples, or entries with addr, freq and
+    loop fields (like rowhammer_host.Aggressor_Entry).
+    """
+    aggressors: List = field(default_factory=list)
+    table_cycles: int = 1  # Plays of the whole aggressor table
+    pattern_1: int = 0
+    pattern_2: int = 0
+    double_pattern: bool = False
+    pattern_mode: int = PATTERN_ROW_PARITY
+    prbs: bool = False
+    prbs_seed: int = 1
+    fill_check_mode: int = FILL_CHECK_ALL
+    fill_check_window_start: int = 0
+    fill_check_window_end: Optional[int] = None  # None: last address
+    fill_check_neighborhood_rows: int = 1
+    sweep: bool = False
+    sweep_base_row: int = 0
+    sweep_stride: int = 1
+    sweep_end_row: int = 0
+    sweep_hammer_count: int = 0
+    hammer_interleave: bool = False
+    dfi_hammer: bool = False  # Attack sent by the DFI hammer path
+    hc_search_mode: int = HC_SEARCH_OFF
+    hc_search_min: int = 1
+    hc_search_max: int = 1024
+
+    @classmethod
+    def from_test_config(cls, config, base=None):
+        """
+        Model settings from a rowhammer_host.Test_Config: the settings it
+        gives (not None) over base, or over the reset values
+        """
+        values = {f.name: getattr(base, f.name) for f in fields(cls)} if base is not None else {}
+        for f in fields(cls):
+            value = getattr(config, f.name, None)
+            if value is not None:
+                values[f.name] = value
+        return cls(**values)
+
+
+@dataclass
+class Model_Rates:
+    """
+    Throughput of the port, as measured by rowhammer_bench (from_bench takes
+    the metrics of one of its cases). The defaults are a port taking a
+    command every cycle. dfi_act_interval is the act_interval_csr of the
+    DFI hammer path, its wait for a controller refresh and its REFs are not
+    modeled.
+    """
+    fill_cycles_per_word: float = 1.0
+    check_cycles_per_word: float = 1.0
+    hammer_cmds_per_cycle: float = 1.0
+    drain_cycles: int = 8  # Reads of the attack still in flight when it ends
+    dfi_act_interval: int = 1  # Cycles from one ACT to the next of the DFI hammer path
+
+    @classmethod
+    def from_bench(cls, metrics):
+        return cls(
+            fill_cycles_per_word=metrics["fill_cycles_per_word"],
+            check_cycles_per_word=metrics["check_cycles_per_word"],
+            hammer_cmds_per_cycle=metrics["hammer_cmds_per_cycle"],
+            drain_cycles=metrics["hammer_drain_cycles"],
+        )
+
+
+@dataclass
+class Model_Error:
+    """
+    Flipped bits of one 32-bit lane of a word with errors, same fields as
+    rowhammer_host.Error_Record
+    """
+    addr: int
+    lane: int
+    xor: int
+    up: int  # Bits flipped from 0 to 1
+    popcount: int
+    after_attack: bool
+
+
+@dataclass
+class Model_Test:
+    """
+    One test (fill, check, attack, check) of a step
+    """
+    plays: int  # Plays of the aggressor table
+    fill_words: int
+    check_words_before: int
+    check_words_after: int
+    hammer_cmds: int
+    errors_before: int
+    errors_after: int
+    cycles: int
+    bank_reads: List[int] = field(default_factory=list)  # Reads of the attack per bank
+
+
+@dataclass
+class Model_Step:
+    """
+    One step of a row sweep (or the only step of a test), same fields as
+    rowhammer_host.Sweep_Step
+    """
+    row: int
+    errors_before: int
+    errors_after: int
+    cycles: int
+    hc_first: int  # 0: no flip found by the search
+    tests: int
+    invalid: bool = False  # The check before the attack found errors, the search stopped
+    runs: List[Model_Test] = field(default_factory=list)
+
+
+@dataclass
+class Model_Result:
+    """
+    Prediction of a whole test. The counts of the passes and the errors are
+    those of the last test, like the CSRs of the tester; the commands and
+    cycles are summed over all of them.
+    """
+    errors_before: int
+    errors_after: int
+    fill_words: int
+    read_words: int
+    hc_first: int
+    write_cmds: int
+    read_cmds: int
+    hammer_cmds: int
+    cycles: int
+    seconds: float
+    bank_reads: List[int] = field(default_factory=list)  # Reads of the last attack per bank
+    errors: List[Model_Error] = field(default_factory=list)
+    steps: List[Model_Step] = field(default_factory=list)
+
+    def compare(self, result):
+        """
+        Differences with what the tester reported (a rowhammer_host.Test_Result),
+        an empty list when it matches. With the HC_first search the check
+        after the attack stops at the first error, the reads already in
+        flight can add a few more, so only whether errors were found is
+        compared.
+        """
+        search = any(step.tests != 0 for step in self.steps)
+
+        def errors(count):
+            return min(count, 1) if search else count
+
+        mismatches = []
+        for name in ["errors_before", "errors_after"]:
+            if errors(getattr(self, name)) != errors(getattr(result, name)):
+                mismatches.append("{}: model {}, tester {}".format(name, getattr(self, name), getattr(result, name)))
+        for name in ["fill_words", "hc_first"] + ([] if search else ["read_words"]):
+            if getattr(self, name) != getattr(result, name):
+                mismatches.append("{}: model {}, tester {}".format(name, getattr(self, name), getattr(result, name)))
+
+        if getattr(result, "bank_reads", None) and result.bank_reads != self.bank_reads:
+            mismatches.append("bank_reads: model {}, tester {}".format(self.bank_reads, result.bank_reads))
+
+        if len(result.steps) not in [0, len(self.steps)]:
+            mismatches.append("steps: model {}, tester {}".format(len(self.steps), len(result.steps)))
+        else:
+            for step, got in zip(self.steps, result.steps):
+                for name in ["row", "hc_first", "tests", "invalid"]:
+                    if getattr(step, name) != getattr(got, name):
+                        mismatches.append("step at row {}: {} model {}, tester {}".format(step.row, name, getattr(step, name), getattr(got, name)))
+                if errors(step.errors_after) != errors(got.errors_after):
+                    mismatches.append("step at row {}: errors_after model {}, tester {}".format(step.row, step.errors_after, got.errors_after))
+        return mismatches
+
+
+
+"""
+Flip models
+"""
+
+class Threshold_Flips:
+    """
+    Stand-in for the DRAM: a victim row gets its bits flipped once the rows
+    distance away on both sides, in the same bank, were read threshold times
+    or more in total. mask is XORed into the words of the victim row at the
+    columns given.
+    """
+
+    def __init__(self, threshold, mask=1, distance=1, cols=(0,)):
+        self.threshold = threshold
+        self.mask = mask
+        self.distance = distance
+        self.cols = cols
+
+    def __call__(self, model, rows, reads):
+        bank_mask = (1 << model.bank_bits) - 1
+        banks = rows & bank_mask
+        row_idx = rows >> model.bank_bits
+
+        # Reads seen by every victim, from the aggressors on both sides
+        victim_banks = np.concatenate([banks, banks])
+        victim_rows = np.concatenate([row_idx - self.distance, row_idx + self.distance])
+        victim_reads = np.concatenate([reads, reads])
+        keep = (victim_rows >= 0) & (victim_rows <= model.max_row)
+        victims, inverse = np.unique((victim_rows[keep] << model.bank_bits) | victim_banks[keep], return_inverse=True)
+        totals = np.zeros(len(victims), dtype=np.uint64)
+        np.add.at(totals, inverse, victim_reads[keep].astype(np.uint64))
+
+        flips = {}
+        for victim in victims[totals >= self.threshold]:
+            for col in self.cols:
+                flips[(int(victim) << model.col_bits) | col] = self.mask
+        return flips
+
+
+
+"""
+Model
+"""
+
+def prbs_taps(num_bits, skip=PRBS_SKIP_BITS):
+    """
+    Bits of the LFSR sequence after skip bits, each given as the mask of the
+    starting state bits XORed together to make it. Same as rh_test.py.
+    """
+    state = [1 << i for i in range(PRBS_WIDTH)]
+    taps = []
+    for step in range(skip + num_bits):
+        if step >= skip:
+            taps.append(state[PRBS_WIDTH - 1])
+        state = [reduce(xor, [state[tap - 1] for tap in PRBS_TAPS])] + state[:-1]
+    return taps
+
+
+def _rotate_left(value, shift):
+    """
+    32-bit value (or array of them) rotated left by shift bits.
+    """
+    return ((value << shift) | (value >> (PRBS_WIDTH - shift))) & LANE_MASK
+
+
+def _count(value):
+    """
+    Plays of a 32-bit counter loaded with value, 0 wraps around
+    """
+    return COUNTER_WRAP if value == 0 else value
+
+
+class Row_Hammer_Model:
+    """
+    Row_Hammer_Test of a given geometry. Data words are (n, lanes) arrays of
+    32-bit lanes, lane 0 holding the low bits of the word.
+
+    Flips come from two places, both as {address: XOR mask of the word}:
+    flips_before are in the DRAM once it is filled (weak or stuck bits,
+    seen by both checks), hammer_flips(model, rows, reads) gives the flips
+    of an attack, from the reads of every hammered row (rows are bank and
+    row of the address, addr >> col_bits). A fill writes over the flips of
+    the previous test.
+    """
+
+    def __init__(self, address_width, data_width, bank_bits, col_bits, num_aggressors=DEFAULT_AGGRESSOR_TABLE_DEPTH, sys_clk_freq=100e6, rates=None):
+        self.address_width = address_width
+        self.data_width = data_width
+        self.bank_bits = bank_bits
+        self.col_bits = col_bits
+        self.num_aggressors = num_aggressors
+        self.sys_clk_freq = sys_clk_freq
+        self.rates = rates if rates is not None else Model_Rates()
+
+        self.lanes = data_width // LANE_BITS
+        self.row_shift = bank_bits + col_bits
+        self.max_address = (2 ** address_width) - 1
+        self.max_row = (2 ** (address_width - self.row_shift)) - 1
+        self.num_role_rows = min(NUM_ROLE_AGGRESSORS, num_aggressors)
+
+        # Lane masks of the data bits every PRBS state bit goes into
+        taps = prbs_taps(data_width)
+        prbs_masks = np.zeros((PRBS_WIDTH, self.lanes), dtype=np.uint32)
+        for i, tap in enumerate(taps):
+            for j in range(PRBS_WIDTH):
+                if (tap >> j) & 1:
+                    prbs_masks[j, i // LANE_BITS] |= np.uint32(1 << (i % LANE_BITS))
+
+        # The data is linear in the state, so it is the XOR of one table
+        # lookup per state byte
+        self.prbs_tables = np.zeros((PRBS_WIDTH // 8, 256, self.lanes), dtype=np.uint32)
+        for byte in range(PRBS_WIDTH // 8):
+            for value in range(256):
+                for bit in range(8):
+                    if (value >> bit) & 1:
+                        self.prbs_tables[byte, value] ^= prbs_masks[(8 * byte) + bit]
+
+    # Aggressor table
+
+    def map_addr(self, bank, row, row_offset=0, col=0):
+        """
+        Port address of a bank, row plus row_offset and column, as made by the
+        address map of the gateware with its default (controller) layout
+        """
+        bank &= (2 ** self.bank_bits) - 1
+        row = (row + row_offset) & self.max_row
+        col &= (2 ** self.col_bits) - 1
+        return (row << self.row_shift) | (bank << self.col_bits) | col
+
+    def entries(self, config, row=0):
+        """
+        (addr, freq, loop) of the entries attacked, moved by row rows, with
+        the hammer count of the sweep. Entries given as (bank, row, ...)
+        tuples (rowhammer_host.Aggressor_Tuple) are mapped with map_addr.
+        """
+        entries = []
+        for entry in config.aggressors[:self.num_aggressors]:
+            if isinstance(entry, tuple):
+                addr, freq, loop = entry
+            elif hasattr(entry, "bank"):
+                addr, freq, loop = self.map_addr(entry.bank, entry.row, entry.row_offset, entry.col), entry.freq, entry.loop
+            else:
+                addr, freq, loop = entry.addr, entry.freq, entry.loop
+            addr = (addr + (row << self.row_shift)) & self.max_address
+            if config.sweep and config.sweep_hammer_count != 0:
+                freq = config.sweep_hammer_count
+            entries.append((addr, freq, loop))
+        return entries
+
+    def bank_parallel_aggressors(self, victim_row, num_banks, ba_bits, hammer_count):
+        """
+        (addr, freq, loop) of the table set by sdram_set_bank_parallel_attack,
+        a double-sided attack of victim_row in num_banks banks, to run with
+        hammer_interleave. Consecutive entries are in different bank groups
+        (the bank bits above the ba_bits bank address bits, as on DDR4).
+        """
+        if num_banks < 1 or num_banks > min(MAX_PARALLEL_BANKS, 2 ** self.bank_bits):
+            raise ValueError("Number of banks must be 1 to {}".format(min(MAX_PARALLEL_BANKS, 2 ** self.bank_bits)))
+
+        num_groups = min(num_banks, 2 ** max(self.bank_bits - ba_bits, 0))
+        banks = [((i % num_groups) << ba_bits) | (i // num_groups) for i in range(num_banks)]
+
+        # Aggressors below the victim in every bank, then above it, one group played once
+        entries = [(self.map_addr(bank, victim_row, row_offset), hammer_count, 0) for row_offset in [-1, 1] for bank in banks]
+        entries[-1] = entries[-1][:2] + (1,)
+        return entries
+
+    def groups(self, entries):
+        """
+        (first, last, plays) of every group of entries. An entry with a loop
+        count N closes a group, played N times, that starts after the
+        previous entry with a loop count. The entries after the last closing
+        one are played once.
+        """
+        groups = []
+        group_start = 0
+        for idx, (_, _, loop) in enumerate(entries):
+            if loop != 0 or idx == len(entries) - 1:
+                groups.append((group_start, idx, max(loop, 1)))
+                group_start = idx + 1
+        return groups
+
+    def hammer_reads(self, entries, interleave=False):
+        """
+        Reads of every entry in one play of the table. When interleaving, an
+        entry with a hammer count of 0 is never read.
+        """
+        reads = np.array([freq if interleave else _count(freq) for _, freq, _ in entries], dtype=np.uint64)
+        for first, last, loop in self.groups(entries):
+            reads[first:last + 1] *= np.uint64(loop)
+        return reads
+
+    def hammer_turns(self, entries, interleave=False):
+        """
+        Turns of the entries in one play of the table, one per cycle when
+        the port takes every read. When interleaving, every entry of a group
+        has a turn in every round, read or skipped, till the largest hammer
+        count of the group is used up.
+        """
+        if not interleave:
+            return int(self.hammer_reads(entries).sum())
+        turns = 0
+        for first, last, loop in self.groups(entries):
+            rounds = max(freq for _, freq, _ in entries[first:last + 1])
+            turns += max(rounds, 1) * (last - first + 1) * loop
+        return turns
+
+    def hammered_rows(self, entries, plays, interleave=False):
+        """
+        Bank and row of every hammered row (addr >> col_bits), and its reads
+        """
+        if not entries:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint64)
+        keys = np.array([addr for addr, _, _ in entries], dtype=np.int64) >> self.col_bits
+        rows, inverse = np.unique(keys, return_inverse=True)
+        reads = np.zeros(len(rows), dtype=np.uint64)
+        np.add.at(reads, inverse, self.hammer_reads(entries, interleave) * np.uint64(plays))
+        return rows, reads
+
+    def bank_reads(self, rows, reads):
+        """
+        Reads per bank, from the reads of the hammered rows
+        """
+        banks = np.zeros(2 ** self.bank_bits, dtype=np.uint64)
+        np.add.at(banks, rows & ((1 << self.bank_bits) - 1), reads)
+        return [int(count) for count in banks]
+
+    # Filled and checked addresses
+
+    def ranges(self, config, entries):
+        """
+        (first, last) address ranges of the fill and check passes, in the
+        order they are given out. Neighborhoods that overlap or touch are
+        merged and go out from the lowest row up, as in Fill_Check_Addresses.
+        """
+        mode = FILL_CHECK_NEIGHBORHOOD if config.hc_search_mode != HC_SEARCH_OFF else config.fill_check_mode
+        if mode == FILL_CHECK_WINDOW:
+            end = self.max_address if config.fill_check_window_end is None else config.fill_check_window_end
+            return [(config.fill_check_window_start, end)] if config.fill_check_window_start <= end else []
+        if mode != FILL_CHECK_NEIGHBORHOOD:
+            return [(0, self.max_address)]
+
+        ranges = []
+        num_rows = config.fill_check_neighborhood_rows
+        neighborhoods = []
+        for addr, _, _ in entries:
+            row = addr >> self.row_shift
+            neighborhoods.append((row - num_rows if row > num_rows else 0, min(row + num_rows, self.max_row)))
+        for lo, hi in sorted(neighborhoods):
+            if ranges and lo <= ranges[-1][1] + 1:
+                ranges[-1] = (ranges[-1][0], max(hi, ranges[-1][1]))
+            else:
+                ranges.append((lo, hi))
+        row_mask = (1 << self.row_shift) - 1
+        return [(lo << self.row_shift, (hi << self.row_shift) | row_mask) for lo, hi in ranges]
+
+    def addresses(self, ranges):
+        """
+        Every address of the ranges, in pass order
+        """
+        if not ranges:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate([np.arange(first, last + 1, dtype=np.int64) for first, last in ranges])
+
+    # Data
+
+    def _replicate(self, value):
+        return np.full(self.lanes, value & LANE_MASK, dtype=np.uint32)
+
+    def data(self, config, addrs, entries=()):
+        """
+        Data words written to, and expected back from, addrs
+        """
+        addrs = np.asarray(addrs, dtype=np.int64)
+        data = np.empty((len(addrs), self.lanes), dtype=np.uint32)
+        odd_row = ((addrs >> self.row_shift) & 1).astype(bool)[:, None]
+        data_1 = self._replicate(config.pattern_1)
+        data_2 = self._replicate(config.pattern_2)
+        column_stripe = data_1 ^ np.uint32(COLUMN_STRIPE_LANE)
+
+        if config.prbs:
+            # Addresses wider than the PRBS state are folded into it, then the seed mixed in
+            seed = config.prbs_seed & LANE_MASK
+            state = np.zeros(len(addrs), dtype=np.int64)
+            for i in range(0, self.address_width, PRBS_WIDTH):
+                state ^= (addrs >> i) & LANE_MASK
+            state = (state + seed) & LANE_MASK
+            for state_rotate, seed_rotate in PRBS_MIX_ROUNDS:
+                state ^= _rotate_left(state, state_rotate)
+                state = (state + _rotate_left(seed, seed_rotate)) & LANE_MASK
+            data[:] = 0
+            for byte, table in enumerate(self.prbs_tables):
+                data ^= table[(state >> (8 * byte)) & 0xFF]
+        elif config.pattern_mode == PATTERN_ROLE:
+            role_rows = [addr >> self.col_bits for addr, _, _ in list(entries)[:self.num_role_rows]]
+            aggressor_row = np.isin(addrs >> self.col_bits, role_rows)[:, None]
+            data[:] = np.where(aggressor_row, data_1, data_2)
+        elif config.pattern_mode == PATTERN_ROW_STRIPE:
+            data[:] = np.where(odd_row, ~data_1, data_1)
+        elif config.pattern_mode == PATTERN_COLUMN_STRIPE:
+            data[:] = column_stripe
+        elif config.pattern_mode == PATTERN_CHECKERBOARD:
+            data[:] = np.where(odd_row, ~column_stripe, column_stripe)
+        elif config.double_pattern:
+            data[:] = np.where(odd_row, data_2, data_1)
+        else:
+            data[:] = data_1
+        return data
+
+    def check(self, config, addrs, data, entries=()):
+        """
+        Flipped bits (XOR with the data expected) of words read back from
+        addrs, e.g. a dump of the DRAM, and whether every word has errors
+        """
+        flipped = np.asarray(data, dtype=np.uint32) ^ self.data(config, addrs, entries)
+        return flipped, flipped.any(axis=1)
+
+    def word_lanes(self, value):
+        return [(value >> (LANE_BITS * lane)) & LANE_MASK for lane in range(self.lanes)]
+
+    # Test
+
+    def _check_pass(self, config, ranges, entries, flips, after_attack, stop_on_error):
+        """
+        Words read and errors found by a read check, errors in pass order
+        """
+        flip_addrs = np.array(sorted(flips), dtype=np.int64)
+        words = 0
+        found = []
+        for first, last in ranges:
+            lo, hi = np.searchsorted(flip_addrs, [first, last + 1])
+            hits = flip_addrs[lo:hi]
+            if stop_on_error and len(hits):
+                words += int(hits[0]) - first + 1
+                found.append(int(hits[0]))
+                break
+            words += last - first + 1
+            found.extend(int(addr) for addr in hits)
+
+        errors = []
+        if found:
+            expected = self.data(config, found, entries)
+            for addr, word in zip(found, expected):
+                for lane, lane_xor in enumerate(self.word_lanes(flips[addr])):
+                    if lane_xor:
+                        errors.append(Model_Error(addr, lane, lane_xor, lane_xor & ~int(word[lane]) & LANE_MASK, bin(lane_xor).count("1"), after_attack))
+        return words, found, errors
+
+    def run_test(self, config, row, plays, flips_before=None, hammer_flips=None):
+        """
+        One test of a step with plays plays of the aggressor table, gives the
+        Model_Test and its errors. With the search, a test whose check before
+        the attack finds errors stops there, without an attack.
+        """
+        stop_on_error = config.hc_search_mode != HC_SEARCH_OFF
+        entries = self.entries(config, row)
+        ranges = self.ranges(config, entries)
+        fill_words = sum(last - first + 1 for first, last in ranges)
+
+        # Only flips inside the filled addresses are seen by the checks, the check
+        # before the attack never stops early
+        flips = dict(flips_before or {})
+        words_before, found_before, errors = self._check_pass(config, ranges, entries, flips, False, False)
+        stopped = stop_on_error and bool(found_before)
+
+        hammer_cmds = 0
+        hammer_cycles = 0
+        bank_reads = [0] * (2 ** self.bank_bits)
+        if entries and not stopped:
+            rows, reads = self.hammered_rows(entries, plays, config.hammer_interleave)
+            hammer_cmds = int(reads.sum())
+            bank_reads = self.bank_reads(rows, reads)
+
+            # Skipped turns take a cycle each, the reads take what the port allows.
+            # The DFI hammer path sends one ACT/RD/PRE per ACT interval, skipped
+            # turns go by meanwhile and no read data comes back.
+            skipped = (self.hammer_turns(entries, config.hammer_interleave) * plays) - hammer_cmds
+            if config.dfi_hammer:
+                hammer_cycles = hammer_cmds * self.rates.dfi_act_interval
+            else:
+                hammer_cycles = skipped + (hammer_cmds / self.rates.hammer_cmds_per_cycle) + self.rates.drain_cycles
+            if hammer_flips is not None:
+                for addr, mask in hammer_flips(self, rows, reads).items():
+                    flips[addr] = flips.get(addr, 0) | mask
+        if stopped:
+            words_after, found_after, errors_after = 0, [], []
+        else:
+            words_after, found_after, errors_after = self._check_pass(config, ranges, entries, flips, True, stop_on_error)
+
+        rates = self.rates
+        cycles = (TEST_FIXED_CYCLES + self.num_role_rows + 2
+            + (fill_words * rates.fill_cycles_per_word)
+            + ((words_before + words_after) * rates.check_cycles_per_word)
+            + hammer_cycles)
+
+        test = Model_Test(plays, fill_words, words_before, words_after, hammer_cmds, len(found_before), len(found_after), int(cycles), bank_reads)
+        return test, errors + errors_after
+
+    def run(self, config, flips_before=None, hammer_flips=None):
+        """
+        Whole test as run by the row hammer FSM: every step of the sweep (or
+        the only step), every test of the HC_first search in a step. Like the
+        tester, it does not start the aggressor/victim pattern with more
+        entries than it knows as aggressor rows.
+        """
+        if config.pattern_mode == PATTERN_ROLE and not config.prbs and len(config.aggressors) > self.num_role_rows:
+            raise ValueError("Aggressor/victim pattern with {} table entries, only the first {} are known as aggressor rows".format(
+                len(config.aggressors), self.num_role_rows))
+
+        steps = []
+        errors = []
+        tests = []
+
+        row = config.sweep_base_row if config.sweep else 0
+        while True:
+            step = Model_Step(row, 0, 0, 0, 0, 0)
+
+            if config.hc_search_mode == HC_SEARCH_OFF:
+                test, test_errors = self.run_test(config, row, _count(config.table_cycles), flips_before, hammer_flips)
+                step.runs.append(test)
+                errors.extend(test_errors)
+            else:
+                # Same walk of the plays as RH_SEARCH_NEXT and READ_FINISH
+                lo = max(config.hc_search_min, 1)
+                hi = config.hc_search_max
+                plays = lo
+                exp = config.hc_search_mode == HC_SEARCH_EXPONENTIAL
+                while lo <= hi:
+                    if not exp:
+                        plays = (lo + hi) >> 1
+                    step.tests += 1
+                    test, test_errors = self.run_test(config, row, plays, flips_before, hammer_flips)
+                    step.runs.append(test)
+                    errors.extend(test_errors)
+                    if test.errors_before != 0:
+                        # Errors before the attack, the search of the step stops without a HC_first
+                        step.hc_first = 0
+                        step.invalid = True
+                        break
+                    if test.errors_after != 0:
+                        step.hc_first = plays
+                        hi = plays - 1
+                        exp = False
+                    else:
+                        lo = plays + 1
+                        if exp:
+                            if plays >= hi:
+                                exp = False
+                            plays = min(plays << 1, hi)
+
+            if step.runs:
+                step.errors_before = step.runs[-1].errors_before
+                step.errors_after = step.runs[-1].errors_after
+                step.cycles = sum(test.cycles for test in step.runs)
+            steps.append(step)
+            tests.extend(step.runs)
+
+            next_row = row + config.sweep_stride
+            if not config.sweep or config.sweep_stride == 0 or next_row > config.sweep_end_row:
+                break
+            row = next_row
+
+        last = tests[-1] if tests else Model_Test(0, 0, 0, 0, 0, 0, 0, 0)
+        cycles = sum(step.cycles for step in steps)
+        return Model_Result(
+            errors_before=last.errors_before,
+            errors_after=last.errors_after,
+            fill_words=last.fill_words,
+            read_words=last.check_words_after,
+            hc_first=steps[-1].hc_first,
+            write_cmds=sum(test.fill_words for test in tests),
+            read_cmds=sum(test.check_words_before + test.check_words_after for test in tests),
+            hammer_cmds=sum(test.hammer_cmds for test in tests),
+            cycles=cycles,
+            seconds=cycles / self.sys_clk_freq,
+            bank_reads=last.bank_reads,
+            errors=errors,
+            steps=steps,
+        )
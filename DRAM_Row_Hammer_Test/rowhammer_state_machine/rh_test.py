@@ -3,9 +3,16 @@ A self-made implementation of a rowhammer-test state machine.
 """
 
 
+from math import ceil
+from functools import reduce
+from operator import add, xor, or_
+
 from migen import *
+from migen.genlib.fifo import SyncFIFO, SyncFIFOBuffered
 
 from litex.soc.interconnect.csr import *
+from litex.soc.interconnect.csr_eventmanager import *
+from litex.soc.interconnect import wishbone
 
 from litedram.common import LiteDRAMNativePort
 
@@ -18,38 +25,82 @@ Constants
 # Signal width constants
 ONE_BIT_WIDE = 1
 TWO_BITS_WIDE = 2
+THREE_BITS_WIDE = 3
 WIDTH_8_BITS = 8
 WIDTH_16_BITS = 16
 WIDTH_32_BITS = 32
 WIDTH_64_BITS = 64
 
 # Timer Value Constants
-ADDR_FREQ_SET_DELAY = 10000
-DATA_SET_DELAY = 10000
 ROWHAMER_DELAY = 10000
 
-# Set Addr Freq Cntrl Constants
-SET_ADDR_1_CONST = 0
-SET_ADDR_2_CONST = 1
-SET_ADDR_3_CONST = 2
-SET_ADDR_4_CONST = 3
-SET_ADDR_5_CONST = 4
-SET_ADDR_6_CONST = 5
-SET_ADDR_7_CONST = 6
-SET_ADDR_8_CONST = 7
-SET_ADDR_9_CONST = 8
-SET_ADDR_10_CONST = 9
-SET_ADDR_11_CONST = 10
-SET_ADDR_12_CONST = 11
-SET_ADDR_13_CONST = 12
-SET_ADDR_14_CONST = 13
-SET_ADDR_15_CONST = 14
-SET_ADDR_16_CONST = 15
-SET_ADDR_17_CONST = 16
-SET_ADDR_18_CONST = 17
-SET_ADDR_19_CONST = 18
-SET_ADDR_20_CONST = 19
-SET_NUM_ADDRS_CONST = 20
+# Aggressor table constants
+DEFAULT_AGGRESSOR_TABLE_DEPTH = 512
+AGGRESSOR_TABLE_ENTRY_WORDS = 4  # Address, hammer count, loop count, unused
+AGGRESSOR_TUPLE_ENTRY_WORDS = 8  # Bank, row, row offset, column, hammer count, loop count, unused, unused
+AGGRESSOR_TUPLE_FIELDS = [3, 4, 5]  # Tuple words of the address (column), hammer count and loop count
+
+# Address map constants
+ADDRESS_MAP_SHIFT_WIDTH = 5  # Bit positions up to 31
+
+# Error FIFO constants
+DEFAULT_ERROR_FIFO_DEPTH = 512
+ERROR_RECORD_WORDS = 4  # Address, flipped bits, bits flipped up, flags (reading it pops the record)
+ERROR_RECORD_WORD_BITS = 2
+ERROR_RECORD_WINDOW_RECORDS = 64  # Times the head record repeats on the bus, a burst of addresses pops as many
+ERROR_RECORD_POPCOUNT_SHIFT = 8  # Flags word: lane, popcount, after the attack, last record of the error, valid
+ERROR_RECORD_FIELD_MASK = 0xff  # Lane and popcount are 8 bits
+ERROR_RECORD_AFTER_RH_BIT = 16
+ERROR_RECORD_LAST_BIT = 17
+ERROR_RECORD_VALID_BIT = 31
+
+# Row histogram constants
+DEFAULT_ROW_HISTOGRAM_DEPTH = 1024
+
+# Row sweep constants
+DEFAULT_SWEEP_LOG_DEPTH = 1024
+SWEEP_LOG_WORDS = 7        # Row, errors before/after the attack, cycles, HC_first, tests run, invalid
+SWEEP_LOG_WORD_BITS = 3    # Words per step on the bus are a power of two
+SWEEP_LOG_ENTRY_WORDS = 2 ** SWEEP_LOG_WORD_BITS
+
+# State trace constants
+DEFAULT_STATE_TRACE_DEPTH = 512
+STATE_TRACE_WORDS = 4        # Timestamp (low, high word), state entered, address_csr
+STATE_TRACE_WORD_BITS = 2
+STATE_TRACE_ENTRY_WORDS = 2 ** STATE_TRACE_WORD_BITS
+
+# HC_first search modes
+HC_SEARCH_OFF = 0
+HC_SEARCH_BINARY = 1
+HC_SEARCH_EXPONENTIAL = 2  # Double the hammer count till a flip, then binary search
+
+# Fill and read check modes
+FILL_CHECK_ALL = 0
+FILL_CHECK_WINDOW = 1
+FILL_CHECK_NEIGHBORHOOD = 2
+FILL_CHECK_RANGE_FIFO_DEPTH = 4
+
+# Data pattern modes
+PATTERN_ROW_PARITY = 0      # Pattern 1, or pattern 2 in odd rows with the double pattern setting
+PATTERN_ROLE = 1            # Pattern 1 in aggressor rows, pattern 2 in the other rows (victims)
+PATTERN_ROW_STRIPE = 2      # Pattern 1 in even rows, inverted in odd rows
+PATTERN_COLUMN_STRIPE = 3   # Pattern 1 with every other bit inverted
+PATTERN_CHECKERBOARD = 4    # Column stripe, inverted in odd rows
+COLUMN_STRIPE_BITS = 0b10   # Replicated over the word for the column stripes
+NUM_ROLE_AGGRESSORS = 16    # Table entries known as aggressor rows by the data pattern
+
+# PRBS data constants
+PRBS_WIDTH = 32
+PRBS_TAPS = [32, 22, 2, 1]  # x^32 + x^22 + x^2 + x + 1, maximal length
+PRBS_SKIP_BITS = 64  # Bits dropped after the seed, so the data does not start with the address
+PRBS_MIX_ROUNDS = [(13, 16), (7, 8)]  # (State, seed) left rotations of the rounds mixing the seed into the address
+
+# Read check constants
+DEFAULT_READ_FIFO_DEPTH = 64
+
+# DFI hammer path constants
+DFI_HAMMER_TRTP_NS = 7.5  # Read to precharge, DDR4 tRTP is max(4 nCK, 7.5 ns)
+DFI_HAMMER_TRTP_CK = 4
 
 # Feedback State Sections
 RH_IDLE_STATE = 0x100
@@ -84,1410 +135,2417 @@ RH_NINETEENTH_STATE = 0x12
 RH_TWENTIETH_STATE = 0x13
 
 
-class Row_Hammer_Test(Module, AutoCSR):
-
-    def __init__(self, rw_test_port : LiteDRAMNativePort, sys_clk_freq : int, trefi : Signal, refresh_enable : Signal, auto_precharge_setting : Signal, bank_bits, col_bits, trefi_setting):
-
-        self.rw_test_port = rw_test_port
+"""
+Aggressor table
+"""
 
-        # Address width integers
-        PORT_COLS_AND_BANKS_PER_ROW_ADDR = 2 ** (bank_bits + col_bits) 
+class Aggressor_Table(Module, AutoCSR):
+    """
+    BRAM holding the rows to attack, with a hammer count and a loop count per
+    row. The entries are set/got on a wishbone bus, AGGRESSOR_TABLE_ENTRY_WORDS
+    32-bit words per entry (address, hammer count, loop count, unused), so it
+    can be set with plain bulk stores. A second bus (tuple_bus) takes the
+    entries as AGGRESSOR_TUPLE_ENTRY_WORDS words of (bank, row, row offset,
+    column, hammer count, loop count) instead, the address goes through
+    address_map as it is written, so a whole table of rows is set with one
+    bulk store. The bank, row and offset words are held till the column
+    word of the entry is written, then the mapped address is stored; reads
+    give back the address (column word), hammer count and loop count of
+    the entry, the other words read 0. The first bus goes first when both
+    are accessed. SoCs that do not map the buses set/get one entry at a
+    time through CSRs instead, the buses are idle there. The walker port is
+    read by the row hammer state machine. Both ports read synchronously,
+    data comes out one cycle after the index was presented.
+    """
+
+    def __init__(self, address_width, depth, address_map):
+
+        self.depth = depth
+        self.size = depth * AGGRESSOR_TABLE_ENTRY_WORDS * (WIDTH_32_BITS // WIDTH_8_BITS)  # Bytes on the bus
+        self.tuple_size = depth * AGGRESSOR_TUPLE_ENTRY_WORDS * (WIDTH_32_BITS // WIDTH_8_BITS)
+        self.bus = bus = wishbone.Interface()
+        self.tuple_bus = tuple_bus = wishbone.Interface()
+
+        # Walker port
+        self.adr = Signal(max=depth)
+        self.addr = Signal(address_width)
+        self.freq = Signal(WIDTH_32_BITS)
+        self.loop = Signal(WIDTH_32_BITS)
 
         """
         CSR Registers
         """
 
-        # Control the number of rows and the frequency of attacking them - Control CSR registers
-        self.addr_to_set_val_csr = CSRStorage(rw_test_port.address_width, description="The row to attack in the DRAM")
-        self.addr_to_set_freq_csr = CSRStorage(WIDTH_32_BITS, description="The freq of the row to attack in the DRAM")
-        self.addr_to_set_val_out_csr = CSRStatus(rw_test_port.address_width, description="The row to attack in the DRAM, output")
-        self.addr_to_set_freq_out_csr = CSRStatus(WIDTH_32_BITS, description="The freq of the row to attack in the DRAM, output")
-        self.addr_to_set_sel_val_csr = CSRStorage(WIDTH_32_BITS, description="Select the value of the row to set")
-        self.addr_to_set_start_fsm_csr = CSRStorage(ONE_BIT_WIDE, description="Start setting addr and freq fsm")
-        self.addr_to_set_set_not_get_csr = CSRStorage(ONE_BIT_WIDE, description="High: set the val and freq, Low: get the val and freq for display")
-        self.addr_to_set_start_prev_csr = CSRStatus(ONE_BIT_WIDE, description="One bit signal, high once start pulse has run")
+        self.entry_csr = CSRStorage(WIDTH_32_BITS, description="Entry set/got through the CSRs (when the table is not on the bus)")
+        self.addr_csr = CSRStorage(address_width, description="Address written to the entry")
+        self.freq_csr = CSRStorage(WIDTH_32_BITS, description="Hammer count written to the entry")
+        self.loop_csr = CSRStorage(WIDTH_32_BITS, description="Loop count written to the entry")
+        self.write_csr = CSRStorage(ONE_BIT_WIDE, description="Write to store addr_csr, freq_csr and loop_csr in the entry")
+        self.addr_out_csr = CSRStatus(address_width, description="Address held by the entry")
+        self.freq_out_csr = CSRStatus(WIDTH_32_BITS, description="Hammer count held by the entry")
+        self.loop_out_csr = CSRStatus(WIDTH_32_BITS, description="Loop count held by the entry")
+
+        # One memory per field, keeps every word within a CSR/bus word
+        addr_mem = Memory(address_width, depth)
+        freq_mem = Memory(WIDTH_32_BITS, depth)
+        loop_mem = Memory(WIDTH_32_BITS, depth)
+        self.specials += addr_mem, freq_mem, loop_mem
+
+        # Bus access, word adr is the entry and the field in it
+        bus_entry = Signal(max=depth)
+        bus_field = Signal(TWO_BITS_WIDE)
+        bus_field_r = Signal(TWO_BITS_WIDE)
+        bus_write = Signal(ONE_BIT_WIDE)
+        bus_access = Signal(ONE_BIT_WIDE)
+        bus_dat_r = []
+
+        # Tuple bus access, word adr is the entry and the tuple word in it
+        tuple_entry = Signal(max=depth)
+        tuple_field = Signal(THREE_BITS_WIDE)
+        tuple_field_r = Signal(THREE_BITS_WIDE)
+        tuple_write = Signal(ONE_BIT_WIDE)
+        tuple_access = Signal(ONE_BIT_WIDE)
+        tuple_bank = Signal(WIDTH_32_BITS)
+        tuple_row = Signal(WIDTH_32_BITS)
+        tuple_row_offset = Signal(WIDTH_32_BITS)
+        tuple_addr = address_map.map(tuple_bank, tuple_row, tuple_row_offset, tuple_bus.dat_w)
 
-        # Input data CSR registers
-        self.input_data_set_not_get_csr = CSRStorage(ONE_BIT_WIDE, description="High: set the data, Low: get the data for display")
-        self.input_data_sel_val_csr = CSRStorage(WIDTH_32_BITS, description="Select where to put data (0 for even addresses, 1 for odd)")
-        self.input_data_double_pattern_setting_csr = CSRStorage(ONE_BIT_WIDE, description="Use a double data pattern, 0 for disable")
-        self.input_data_pattern_csr = CSRStorage(WIDTH_32_BITS, description="Data pattern written to DRAM (Replicated/Concatenated to fill DRAM data width)")
-        self.input_data_pattern_output_csr = CSRStatus(WIDTH_32_BITS, description="Output the data pattern we want to see")
-        self.input_data_to_set_start_fsm_csr = CSRStorage(ONE_BIT_WIDE, description="Start setting data fsm")
-        self.input_data_set_start_prev_csr = CSRStatus(ONE_BIT_WIDE, description="One bit signal, high once start pulse has run")
-        self.data_width_csr = CSRStatus(WIDTH_32_BITS, reset=rw_test_port.data_width, description="The width of the data for reference")
+        self.comb += [
+            bus_entry.eq(bus.adr[TWO_BITS_WIDE:]),
+            bus_field.eq(bus.adr[0:TWO_BITS_WIDE]),
+            bus_write.eq(bus.cyc & bus.stb & bus.we & ~bus.ack),
+            bus_access.eq(bus.cyc & bus.stb),
+
+            # The tuple bus waits while the first bus has the ports
+            tuple_entry.eq(tuple_bus.adr[THREE_BITS_WIDE:]),
+            tuple_field.eq(tuple_bus.adr[0:THREE_BITS_WIDE]),
+            tuple_write.eq(tuple_bus.cyc & tuple_bus.stb & tuple_bus.we & ~tuple_bus.ack & ~bus_access),
+            tuple_access.eq(tuple_bus.cyc & tuple_bus.stb & ~bus_access),
+        ]
 
-        # Change refresh rate, or enable it
-        self.refresh_enable_csr = CSRStorage(ONE_BIT_WIDE, reset=1, description="Enable DRAM refresh for test")
-        self.refresh_rate_csr = CSRStorage(WIDTH_32_BITS, reset=trefi_setting, description="Choose refresh rate")
+        # The CSRs share the bus port, they point it at their entry while the buses are idle
+        fields = [
+            (addr_mem, self.addr, self.addr_csr, self.addr_out_csr, tuple_addr),
+            (freq_mem, self.freq, self.freq_csr, self.freq_out_csr, tuple_bus.dat_w),
+            (loop_mem, self.loop, self.loop_csr, self.loop_out_csr, tuple_bus.dat_w),
+        ]
+        for field, (mem, walk_r, csr, out_csr, tuple_dat_w) in enumerate(fields):
+            bus_port = mem.get_port(write_capable=True)
+            walk_port = mem.get_port()
+            self.specials += bus_port, walk_port
+            self.comb += [
+                bus_port.adr.eq(Mux(bus_access, bus_entry, Mux(tuple_access, tuple_entry, self.entry_csr.storage))),
+                bus_port.we.eq((bus_write & (bus_field == field)) | (tuple_write & (tuple_field == AGGRESSOR_TUPLE_FIELDS[field])) | (self.write_csr.re & ~bus_access & ~tuple_access)),
+                bus_port.dat_w.eq(Mux(bus_access, bus.dat_w, Mux(tuple_access, tuple_dat_w, csr.storage))),
+                out_csr.status.eq(bus_port.dat_r),
+                walk_port.adr.eq(self.adr),
+                walk_r.eq(walk_port.dat_r),
+            ]
+            bus_dat_r.append(bus_port.dat_r)
+
+        # Data comes out one cycle after the entry was presented, the unused field reads 0
+        self.comb += bus.dat_r.eq(Array(bus_dat_r + [0])[bus_field_r])
+
+        # Only the words stored in the table read back from the tuple bus
+        tuple_dat_r = [0] * AGGRESSOR_TUPLE_ENTRY_WORDS
+        for field, tuple_word in enumerate(AGGRESSOR_TUPLE_FIELDS):
+            tuple_dat_r[tuple_word] = bus_dat_r[field]
+        self.comb += tuple_bus.dat_r.eq(Array(tuple_dat_r)[tuple_field_r])
 
-        # Change auto refresh setting
-        self.auto_precharge_csr = CSRStorage(1, description="Enable or Disable auto csr refresh for row hammer test")
+        self.sync += [
+            bus.ack.eq(0),
+            If(bus.cyc & bus.stb & ~bus.ack,
+                bus.ack.eq(1),
+                bus_field_r.eq(bus_field),
+            ),
 
-        # Address sig csr
-        self.address_csr = CSRStatus(rw_test_port.address_width, description="Control address while making it available to user")
-        
-        # Output data CSR registers
-        self.output_data_pattern1_csr = CSRStatus(WIDTH_32_BITS, description="Data read after performing read")
-        self.output_data_pattern2_csr = CSRStatus(WIDTH_32_BITS, description="Data read after performing read")
-        self.output_data_pattern3_csr = CSRStatus(WIDTH_32_BITS, description="Data read after performing read")
-        self.output_data_pattern4_csr = CSRStatus(WIDTH_32_BITS, description="Data read after performing read")
-        self.output_data_pattern5_csr = CSRStatus(WIDTH_32_BITS, description="Data read after performing read")
-        self.output_data_pattern6_csr = CSRStatus(WIDTH_32_BITS, description="Data read after performing read")
-        self.output_data_pattern7_csr = CSRStatus(WIDTH_32_BITS, description="Data read after performing read")
-        self.output_data_pattern8_csr = CSRStatus(WIDTH_32_BITS, description="Data read after performing read")
-        self.output_data_pattern9_csr = CSRStatus(WIDTH_32_BITS, description="Data read after performing read")
-        self.output_data_pattern10_csr = CSRStatus(WIDTH_32_BITS, description="Data read after performing read")
-        self.output_data_pattern11_csr = CSRStatus(WIDTH_32_BITS, description="Data read after performing read")
-        self.output_data_pattern12_csr = CSRStatus(WIDTH_32_BITS, description="Data read after performing read")
-        self.output_data_pattern13_csr = CSRStatus(WIDTH_32_BITS, description="Data read after performing read")
-        self.output_data_pattern14_csr = CSRStatus(WIDTH_32_BITS, description="Data read after performing read")
-        self.output_data_pattern15_csr = CSRStatus(WIDTH_32_BITS, description="Data read after performing read")
-        self.output_data_pattern16_csr = CSRStatus(WIDTH_32_BITS, description="Data read after performing read")
-        self.output_data_pattern17_csr = CSRStatus(WIDTH_32_BITS, description="Data read after performing read")
-        self.output_data_pattern18_csr = CSRStatus(WIDTH_32_BITS, description="Data read after performing read")
+            tuple_bus.ack.eq(0),
+            If(tuple_bus.cyc & tuple_bus.stb & ~tuple_bus.ack & ~bus_access,
+                tuple_bus.ack.eq(1),
+                tuple_field_r.eq(tuple_field),
+            ),
 
-        # Rowhammer Tester FSM CSR registers
-        self.rowhammer_start_fsm_csr = CSRStorage(ONE_BIT_WIDE, description="Start the Rowhammer tester")
-        self.rowhammer_start_prev_fsm_csr = CSRStatus(ONE_BIT_WIDE, description="Keep track of previous value of start")
-        self.rowhammer_err_cnt_csr = CSRStatus(WIDTH_32_BITS, description="Count the total errors before/after rowhammer test")
-        # Useful for debugging if needed, replace with num_addrs_attack_sig signal
-        # self.rowhammer_state_counter_csr = CSRStorage(WIDTH_32_BITS, description="Store the number of addresses as an option (up to 9)")
-        self.rowhammer_state_cycle_counter_csr = CSRStorage(WIDTH_32_BITS, reset=1, description="Store the number of cycles as an option")
-        self.rowhammer_state_cycle_counter_val_output_csr = CSRStatus(WIDTH_32_BITS, reset=1, description="Show the number of cycles")
+            # Fields of the address held till the column word is written
+            If(tuple_write,
+                Case(tuple_field, {
+                    0: tuple_bank.eq(tuple_bus.dat_w),
+                    1: tuple_row.eq(tuple_bus.dat_w),
+                    2: tuple_row_offset.eq(tuple_bus.dat_w),
+                    "default": [],
+                })
+            ),
+        ]
 
-        # # Read FSM CSR registers
-        # self.read_fsm_paused_csr = CSRStatus(ONE_BIT_WIDE, description="Goes high when finished a read cycle, must be acknowledged")
-        # self.read_fsm_ack_csr = CSRStorage(ONE_BIT_WIDE, description="Acknowledge that the read state machine has paused, can continue")
 
-        # Error acknowledging for displaying errors
-        self.error_ack_csr = CSRStorage(ONE_BIT_WIDE, description="Acknowledge error has been sent")
-        self.error_ack_prev_csr = CSRStatus(ONE_BIT_WIDE, description="See that error signal has been seen and received")
-        self.error_found_flag_csr = CSRStatus(ONE_BIT_WIDE, description="High if the state machine is paused, as an error has been found.")
+"""
+Address map
+"""
 
-        # CSR register for giving back feedback to user of where we are
-        self.feedback_state_csr = CSRStatus(WIDTH_16_BITS, description="Feedback of which state the fsm is in")
+class Address_Map(Module, AutoCSR):
+    """
+    Turn a (bank, row, column) tuple into a native port address. The row can
+    be given relative to a base row (row_csr + row_offset_csr, the offset is
+    two's complement), so the rows around a victim are set with a base row
+    and offsets like -1 and +1. The bit positions and widths of the fields in
+    the port address are set at runtime, by default they are the ones of the
+    controller (row, bank, column from the top). Only the addresses given by
+    this map follow them, the rest of the tester (bank counters, histogram,
+    neighborhoods) decodes port addresses with the controller layout. The
+    aggressor table maps the tuples written to it with the same fields.
+    """
 
-        # Obtain address width, bank bits, column bits
-        self.address_width_csr = CSRStatus(WIDTH_8_BITS, reset=rw_test_port.address_width, description="Holds address width value")
-        self.bank_width_csr = CSRStatus(WIDTH_8_BITS, reset=bank_bits, description="Holds bank width value")
-        self.col_width_csr = CSRStatus(WIDTH_8_BITS, reset=col_bits, description="Holds column width value")
+    def __init__(self, address_width, bank_bits, col_bits):
 
-        # Reader fsm guider signal, Guide for state machine: running reader before or after rh test
-        self.before_after_rh_csr = CSRStatus(ONE_BIT_WIDE, description="Controls return state after reader is finished")
+        row_bits = address_width - (bank_bits + col_bits)
+
+        self.address_width = address_width
+        self.addr = Signal(address_width)
 
         """
-        Signals
+        CSR Registers
         """
 
-        # Address sigs
-        max_address_sig = Signal(rw_test_port.address_width)
-        self.burst_cntr_sig = Signal(WIDTH_32_BITS) # Important signal, counts the number 
-                                               # reads/writes, knows when to finish fsm.
+        self.bank_csr = CSRStorage(WIDTH_8_BITS, description="Bank of the address")
+        self.row_csr = CSRStorage(WIDTH_32_BITS, description="Row of the address, or base row with an offset")
+        self.row_offset_csr = CSRStorage(WIDTH_32_BITS, description="Offset added to the row, two's complement (0: row_csr is the row)")
+        self.col_csr = CSRStorage(WIDTH_32_BITS, description="Column of the address (in port words)")
+        self.bank_shift_csr = CSRStorage(ADDRESS_MAP_SHIFT_WIDTH, reset=col_bits, description="Position of the bank bits in the port address")
+        self.row_shift_csr = CSRStorage(ADDRESS_MAP_SHIFT_WIDTH, reset=bank_bits + col_bits, description="Position of the row bits in the port address")
+        self.col_shift_csr = CSRStorage(ADDRESS_MAP_SHIFT_WIDTH, reset=0, description="Position of the column bits in the port address")
+        self.bank_width_csr = CSRStorage(ADDRESS_MAP_SHIFT_WIDTH + 1, reset=bank_bits, description="Number of bank bits in the port address")
+        self.row_width_csr = CSRStorage(ADDRESS_MAP_SHIFT_WIDTH + 1, reset=row_bits, description="Number of row bits in the port address")
+        self.col_width_csr = CSRStorage(ADDRESS_MAP_SHIFT_WIDTH + 1, reset=col_bits, description="Number of column bits in the port address")
+        self.addr_csr = CSRStatus(address_width, description="Port address of the bank, row and column")
 
-        # Data sigs for switching pattern
-        data_sig_1 = Signal(rw_test_port.data_width)
-        data_sig_2 = Signal(rw_test_port.data_width)
-        data_sig_timer = Signal(rw_test_port.data_width)
-        error_data = Signal(rw_test_port.data_width)
+        """
+        Comb block
+        """
 
-        ###########################################################################
-        # Addrs and freq sigs
-        ###########################################################################
+        self.comb += [
+            self.addr.eq(self.map(self.bank_csr.storage, self.row_csr.storage, self.row_offset_csr.storage, self.col_csr.storage)),
+            self.addr_csr.status.eq(self.addr),
+        ]
+
+    def map(self, bank, row, row_offset, col):
+        """
+        Port address of bank, row plus row_offset and col, with the bit
+        positions and widths set in the CSRs.
+        """
+        addr = Signal(self.address_width)
+        bank_field = Signal(self.address_width)
+        row_field = Signal(self.address_width)
+        col_field = Signal(self.address_width)
 
-        # First 10 addrs, changeable frequencies
-        addr_1_val_sig = Signal(rw_test_port.address_width)
-        addr_1_freq_sig = Signal(WIDTH_32_BITS)
-        addr_2_val_sig = Signal(rw_test_port.address_width)
-        addr_2_freq_sig = Signal(WIDTH_32_BITS)
-        addr_3_val_sig = Signal(rw_test_port.address_width)
-        addr_3_freq_sig = Signal(WIDTH_32_BITS)
-        addr_4_val_sig = Signal(rw_test_port.address_width)
-        addr_4_freq_sig = Signal(WIDTH_32_BITS)
-        addr_5_val_sig = Signal(rw_test_port.address_width)
-        addr_5_freq_sig = Signal(WIDTH_32_BITS)
-        addr_6_val_sig = Signal(rw_test_port.address_width)
-        addr_6_freq_sig = Signal(WIDTH_32_BITS)
-        addr_7_val_sig = Signal(rw_test_port.address_width)
-        addr_7_freq_sig = Signal(WIDTH_32_BITS)
-        addr_8_val_sig = Signal(rw_test_port.address_width)
-        addr_8_freq_sig = Signal(WIDTH_32_BITS)
-        addr_9_val_sig = Signal(rw_test_port.address_width)
-        addr_9_freq_sig = Signal(WIDTH_32_BITS)
-        addr_10_val_sig = Signal(rw_test_port.address_width)
-        addr_10_freq_sig = Signal(WIDTH_32_BITS)
-
-        # Second 10, all have freq of one
-        addr_11_val_sig = Signal(rw_test_port.address_width)
-        addr_12_val_sig = Signal(rw_test_port.address_width)
-        addr_13_val_sig = Signal(rw_test_port.address_width)
-        addr_14_val_sig = Signal(rw_test_port.address_width)
-        addr_15_val_sig = Signal(rw_test_port.address_width)
-        addr_16_val_sig = Signal(rw_test_port.address_width)
-        addr_17_val_sig = Signal(rw_test_port.address_width)
-        addr_18_val_sig = Signal(rw_test_port.address_width)
-        addr_19_val_sig = Signal(rw_test_port.address_width)
-        addr_20_val_sig = Signal(rw_test_port.address_width)
-
-        # Store the number of addrs to attack
-        num_addrs_attack_sig = Signal(WIDTH_32_BITS)
-
-        # Control addr, freq setting signals
-        addr_freq_set_start_buf1_sig = Signal(ONE_BIT_WIDE)
-        addr_freq_set_start_buf2_sig = Signal(ONE_BIT_WIDE)
-        addr_freq_set_start_sig = Signal(ONE_BIT_WIDE)
-        addr_freq_set_timer = Signal(WIDTH_32_BITS)
-
-        # Control data setting signals
-        self.data_set_start_buf1_sig = data_set_start_buf1_sig = Signal(ONE_BIT_WIDE)
-        self.data_set_start_buf2_sig = data_set_start_buf2_sig = Signal(ONE_BIT_WIDE)
-        self.data_set_start_sig = data_set_start_sig = Signal(ONE_BIT_WIDE)
-        self.data_set_timer = data_set_timer = Signal(WIDTH_32_BITS)
-
-        # Error acknowledging and oneshot signals
-        error_ack_sig = Signal(ONE_BIT_WIDE)
-        error_ack_buf1_sig = Signal(ONE_BIT_WIDE)
-        error_ack_buf2_sig = Signal(ONE_BIT_WIDE)
+        self.comb += [
+            # Fields are cut to their widths, a row offset past the first or last row wraps around
+            bank_field.eq(bank & ((1 << self.bank_width_csr.storage) - 1)),
+            row_field.eq((row + row_offset) & ((1 << self.row_width_csr.storage) - 1)),
+            col_field.eq(col & ((1 << self.col_width_csr.storage) - 1)),
+            addr.eq((row_field << self.row_shift_csr.storage) | (bank_field << self.bank_shift_csr.storage) | (col_field << self.col_shift_csr.storage)),
+        ]
+        return addr
 
-        # Rowhammer attack timer, Keep track of frequencies of attacked addresses
-        self.rowhammer_attack_cmd_timer_sig = rowhammer_attack_cmd_timer_sig = Signal(WIDTH_32_BITS)
 
-        # Flip the type of data we write
-        input_data_double_pattern_setting = Signal(ONE_BIT_WIDE)
+"""
+DRAM command counters
+"""
 
-        ###########################################################################
+class DRAM_Cmd_Counters(Module, AutoCSR):
+    """
+    Count the commands the controller sends to the DRAM (taken from a DFI
+    interface, before the PHY) while enable is high. ACT, PRE and read
+    counts are kept per bank, REF is an all-bank command and is counted once.
+    ACTs are also counted over windows of act_window_csr cycles (tREFI by
+    default) to see the hammering rate that is actually achieved.
+    """
 
-        ###########################################################################
-        # Rowhammer FSM sigs
-        ###########################################################################
+    def __init__(self, dfi, enable : Signal, clear : Signal, trefi_setting):
 
-        rowhammer_start_buf1_sig = Signal(ONE_BIT_WIDE)
-        rowhammer_start_buf2_sig = Signal(ONE_BIT_WIDE)
-        rowhammer_start_sig = Signal(ONE_BIT_WIDE)
-        self.rowhammer_two_states_counter_1_storage_sig = rowhammer_two_states_counter_1_storage_sig = Signal(WIDTH_32_BITS, reset=1)
-        self.rowhammer_two_states_counter_2_storage_sig = rowhammer_two_states_counter_2_storage_sig = Signal(WIDTH_32_BITS, reset=1)
-        self.rowhammer_two_states_counter_3_storage_sig = rowhammer_two_states_counter_3_storage_sig = Signal(WIDTH_32_BITS, reset=1)
-        self.rowhammer_two_states_counter_4_storage_sig = rowhammer_two_states_counter_4_storage_sig = Signal(WIDTH_32_BITS, reset=1)
-        self.rowhammer_two_states_counter_5_storage_sig = rowhammer_two_states_counter_5_storage_sig = Signal(WIDTH_32_BITS, reset=1)
-        self.temporary_state_machine_var = Signal(ONE_BIT_WIDE)
-        self.rowhammer_two_states_counter_sig = rowhammer_two_states_counter_sig = Signal(WIDTH_32_BITS)
-        self.rowhammer_state_cycle_counter = rowhammer_state_cycle_counter = Signal(WIDTH_32_BITS)
-        self.rowhammer_state_cycle_storage_counter = rowhammer_state_cycle_storage_counter = Signal(WIDTH_32_BITS, reset=1)
-        self.rowhammer_state_counter = rowhammer_state_counter = Signal(WIDTH_32_BITS)
-        rowhammer_port_wready_rvalid_counter = Signal(WIDTH_32_BITS)
+        nbanks = 2 ** len(dfi.p0.bank)
+        nranks = len(dfi.p0.cs_n)
 
-        ###########################################################################
+        """
+        CSR Registers
+        """
+
+        self.bank_sel_csr = CSRStorage(WIDTH_8_BITS, description="Select the bank shown in the per bank counters")
+        self.act_count_csr = CSRStatus(WIDTH_32_BITS, description="ACT commands sent to the selected bank")
+        self.pre_count_csr = CSRStatus(WIDTH_32_BITS, description="PRE commands sent to the selected bank (including precharge all)")
+        self.read_count_csr = CSRStatus(WIDTH_32_BITS, description="Read commands sent to the selected bank")
+        self.ref_count_csr = CSRStatus(WIDTH_32_BITS, description="REF commands sent (all banks)")
+        self.act_total_csr = CSRStatus(WIDTH_32_BITS, description="ACT commands sent to all banks")
+        self.cycles_csr = CSRStatus(WIDTH_32_BITS, description="Clock cycles counted over")
+        self.act_window_csr = CSRStorage(WIDTH_32_BITS, reset=trefi_setting, description="Length of the ACT rate window in clock cycles (tREFI by default)")
+        self.act_per_window_last_csr = CSRStatus(WIDTH_32_BITS, description="ACT commands (all banks) in the last full window")
+        self.act_per_window_max_csr = CSRStatus(WIDTH_32_BITS, description="Most ACT commands (all banks) in a full window")
+        self.num_banks_csr = CSRStatus(WIDTH_8_BITS, reset=nbanks, description="Number of banks counted")
 
         """
-        Addr and freq set FSM
+        Signals
         """
 
-        addr_and_freq_fsm = FSM(reset_state="SET_FREQ_ADDR_IDLE")
-        self.submodules.addr_and_freq_fsm = addr_and_freq_fsm
+        act_counters = [Signal(WIDTH_32_BITS) for _ in range(nbanks)]
+        pre_counters = [Signal(WIDTH_32_BITS) for _ in range(nbanks)]
+        read_counters = [Signal(WIDTH_32_BITS) for _ in range(nbanks)]
+        ref_counter = Signal(WIDTH_32_BITS)
+        act_total = Signal(WIDTH_32_BITS)
+        cycles = Signal(WIDTH_32_BITS)
+        window_timer = Signal(WIDTH_32_BITS)
+        window_acts = Signal(WIDTH_32_BITS)
+
+        # Decode the commands of every phase
+        act_incs = [[] for _ in range(nbanks)]
+        pre_incs = [[] for _ in range(nbanks)]
+        read_incs = [[] for _ in range(nbanks)]
+        ref_incs = []
+        for phase in dfi.phases:
+            cmd_valid = Signal(ONE_BIT_WIDE)
+            is_act = Signal(ONE_BIT_WIDE)
+            is_pre = Signal(ONE_BIT_WIDE)
+            is_pre_all = Signal(ONE_BIT_WIDE)
+            is_ref = Signal(ONE_BIT_WIDE)
+            is_read = Signal(ONE_BIT_WIDE)
+            self.comb += [
+                cmd_valid.eq(phase.cs_n != (2 ** nranks - 1)),
+                is_act.eq(cmd_valid & ~phase.ras_n & phase.cas_n & phase.we_n),
+                is_pre.eq(cmd_valid & ~phase.ras_n & phase.cas_n & ~phase.we_n),
+                is_pre_all.eq(is_pre & phase.address[10]),
+                is_ref.eq(cmd_valid & ~phase.ras_n & ~phase.cas_n & phase.we_n),
+                is_read.eq(cmd_valid & phase.ras_n & ~phase.cas_n & phase.we_n),
+            ]
+            for bank in range(nbanks):
+                act_incs[bank].append(is_act & (phase.bank == bank))
+                pre_incs[bank].append(is_pre_all | (is_pre & (phase.bank == bank)))
+                read_incs[bank].append(is_read & (phase.bank == bank))
+            ref_incs.append(is_ref)
+
+        act_inc_total = Signal(max=len(dfi.phases) + 1)
+        self.comb += act_inc_total.eq(reduce(add, [inc for incs in act_incs for inc in incs]))
 
-        addr_and_freq_fsm.act("SET_FREQ_ADDR_IDLE",
-            If(addr_freq_set_start_sig,
-                NextState("SET_FREQ_ADDR_SET_VAL"),
-            ).Else(
-                NextState("SET_FREQ_ADDR_IDLE"),
-            )              
-        )
+        """
+        Counter sync block
+        """
 
+        for bank in range(nbanks):
+            for counter, incs in [(act_counters[bank], act_incs[bank]), (pre_counters[bank], pre_incs[bank]), (read_counters[bank], read_incs[bank])]:
+                self.sync += If(clear,
+                    counter.eq(0),
+                ).Elif(enable,
+                    counter.eq(counter + reduce(add, incs)),
+                )
 
-        # My idea for incrementing addresses: Make an incrementing signal, controlling
-        # both the amount each address cah increment, and the limit of the times it can increment. 
-        addr_and_freq_fsm.act("SET_FREQ_ADDR_SET_VAL",
-            If(self.addr_to_set_set_not_get_csr.storage,
-                If(self.addr_to_set_sel_val_csr.storage == SET_ADDR_1_CONST,
-                    NextValue(addr_1_val_sig, self.addr_to_set_val_csr.storage),
-                    NextValue(addr_1_freq_sig, self.addr_to_set_freq_csr.storage),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_2_CONST,
-                    NextValue(addr_2_val_sig, self.addr_to_set_val_csr.storage),
-                    NextValue(addr_2_freq_sig, self.addr_to_set_freq_csr.storage),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_3_CONST,
-                    NextValue(addr_3_val_sig, self.addr_to_set_val_csr.storage),
-                    NextValue(addr_3_freq_sig, self.addr_to_set_freq_csr.storage),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_4_CONST,
-                    NextValue(addr_4_val_sig, self.addr_to_set_val_csr.storage),
-                    NextValue(addr_4_freq_sig, self.addr_to_set_freq_csr.storage),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_5_CONST,
-                    NextValue(addr_5_val_sig, self.addr_to_set_val_csr.storage),
-                    NextValue(addr_5_freq_sig, self.addr_to_set_freq_csr.storage),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_6_CONST,
-                    NextValue(addr_6_val_sig, self.addr_to_set_val_csr.storage),
-                    NextValue(addr_6_freq_sig, self.addr_to_set_freq_csr.storage),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_7_CONST,
-                    NextValue(addr_7_val_sig, self.addr_to_set_val_csr.storage),
-                    NextValue(addr_7_freq_sig, self.addr_to_set_freq_csr.storage),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_8_CONST,
-                    NextValue(addr_8_val_sig, self.addr_to_set_val_csr.storage),
-                    NextValue(addr_8_freq_sig, self.addr_to_set_freq_csr.storage),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_9_CONST,
-                    NextValue(addr_9_val_sig, self.addr_to_set_val_csr.storage),
-                    NextValue(addr_9_freq_sig, self.addr_to_set_freq_csr.storage),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_10_CONST,
-                    NextValue(addr_10_val_sig, self.addr_to_set_val_csr.storage),
-                    NextValue(addr_10_freq_sig, self.addr_to_set_freq_csr.storage),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_11_CONST,
-                    NextValue(addr_11_val_sig, self.addr_to_set_val_csr.storage),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_12_CONST,
-                    NextValue(addr_12_val_sig, self.addr_to_set_val_csr.storage),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_13_CONST,
-                    NextValue(addr_13_val_sig, self.addr_to_set_val_csr.storage),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_14_CONST,
-                    NextValue(addr_14_val_sig, self.addr_to_set_val_csr.storage),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_15_CONST,
-                    NextValue(addr_15_val_sig, self.addr_to_set_val_csr.storage),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_16_CONST,
-                    NextValue(addr_16_val_sig, self.addr_to_set_val_csr.storage),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_17_CONST,
-                    NextValue(addr_17_val_sig, self.addr_to_set_val_csr.storage),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_18_CONST,
-                    NextValue(addr_18_val_sig, self.addr_to_set_val_csr.storage),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_19_CONST,
-                    NextValue(addr_19_val_sig, self.addr_to_set_val_csr.storage),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_20_CONST,
-                    NextValue(addr_20_val_sig, self.addr_to_set_val_csr.storage),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_NUM_ADDRS_CONST,
-                    NextValue(num_addrs_attack_sig, self.addr_to_set_freq_csr.storage),       
-                ),
-            ).Else(
-                If(self.addr_to_set_sel_val_csr.storage == SET_ADDR_1_CONST,
-                    NextValue(self.addr_to_set_val_out_csr.status, addr_1_val_sig),
-                    NextValue(self.addr_to_set_freq_out_csr.status, addr_1_freq_sig),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_2_CONST,
-                    NextValue(self.addr_to_set_val_out_csr.status, addr_2_val_sig),
-                    NextValue(self.addr_to_set_freq_out_csr.status, addr_2_freq_sig),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_3_CONST,
-                    NextValue(self.addr_to_set_val_out_csr.status, addr_3_val_sig),
-                    NextValue(self.addr_to_set_freq_out_csr.status, addr_3_freq_sig),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_4_CONST,
-                    NextValue(self.addr_to_set_val_out_csr.status, addr_4_val_sig),
-                    NextValue(self.addr_to_set_freq_out_csr.status, addr_4_freq_sig),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_5_CONST,
-                    NextValue(self.addr_to_set_val_out_csr.status, addr_5_val_sig),
-                    NextValue(self.addr_to_set_freq_out_csr.status, addr_5_freq_sig),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_6_CONST,
-                    NextValue(self.addr_to_set_val_out_csr.status, addr_6_val_sig),
-                    NextValue(self.addr_to_set_freq_out_csr.status, addr_6_freq_sig),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_7_CONST,
-                    NextValue(self.addr_to_set_val_out_csr.status, addr_7_val_sig),
-                    NextValue(self.addr_to_set_freq_out_csr.status, addr_7_freq_sig),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_8_CONST,
-                    NextValue(self.addr_to_set_val_out_csr.status, addr_8_val_sig),
-                    NextValue(self.addr_to_set_freq_out_csr.status, addr_8_freq_sig),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_9_CONST,
-                    NextValue(self.addr_to_set_val_out_csr.status, addr_9_val_sig),
-                    NextValue(self.addr_to_set_freq_out_csr.status, addr_9_freq_sig),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_10_CONST,
-                    NextValue(self.addr_to_set_val_out_csr.status, addr_10_val_sig),
-                    NextValue(self.addr_to_set_freq_out_csr.status, addr_10_freq_sig),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_11_CONST,
-                    NextValue(self.addr_to_set_val_out_csr.status, addr_11_val_sig),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_12_CONST,
-                    NextValue(self.addr_to_set_val_out_csr.status, addr_12_val_sig),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_13_CONST,
-                    NextValue(self.addr_to_set_val_out_csr.status, addr_13_val_sig),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_14_CONST,
-                    NextValue(self.addr_to_set_val_out_csr.status, addr_14_val_sig),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_15_CONST,
-                    NextValue(self.addr_to_set_val_out_csr.status, addr_15_val_sig),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_16_CONST,
-                    NextValue(self.addr_to_set_val_out_csr.status, addr_16_val_sig),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_17_CONST,
-                    NextValue(self.addr_to_set_val_out_csr.status, addr_17_val_sig),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_18_CONST,
-                    NextValue(self.addr_to_set_val_out_csr.status, addr_18_val_sig),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_19_CONST,
-                    NextValue(self.addr_to_set_val_out_csr.status, addr_19_val_sig),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_ADDR_20_CONST,
-                    NextValue(self.addr_to_set_val_out_csr.status, addr_20_val_sig),
-                ).Elif(self.addr_to_set_sel_val_csr.storage == SET_NUM_ADDRS_CONST,
-                    NextValue(self.addr_to_set_freq_out_csr.status, num_addrs_attack_sig),       
+        self.sync += [
+            If(clear,
+                ref_counter.eq(0),
+                act_total.eq(0),
+                cycles.eq(0),
+                window_timer.eq(0),
+                window_acts.eq(0),
+                self.act_per_window_last_csr.status.eq(0),
+                self.act_per_window_max_csr.status.eq(0),
+            ).Elif(enable,
+                ref_counter.eq(ref_counter + reduce(add, ref_incs)),
+                act_total.eq(act_total + act_inc_total),
+                cycles.eq(cycles + 1),
+
+                # ACT rate window
+                If((window_timer + 1) >= self.act_window_csr.storage,
+                    window_timer.eq(0),
+                    window_acts.eq(0),
+                    self.act_per_window_last_csr.status.eq(window_acts + act_inc_total),
+                    If((window_acts + act_inc_total) > self.act_per_window_max_csr.status,
+                        self.act_per_window_max_csr.status.eq(window_acts + act_inc_total),
+                    ),
+                ).Else(
+                    window_timer.eq(window_timer + 1),
+                    window_acts.eq(window_acts + act_inc_total),
                 ),
-            ),
-            NextState("SET_FREQ_ADDR_IDLE"),
-        )
+            )
+        ]
+
+        """
+        Comb block
+        """
+
+        self.comb += [
+            self.act_count_csr.status.eq(Array(act_counters)[self.bank_sel_csr.storage]),
+            self.pre_count_csr.status.eq(Array(pre_counters)[self.bank_sel_csr.storage]),
+            self.read_count_csr.status.eq(Array(read_counters)[self.bank_sel_csr.storage]),
+            self.ref_count_csr.status.eq(ref_counter),
+            self.act_total_csr.status.eq(act_total),
+            self.cycles_csr.status.eq(cycles),
+        ]
+
+
+"""
+Flip bit histogram
+"""
+
+class Flip_Bit_Histogram(Module, AutoCSR):
+    """
+    One saturating counter per data bit, counting how many times the bit
+    flipped in the words checked while enable is high. Bit i of the port
+    data is DQ (i % number of DQs) of the burst, so the counters give the
+    flips per DQ, byte lane and chip with one readout at the end of the test.
+    The counters are read through a wishbone bus (one 32-bit word per data
+    bit, the words past the last bit read 0) so the host gets all of them in
+    one bulk transfer. SoCs that do not map the bus select one counter at a
+    time through the CSRs instead, they share the bus mux while it is idle.
+    """
+
+    def __init__(self, xor_data : Signal, enable : Signal, clear : Signal, counter_width=WIDTH_16_BITS):
 
+        data_width = len(xor_data)
+        num_words = 2 ** bits_for(data_width - 1)
 
+        self.size = num_words * (WIDTH_32_BITS // WIDTH_8_BITS)  # Bytes on the bus
+        self.bus = bus = wishbone.Interface()
 
         """
-        Addr and freq set sync block
+        CSR Registers
         """
-        self.sync += [
 
-            # Buffered Input
-            addr_freq_set_start_buf1_sig.eq(self.addr_to_set_start_fsm_csr.storage),
-            addr_freq_set_start_buf2_sig.eq(addr_freq_set_start_buf1_sig),
+        self.sel_csr = CSRStorage(WIDTH_16_BITS, description="Select the data bit shown in count_csr (when the counters are not on the bus)")
+        self.count_csr = CSRStatus(counter_width, description="Number of flips of the selected data bit (saturates)")
+        self.num_bits_csr = CSRStatus(WIDTH_16_BITS, reset=data_width, description="Number of data bits counted")
 
-            # Oneshot and Timer
-            If(addr_freq_set_start_buf2_sig,
-                If(addr_freq_set_timer < ADDR_FREQ_SET_DELAY,
-                    addr_freq_set_timer.eq(addr_freq_set_timer + 1),
-                ).Else(
-                    If(self.addr_to_set_start_prev_csr.status,
-                        addr_freq_set_start_sig.eq(0),
-                        self.addr_to_set_start_prev_csr.status.eq(1),
-                    ).Else(
-                        addr_freq_set_start_sig.eq(1),
-                        self.addr_to_set_start_prev_csr.status.eq(1),
-                    )
-                )
-            ).Else(
-                addr_freq_set_timer.eq(0),
-                addr_freq_set_start_sig.eq(0),
-                self.addr_to_set_start_prev_csr.status.eq(0),
+        """
+        Counters
+        """
+
+        counters = [Signal(counter_width) for _ in range(data_width)]
+        for i, counter in enumerate(counters):
+            self.sync += If(clear,
+                counter.eq(0),
+            ).Elif(enable & xor_data[i] & (counter != (2 ** counter_width - 1)),
+                counter.eq(counter + 1),
+            )
+
+        # One mux for the bus and the CSRs, the word read is latched with the ack
+        sel = Signal(max=num_words)
+        count = Signal(counter_width)
+        self.comb += [
+            sel.eq(Mux(bus.cyc & bus.stb, bus.adr, self.sel_csr.storage)),
+            count.eq(Array(counters + [0] * (num_words - data_width))[sel]),
+            self.count_csr.status.eq(count),
+        ]
+
+        self.sync += [
+            bus.ack.eq(0),
+            If(bus.cyc & bus.stb & ~bus.ack,
+                bus.ack.eq(1),
+                bus.dat_r.eq(count),
             )
         ]
 
 
+"""
+Hammer reads per bank
+"""
 
-        # ##############################################################################################
+class Bank_Hammer_Counters(Module, AutoCSR):
+    """
+    Count the reads of the attack taken by the port, per bank of their
+    address, while enable is high. These are the hammers the tester sent,
+    the DRAM command counters show what the controller made of them.
+    """
 
+    def __init__(self, addr : Signal, enable : Signal, clear : Signal, bank_bits, col_bits):
+
+        nbanks = 2 ** bank_bits
 
         """
-        data and timer set FSM
+        CSR Registers
         """
 
-        data_fsm = FSM(reset_state="SET_DATA_IDLE")
-        self.submodules.data_fsm = data_fsm
+        self.bank_sel_csr = CSRStorage(WIDTH_8_BITS, description="Select the bank shown in reads_csr")
+        self.reads_csr = CSRStatus(WIDTH_32_BITS, description="Reads of the attack sent to the selected bank")
+        self.num_banks_csr = CSRStatus(WIDTH_8_BITS, reset=nbanks, description="Number of banks counted")
 
-        data_fsm.act("SET_DATA_IDLE",
-            self.temporary_state_machine_var.eq(0),
-            If(data_set_start_sig,
-                NextState("SET_DATA_SET_VAL"),
-            ).Else(
-                NextState("SET_DATA_IDLE"),
-            )              
-        )
+        """
+        Counters
+        """
 
-        data_fsm.act("SET_DATA_SET_VAL",
-            self.temporary_state_machine_var.eq(1),
-            If(self.input_data_set_not_get_csr.storage,
-                If(self.input_data_sel_val_csr.storage == SET_ADDR_1_CONST,
-                    NextValue(data_sig_1, Replicate(self.input_data_pattern_csr.storage, rw_test_port.data_width // len(self.input_data_pattern_csr.storage))),  
-                ).Elif(self.input_data_sel_val_csr.storage == SET_ADDR_2_CONST,
-                    NextValue(data_sig_2, Replicate(self.input_data_pattern_csr.storage, rw_test_port.data_width // len(self.input_data_pattern_csr.storage))), 
-                ).Elif(self.input_data_sel_val_csr.storage == SET_ADDR_3_CONST,
-                    NextValue(rowhammer_two_states_counter_1_storage_sig, self.rowhammer_state_cycle_counter_csr.storage)       
-                ).Elif(self.input_data_sel_val_csr.storage == SET_ADDR_4_CONST,
-                    NextValue(rowhammer_two_states_counter_2_storage_sig, self.rowhammer_state_cycle_counter_csr.storage)       
-                ).Elif(self.input_data_sel_val_csr.storage == SET_ADDR_5_CONST,
-                    NextValue(rowhammer_two_states_counter_3_storage_sig, self.rowhammer_state_cycle_counter_csr.storage)       
-                ).Elif(self.input_data_sel_val_csr.storage == SET_ADDR_6_CONST,
-                    NextValue(rowhammer_two_states_counter_4_storage_sig, self.rowhammer_state_cycle_counter_csr.storage)       
-                ).Elif(self.input_data_sel_val_csr.storage == SET_ADDR_7_CONST,
-                    NextValue(rowhammer_two_states_counter_5_storage_sig, self.rowhammer_state_cycle_counter_csr.storage)       
-                ).Elif(self.input_data_sel_val_csr.storage == SET_ADDR_8_CONST,
-                    NextValue(rowhammer_state_cycle_storage_counter, self.rowhammer_state_cycle_counter_csr.storage)       
-                )
-            ).Else(
-                If(self.input_data_sel_val_csr.storage == SET_ADDR_1_CONST,
-                    NextValue(self.input_data_pattern_output_csr.status, data_sig_1[0:WIDTH_32_BITS]), 
-                ).Elif(self.input_data_sel_val_csr.storage == SET_ADDR_2_CONST,
-                    NextValue(self.input_data_pattern_output_csr.status, data_sig_2[0:WIDTH_32_BITS]),
-                ).Elif(self.input_data_sel_val_csr.storage == SET_ADDR_3_CONST,
-                    NextValue(self.rowhammer_state_cycle_counter_val_output_csr.status, rowhammer_two_states_counter_1_storage_sig),
-                ).Elif(self.input_data_sel_val_csr.storage == SET_ADDR_4_CONST,
-                    NextValue(self.rowhammer_state_cycle_counter_val_output_csr.status, rowhammer_two_states_counter_2_storage_sig),
-                ).Elif(self.input_data_sel_val_csr.storage == SET_ADDR_5_CONST,
-                    NextValue(self.rowhammer_state_cycle_counter_val_output_csr.status, rowhammer_two_states_counter_3_storage_sig),
-                ).Elif(self.input_data_sel_val_csr.storage == SET_ADDR_6_CONST,
-                    NextValue(self.rowhammer_state_cycle_counter_val_output_csr.status, rowhammer_two_states_counter_4_storage_sig),
-                ).Elif(self.input_data_sel_val_csr.storage == SET_ADDR_7_CONST,
-                    NextValue(self.rowhammer_state_cycle_counter_val_output_csr.status, rowhammer_two_states_counter_5_storage_sig),
-                ).Elif(self.input_data_sel_val_csr.storage == SET_ADDR_8_CONST,
-                    NextValue(self.rowhammer_state_cycle_counter_val_output_csr.status, rowhammer_state_cycle_storage_counter),
-                )
-            ),
-            NextState("SET_DATA_IDLE"),
-        )
+        bank = Signal(max=max(nbanks, 2))
+        self.comb += bank.eq(addr[col_bits:col_bits + bank_bits])
+
+        counters = [Signal(WIDTH_32_BITS) for _ in range(nbanks)]
+        for i, counter in enumerate(counters):
+            self.sync += If(clear,
+                counter.eq(0),
+            ).Elif(enable & (bank == i),
+                counter.eq(counter + 1),
+            )
+
+        self.comb += self.reads_csr.status.eq(Array(counters)[self.bank_sel_csr.storage])
+
+
+"""
+Performance counters
+"""
+
+class Perf_Counters(Module, AutoCSR):
+    """
+    Free-running 64-bit counters of the cycles spent in every phase of the
+    test, and of the cycles the port stalled the commands or the write data.
+    They are never cleared: writing snapshot_csr copies all of them to their
+    CSRs in the same cycle, a test is timed by the difference of a snapshot
+    taken before it and one taken after it.
+    """
+
+    def __init__(self):
+
+        # Phase of the test, one of them high at a time (none while idle)
+        self.fill = Signal(ONE_BIT_WIDE)
+        self.initial_check = Signal(ONE_BIT_WIDE)
+        self.init = Signal(ONE_BIT_WIDE)
+        self.attack = Signal(ONE_BIT_WIDE)
+        self.drain = Signal(ONE_BIT_WIDE)
+        self.post_check = Signal(ONE_BIT_WIDE)
+        self.readout = Signal(ONE_BIT_WIDE)
+
+        # Stalls of the port
+        self.cmd_stall = Signal(ONE_BIT_WIDE)
+        self.wdata_stall = Signal(ONE_BIT_WIDE)
 
         """
-        data and timer set sync block
+        CSR Registers
         """
-        self.sync += [
 
-            # Buffered Input
-            data_set_start_buf1_sig.eq(self.input_data_to_set_start_fsm_csr.storage),
-            data_set_start_buf2_sig.eq(data_set_start_buf1_sig),
+        self.snapshot_csr = CSRStorage(ONE_BIT_WIDE, description="Write to copy all the counters to their CSRs at once")
+        self.cycles_csr = CSRStatus(WIDTH_64_BITS, description="Cycles since reset")
+        self.fill_cycles_csr = CSRStatus(WIDTH_64_BITS, description="Cycles spent filling the DRAM")
+        self.initial_check_cycles_csr = CSRStatus(WIDTH_64_BITS, description="Cycles spent checking the DRAM before the attack")
+        self.init_cycles_csr = CSRStatus(WIDTH_64_BITS, description="Cycles spent setting up the tests and the attack (steps, search, settings)")
+        self.attack_cycles_csr = CSRStatus(WIDTH_64_BITS, description="Cycles spent sending the reads of the attack")
+        self.drain_cycles_csr = CSRStatus(WIDTH_64_BITS, description="Cycles spent draining the attack and resetting the settings")
+        self.post_check_cycles_csr = CSRStatus(WIDTH_64_BITS, description="Cycles spent checking the DRAM after the attack")
+        self.readout_cycles_csr = CSRStatus(WIDTH_64_BITS, description="Cycles the finished test waited with errors left in the error FIFO")
+        self.cmd_stall_cycles_csr = CSRStatus(WIDTH_64_BITS, description="Cycles with cmd.valid high and cmd.ready low on the port")
+        self.wdata_stall_cycles_csr = CSRStatus(WIDTH_64_BITS, description="Cycles with wdata.valid high and wdata.ready low on the port")
 
-            If(data_set_start_buf2_sig,
-                If(data_set_timer < DATA_SET_DELAY,
-                    data_set_timer.eq(data_set_timer + 1),
-                ).Else(
-                    If(self.input_data_set_start_prev_csr.status,
-                        data_set_start_sig.eq(0),
-                        self.input_data_set_start_prev_csr.status.eq(1),
-                    ).Else(
-                        data_set_start_sig.eq(1),
-                        self.input_data_set_start_prev_csr.status.eq(1),
-                    )
-                )
-            ).Else(
-                data_set_start_sig.eq(0),
-                If(data_set_timer > 0,
-                    self.input_data_set_start_prev_csr.status.eq(1),
-                    data_set_timer.eq(data_set_timer - 1)
-                ).Else(
-                    self.input_data_set_start_prev_csr.status.eq(0),
-                )
-            )
-            
+        """
+        Counters
+        """
+
+        counted = [
+            (1, self.cycles_csr),  # Every cycle
+            (self.fill, self.fill_cycles_csr),
+            (self.initial_check, self.initial_check_cycles_csr),
+            (self.init, self.init_cycles_csr),
+            (self.attack, self.attack_cycles_csr),
+            (self.drain, self.drain_cycles_csr),
+            (self.post_check, self.post_check_cycles_csr),
+            (self.readout, self.readout_cycles_csr),
+            (self.cmd_stall, self.cmd_stall_cycles_csr),
+            (self.wdata_stall, self.wdata_stall_cycles_csr),
         ]
 
+        counters = []
+        for enable, csr in counted:
+            counter = Signal(WIDTH_64_BITS)
+            counters.append(counter)
+            self.sync += [
+                If(enable,
+                    counter.eq(counter + 1),
+                ),
+                If(self.snapshot_csr.re,
+                    csr.status.eq(counter),
+                ),
+            ]
+
+        # Cycles since reset, a time base for the rest of the tester
+        self.cycles = counters[0]
+
+
+"""
+DFI hammer path
+"""
 
+class DFI_Hammer(Module, AutoCSR):
+    """
+    Hammer path that bypasses the LiteDRAM controller. Every read of the
+    attack taken (valid/ready, address addr) is sent straight on the DFI as
+    an ACT, RD, PRE sequence at the minimum spacing the DRAM timings allow
+    in system clock cycles: RD tRCD after the ACT, PRE once tRAS and tRTP
+    are met, next ACT once tRP and tRC are met.
+
+    The DFI is taken from the controller (through the external DFI of the
+    LiteDRAM DFI injector) just after one of its refreshes, when it has no
+    row open, and is held till enable goes low. The controller commands are
+    dropped meanwhile, REFs are sent from here instead every refresh_rate
+    cycles if refresh_enable is high. Every sequence closes its row, so the
+    DFI is handed back with all banks closed, as the controller left them.
+
+    The controller itself is not stopped: no other port of the crossbar may
+    be used while the DFI is held. Its bank machines would take the dropped
+    ACT/RD/WR as sent, and a read of that port would never get its data.
+    Those commands are counted in dropped_cmds_csr, which must stay 0.
+    """
+
+    def __init__(self, dfi, dfi_sel : Signal, controller_dfi, rdphase, timing, trtp, addr : Signal, valid : Signal, enable : Signal,
+                 controller_refresh : Signal, refresh_enable : Signal, refresh_rate : Signal, bank_bits, col_bits, address_align):
+
+        nphases = len(dfi.phases)
+        nranks = len(dfi.p0.cs_n)
+        dfi_bank_bits = len(dfi.p0.bank)
+        rank_bits = bank_bits - dfi_bank_bits
+        row_width = len(addr) - (bank_bits + col_bits)
+
+        # Cycles between the commands of a sequence, at least one
+        act_to_rd = max(timing.tRCD, 1)
+        rd_to_pre = max(timing.tRAS - act_to_rd, trtp, 1)
+        pre_to_act = max(timing.tRP, timing.tRC - (act_to_rd + rd_to_pre), 1)
+
+        # Read of the attack taken, high in the cycle of its ACT
+        self.ready = Signal(ONE_BIT_WIDE)
+
+        # High from the start till the DFI is handed back
+        self.busy = Signal(ONE_BIT_WIDE)
 
         """
-        Row Hammer FSM
+        CSR Registers
         """
 
-        rh_fsm = FSM(reset_state="RH_IDLE")
-        self.submodules.rh_fsm = rh_fsm
+        self.act_interval_csr = CSRStatus(WIDTH_16_BITS, reset=act_to_rd + rd_to_pre + pre_to_act, description="Cycles from one ACT to the next (tRC as sent on the DFI)")
+        self.hammers_csr = CSRStatus(WIDTH_32_BITS, description="ACT, RD, PRE sequences sent in the last attack")
+        self.refreshes_csr = CSRStatus(WIDTH_32_BITS, description="REFs sent while the DFI was held in the last attack")
+        self.held_cycles_csr = CSRStatus(WIDTH_32_BITS, description="Cycles the DFI was held in the last attack")
+        self.sync_cycles_csr = CSRStatus(WIDTH_32_BITS, description="Cycles waited for a controller refresh before taking the DFI")
+        self.dropped_cmds_csr = CSRStatus(WIDTH_32_BITS, description="ACT/RD/WR of the controller dropped while the DFI was held, another port was used (must be 0)")
 
-        # Idle state, wait here until user turns on row hammer tester
-        rh_fsm.act("RH_IDLE",
-            self.feedback_state_csr.status.eq(RH_IDLE_STATE),
-            If(rowhammer_start_sig,
-                NextValue(self.address_csr.status, 0),
-                NextValue(input_data_double_pattern_setting, 0),
-                # NextValue(rw_test_port.wdata.data, data_sig[0:rw_test_port.data_width]),
-                NextValue(rw_test_port.wdata.data, data_sig_1),
-                NextValue(data_sig_timer, PORT_COLS_AND_BANKS_PER_ROW_ADDR),
-                NextState("RH_FILL_REQ"),
-            ).Else(
-                NextState("RH_IDLE"), 
-            ) 
-        )
+        """
+        Signals
+        """
 
-        # Beginning of sending commands to write designated data pattern 
-        # to entire DRAM. Once we get the OK (cmd.ready), move on to 
-        # the next state of both sending commands and counting received ones.
-        rh_fsm.act("RH_FILL_REQ",
-            self.feedback_state_csr.status.eq(RH_WRITE_FILL_INIT_STATE | RH_FIRST_STATE),
-            rw_test_port.cmd.we.eq(1),
-            rw_test_port.cmd.valid.eq(1),
-            If(rw_test_port.cmd.ready,
-                If(self.address_csr.status == max_address_sig,
-                    NextValue(self.address_csr.status, 0),
-                    NextValue(self.burst_cntr_sig, 0),
-                    NextState("RH_FILL_REC"),   
-                ).Else(
-                    NextValue(data_sig_timer, data_sig_timer - 1),
-                    NextValue(self.address_csr.status, self.address_csr.status + 1),
-                    NextValue(self.burst_cntr_sig, 0),
-                    If(self.input_data_double_pattern_setting_csr.storage & input_data_double_pattern_setting,
-                        NextValue(rw_test_port.wdata.data, data_sig_2),
-                    ),
-                    NextState("RH_FILL_REQ_REC"),
-                )
+        timer = Signal(WIDTH_16_BITS)
+        refresh_timer = Signal(WIDTH_32_BITS)
+        controller_ref = Signal(ONE_BIT_WIDE)
+        controller_access = Signal(ONE_BIT_WIDE)
+
+        # Sequence being sent, latched with its ACT
+        bank = Signal(max=max(2 ** bank_bits, 2))
+        col = Signal(col_bits + address_align)
+
+        # Command of the cycle, ACT/PRE/REF go on the command phase, RD on the read phase
+        cmd_act = Signal(ONE_BIT_WIDE)
+        cmd_rd = Signal(ONE_BIT_WIDE)
+        cmd_pre = Signal(ONE_BIT_WIDE)
+        cmd_pre_all = Signal(ONE_BIT_WIDE)
+        cmd_ref = Signal(ONE_BIT_WIDE)
+        cmd_bank = Signal(max=max(2 ** bank_bits, 2))
+        cs_n = Signal(nranks)
+
+        # Phase of the ACT/PRE commands, the one before the read phase as in the controller
+        if isinstance(rdphase, Signal):
+            cmdphase = Signal.like(rdphase)
+            self.comb += cmdphase.eq(rdphase - 1) # Implicit %nphases
+        else:
+            cmdphase = (rdphase - 1) % nphases
+
+        """
+        DFI FSM
+        """
+
+        fsm = FSM(reset_state="DFI_IDLE")
+        self.submodules.fsm = fsm
+
+        fsm.act("DFI_IDLE",
+            If(enable & valid,
+                NextValue(self.hammers_csr.status, 0),
+                NextValue(self.refreshes_csr.status, 0),
+                NextValue(self.sync_cycles_csr.status, 0),
+                NextValue(self.dropped_cmds_csr.status, 0),
+                NextState("DFI_SYNC"),
             )
         )
 
-        # Send commands, count both the number received and the number 
-        # number executed, wait till we reach the very last address
-        rh_fsm.act("RH_FILL_REQ_REC",
-            self.feedback_state_csr.status.eq(RH_WRITE_FILL_INIT_STATE | RH_SECOND_STATE),
-            rw_test_port.cmd.we.eq(1),
-            rw_test_port.wdata.valid.eq(1),
-            rw_test_port.cmd.valid.eq(1),
-            If(rw_test_port.wdata.ready,
-                If(self.input_data_double_pattern_setting_csr.storage & input_data_double_pattern_setting,
-                    NextValue(rw_test_port.wdata.data, data_sig_2),
-                ).Else(
-                    NextValue(rw_test_port.wdata.data, data_sig_1),
-                ),
-                If((data_sig_timer - 1) == 0,
-                    NextValue(input_data_double_pattern_setting, ~input_data_double_pattern_setting),
-                    NextValue(data_sig_timer, PORT_COLS_AND_BANKS_PER_ROW_ADDR),
-                ).Else(
-                    NextValue(data_sig_timer, data_sig_timer - 1),
-                ),
-                NextValue(self.burst_cntr_sig, self.burst_cntr_sig + 1),  
-            ),
-            If(rw_test_port.cmd.ready,
-                If(self.address_csr.status == max_address_sig,
-                    NextValue(self.address_csr.status, 0),
-                    NextState("RH_FILL_REC")
-                ).Else(
-                    NextValue(self.address_csr.status, self.address_csr.status + 1),
-                )
+        # Wait for a refresh of the controller, it closes all the banks first.
+        # With its refresh off no REF comes, the DFI is taken at once.
+        fsm.act("DFI_SYNC",
+            NextValue(self.sync_cycles_csr.status, self.sync_cycles_csr.status + 1),
+            If(controller_ref | ~controller_refresh,
+                NextValue(timer, timing.tRFC),
+                NextState("DFI_SYNC_WAIT"),
             )
         )
 
-        # Keep receiving commands till we finish
-        rh_fsm.act("RH_FILL_REC",
-            self.feedback_state_csr.status.eq(RH_WRITE_FILL_INIT_STATE | RH_THIRD_STATE),
-            rw_test_port.cmd.we.eq(1),
-            rw_test_port.wdata.valid.eq(1),
-            If(rw_test_port.wdata.ready,
-                If(self.input_data_double_pattern_setting_csr.storage & input_data_double_pattern_setting,
-                    NextValue(rw_test_port.wdata.data, data_sig_2),
-                ).Else(
-                    NextValue(rw_test_port.wdata.data, data_sig_1),
-                ),
-                If((data_sig_timer - 1) == 0,
-                    NextValue(input_data_double_pattern_setting, ~input_data_double_pattern_setting),
-                    NextValue(data_sig_timer, PORT_COLS_AND_BANKS_PER_ROW_ADDR),
-                ).Else(
-                    NextValue(data_sig_timer, data_sig_timer - 1),
-                ),
-                NextValue(self.burst_cntr_sig, self.burst_cntr_sig + 1),
-                If((self.burst_cntr_sig + 1) >= (max_address_sig + 1),
-                    NextValue(self.burst_cntr_sig, 0),
-                    NextValue(self.address_csr.status, 0),
-                    NextValue(self.rowhammer_err_cnt_csr.status, 0),
-                    NextValue(self.before_after_rh_csr.status, 0),
-                    NextValue(input_data_double_pattern_setting, 0),
-                    NextValue(data_sig_timer, PORT_COLS_AND_BANKS_PER_ROW_ADDR),
-                    NextState("READ_CHECK_REQ"),
-                )
+        fsm.act("DFI_SYNC_WAIT",
+            If(timer == 0,
+                NextState("DFI_TAKE"),
+            ).Else(
+                NextValue(timer, timer - 1),
             )
         )
 
-        # Initial settings for the row hammer attack
-        rh_fsm.act("RH_INIT_SETTINGS",
-            # Modify refresh rate here
-            self.feedback_state_csr.status.eq(RH_INIT_SETTINGS_STATE),
-            NextState("RH_ATTACK_1"),
-            If(self.refresh_enable_csr.storage,
-                NextValue(trefi, self.refresh_rate_csr.storage),
-            ).Else(
-                NextValue(refresh_enable, 0),
-            ),
-            NextValue(auto_precharge_setting, self.auto_precharge_csr.storage),
-            NextValue(self.address_csr.status, addr_1_val_sig),
-            NextValue(rowhammer_attack_cmd_timer_sig, addr_1_freq_sig),
-            NextValue(rowhammer_state_counter, num_addrs_attack_sig),
-            NextValue(rowhammer_state_cycle_counter, rowhammer_state_cycle_storage_counter),
-            NextValue(rowhammer_port_wready_rvalid_counter, 0),
-            NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_1_storage_sig),
+        # Close all the banks, in case the controller left one open
+        fsm.act("DFI_TAKE",
+            dfi_sel.eq(1),
+            cmd_pre_all.eq(1),
+            NextValue(timer, pre_to_act - 1),
+            NextState("DFI_NEXT"),
         )
 
-        # First row hammer attack state
-        rh_fsm.act("RH_ATTACK_1",
-            self.feedback_state_csr.status.eq(RH_ROWHAMMER_STATE | RH_FIRST_STATE),
-                   
-            # Set command valid
-            rw_test_port.cmd.valid.eq(1),
+        # All banks closed, send a REF when due, or the ACT of the next read
+        fsm.act("DFI_NEXT",
+            dfi_sel.eq(1),
+            If(timer != 0,
+                NextValue(timer, timer - 1),
+            ).Elif(refresh_enable & (refresh_timer == 0),
+                cmd_ref.eq(1),
+                NextValue(self.refreshes_csr.status, self.refreshes_csr.status + 1),
+                NextValue(timer, max(timing.tRFC, 1) - 1),
+            ).Elif(enable & valid,
+                cmd_act.eq(1),
+                self.ready.eq(1),
+                NextValue(self.hammers_csr.status, self.hammers_csr.status + 1),
+                NextValue(bank, addr[col_bits:col_bits + bank_bits]),
+                NextValue(col, Cat(Replicate(0, address_align), addr[:col_bits])),
+                NextValue(timer, act_to_rd - 1),
+                NextState("DFI_ACT_WAIT"),
+            ).Elif(~enable,
+                NextState("DFI_IDLE"),
+            )
+        )
 
-            # Control necessary signals for reads
-            rw_test_port.cmd.we.eq(0),
-            rw_test_port.rdata.ready.eq(1),
+        fsm.act("DFI_ACT_WAIT",
+            dfi_sel.eq(1),
+            If(timer == 0,
+                cmd_rd.eq(1),
+                NextValue(timer, rd_to_pre - 1),
+                NextState("DFI_RD_WAIT"),
+            ).Else(
+                NextValue(timer, timer - 1),
+            )
+        )
 
-            # Control if we need to quit or move on to next bit after command execution
-            If(rw_test_port.cmd.ready,
-                
-                # A timer containing the number of times to hammer the bit (addr_#_freq_sig)
-                # Once it finishes, we go to a next state (RH_RESET_SETTINGS, RH_ATTACK_1, RH_ATTACK_2)
-                If((rowhammer_attack_cmd_timer_sig - 1) == 0,
-                    
-                    # A timer controlling whether to 1. continue the cycle of states, or 
-                    # 2. repeat the cycle of states (go back to the first state) or finish.
-                    If((rowhammer_state_counter - 1) == 0,
-                       
-                        # A timer for a pair of states (state 1 and 2 in this case)
-                        # Access here means theres only one rowhammer state being used.
-                        If((rowhammer_two_states_counter_sig - 1) == 0, 
-                        
-                            # A timer to control when to either repeat the cycle of states or 
-                            # finish sending commands.
-                            If((rowhammer_state_cycle_counter - 1) == 0,
-                                NextState("RH_RESET_SETTINGS"),
-                            ).Else(
-                                NextValue(rowhammer_state_cycle_counter, rowhammer_state_cycle_counter - 1),
-                                NextValue(rowhammer_state_counter, num_addrs_attack_sig),
-                                NextValue(rowhammer_attack_cmd_timer_sig, addr_1_freq_sig),
-                                NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_1_storage_sig),
-                                NextState("RH_ATTACK_1"),
-                            ),
+        fsm.act("DFI_RD_WAIT",
+            dfi_sel.eq(1),
+            If(timer == 0,
+                cmd_pre.eq(1),
+                NextValue(timer, pre_to_act - 1),
+                NextState("DFI_NEXT"),
+            ).Else(
+                NextValue(timer, timer - 1),
+            )
+        )
 
-                        ).Else(
-                            NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_sig - 1),
-                            NextValue(rowhammer_attack_cmd_timer_sig, addr_1_freq_sig),
-                            NextState("RH_ATTACK_1"),
-                        ),
+        """
+        Sync block
+        """
 
-                    ).Else(
-                        NextValue(rowhammer_state_counter, rowhammer_state_counter - 1),
-                        NextValue(rowhammer_attack_cmd_timer_sig, addr_2_freq_sig),
-                        NextValue(self.address_csr.status, addr_2_val_sig),
-                        NextState("RH_ATTACK_2"),
-                    ),
-                ).Else(
-                    # Stay in this state till this freq timer finishes
-                    NextValue(rowhammer_attack_cmd_timer_sig, rowhammer_attack_cmd_timer_sig - 1)   
-                ),
+        self.sync += [
+            If(fsm.ongoing("DFI_IDLE") & enable & valid,
+                self.held_cycles_csr.status.eq(0),
+            ).Elif(dfi_sel,
+                self.held_cycles_csr.status.eq(self.held_cycles_csr.status + 1),
             ),
-            If(rw_test_port.cmd.ready & ~rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter + 1),   
-            ).Elif(~rw_test_port.cmd.ready & rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter - 1),         
+
+            # Accesses of other ports, the controller thinks they were sent
+            If(dfi_sel & controller_access,
+                self.dropped_cmds_csr.status.eq(self.dropped_cmds_csr.status + 1),
             ),
-        )
 
-        rh_fsm.act("RH_ATTACK_2",
-            self.feedback_state_csr.status.eq(RH_ROWHAMMER_STATE | RH_SECOND_STATE),
+            # The refresh period starts when the DFI is taken and at every REF
+            If(fsm.ongoing("DFI_TAKE") | cmd_ref,
+                refresh_timer.eq(refresh_rate),
+            ).Elif(refresh_timer != 0,
+                refresh_timer.eq(refresh_timer - 1),
+            )
+        ]
 
-            # Set command valid
-            rw_test_port.cmd.valid.eq(1),
+        """
+        Comb block
+        """
 
-            # Control necessary signals for reads
-            rw_test_port.cmd.we.eq(0),
-            rw_test_port.rdata.ready.eq(1),
+        # REF of the controller, on any phase
+        self.comb += controller_ref.eq(reduce(or_, [(phase.cs_n != (2 ** nranks - 1)) & ~phase.ras_n & ~phase.cas_n & phase.we_n for phase in controller_dfi.phases]))
 
-            # Control if we need to quit or move on to next bit after command execution
-            If(rw_test_port.cmd.ready,
-               
-                # A timer containing the number of times to hammer the bit (addr_#_freq_sig)
-                # Once it finishes, we go to a next state (RH_RESET_SETTINGS, RH_ATTACK_1, RH_ATTACK_2)
-                If((rowhammer_attack_cmd_timer_sig - 1) == 0,
-                   
-                    # A timer controlling whether to 1. continue the cycle of states, or 
-                    # 2. repeat the cycle of states (go back to the first state) or finish.
-                    If((rowhammer_state_counter - 1) == 0,
-                       
-                        # A timer for a pair of states (state 1 and 2 in this case)
-                        # Access here means theres only one rowhammer state being used.
-                        If((rowhammer_two_states_counter_sig - 1) == 0, 
-                    
-                            # A timer to control when to either repeat the cycle of states or 
-                            # finish sending commands.
-                            If((rowhammer_state_cycle_counter - 1) == 0,
-                                NextState("RH_RESET_SETTINGS"),
-                            ).Else(
-                                NextValue(rowhammer_state_cycle_counter, rowhammer_state_cycle_counter - 1),
-                                NextValue(rowhammer_state_counter, num_addrs_attack_sig),
-                                NextValue(rowhammer_attack_cmd_timer_sig, addr_1_freq_sig),
-                                NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_1_storage_sig),
-                                NextValue(self.address_csr.status, addr_1_val_sig),
-                                NextState("RH_ATTACK_1")
-                            ),
-
-                        ).Else(
-                            NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_sig - 1),
-                            NextValue(rowhammer_state_counter, rowhammer_state_counter + 1),
-                            NextValue(rowhammer_attack_cmd_timer_sig, addr_1_freq_sig),
-                            NextValue(self.address_csr.status, addr_1_val_sig),
-                            NextState("RH_ATTACK_1"),
-                        ),
+        # ACT, RD or WR of the controller, on any phase (its PRE and ZQCS come from the refresher too)
+        self.comb += controller_access.eq(reduce(or_, [(phase.cs_n != (2 ** nranks - 1)) & ((~phase.ras_n & phase.cas_n & phase.we_n) | (phase.ras_n & ~phase.cas_n)) for phase in controller_dfi.phases]))
 
-                    ).Else(
+        self.comb += [
+            self.busy.eq(~fsm.ongoing("DFI_IDLE")),
+            cmd_bank.eq(Mux(cmd_act, addr[col_bits:col_bits + bank_bits], bank)),
+        ]
 
-                        If((rowhammer_two_states_counter_sig - 1) == 0, 
-                            NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_2_storage_sig),
-                            NextValue(rowhammer_state_counter, rowhammer_state_counter - 1),
-                            NextValue(rowhammer_attack_cmd_timer_sig, addr_3_freq_sig),
-                            NextValue(self.address_csr.status, addr_3_val_sig),
-                            NextState("RH_ATTACK_3"),
-                        ).Else(
-                            NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_sig - 1),
-                            NextValue(rowhammer_state_counter, rowhammer_state_counter + 1),
-                            NextValue(rowhammer_attack_cmd_timer_sig, addr_1_freq_sig),
-                            NextValue(self.address_csr.status, addr_1_val_sig),
-                            NextState("RH_ATTACK_1"),
-                        )
+        # Rank of the bank address, REF and precharge all go to every rank
+        if rank_bits > 0:
+            self.comb += cs_n.eq(Mux(cmd_ref | cmd_pre_all, 0, ~(1 << cmd_bank[dfi_bank_bits:])))
+        else:
+            self.comb += cs_n.eq(0)
+
+        for i, phase in enumerate(dfi.phases):
+            self.comb += [
+                phase.cke.eq(2 ** nranks - 1),
+                phase.odt.eq(2 ** nranks - 1),
+                phase.reset_n.eq(1),
+                If((cmd_act | cmd_pre | cmd_pre_all | cmd_ref) & (cmdphase == i),
+                    phase.cs_n.eq(cs_n),
+                    phase.bank.eq(cmd_bank[:dfi_bank_bits]),
+                    phase.ras_n.eq(0),
+                    phase.cas_n.eq(~cmd_ref),
+                    phase.we_n.eq(~(cmd_pre | cmd_pre_all)),
+                    If(cmd_act,
+                        phase.address.eq(addr[col_bits + bank_bits:col_bits + bank_bits + row_width]),
+                    ).Elif(cmd_pre_all,
+                        phase.address.eq(2 ** 10),
                     ),
-
-                ).Else(
-                    NextValue(rowhammer_attack_cmd_timer_sig, rowhammer_attack_cmd_timer_sig - 1)   
                 ),
-            ),
-            If(rw_test_port.cmd.ready & ~rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter + 1),   
-            ).Elif(~rw_test_port.cmd.ready & rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter - 1),         
-            ),
-        )
-
-        rh_fsm.act("RH_ATTACK_3",
-            self.feedback_state_csr.status.eq(RH_ROWHAMMER_STATE | RH_THIRD_STATE),
-            rw_test_port.cmd.valid.eq(1),
-            rw_test_port.cmd.we.eq(0),
-            rw_test_port.rdata.ready.eq(1),
-            If(rw_test_port.cmd.ready,
-                If((rowhammer_attack_cmd_timer_sig - 1) == 0,
-                    If((rowhammer_state_counter - 1) == 0,
-                        If((rowhammer_two_states_counter_sig - 1) == 0, 
-                            If((rowhammer_state_cycle_counter - 1) == 0,
-                                NextState("RH_RESET_SETTINGS"),
-                            ).Else(
-                                NextValue(rowhammer_state_cycle_counter, rowhammer_state_cycle_counter - 1),
-                                NextValue(rowhammer_state_counter, num_addrs_attack_sig),
-                                NextValue(rowhammer_attack_cmd_timer_sig, addr_1_freq_sig),
-                                NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_1_storage_sig),
-                                NextValue(self.address_csr.status, addr_1_val_sig),
-                                NextState("RH_ATTACK_1")
-                            ),
-                        ).Else(
-                            NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_sig - 1),
-                            NextValue(rowhammer_attack_cmd_timer_sig, addr_3_freq_sig),
-                            NextState("RH_ATTACK_3"),
-                        )
-                    ).Else(
-                        NextValue(rowhammer_state_counter, rowhammer_state_counter - 1),
-                        NextValue(rowhammer_attack_cmd_timer_sig, addr_4_freq_sig),
-                        NextValue(self.address_csr.status, addr_4_val_sig),
-                        NextState("RH_ATTACK_4"),
-                    ),
-                ).Else(
-                    NextValue(rowhammer_attack_cmd_timer_sig, rowhammer_attack_cmd_timer_sig - 1)   
+                If(cmd_rd & (rdphase == i),
+                    phase.cs_n.eq(cs_n),
+                    phase.bank.eq(cmd_bank[:dfi_bank_bits]),
+                    phase.cas_n.eq(0),
+                    phase.address.eq(col),
+                    phase.rddata_en.eq(1),
                 ),
-            ),
-            If(rw_test_port.cmd.ready & ~rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter + 1),   
-            ).Elif(~rw_test_port.cmd.ready & rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter - 1),         
-            ),
-        )
+            ]
 
-        rh_fsm.act("RH_ATTACK_4",
-            self.feedback_state_csr.status.eq(RH_ROWHAMMER_STATE | RH_FOURTH_STATE),
-            rw_test_port.cmd.valid.eq(1),
-            rw_test_port.cmd.we.eq(0),
-            rw_test_port.rdata.ready.eq(1),
-            If(rw_test_port.cmd.ready,
-                If((rowhammer_attack_cmd_timer_sig - 1) == 0,
-                    If((rowhammer_state_counter - 1) == 0,
-                        If((rowhammer_two_states_counter_sig - 1) == 0,
-                            If((rowhammer_state_cycle_counter - 1) == 0,
-                                NextState("RH_RESET_SETTINGS"),
-                            ).Else(
-                                NextValue(rowhammer_state_cycle_counter, rowhammer_state_cycle_counter - 1),
-                                NextValue(rowhammer_state_counter, num_addrs_attack_sig),
-                                NextValue(rowhammer_attack_cmd_timer_sig, addr_1_freq_sig),
-                                NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_1_storage_sig),
-                                NextValue(self.address_csr.status, addr_1_val_sig),
-                                NextState("RH_ATTACK_1")
-                            ),
-                        ).Else(
-                            NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_sig - 1),
-                            NextValue(rowhammer_state_counter, rowhammer_state_counter + 1),
-                            NextValue(rowhammer_attack_cmd_timer_sig, addr_3_freq_sig),
-                            NextValue(self.address_csr.status, addr_3_val_sig),
-                            NextState("RH_ATTACK_3")
-                        )
-                    ).Else(
 
-                        If((rowhammer_two_states_counter_sig - 1) == 0,
-                            NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_3_storage_sig),
-                            NextValue(rowhammer_state_counter, rowhammer_state_counter - 1),
-                            NextValue(rowhammer_attack_cmd_timer_sig, addr_5_freq_sig),
-                            NextValue(self.address_csr.status, addr_5_val_sig),
-                            NextState("RH_ATTACK_5"),
-                        ).Else(
-                            NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_sig - 1),
-                            NextValue(rowhammer_state_counter, rowhammer_state_counter + 1),
-                            NextValue(rowhammer_attack_cmd_timer_sig, addr_3_freq_sig),
-                            NextValue(self.address_csr.status, addr_3_val_sig),
-                            NextState("RH_ATTACK_3"),
-                        ),
-                    ),
-                ).Else(
-                    NextValue(rowhammer_attack_cmd_timer_sig, rowhammer_attack_cmd_timer_sig - 1)   
-                ),
-            ),
-            If(rw_test_port.cmd.ready & ~rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter + 1),   
-            ).Elif(~rw_test_port.cmd.ready & rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter - 1),         
-            ),
-        )
+"""
+Row flip histogram
+"""
 
-        rh_fsm.act("RH_ATTACK_5",
-            self.feedback_state_csr.status.eq(RH_ROWHAMMER_STATE | RH_FIFTH_STATE),
-            rw_test_port.cmd.valid.eq(1),
-            rw_test_port.cmd.we.eq(0),
-            rw_test_port.rdata.ready.eq(1),
-            If(rw_test_port.cmd.ready,
-                If((rowhammer_attack_cmd_timer_sig - 1) == 0,
-                    If((rowhammer_state_counter - 1) == 0,
-                        If((rowhammer_two_states_counter_sig - 1) == 0,
-                            If((rowhammer_state_cycle_counter - 1) == 0,
-                                NextState("RH_RESET_SETTINGS"),
-                            ).Else(
-                                NextValue(rowhammer_state_cycle_counter, rowhammer_state_cycle_counter - 1),
-                                NextValue(rowhammer_state_counter, num_addrs_attack_sig),
-                                NextValue(rowhammer_attack_cmd_timer_sig, addr_1_freq_sig),
-                                NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_1_storage_sig),
-                                NextValue(self.address_csr.status, addr_1_val_sig),
-                                NextState("RH_ATTACK_1")
-                            ),
-                        ).Else(
-                            NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_sig - 1),
-                            NextValue(rowhammer_attack_cmd_timer_sig, addr_5_freq_sig),
-                            NextState("RH_ATTACK_5"),
-                        )
-                    ).Else(
-                        NextValue(rowhammer_state_counter, rowhammer_state_counter - 1),
-                        NextValue(rowhammer_attack_cmd_timer_sig, addr_6_freq_sig),
-                        NextValue(self.address_csr.status, addr_6_val_sig),
-                        NextState("RH_ATTACK_6"),
-                    ),
-                ).Else(
-                    NextValue(rowhammer_attack_cmd_timer_sig, rowhammer_attack_cmd_timer_sig - 1)   
-                ),
+class Row_Flip_Histogram(Module, AutoCSR):
+    """
+    Count the flipped bits of every row (or window of 2**row_shift_csr rows)
+    of one bank, starting at base_row_csr, in a BRAM. The counts are read
+    through a wishbone bus (one 32-bit word per window) so the host gets the
+    whole histogram in one bulk transfer. Updates go through a read, add,
+    write pipeline, the bus is only given the BRAM read port when the
+    pipeline does not need it, and the word read is latched before stage 1
+    can take the port back. clear starts a sweep of depth cycles setting
+    every entry to 0, clearing is high meanwhile and enable must stay low.
+    """
+
+    def __init__(self, addr : Signal, xor_data : Signal, enable : Signal, clear : Signal, bank_bits, col_bits, depth=DEFAULT_ROW_HISTOGRAM_DEPTH):
+
+        row_width = len(addr) - (bank_bits + col_bits)
+        num_lanes = len(xor_data) // WIDTH_32_BITS
+
+        self.depth = depth
+        self.size = depth * (WIDTH_32_BITS // WIDTH_8_BITS)  # Bytes on the bus
+        self.bus = bus = wishbone.Interface()
+
+        """
+        CSR Registers
+        """
+
+        self.bank_csr = CSRStorage(WIDTH_8_BITS, description="Bank counted in the histogram")
+        self.all_banks_csr = CSRStorage(ONE_BIT_WIDE, description="Count all banks together")
+        self.base_row_csr = CSRStorage(WIDTH_32_BITS, description="First row of the histogram")
+        self.row_shift_csr = CSRStorage(WIDTH_8_BITS, description="Each histogram entry counts 2**row_shift rows")
+        self.depth_csr = CSRStatus(WIDTH_32_BITS, reset=depth, description="Number of histogram entries")
+        self.out_of_window_csr = CSRStatus(WIDTH_32_BITS, description="Flipped bits found outside of the histogram rows")
+
+        """
+        Signals
+        """
+
+        mem = Memory(WIDTH_32_BITS, depth)
+        read_port = mem.get_port()
+        write_port = mem.get_port(write_capable=True)
+        self.specials += mem, read_port, write_port
+
+        row = Signal(row_width)
+        bank = Signal(max(bank_bits, 1))
+        row_offset = Signal(row_width)
+        row_bin = Signal(row_width)
+        in_window = Signal(ONE_BIT_WIDE)
+
+        # Pipeline, stage 1 (lane popcounts) and stage 2 (add to the entry)
+        s1_valid = Signal(ONE_BIT_WIDE)
+        s1_in_window = Signal(ONE_BIT_WIDE)
+        s1_idx = Signal(max=depth)
+        s1_lane_counts = [Signal(max=WIDTH_32_BITS + 1) for _ in range(num_lanes)]
+        s2_valid = Signal(ONE_BIT_WIDE)
+        s2_in_window = Signal(ONE_BIT_WIDE)
+        s2_idx = Signal(max=depth)
+        s2_count = Signal(WIDTH_16_BITS)
+        s2_sum = Signal(WIDTH_32_BITS)
+
+        # Last entry written, still being written when the next read comes out
+        last_valid = Signal(ONE_BIT_WIDE)
+        last_idx = Signal(max=depth)
+        last_sum = Signal(WIDTH_32_BITS)
+
+        # Clearing all entries at the start of a test
+        self.clearing = clearing = Signal(ONE_BIT_WIDE)
+        clear_idx = Signal(max=depth)
+
+        bus_pending = Signal(ONE_BIT_WIDE)
+        bus_data = Signal(WIDTH_32_BITS)
+
+        """
+        Comb block
+        """
+
+        self.comb += [
+            row.eq(addr[bank_bits + col_bits:]),
+            row_offset.eq(row - self.base_row_csr.storage),
+            row_bin.eq(row_offset >> self.row_shift_csr.storage),
+            in_window.eq((row >= self.base_row_csr.storage) & (row_bin < depth) & (self.all_banks_csr.storage | (bank == self.bank_csr.storage))),
+
+            # Stage 2 adds to the entry read, or to the entry written last cycle if it is the same
+            s2_sum.eq(Mux(last_valid & (last_idx == s2_idx), last_sum, read_port.dat_r) + s2_count),
+
+            If(clearing,
+                write_port.adr.eq(clear_idx),
+                write_port.dat_w.eq(0),
+                write_port.we.eq(1),
+            ).Else(
+                write_port.adr.eq(s2_idx),
+                write_port.dat_w.eq(s2_sum),
+                write_port.we.eq(s2_valid & s2_in_window),
             ),
-            If(rw_test_port.cmd.ready & ~rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter + 1),   
-            ).Elif(~rw_test_port.cmd.ready & rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter - 1),         
+
+            # Stage 1 reads the entry, the bus only gets the read port when stage 1 is empty
+            If(s1_valid,
+                read_port.adr.eq(s1_idx),
+            ).Else(
+                read_port.adr.eq(bus.adr[:len(read_port.adr)]),
             ),
-        )
+            bus.dat_r.eq(bus_data),
+        ]
+        if bank_bits > 0:
+            self.comb += bank.eq(addr[col_bits:col_bits + bank_bits])
 
-        rh_fsm.act("RH_ATTACK_6",
-            self.feedback_state_csr.status.eq(RH_ROWHAMMER_STATE | RH_SIXTH_STATE),
-            rw_test_port.cmd.valid.eq(1),
-            rw_test_port.cmd.we.eq(0),
-            rw_test_port.rdata.ready.eq(1),
-            If(rw_test_port.cmd.ready,
-                If((rowhammer_attack_cmd_timer_sig - 1) == 0,
-                    If((rowhammer_state_counter - 1) == 0,
-                        If((rowhammer_two_states_counter_sig - 1) == 0, 
-                            If((rowhammer_state_cycle_counter - 1) == 0,
-                                NextState("RH_RESET_SETTINGS"),
-                            ).Else(
-                                NextValue(rowhammer_state_cycle_counter, rowhammer_state_cycle_counter - 1),
-                                NextValue(rowhammer_state_counter, num_addrs_attack_sig),
-                                NextValue(rowhammer_attack_cmd_timer_sig, addr_1_freq_sig),
-                                NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_1_storage_sig),
-                                NextValue(self.address_csr.status, addr_1_val_sig),
-                                NextState("RH_ATTACK_1"),
-                            ),
-                        ).Else(
-                            NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_sig - 1),
-                            NextValue(rowhammer_state_counter, rowhammer_state_counter + 1),
-                            NextValue(rowhammer_attack_cmd_timer_sig, addr_5_freq_sig),
-                            NextValue(self.address_csr.status, addr_5_val_sig),
-                            NextState("RH_ATTACK_5"),
-                        ),
-                    ).Else(
+        """
+        Sync block
+        """
 
-                        If((rowhammer_two_states_counter_sig - 1) == 0,
-                            NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_4_storage_sig),
-                            NextValue(rowhammer_state_counter, rowhammer_state_counter - 1),
-                            NextValue(rowhammer_attack_cmd_timer_sig, addr_7_freq_sig),
-                            NextValue(self.address_csr.status, addr_7_val_sig),
-                            NextState("RH_ATTACK_7"),
-                        ).Else(
-                            NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_sig - 1),
-                            NextValue(rowhammer_state_counter, rowhammer_state_counter + 1),
-                            NextValue(rowhammer_attack_cmd_timer_sig, addr_5_freq_sig),
-                            NextValue(self.address_csr.status, addr_5_val_sig),
-                            NextState("RH_ATTACK_5"),
-                        ),
-                    ),
-                ).Else(
-                    NextValue(rowhammer_attack_cmd_timer_sig, rowhammer_attack_cmd_timer_sig - 1)   
+        self.sync += [
+            # Stage 1
+            s1_valid.eq(enable),
+            s1_in_window.eq(in_window),
+            s1_idx.eq(row_bin),
+            [s1_lane_counts[i].eq(reduce(add, [xor_data[(WIDTH_32_BITS * i) + j] for j in range(WIDTH_32_BITS)])) for i in range(num_lanes)],
+
+            # Stage 2
+            s2_valid.eq(s1_valid),
+            s2_in_window.eq(s1_in_window),
+            s2_idx.eq(s1_idx),
+            s2_count.eq(reduce(add, s1_lane_counts)),
+
+            last_valid.eq(s2_valid & s2_in_window & ~clearing),
+            last_idx.eq(s2_idx),
+            last_sum.eq(s2_sum),
+
+            If(clear,
+                clearing.eq(1),
+                clear_idx.eq(0),
+                self.out_of_window_csr.status.eq(0),
+            ).Elif(clearing,
+                If(clear_idx == (depth - 1),
+                    clearing.eq(0),
                 ),
+                clear_idx.eq(clear_idx + 1),
+            ).Elif(s2_valid & ~s2_in_window,
+                self.out_of_window_csr.status.eq(self.out_of_window_csr.status + s2_count),
             ),
-            If(rw_test_port.cmd.ready & ~rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter + 1),   
-            ).Elif(~rw_test_port.cmd.ready & rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter - 1),         
+
+            # Wishbone, read only, data comes out one cycle after the read port is free
+            # and is held for the ack, stage 1 may use the port again meanwhile
+            bus.ack.eq(0),
+            If(bus.cyc & bus.stb & ~bus.ack,
+                If(~bus.we & ~bus_pending & ~s1_valid,
+                    bus_pending.eq(1),
+                ).Elif(bus.we | bus_pending,
+                    bus_pending.eq(0),
+                    bus_data.eq(read_port.dat_r),
+                    bus.ack.eq(1),
+                )
+            )
+        ]
+
+
+"""
+Row sweep log
+"""
+
+class Row_Sweep_Log(Module, AutoCSR):
+    """
+    Results of every step of a row sweep in a BRAM, SWEEP_LOG_ENTRY_WORDS
+    32-bit words per step (row the template was moved by, errors before and
+    after the attack, cycles of the step, HC_first found and tests run by the
+    HC_first search, 1 if the search of the step was stopped as its check
+    before the attack found errors, the rest reads 0), read through a
+    wishbone bus so the host gets the whole sweep in one bulk transfer.
+    Steps past the depth are run but not logged.
+    """
+
+    def __init__(self, depth=DEFAULT_SWEEP_LOG_DEPTH):
+
+        self.depth = depth
+        self.size = depth * SWEEP_LOG_ENTRY_WORDS * (WIDTH_32_BITS // WIDTH_8_BITS)  # Bytes on the bus
+        self.bus = bus = wishbone.Interface()
+
+        # Step to log, written when we is high
+        self.clear = Signal(ONE_BIT_WIDE)
+        self.we = Signal(ONE_BIT_WIDE)
+        self.row = Signal(WIDTH_32_BITS)
+        self.errors_before = Signal(WIDTH_32_BITS)
+        self.errors_after = Signal(WIDTH_32_BITS)
+        self.cycles = Signal(WIDTH_32_BITS)
+        self.hc_first = Signal(WIDTH_32_BITS)
+        self.tests = Signal(WIDTH_32_BITS)
+        self.invalid = Signal(ONE_BIT_WIDE)
+
+        """
+        CSR Registers
+        """
+
+        self.steps_csr = CSRStatus(WIDTH_32_BITS, description="Steps run in the last test (only the first depth_csr are logged)")
+        self.depth_csr = CSRStatus(WIDTH_32_BITS, reset=depth, description="Number of steps the log holds")
+
+        """
+        Signals
+        """
+
+        # Fields of a step in the order of the words on the bus, stored at their widths
+        fields = [self.row, self.errors_before, self.errors_after, self.cycles, self.hc_first, self.tests, self.invalid]
+        mem = Memory(sum(len(field) for field in fields), depth)
+        write_port = mem.get_port(write_capable=True)
+        read_port = mem.get_port()
+        self.specials += mem, write_port, read_port
+
+        bus_word = Signal(SWEEP_LOG_WORD_BITS)
+        bus_words = []
+        start = 0
+        for field in fields:
+            bus_words.append(read_port.dat_r[start:start + len(field)])
+            start += len(field)
+
+        """
+        Comb block
+        """
+
+        self.comb += [
+            write_port.adr.eq(self.steps_csr.status),
+            write_port.we.eq(self.we & (self.steps_csr.status < depth)),
+            write_port.dat_w.eq(Cat(*fields)),
+
+            read_port.adr.eq(bus.adr[SWEEP_LOG_WORD_BITS:]),
+            bus.dat_r.eq(Array(bus_words + [0] * (SWEEP_LOG_ENTRY_WORDS - SWEEP_LOG_WORDS))[bus_word]),
+        ]
+
+        """
+        Sync block
+        """
+
+        self.sync += [
+            If(self.clear,
+                self.steps_csr.status.eq(0),
+            ).Elif(self.we,
+                self.steps_csr.status.eq(self.steps_csr.status + 1),
             ),
-        )
 
-        rh_fsm.act("RH_ATTACK_7",
-            self.feedback_state_csr.status.eq(RH_ROWHAMMER_STATE | RH_SEVENTH_STATE),
-            rw_test_port.cmd.valid.eq(1),
-            rw_test_port.cmd.we.eq(0),
-            rw_test_port.rdata.ready.eq(1),
-            If(rw_test_port.cmd.ready,
-                If((rowhammer_attack_cmd_timer_sig - 1) == 0,
-                    If((rowhammer_state_counter - 1) == 0,
-                       If((rowhammer_two_states_counter_sig - 1) == 0,
-                            If((rowhammer_state_cycle_counter - 1) == 0,
-                                NextState("RH_RESET_SETTINGS"),
-                            ).Else(
-                                NextValue(rowhammer_state_cycle_counter, rowhammer_state_cycle_counter - 1),
-                                NextValue(rowhammer_state_counter, num_addrs_attack_sig),
-                                NextValue(rowhammer_attack_cmd_timer_sig, addr_1_freq_sig),
-                                NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_1_storage_sig),
-                                NextValue(self.address_csr.status, addr_1_val_sig),
-                                NextState("RH_ATTACK_1")
-                            ),
-                       ).Else(
-                           NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_sig - 1),
-                           NextValue(rowhammer_attack_cmd_timer_sig, addr_7_freq_sig),
-                           NextState("RH_ATTACK_7"),
-                       )
-                    ).Else(
-                        NextValue(rowhammer_state_counter, rowhammer_state_counter - 1),
-                        NextValue(rowhammer_attack_cmd_timer_sig, addr_8_freq_sig),
-                        NextValue(self.address_csr.status, addr_8_val_sig),
-                        NextState("RH_ATTACK_8"),
-                    ),
+            # Wishbone, read only, data comes out one cycle after the entry was presented
+            bus.ack.eq(0),
+            If(bus.cyc & bus.stb & ~bus.ack,
+                bus.ack.eq(1),
+                bus_word.eq(bus.adr[0:SWEEP_LOG_WORD_BITS]),
+            )
+        ]
+
+
+"""
+Error record window
+"""
+
+class Error_Record_Window(Module):
+    """
+    Head record of the error FIFO on a wishbone bus, ERROR_RECORD_WORDS
+    32-bit words (address, flipped bits of the lane, bits of the lane
+    flipped from 0 to 1, then the lane, popcount, after the attack, last
+    and valid flags). Reading the flags word pops the record, so records
+    come out one after another from the same words, and the window repeats
+    them ERROR_RECORD_WINDOW_RECORDS times so the host gets many in one
+    bulk transfer of increasing addresses. The flags word of an empty FIFO
+    reads 0 (not valid) and pops nothing. Reads wait while the FIFO output
+    refills after a pop.
+    """
+
+    def __init__(self, addr : Signal, xor : Signal, up : Signal, lane : Signal, popcount : Signal, after_rh : Signal, last : Signal, valid : Signal, refilling : Signal):
+
+        self.size = ERROR_RECORD_WINDOW_RECORDS * ERROR_RECORD_WORDS * (WIDTH_32_BITS // WIDTH_8_BITS)  # Bytes on the bus
+        self.bus = bus = wishbone.Interface()
+        self.pop = Signal(ONE_BIT_WIDE)
+
+        """
+        Signals
+        """
+
+        flags = Signal(WIDTH_32_BITS)
+        word = Signal(WIDTH_32_BITS)
+        popped = Signal(ONE_BIT_WIDE)  # Lanes of the record popped last cycle still being updated
+        read = Signal(ONE_BIT_WIDE)
+
+        """
+        Comb block
+        """
+
+        self.comb += [
+            flags.eq(Mux(valid, lane | (popcount << ERROR_RECORD_POPCOUNT_SHIFT) | (after_rh << ERROR_RECORD_AFTER_RH_BIT) | (last << ERROR_RECORD_LAST_BIT) | (1 << ERROR_RECORD_VALID_BIT), 0)),
+            word.eq(Array([addr, xor, up, flags])[bus.adr[:ERROR_RECORD_WORD_BITS]]),
+            read.eq(bus.cyc & bus.stb & ~bus.ack & ~bus.we & ~popped & ~refilling),
+            self.pop.eq(read & valid & (bus.adr[:ERROR_RECORD_WORD_BITS] == (ERROR_RECORD_WORDS - 1))),
+        ]
+
+        """
+        Sync block
+        """
+
+        self.sync += [
+            popped.eq(self.pop),
+
+            # Wishbone, writes are acked and dropped
+            bus.ack.eq(0),
+            If(read,
+                bus.ack.eq(1),
+                bus.dat_r.eq(word),
+            ).Elif(bus.cyc & bus.stb & ~bus.ack & bus.we,
+                bus.ack.eq(1),
+            )
+        ]
+
+
+"""
+State trace
+"""
+
+class State_Trace(Module, AutoCSR):
+    """
+    Ring buffer in a BRAM of the state changes of the row hammer FSM, one
+    entry of STATE_TRACE_ENTRY_WORDS 32-bit words per change (cycle it
+    happened at, low then high word, feedback state entered and address_csr
+    at that cycle), read through a wishbone bus after the run. A change is
+    seen as a new value of state, every state has its own feedback value,
+    the state the FSM resets to (reset_state) is not a change. Once full,
+    the oldest entries are written over, entry transitions_csr % depth_csr
+    is the oldest one.
+    """
+
+    def __init__(self, state : Signal, addr : Signal, timestamp : Signal, clear : Signal, depth=DEFAULT_STATE_TRACE_DEPTH, reset_state=RH_IDLE_STATE):
+
+        self.depth = depth
+        self.size = depth * STATE_TRACE_ENTRY_WORDS * (WIDTH_32_BITS // WIDTH_8_BITS)  # Bytes on the bus
+        self.bus = bus = wishbone.Interface()
+
+        """
+        CSR Registers
+        """
+
+        self.transitions_csr = CSRStatus(WIDTH_32_BITS, description="State changes seen since the test started (only the last depth_csr are kept)")
+        self.depth_csr = CSRStatus(WIDTH_32_BITS, reset=depth, description="Number of state changes the trace holds")
+
+        """
+        Signals
+        """
+
+        mem = Memory(WIDTH_32_BITS * STATE_TRACE_WORDS, depth)
+        write_port = mem.get_port(write_capable=True)
+        read_port = mem.get_port()
+        self.specials += mem, write_port, read_port
+
+        self.changed = changed = Signal(ONE_BIT_WIDE)  # High in the first cycle of a new state
+        last_state = Signal(len(state), reset=reset_state)
+        write_adr = Signal(max=max(depth, 2))
+        bus_word = Signal(STATE_TRACE_WORD_BITS)
+
+        """
+        Comb block
+        """
+
+        self.comb += [
+            changed.eq(state != last_state),
+
+            write_port.adr.eq(write_adr),
+            write_port.we.eq(changed),
+            write_port.dat_w.eq(Cat(timestamp[:WIDTH_32_BITS], timestamp[WIDTH_32_BITS:2 * WIDTH_32_BITS], state, Constant(0, WIDTH_32_BITS - len(state)), addr)),
+
+            read_port.adr.eq(bus.adr[STATE_TRACE_WORD_BITS:]),
+            bus.dat_r.eq(Array([read_port.dat_r[WIDTH_32_BITS * i:WIDTH_32_BITS * (i + 1)] for i in range(STATE_TRACE_WORDS)] +
+                               [0] * (STATE_TRACE_ENTRY_WORDS - STATE_TRACE_WORDS))[bus_word]),
+        ]
+
+        """
+        Sync block
+        """
+
+        self.sync += [
+            last_state.eq(state),
+
+            If(clear,
+                self.transitions_csr.status.eq(0),
+                write_adr.eq(0),
+            ).Elif(changed,
+                self.transitions_csr.status.eq(self.transitions_csr.status + 1),
+                If(write_adr == (depth - 1),
+                    write_adr.eq(0),
                 ).Else(
-                    NextValue(rowhammer_attack_cmd_timer_sig, rowhammer_attack_cmd_timer_sig - 1)   
+                    write_adr.eq(write_adr + 1),
                 ),
             ),
-            If(rw_test_port.cmd.ready & ~rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter + 1),   
-            ).Elif(~rw_test_port.cmd.ready & rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter - 1),         
-            ),
-        )
 
-        rh_fsm.act("RH_ATTACK_8",
-            self.feedback_state_csr.status.eq(RH_ROWHAMMER_STATE | RH_EIGHTH_STATE),
-            rw_test_port.cmd.valid.eq(1),
-            rw_test_port.cmd.we.eq(0),
-            rw_test_port.rdata.ready.eq(1),
-            If(rw_test_port.cmd.ready,
-                If((rowhammer_attack_cmd_timer_sig - 1) == 0,
-                    If((rowhammer_state_counter - 1) == 0,
-                        If((rowhammer_two_states_counter_sig - 1) == 0,
-                            If((rowhammer_state_cycle_counter - 1) == 0,
-                                NextState("RH_RESET_SETTINGS"),
-                            ).Else(
-                                NextValue(rowhammer_state_cycle_counter, rowhammer_state_cycle_counter - 1),
-                                NextValue(rowhammer_state_counter, num_addrs_attack_sig),
-                                NextValue(rowhammer_attack_cmd_timer_sig, addr_1_freq_sig),
-                                NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_1_storage_sig),
-                                NextValue(self.address_csr.status, addr_1_val_sig),
-                                NextState("RH_ATTACK_1")
-                            ),
-                        ).Else(
-                            NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_sig - 1),
-                            NextValue(rowhammer_state_counter, rowhammer_state_counter + 1),
-                            NextValue(rowhammer_attack_cmd_timer_sig, addr_7_freq_sig),
-                            NextValue(self.address_csr.status, addr_7_val_sig),
-                            NextState("RH_ATTACK_7"),
-                        )
-                    ).Else(
+            # Wishbone, read only, data comes out one cycle after the entry was presented
+            bus.ack.eq(0),
+            If(bus.cyc & bus.stb & ~bus.ack,
+                bus.ack.eq(1),
+                bus_word.eq(bus.adr[0:STATE_TRACE_WORD_BITS]),
+            )
+        ]
 
-                        If((rowhammer_two_states_counter_sig - 1) == 0,
-                            NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_5_storage_sig),
-                            NextValue(rowhammer_state_counter, rowhammer_state_counter - 1),
-                            NextValue(rowhammer_attack_cmd_timer_sig, addr_9_freq_sig),
-                            NextValue(self.address_csr.status, addr_9_val_sig),
-                            NextState("RH_ATTACK_9"),
-                        ).Else(
-                            NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_sig - 1),
-                            NextValue(rowhammer_state_counter, rowhammer_state_counter + 1),
-                            NextValue(rowhammer_attack_cmd_timer_sig, addr_7_freq_sig),
-                            NextValue(self.address_csr.status, addr_7_val_sig),
-                            NextState("RH_ATTACK_7")
-                        ),
-                    ),
+
+"""
+Data pattern
+"""
+
+def prbs_taps(num_bits, skip=PRBS_SKIP_BITS):
+    """
+    Bits of the LFSR sequence after skip bits, each given as the mask of the
+    starting state bits XORed together to make it.
+    """
+    state = [1 << i for i in range(PRBS_WIDTH)]
+    taps = []
+    for step in range(skip + num_bits):
+        if step >= skip:
+            taps.append(state[PRBS_WIDTH - 1])
+        state = [reduce(xor, [state[tap - 1] for tap in PRBS_TAPS])] + state[:-1]
+    return taps
+
+
+class Aggressor_Rows(Module):
+    """
+    Copy of the bank and row of the first num_rows entries of the aggressor
+    table in registers, so an address can be checked against all of them in
+    one cycle. The table is read one entry per cycle while enable is high
+    (its walker port is free), so the copy follows the table as it is set.
+    """
+
+    def __init__(self, address_width, col_bits, num_aggressors, num_rows=NUM_ROLE_AGGRESSORS):
+
+        self.num_rows = num_rows = min(num_rows, num_aggressors)
+        self.col_bits = col_bits
+
+        self.enable = Signal(ONE_BIT_WIDE)
+        self.num_entries = Signal(WIDTH_32_BITS)
+
+        # Aggressor table walker port, data comes out one cycle after the index
+        self.table_adr = Signal(max=num_aggressors)
+        self.table_addr = Signal(address_width)
+
+        # Bank and row of every entry copied
+        self.rows = [Signal(address_width - col_bits) for _ in range(num_rows)]
+        self.valid = [Signal(ONE_BIT_WIDE) for _ in range(num_rows)]
+
+        """
+        Signals
+        """
+
+        idx = Signal(max=num_rows)
+        read_idx = Signal(max=num_rows)
+        read_valid = Signal(ONE_BIT_WIDE)
+
+        """
+        Comb block
+        """
+
+        self.comb += self.table_adr.eq(idx)
+        for i in range(num_rows):
+            self.comb += self.valid[i].eq(i < self.num_entries)
+
+        """
+        Sync block
+        """
+
+        self.sync += [
+            read_valid.eq(self.enable),
+            read_idx.eq(idx),
+            If(self.enable,
+                If(idx == (num_rows - 1),
+                    idx.eq(0),
                 ).Else(
-                    NextValue(rowhammer_attack_cmd_timer_sig, rowhammer_attack_cmd_timer_sig - 1)   
-                ),
-            ),
-            If(rw_test_port.cmd.ready & ~rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter + 1),   
-            ).Elif(~rw_test_port.cmd.ready & rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter - 1),         
+                    idx.eq(idx + 1),
+                )
             ),
-        )
+            If(read_valid,
+                Case(read_idx, {i: self.rows[i].eq(self.table_addr[col_bits:]) for i in range(num_rows)}),
+            )
+        ]
 
-        rh_fsm.act("RH_ATTACK_9",
-            self.feedback_state_csr.status.eq(RH_ROWHAMMER_STATE | RH_NINTH_STATE),
-            rw_test_port.cmd.valid.eq(1),
-            rw_test_port.cmd.we.eq(0),
-            rw_test_port.rdata.ready.eq(1),
-            If(rw_test_port.cmd.ready,
-                If((rowhammer_attack_cmd_timer_sig - 1) == 0,
-                    If((rowhammer_state_counter - 1) == 0,
-                        If((rowhammer_two_states_counter_sig - 1) == 0,
-                            If((rowhammer_state_cycle_counter - 1) == 0,
-                                NextState("RH_RESET_SETTINGS"),
-                            ).Else(
-                                NextValue(rowhammer_state_cycle_counter, rowhammer_state_cycle_counter - 1),
-                                NextValue(rowhammer_state_counter, num_addrs_attack_sig),
-                                NextValue(rowhammer_attack_cmd_timer_sig, addr_1_freq_sig),
-                                NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_1_storage_sig),
-                                NextValue(self.address_csr.status, addr_1_val_sig),
-                                NextState("RH_ATTACK_1")
-                            ),
-                        ).Else(
-                            NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_sig - 1),
-                            NextValue(rowhammer_attack_cmd_timer_sig, addr_9_freq_sig),
-                            NextState("RH_ATTACK_9"),
-                        )
-                    ).Else(
-                        NextValue(rowhammer_state_counter, rowhammer_state_counter - 1),
-                        NextValue(rowhammer_attack_cmd_timer_sig, addr_10_freq_sig),
-                        NextValue(self.address_csr.status, addr_10_val_sig),
-                        NextState("RH_ATTACK_10"),
+    def is_aggressor(self, addr):
+        """
+        High when addr is in the bank and row of one of the entries copied.
+        """
+        return reduce(or_, [self.valid[i] & (self.rows[i] == addr[self.col_bits:]) for i in range(self.num_rows)])
+
+
+class Data_Pattern(Module):
+    """
+    Data word written to, and expected back from, addr. Depending on mode,
+    the 32-bit patterns replicated over the word are given out per row
+    parity, per row role (aggressor rows of aggressor_rows get data_1, the
+    others data_2) or as row stripes, column stripes or a checkerboard made
+    from data_1. With prbs, the word is made of the bits of a 32-bit LFSR
+    instead, so random data needs no storage. The LFSR starts from the
+    address added to the seed, then mixed by rounds of XOR with itself
+    rotated and add of the seed rotated. The adds carry, so the data of two
+    addresses differ by something that changes with the seed too (a plain
+    XOR of the seed would cancel out between them). The fill and the read
+    check each have one, fed from their own address, so the checker
+    regenerates exactly what the fill wrote. The LFSR steps are a XOR
+    network worked out at build time, the taps mix every state bit into
+    about half of the data bits.
+    """
+
+    def __init__(self, addr : Signal, data_1 : Signal, data_2 : Signal, double_pattern : Signal, prbs : Signal, seed : Signal, mode : Signal, aggressor_rows : Aggressor_Rows, bank_bits, col_bits):
+
+        data_width = len(data_1)
+
+        self.data = Signal(data_width)
+
+        """
+        Signals
+        """
+
+        odd_row = Signal(ONE_BIT_WIDE)
+        aggressor_row = Signal(ONE_BIT_WIDE)
+        column_stripe = Signal(data_width)
+        prbs_fold = Signal(PRBS_WIDTH)
+        prbs_mix = [Signal(PRBS_WIDTH) for _ in range(len(PRBS_MIX_ROUNDS) + 1)]
+        prbs_state = prbs_mix[-1]
+        prbs_data = Signal(data_width)
+
+        """
+        Comb block
+        """
+
+        # Addresses wider than the PRBS state are folded into it
+        self.comb += prbs_fold.eq(reduce(xor, [addr[i:i + PRBS_WIDTH] for i in range(0, len(addr), PRBS_WIDTH)]))
+
+        # Seed mixed in by adds (mod 2^32), so it does not cancel out between addresses
+        self.comb += prbs_mix[0].eq((prbs_fold + seed)[:PRBS_WIDTH])
+        for i, (state_rotate, seed_rotate) in enumerate(PRBS_MIX_ROUNDS):
+            state_rotated = Cat(prbs_mix[i][PRBS_WIDTH - state_rotate:], prbs_mix[i][:PRBS_WIDTH - state_rotate])
+            seed_rotated = Cat(seed[PRBS_WIDTH - seed_rotate:], seed[:PRBS_WIDTH - seed_rotate])
+            self.comb += prbs_mix[i + 1].eq(((prbs_mix[i] ^ state_rotated) + seed_rotated)[:PRBS_WIDTH])
+
+        for i, taps in enumerate(prbs_taps(data_width)):
+            self.comb += prbs_data[i].eq(reduce(xor, [prbs_state[j] for j in range(PRBS_WIDTH) if (taps >> j) & 1]))
+
+        self.comb += [
+            odd_row.eq(addr[bank_bits + col_bits]),
+            aggressor_row.eq(aggressor_rows.is_aggressor(addr)),
+            column_stripe.eq(data_1 ^ Replicate(Constant(COLUMN_STRIPE_BITS, TWO_BITS_WIDE), data_width // TWO_BITS_WIDE)),
+
+            If(prbs,
+                self.data.eq(prbs_data),
+            ).Elif(mode == PATTERN_ROLE,
+                self.data.eq(Mux(aggressor_row, data_1, data_2)),
+            ).Elif(mode == PATTERN_ROW_STRIPE,
+                self.data.eq(Mux(odd_row, ~data_1, data_1)),
+            ).Elif(mode == PATTERN_COLUMN_STRIPE,
+                self.data.eq(column_stripe),
+            ).Elif(mode == PATTERN_CHECKERBOARD,
+                self.data.eq(Mux(odd_row, ~column_stripe, column_stripe)),
+            ).Elif(double_pattern & odd_row,
+                self.data.eq(data_2),
+            ).Else(
+                self.data.eq(data_1),
+            )
+        ]
+
+
+"""
+Fill and read check addresses
+"""
+
+class Fill_Check_Addresses(Module):
+    """
+    Addresses written by the fill pass and read by the read check passes.
+    Depending on mode, the passes cover the whole DRAM, the window from
+    window_start to window_end, or the rows within neighborhood_rows of every
+    aggressor in the table (whole rows, all banks). Neighborhoods that
+    overlap or touch are merged wherever their entries are in the table, and
+    the ranges are given out from the lowest row up, so no row is filled or
+    checked twice. Each range takes a few passes over the table, one entry a
+    cycle: one for its first row, then until no entry extends it. The
+    ranges are given out twice, once for the commands and once,
+    through a small FIFO, for the data (write data or read data), which comes
+    back in the same order but later. A pass is dropped with abort.
+    """
+
+    def __init__(self, address_width, bank_bits, col_bits, num_aggressors):
+
+        row_shift = bank_bits + col_bits
+        row_width = address_width - row_shift
+        max_address = (2 ** address_width) - 1
+        max_row = (2 ** row_width) - 1
+
+        # Settings, start is a one cycle pulse, abort drops the ranges left
+        self.start = Signal(ONE_BIT_WIDE)
+        self.abort = Signal(ONE_BIT_WIDE)
+        self.mode = Signal(TWO_BITS_WIDE)
+        self.window_start = Signal(address_width)
+        self.window_end = Signal(address_width)
+        self.neighborhood_rows = Signal(WIDTH_32_BITS)
+        self.num_entries = Signal(WIDTH_32_BITS)
+
+        # Aggressor table walker port, data comes out one cycle after the index
+        self.table_adr = Signal(max=num_aggressors)
+        self.table_addr = Signal(address_width)
+
+        # Command side, cmd_ready moves on to the next address
+        self.cmd_valid = Signal(ONE_BIT_WIDE)
+        self.cmd_ready = Signal(ONE_BIT_WIDE)
+        self.cmd_addr = Signal(address_width)
+        self.cmd_done = Signal(ONE_BIT_WIDE)
+
+        # Data side, data_ready moves on to the next address
+        self.data_valid = Signal(ONE_BIT_WIDE)
+        self.data_ready = Signal(ONE_BIT_WIDE)
+        self.data_addr = Signal(address_width)
+        self.done = Signal(ONE_BIT_WIDE)
+
+        """
+        Signals
+        """
+
+        # Range handed from the range FSM to the command side
+        range_valid = Signal(ONE_BIT_WIDE)
+        range_ready = Signal(ONE_BIT_WIDE)
+        range_start = Signal(address_width)
+        range_end = Signal(address_width)
+        range_final = Signal(ONE_BIT_WIDE)  # No range after this one
+
+        # Neighborhood of the table entry read, and the merged one not given out yet
+        entry_idx = Signal(max=num_aggressors)
+        entry_row = Signal(row_width)
+        entry_lo = Signal(row_width)
+        entry_hi_sum = Signal(row_width + WIDTH_32_BITS + ONE_BIT_WIDE)
+        entry_hi = Signal(row_width)
+        entry_last = Signal(ONE_BIT_WIDE)
+        entry_first = Signal(row_width)  # First row of the neighborhood not given out yet
+        entry_left = Signal(ONE_BIT_WIDE)  # Part of the neighborhood not given out yet
+        pending_lo = Signal(row_width)
+        pending_hi = Signal(row_width)
+
+        # Passes over the table, an entry index a cycle, its row comes out the next one
+        cursor = Signal(row_width + ONE_BIT_WIDE)  # Rows below are given out
+        scan_issued = Signal(ONE_BIT_WIDE)
+        scan_valid = Signal(ONE_BIT_WIDE)
+        scan_last = Signal(ONE_BIT_WIDE)
+        extending = Signal(ONE_BIT_WIDE)  # Finding the last row of the range, else its first row
+        found = Signal(ONE_BIT_WIDE)
+        changed = Signal(ONE_BIT_WIDE)
+
+        cmd_busy = Signal(ONE_BIT_WIDE)
+        cmd_end = Signal(address_width)
+        cmd_last = Signal(ONE_BIT_WIDE)
+
+        data_busy = Signal(ONE_BIT_WIDE)
+        data_end = Signal(address_width)
+        data_last = Signal(ONE_BIT_WIDE)
+
+        range_fifo = ResetInserter()(SyncFIFO(2 * address_width, FILL_CHECK_RANGE_FIFO_DEPTH))
+        self.submodules.range_fifo = range_fifo
+
+        """
+        Range FSM
+        """
+
+        range_fsm = ResetInserter()(FSM(reset_state="RANGE_IDLE"))
+        self.submodules.range_fsm = range_fsm
+
+        range_fsm.act("RANGE_IDLE",
+            If(self.start,
+                If(self.mode == FILL_CHECK_WINDOW,
+                    NextValue(range_start, self.window_start),
+                    NextValue(range_end, self.window_end),
+                    NextValue(range_final, 1),
+                    # An empty window has nothing to fill or check
+                    If(self.window_start <= self.window_end,
+                        NextState("RANGE_GIVE"),
+                    ),
+                ).Elif(self.mode == FILL_CHECK_NEIGHBORHOOD,
+                    NextValue(cursor, 0),
+                    NextValue(entry_idx, 0),
+                    NextValue(scan_issued, 0),
+                    NextValue(scan_valid, 0),
+                    NextValue(extending, 0),
+                    NextValue(found, 0),
+                    NextValue(changed, 0),
+                    If(self.num_entries != 0,
+                        NextState("RANGE_SCAN"),
                     ),
                 ).Else(
-                    NextValue(rowhammer_attack_cmd_timer_sig, rowhammer_attack_cmd_timer_sig - 1)   
+                    NextValue(range_start, 0),
+                    NextValue(range_end, max_address),
+                    NextValue(range_final, 1),
+                    NextState("RANGE_GIVE"),
+                )
+            )
+        )
+
+        # One pass over the table. The first one keeps the neighborhood with
+        # the lowest row not given out, the next ones extend it with every
+        # neighborhood that overlaps or touches it.
+        range_fsm.act("RANGE_SCAN",
+            self.table_adr.eq(entry_idx),
+            If(~scan_issued,
+                NextValue(scan_valid, 1),
+                NextValue(scan_last, entry_last),
+                If(entry_last,
+                    NextValue(scan_issued, 1),
+                ).Else(
+                    NextValue(entry_idx, entry_idx + 1),
                 ),
+            ).Else(
+                NextValue(scan_valid, 0),
             ),
-            If(rw_test_port.cmd.ready & ~rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter + 1),   
-            ).Elif(~rw_test_port.cmd.ready & rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter - 1),         
+            If(scan_valid & entry_left,
+                If(~extending,
+                    If(~found | (entry_first < pending_lo),
+                        NextValue(pending_lo, entry_first),
+                        NextValue(pending_hi, entry_hi),
+                        NextValue(found, 1),
+                    ),
+                ).Elif((entry_lo <= (pending_hi + 1)) & (entry_hi > pending_hi),
+                    NextValue(pending_hi, entry_hi),
+                    NextValue(changed, 1),
+                ),
             ),
+            If(scan_valid & scan_last,
+                NextState("RANGE_SCAN_END"),
+            )
         )
-        
-        rh_fsm.act("RH_ATTACK_10",
-            self.feedback_state_csr.status.eq(RH_ROWHAMMER_STATE | RH_TENTH_STATE),
-            rw_test_port.cmd.valid.eq(1),
-            rw_test_port.cmd.we.eq(0),
-            rw_test_port.rdata.ready.eq(1),
-            If(rw_test_port.cmd.ready,
-                If((rowhammer_attack_cmd_timer_sig - 1) == 0,
-                    If((rowhammer_state_counter - 1) == 0,
-                        If((rowhammer_two_states_counter_sig - 1) == 0,
-                            If((rowhammer_state_cycle_counter - 1) == 0,
-                                NextState("RH_RESET_SETTINGS"),
-                            ).Else(
-                                NextValue(rowhammer_state_cycle_counter, rowhammer_state_cycle_counter - 1),
-                                NextValue(rowhammer_state_counter, num_addrs_attack_sig),
-                                NextValue(rowhammer_attack_cmd_timer_sig, addr_1_freq_sig),
-                                NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_1_storage_sig),
-                                NextValue(self.address_csr.status, addr_1_val_sig),
-                                NextState("RH_ATTACK_1")
-                            ),
-                        ).Else(
-                            NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_sig - 1),
-                            NextValue(rowhammer_state_counter, rowhammer_state_counter + 1),
-                            NextValue(rowhammer_attack_cmd_timer_sig, addr_9_freq_sig),
-                            NextValue(self.address_csr.status, addr_9_val_sig),
-                            NextState("RH_ATTACK_9"),
-                        )
-                    ).Else(
-                        If((rowhammer_two_states_counter_sig - 1) == 0,
-                            NextValue(rowhammer_state_counter, rowhammer_state_counter - 1),
-                            NextValue(self.address_csr.status, addr_11_val_sig),
-                            NextState("RH_ATTACK_11"),   
-                        ).Else(
-                            NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_sig - 1),
-                            NextValue(rowhammer_state_counter, rowhammer_state_counter + 1),
-                            NextValue(rowhammer_attack_cmd_timer_sig, addr_9_freq_sig),
-                            NextValue(self.address_csr.status, addr_9_val_sig),
-                            NextState("RH_ATTACK_9"),
-                        )
-                    ),
+
+        # Pass done, scan again, give out the range, or stop when nothing is left
+        range_fsm.act("RANGE_SCAN_END",
+            NextValue(entry_idx, 0),
+            NextValue(scan_issued, 0),
+            NextValue(changed, 0),
+            If(~extending,
+                NextValue(extending, 1),
+                If(found,
+                    NextState("RANGE_SCAN"),
                 ).Else(
-                    NextValue(rowhammer_attack_cmd_timer_sig, rowhammer_attack_cmd_timer_sig - 1)   
+                    NextState("RANGE_IDLE"),
                 ),
+            ).Elif(changed,
+                NextState("RANGE_SCAN"),
+            ).Else(
+                NextValue(range_start, Cat(Replicate(0, row_shift), pending_lo)),
+                NextValue(range_end, Cat(Replicate(1, row_shift), pending_hi)),
+                NextValue(range_final, pending_hi == max_row),
+                NextValue(cursor, pending_hi + 1),
+                NextValue(extending, 0),
+                NextValue(found, 0),
+                NextState("RANGE_GIVE"),
+            )
+        )
+
+        range_fsm.act("RANGE_GIVE",
+            range_valid.eq(1),
+            If(range_ready,
+                If(range_final,
+                    NextState("RANGE_IDLE"),
+                ).Else(
+                    NextState("RANGE_SCAN"),
+                )
+            )
+        )
+
+        """
+        Comb block
+        """
+
+        self.comb += [
+            entry_row.eq(self.table_addr[row_shift:]),
+            entry_lo.eq(Mux(entry_row > self.neighborhood_rows, entry_row - self.neighborhood_rows, 0)),
+            entry_hi_sum.eq(entry_row + self.neighborhood_rows),
+            entry_hi.eq(Mux(entry_hi_sum > max_row, max_row, entry_hi_sum)),
+            entry_last.eq(((entry_idx + 1) >= self.num_entries) | (entry_idx == (num_aggressors - 1))),
+            entry_left.eq(entry_hi >= cursor),
+            entry_first.eq(Mux(entry_lo > cursor, entry_lo, cursor)),
+
+            # A new range is taken once the last address of the current one is out
+            cmd_last.eq(self.cmd_addr == cmd_end),
+            range_ready.eq((~cmd_busy | (self.cmd_ready & cmd_last)) & range_fifo.writable),
+            range_fifo.we.eq(range_valid & range_ready),
+            range_fifo.din.eq(Cat(range_start, range_end)),
+            self.cmd_valid.eq(cmd_busy),
+            self.cmd_done.eq(range_fsm.ongoing("RANGE_IDLE") & ~cmd_busy),
+
+            data_last.eq(self.data_addr == data_end),
+            range_fifo.re.eq(~data_busy | (self.data_ready & data_last)),
+            self.data_valid.eq(data_busy),
+            self.done.eq(self.cmd_done & ~range_fifo.readable & ~data_busy),
+
+            range_fsm.reset.eq(self.abort),
+            range_fifo.reset.eq(self.abort),
+        ]
+
+        """
+        Sync block
+        """
+
+        self.sync += [
+            If(range_valid & range_ready,
+                cmd_busy.eq(1),
+                self.cmd_addr.eq(range_start),
+                cmd_end.eq(range_end),
+            ).Elif(self.cmd_ready & cmd_busy,
+                If(cmd_last,
+                    cmd_busy.eq(0),
+                ).Else(
+                    self.cmd_addr.eq(self.cmd_addr + 1),
+                )
             ),
-            If(rw_test_port.cmd.ready & ~rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter + 1),   
-            ).Elif(~rw_test_port.cmd.ready & rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter - 1),         
+
+            If(range_fifo.re & range_fifo.readable,
+                data_busy.eq(1),
+                Cat(self.data_addr, data_end).eq(range_fifo.dout),
+            ).Elif(self.data_ready & data_busy,
+                If(data_last,
+                    data_busy.eq(0),
+                ).Else(
+                    self.data_addr.eq(self.data_addr + 1),
+                )
             ),
-        )
 
-        rh_fsm.act("RH_ATTACK_11",
-            self.feedback_state_csr.status.eq(RH_ROWHAMMER_STATE | RH_ELEVENTH_STATE),
-            rw_test_port.cmd.valid.eq(1),
-            rw_test_port.cmd.we.eq(0),
-            rw_test_port.rdata.ready.eq(1),
-            If(rw_test_port.cmd.ready,
-                If((rowhammer_state_counter - 1) == 0,
-                    If((rowhammer_state_cycle_counter - 1) == 0,
-                        NextState("RH_RESET_SETTINGS"),
-                    ).Else(
-                        NextValue(rowhammer_state_cycle_counter, rowhammer_state_cycle_counter - 1),
-                        NextValue(rowhammer_state_counter, num_addrs_attack_sig),
-                        NextValue(rowhammer_attack_cmd_timer_sig, addr_1_freq_sig),
-                        NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_1_storage_sig),
-                        NextValue(self.address_csr.status, addr_1_val_sig),
-                        NextState("RH_ATTACK_1")
-                    ),
-                ).Else(
-                    NextValue(rowhammer_state_counter, rowhammer_state_counter - 1),
-                    NextValue(self.address_csr.status, addr_12_val_sig),
-                    NextState("RH_ATTACK_12"),
-                ),
-            ),
-            If(rw_test_port.cmd.ready & ~rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter + 1),   
-            ).Elif(~rw_test_port.cmd.ready & rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter - 1),         
-            ),
-        )
+            If(self.abort,
+                cmd_busy.eq(0),
+                data_busy.eq(0),
+            )
+        ]
+
+
+"""
+Fill engine
+"""
+
+class Fill_Engine(Module, AutoCSR):
+    """
+    Write the data pattern to the addresses of a fill pass, like the LiteDRAM
+    DMA writer: commands and write data are two separate streams, cmd.valid
+    stays high while there are addresses left and wdata.valid stays high
+    while writes wait for their data, so the port can take a write every
+    cycle. The write data is set from data_addr by the parent, and the cycles
+    and words of the last fill are kept to work out its bandwidth.
+    """
+
+    def __init__(self, address_width, data_width, bank_bits, col_bits, num_aggressors):
+
+        # Start is a one cycle pulse, done is high once every write has its data
+        self.start = Signal(ONE_BIT_WIDE)
+        self.done = Signal(ONE_BIT_WIDE)
+
+        # Port side
+        self.cmd_valid = Signal(ONE_BIT_WIDE)
+        self.cmd_ready = Signal(ONE_BIT_WIDE)
+        self.cmd_addr = Signal(address_width)
+        self.wdata_valid = Signal(ONE_BIT_WIDE)
+        self.wdata_ready = Signal(ONE_BIT_WIDE)
+        self.wdata_data = Signal(data_width)
+
+        # Address of the data written next
+        self.data_addr = Signal(address_width)
+
+        """
+        CSR Registers
+        """
+
+        self.cycles_csr = CSRStatus(WIDTH_64_BITS, description="Cycles taken by the last fill")
+        self.words_csr = CSRStatus(WIDTH_32_BITS, description="Data words written by the last fill")
+
+        """
+        Signals
+        """
+
+        busy = Signal(ONE_BIT_WIDE)
+
+        # Addresses of the fill, the settings are set by the parent
+        self.submodules.addrs = addrs = Fill_Check_Addresses(address_width, bank_bits, col_bits, num_aggressors)
+
+        """
+        Comb block
+        """
+
+        self.comb += [
+            addrs.start.eq(self.start),
+            self.done.eq(addrs.done),
+
+            # Commands
+            self.cmd_valid.eq(addrs.cmd_valid),
+            self.cmd_addr.eq(addrs.cmd_addr),
+            addrs.cmd_ready.eq(self.cmd_ready),
+
+            # Write data, only taken by the port for writes already sent
+            self.wdata_valid.eq(addrs.data_valid),
+            self.data_addr.eq(addrs.data_addr),
+            addrs.data_ready.eq(self.wdata_ready),
+        ]
+
+        """
+        Sync block
+        """
+
+        self.sync += [
+            If(self.start,
+                busy.eq(1),
+                self.cycles_csr.status.eq(0),
+                self.words_csr.status.eq(0),
+            ).Elif(busy,
+                If(addrs.done,
+                    busy.eq(0),
+                ).Else(
+                    self.cycles_csr.status.eq(self.cycles_csr.status + 1),
+                ),
+                If(self.wdata_valid & self.wdata_ready,
+                    self.words_csr.status.eq(self.words_csr.status + 1),
+                ),
+            )
+        ]
+
+
+"""
+Read check engine
+"""
+
+class Read_Check_Engine(Module, AutoCSR):
+    """
+    Read back the addresses of a read check pass and compare them with the
+    data pattern, like the LiteDRAM DMA reader: a command generator sends
+    reads on its own, the read data goes into a response FIFO and a
+    comparator stage pops it every cycle. The native port does not wait on
+    rdata.ready, so the command generator never has more reads in flight
+    than the response FIFO can hold. The expected data is set from data_addr
+    (the address of the FIFO head) by the parent, the result of the compare
+    comes out one cycle later. With stop_on_error, no reads are sent after
+    the first mismatch, the pass is done once the reads in flight are
+    compared. The cycles and words of the last pass are kept to work out its
+    bandwidth.
+    """
+
+    def __init__(self, address_width, data_width, bank_bits, col_bits, num_aggressors, fifo_depth=DEFAULT_READ_FIFO_DEPTH):
+
+        # Start is a one cycle pulse, done is high once every read has been compared
+        self.start = Signal(ONE_BIT_WIDE)
+        self.done = Signal(ONE_BIT_WIDE)
+        self.stop_on_error = Signal(ONE_BIT_WIDE)
+        self.stopped = Signal(ONE_BIT_WIDE)  # A mismatch stopped the pass
+
+        # Port side
+        self.cmd_valid = Signal(ONE_BIT_WIDE)
+        self.cmd_ready = Signal(ONE_BIT_WIDE)
+        self.cmd_addr = Signal(address_width)
+        self.rdata_valid = Signal(ONE_BIT_WIDE)
+        self.rdata_data = Signal(data_width)
+
+        # Address of the FIFO head and the data it should hold
+        self.data_addr = Signal(address_width)
+        self.expected = Signal(data_width)
+
+        # Comparator stage
+        self.valid = Signal(ONE_BIT_WIDE)
+        self.addr = Signal(address_width)
+        self.data = Signal(data_width)
+        self.xor_data = Signal(data_width)  # Flipped bits, data read XOR data written
+        self.error = Signal(ONE_BIT_WIDE)
+
+        """
+        CSR Registers
+        """
+
+        self.cycles_csr = CSRStatus(WIDTH_64_BITS, description="Cycles taken by the last read check")
+        self.words_csr = CSRStatus(WIDTH_32_BITS, description="Data words read by the last read check")
+
+        """
+        Signals
+        """
+
+        busy = Signal(ONE_BIT_WIDE)
+        cmd_fire = Signal(ONE_BIT_WIDE)
+        pop = Signal(ONE_BIT_WIDE)
+        in_flight = Signal(max=fifo_depth + 1)  # Reads sent, not popped from the response FIFO yet
+
+        # Addresses of the read check, the settings are set by the parent
+        self.submodules.addrs = addrs = Fill_Check_Addresses(address_width, bank_bits, col_bits, num_aggressors)
+
+        response_fifo = SyncFIFOBuffered(data_width, fifo_depth)
+        self.submodules.response_fifo = response_fifo
+
+        """
+        Comb block
+        """
+
+        self.comb += [
+            addrs.start.eq(self.start),
+            If(self.stopped,
+                self.done.eq((in_flight == 0) & ~self.valid),
+            ).Else(
+                self.done.eq(addrs.done & ~self.valid),
+            ),
+
+            # Addresses not read are dropped once the reads in flight are compared
+            addrs.abort.eq(self.stopped & self.done & ~self.start),
+
+            # Command generator
+            self.cmd_valid.eq(addrs.cmd_valid & (in_flight < fifo_depth) & ~self.stopped),
+            self.cmd_addr.eq(addrs.cmd_addr),
+            cmd_fire.eq(self.cmd_valid & self.cmd_ready),
+            addrs.cmd_ready.eq(cmd_fire),
+
+            # Response FIFO, never full as reads in flight are limited to its depth
+            response_fifo.din.eq(self.rdata_data),
+            response_fifo.we.eq(self.rdata_valid),
+
+            # The comparator takes the FIFO head every cycle
+            pop.eq(response_fifo.readable),
+            response_fifo.re.eq(pop),
+            self.data_addr.eq(addrs.data_addr),
+            addrs.data_ready.eq(pop),
+
+            self.error.eq(self.xor_data != 0),
+        ]
+
+        """
+        Sync block
+        """
+
+        self.sync += [
+            # Comparator stage
+            self.valid.eq(pop),
+            self.addr.eq(addrs.data_addr),
+            self.data.eq(response_fifo.dout),
+            self.xor_data.eq(Mux(pop, response_fifo.dout ^ self.expected, 0)),
+
+            If(cmd_fire & ~pop,
+                in_flight.eq(in_flight + 1),
+            ).Elif(~cmd_fire & pop,
+                in_flight.eq(in_flight - 1),
+            ),
+
+            If(self.start,
+                busy.eq(1),
+                self.cycles_csr.status.eq(0),
+                self.words_csr.status.eq(0),
+            ).Elif(busy,
+                If(self.done,
+                    busy.eq(0),
+                ).Else(
+                    self.cycles_csr.status.eq(self.cycles_csr.status + 1),
+                ),
+                If(pop,
+                    self.words_csr.status.eq(self.words_csr.status + 1),
+                ),
+            ),
+
+            If(self.start,
+                self.stopped.eq(0),
+            ).Elif(busy & self.stop_on_error & self.valid & self.error,
+                self.stopped.eq(1),
+            )
+        ]
+
+
+class Row_Hammer_Test(Module, AutoCSR):
+
+    def __init__(self, rw_test_port : LiteDRAMNativePort, sys_clk_freq : int, trefi : Signal, refresh_enable : Signal, auto_precharge_setting : Signal, bank_bits, col_bits, trefi_setting, num_aggressors=DEFAULT_AGGRESSOR_TABLE_DEPTH, error_fifo_depth=DEFAULT_ERROR_FIFO_DEPTH, row_histogram_depth=DEFAULT_ROW_HISTOGRAM_DEPTH, read_fifo_depth=DEFAULT_READ_FIFO_DEPTH, sweep_log_depth=DEFAULT_SWEEP_LOG_DEPTH, state_trace_depth=DEFAULT_STATE_TRACE_DEPTH):
+
+        self.rw_test_port = rw_test_port
+        self.trefi_setting = trefi_setting
+        self.bank_bits = bank_bits
+        self.col_bits = col_bits
+        self.controller_refresh_sig = refresh_enable
+
+        # Address width integers
+        PORT_COLS_AND_BANKS_PER_ROW_ADDR = 2 ** (bank_bits + col_bits) 
+
+        """
+        CSR Registers
+        """
+
+        # Shadow configuration bank. The settings below are shadow registers, written
+        # freely, and applied all at once by a write to config_commit_csr. The
+        # applied (live) value of every setting is in its *_live_csr register.
+        self.config_commit_csr = CSRStorage(ONE_BIT_WIDE, description="Write to apply all the shadow settings at once (waits until the test is idle)")
+        self.config_commit_pending_csr = CSRStatus(ONE_BIT_WIDE, description="High from a commit until the settings are applied, the test does not start meanwhile")
+
+        # Control the number of rows to attack, the rows themselves are set in the aggressor table on the bus
+        self.aggressor_count_csr = CSRStorage(WIDTH_32_BITS, description="The number of table entries to attack")
+        self.aggressor_table_depth_csr = CSRStatus(WIDTH_32_BITS, reset=num_aggressors, description="The number of rows the aggressor table can hold")
+
+        # Input data CSR registers
+        self.input_data_double_pattern_setting_csr = CSRStorage(ONE_BIT_WIDE, description="Use a double data pattern, 0 for disable")
+        self.input_data_prbs_setting_csr = CSRStorage(ONE_BIT_WIDE, description="Use PRBS data seeded from the address instead of the patterns, 0 for disable")
+        self.input_data_pattern_mode_csr = CSRStorage(WIDTH_8_BITS, description="Pattern per row (0: row parity, 1: aggressor/victim rows, 2: row stripe, 3: column stripe, 4: checkerboard)")
+        self.input_data_role_aggressors_csr = CSRStatus(WIDTH_8_BITS, reset=min(NUM_ROLE_AGGRESSORS, num_aggressors), description="Number of table entries known as aggressor rows by the data pattern")
+        self.input_data_role_overflow_csr = CSRStatus(ONE_BIT_WIDE, description="High when the aggressor/victim pattern is live with more table entries than input_data_role_aggressors_csr, the test does not start meanwhile")
+        self.input_data_prbs_seed_csr = CSRStorage(WIDTH_32_BITS, reset=1, description="Seed of the PRBS data, mixed with the address of every word")
+        self.input_data_pattern_1_csr = CSRStorage(WIDTH_32_BITS, description="First data pattern written to DRAM (Replicated/Concatenated to fill DRAM data width)")
+        self.input_data_pattern_2_csr = CSRStorage(WIDTH_32_BITS, description="Second data pattern written to DRAM (Replicated/Concatenated to fill DRAM data width)")
+        self.data_width_csr = CSRStatus(WIDTH_32_BITS, reset=rw_test_port.data_width, description="The width of the data for reference")
+        self.sys_clk_freq_csr = CSRStatus(WIDTH_32_BITS, reset=int(sys_clk_freq), description="Frequency of the clock counted in cycles, for bandwidths")
+
+        # Change refresh rate, or enable it
+        self.refresh_enable_csr = CSRStorage(ONE_BIT_WIDE, reset=1, description="Enable DRAM refresh for test")
+        self.refresh_rate_csr = CSRStorage(WIDTH_32_BITS, reset=trefi_setting, description="Choose refresh rate")
+
+        # Change auto refresh setting
+        self.auto_precharge_csr = CSRStorage(1, description="Enable or Disable auto csr refresh for row hammer test")
+
+        # Interleave the entries of a group, so the controller can overlap the ACTs of different banks
+        self.hammer_interleave_csr = CSRStorage(ONE_BIT_WIDE, description="Read the entries of every group in turn, one read each, each entry is read its hammer count times (0: hammer count reads in a row)")
+
+        # Send the attack straight on the DFI, bypassing the controller
+        self.dfi_hammer_enable_csr = CSRStorage(ONE_BIT_WIDE, description="Hammer through the DFI hammer path instead of the port, ACT/RD/PRE at the minimum DRAM timings (no effect without the path)")
+
+        # Address sig csr
+        self.address_csr = CSRStatus(rw_test_port.address_width, description="Control address while making it available to user")
+
+        # Part of the DRAM filled and checked
+        self.fill_check_mode_csr = CSRStorage(TWO_BITS_WIDE, description="Addresses filled and checked (0: whole DRAM, 1: address window, 2: rows around the aggressors)")
+        self.fill_check_window_start_csr = CSRStorage(rw_test_port.address_width, description="First address of the window filled and checked")
+        self.fill_check_window_end_csr = CSRStorage(rw_test_port.address_width, reset=(2 ** rw_test_port.address_width) - 1, description="Last address of the window filled and checked")
+        self.fill_check_neighborhood_rows_csr = CSRStorage(WIDTH_32_BITS, reset=1, description="Rows filled and checked on each side of every aggressor")
+
+        # Row sweep, the aggressor table is a template moved by a number of rows at every step
+        self.sweep_enable_csr = CSRStorage(ONE_BIT_WIDE, description="Sweep the aggressor table over the rows, one test (fill, check, attack, check) per step")
+        self.sweep_base_row_csr = CSRStorage(WIDTH_32_BITS, description="Rows the table is moved by in the first step")
+        self.sweep_stride_csr = CSRStorage(WIDTH_32_BITS, reset=1, description="Rows the table is moved by from one step to the next")
+        self.sweep_end_row_csr = CSRStorage(WIDTH_32_BITS, description="Last row the table can be moved by")
+        self.sweep_hammer_count_csr = CSRStorage(WIDTH_32_BITS, description="Hammer count of every table entry during a sweep, 0 keeps the counts of the table")
+        self.sweep_row_csr = CSRStatus(WIDTH_32_BITS, description="Rows the table is moved by in the step running")
+
+        # HC_first search, the fewest plays of the aggressor table that flip a bit, found per step
+        self.hc_search_mode_csr = CSRStorage(TWO_BITS_WIDE, description="HC_first search (0: off, 1: binary, 2: exponential then binary), replaces the cycle counter with the plays searched")
+        self.hc_search_min_csr = CSRStorage(WIDTH_32_BITS, reset=1, description="Fewest plays of the aggressor table the search tries")
+        self.hc_search_max_csr = CSRStorage(WIDTH_32_BITS, reset=1024, description="Most plays of the aggressor table the search tries")
+        self.hc_search_plays_csr = CSRStatus(WIDTH_32_BITS, description="Plays of the aggressor table in the test running")
+        self.hc_first_csr = CSRStatus(WIDTH_32_BITS, description="Fewest plays found to flip a bit in the step (0: no flip up to the max)")
+        self.hc_search_tests_csr = CSRStatus(WIDTH_32_BITS, description="Tests run by the search in the step")
+        self.hc_search_invalid_csr = CSRStatus(ONE_BIT_WIDE, description="The check before the attack of a test of the step found errors, the search of the step was stopped (HC_first 0)")
+        
+        # Rowhammer Tester FSM CSR registers
+        self.rowhammer_start_fsm_csr = CSRStorage(ONE_BIT_WIDE, description="Start the Rowhammer tester")
+        self.rowhammer_start_prev_fsm_csr = CSRStatus(ONE_BIT_WIDE, description="Keep track of previous value of start")
+        self.rowhammer_err_cnt_csr = CSRStatus(WIDTH_32_BITS, description="Count the total errors before/after rowhammer test")
+        # Useful for debugging if needed, replace with num_addrs_attack_sig signal
+        # self.rowhammer_state_counter_csr = CSRStorage(WIDTH_32_BITS, description="Store the number of addresses as an option (up to 9)")
+        self.rowhammer_state_cycle_counter_csr = CSRStorage(WIDTH_32_BITS, reset=1, description="Store the number of cycles as an option")
+
+        # # Read FSM CSR registers
+        # self.read_fsm_paused_csr = CSRStatus(ONE_BIT_WIDE, description="Goes high when finished a read cycle, must be acknowledged")
+        # self.read_fsm_ack_csr = CSRStorage(ONE_BIT_WIDE, description="Acknowledge that the read state machine has paused, can continue")
+
+        # Error FIFO, filled while reading/checking, drained by the CPU at any time.
+        # The oldest error is shown as one record per 32-bit lane with flipped bits.
+        self.error_fifo_level_csr = CSRStatus(WIDTH_32_BITS, description="Number of errors (words) waiting in the error FIFO")
+        self.error_fifo_addr_csr = CSRStatus(rw_test_port.address_width, description="Address of the oldest error in the error FIFO")
+        self.error_fifo_after_rh_csr = CSRStatus(ONE_BIT_WIDE, description="High if the oldest error was found after the rowhammer attack")
+        self.error_fifo_pop_csr = CSRStorage(ONE_BIT_WIDE, description="Write to move to the next error record (next lane with flips, or next error)")
+        self.error_record_lane_csr = CSRStatus(WIDTH_8_BITS, description="32-bit lane of the data word the error record is for")
+        self.error_record_xor_csr = CSRStatus(WIDTH_32_BITS, description="Flipped bits of the lane (data read XOR data written)")
+        self.error_record_up_csr = CSRStatus(WIDTH_32_BITS, description="Bits of the lane flipped from 0 to 1, the other flipped bits went from 1 to 0")
+        self.error_record_popcount_csr = CSRStatus(WIDTH_8_BITS, description="Number of bits flipped in the lane")
+        self.error_record_last_csr = CSRStatus(ONE_BIT_WIDE, description="High if this is the last record of the error")
+        self.error_fifo_overflow_csr = CSRStatus(WIDTH_32_BITS, description="Number of errors not kept as the error FIFO was full")
+        self.rowhammer_initial_err_cnt_csr = CSRStatus(WIDTH_32_BITS, description="Count the total errors before rowhammer test")
+
+        # CSR register for giving back feedback to user of where we are
+        self.feedback_state_csr = CSRStatus(WIDTH_16_BITS, description="Feedback of which state the fsm is in")
+
+        # Obtain address width, bank bits, column bits
+        self.address_width_csr = CSRStatus(WIDTH_8_BITS, reset=rw_test_port.address_width, description="Holds address width value")
+        self.bank_width_csr = CSRStatus(WIDTH_8_BITS, reset=bank_bits, description="Holds bank width value")
+        self.col_width_csr = CSRStatus(WIDTH_8_BITS, reset=col_bits, description="Holds column width value")
+
+        # Reader fsm guider signal, Guide for state machine: running reader before or after rh test
+        self.before_after_rh_csr = CSRStatus(ONE_BIT_WIDE, description="Controls return state after reader is finished")
+
+        """
+        Live configuration
+        """
+
+        # Applied in one cycle while the test is idle, so no test runs with half of a configuration
+        self.config_commit_sig = Signal(ONE_BIT_WIDE)
+
+        num_addrs_attack_sig = self.add_live_config(self.aggressor_count_csr)
+        input_data_pattern_1 = self.add_live_config(self.input_data_pattern_1_csr)
+        input_data_pattern_2 = self.add_live_config(self.input_data_pattern_2_csr)
+        input_data_double_pattern_setting = self.add_live_config(self.input_data_double_pattern_setting_csr)
+        input_data_prbs_setting = self.add_live_config(self.input_data_prbs_setting_csr)
+        input_data_prbs_seed = self.add_live_config(self.input_data_prbs_seed_csr)
+        input_data_pattern_mode = self.add_live_config(self.input_data_pattern_mode_csr)
+        rowhammer_state_cycle_storage_counter = self.add_live_config(self.rowhammer_state_cycle_counter_csr)
+        refresh_enable_setting = self.add_live_config(self.refresh_enable_csr)
+        refresh_rate_setting = self.add_live_config(self.refresh_rate_csr)
+        auto_precharge = self.add_live_config(self.auto_precharge_csr)
+        hammer_interleave = self.add_live_config(self.hammer_interleave_csr)
+        dfi_hammer_enable = self.add_live_config(self.dfi_hammer_enable_csr)
+        fill_check_mode = self.add_live_config(self.fill_check_mode_csr)
+        fill_check_window_start = self.add_live_config(self.fill_check_window_start_csr)
+        fill_check_window_end = self.add_live_config(self.fill_check_window_end_csr)
+        fill_check_neighborhood_rows = self.add_live_config(self.fill_check_neighborhood_rows_csr)
+        sweep_enable = self.add_live_config(self.sweep_enable_csr)
+        sweep_base_row = self.add_live_config(self.sweep_base_row_csr)
+        sweep_stride = self.add_live_config(self.sweep_stride_csr)
+        sweep_end_row = self.add_live_config(self.sweep_end_row_csr)
+        sweep_hammer_count = self.add_live_config(self.sweep_hammer_count_csr)
+        hc_search_mode = self.add_live_config(self.hc_search_mode_csr)
+        hc_search_min = self.add_live_config(self.hc_search_min_csr)
+        hc_search_max = self.add_live_config(self.hc_search_max_csr)
+
+        """
+        Signals
+        """
+
+        # Data sigs for switching pattern
+        data_sig_1 = Signal(rw_test_port.data_width)
+        data_sig_2 = Signal(rw_test_port.data_width)
+        error_xor_data = Signal(rw_test_port.data_width)
+        error_up_data = Signal(rw_test_port.data_width)
+
+        ###########################################################################
+        # Addrs and freq sigs
+        ###########################################################################
+
+        # Position of the attack in the aggressor table
+        self.aggressor_idx_sig = aggressor_idx_sig = Signal(max=num_aggressors)
+        aggressor_group_start_sig = Signal(max=num_aggressors)
+        aggressor_loop_sig = Signal(WIDTH_32_BITS)          # Loop count of the entry being hammered
+        aggressor_loop_counter_sig = Signal(WIDTH_32_BITS)  # Plays left for the current group, 0 until loaded
+
+        # Copies of the first entry of the table and of the current group, so
+        # jumping back does not have to wait on the table read port
+        aggressor_first_addr_sig = Signal(rw_test_port.address_width)
+        aggressor_first_freq_sig = Signal(WIDTH_32_BITS)
+        aggressor_first_loop_sig = Signal(WIDTH_32_BITS)
+        aggressor_group_addr_sig = Signal(rw_test_port.address_width)
+        aggressor_group_freq_sig = Signal(WIDTH_32_BITS)
+        aggressor_group_loop_sig = Signal(WIDTH_32_BITS)
+
+        # Decisions taken when the entry being hammered is done
+        aggressor_last_entry = Signal(ONE_BIT_WIDE)
+        aggressor_loop_left = Signal(WIDTH_32_BITS)
+        aggressor_repeat_group = Signal(ONE_BIT_WIDE)
+        aggressor_step = Signal(ONE_BIT_WIDE)        # The entry had its turn, read taken or skipped
+        aggressor_entry_done = Signal(ONE_BIT_WIDE)  # Move on from the entry after this turn
+        aggressor_group_end = Signal(ONE_BIT_WIDE)   # The entry closes a group, or the table
+
+        # Interleaved hammering, every entry of the group is read once per
+        # round, an entry whose hammer count is used up skips its turn
+        interleave_round = Signal(WIDTH_32_BITS)
+        interleave_more = Signal(ONE_BIT_WIDE)       # An entry of the round has reads left
+        interleave_read = Signal(ONE_BIT_WIDE)       # The entry reads in this round
+        interleave_left = Signal(ONE_BIT_WIDE)       # The entry reads in the next round
+        interleave_again = Signal(ONE_BIT_WIDE)
+
+        # Rowhammer attack timer, Keep track of frequencies of attacked addresses
+        self.rowhammer_attack_cmd_timer_sig = rowhammer_attack_cmd_timer_sig = Signal(WIDTH_32_BITS)
+
+        ###########################################################################
+
+        ###########################################################################
+        # Rowhammer FSM sigs
+        ###########################################################################
+
+        rowhammer_start_buf1_sig = Signal(ONE_BIT_WIDE)
+        rowhammer_start_buf2_sig = Signal(ONE_BIT_WIDE)
+        rowhammer_start_sig = Signal(ONE_BIT_WIDE)
+        self.rowhammer_state_cycle_counter = rowhammer_state_cycle_counter = Signal(WIDTH_32_BITS)
+        self.rowhammer_state_cycle_storage_counter = rowhammer_state_cycle_storage_counter
+        self.hammer_phase_start_sig = Signal(ONE_BIT_WIDE) # High in the cycle the hammer phase starts
+        self.hammer_phase_sig = Signal(ONE_BIT_WIDE)       # High while the hammer commands are sent and drained
+        self.test_start_sig = Signal(ONE_BIT_WIDE)         # High in the cycle the test starts
+        self.flip_found_sig = Signal(ONE_BIT_WIDE)         # High when flipped bits are found after the rowhammer attack
+        self.histogram_clear_sig = Signal(ONE_BIT_WIDE)    # High while the row histogram is cleared, no check after the attack meanwhile
+
+        # Reads of the attack, taken by the port or by the DFI hammer path
+        self.hammer_valid_sig = hammer_valid = Signal(ONE_BIT_WIDE)
+        hammer_ready = Signal(ONE_BIT_WIDE)
+
+        # DFI hammer path, driven by add_dfi_hammer
+        dfi_hammer = Signal(ONE_BIT_WIDE)
+        self.dfi_hammer_attack_sig = Signal(ONE_BIT_WIDE)  # High while the attack goes through the DFI hammer path
+        self.dfi_hammer_available_sig = Signal(ONE_BIT_WIDE)
+        self.dfi_hammer_ready_sig = Signal(ONE_BIT_WIDE)
+        self.dfi_hammer_busy_sig = Signal(ONE_BIT_WIDE)
+        self.rowhammer_port_wready_rvalid_counter = rowhammer_port_wready_rvalid_counter = Signal(WIDTH_32_BITS)  # Reads of the attack not answered yet
+
+        # Row sweep, steps of the aggressor table over the rows
+        sweep_next_row = Signal(WIDTH_32_BITS + 1)
+        sweep_last_step = Signal(ONE_BIT_WIDE)
+        sweep_step_cycles = Signal(WIDTH_32_BITS)
+        rows_copy_timer = Signal(max=NUM_ROLE_AGGRESSORS + 2)
+
+        # HC_first search, plays from hc_search_lo to hc_search_hi are left to try
+        hc_search_enable = Signal(ONE_BIT_WIDE)
+        hc_search_exp = Signal(ONE_BIT_WIDE)  # Doubling the plays till the first flip
+        hc_search_lo = Signal(WIDTH_32_BITS + 1)
+        hc_search_hi = Signal(WIDTH_32_BITS)
+        hc_search_mid = Signal(WIDTH_32_BITS + 1)
+        hc_search_double = Signal(WIDTH_32_BITS + 1)
+        hc_search_plays = self.hc_search_plays_csr.status
+
+        ###########################################################################
+
+        """
+        Aggressor table
+        """
+
+        # Rows to attack can be given as (bank, row, column) or relative rows
+        address_map = Address_Map(rw_test_port.address_width, bank_bits, col_bits)
+        self.submodules.address_map = address_map
+
+        aggressor_table = Aggressor_Table(rw_test_port.address_width, num_aggressors, address_map)
+        self.submodules.aggressor_table = aggressor_table
+
+        # Entries of the table moved by the rows of the sweep step (0 outside of a sweep),
+        # the hammer count of every entry can be changed for the sweep
+        aggressor_addr_sig = Signal(rw_test_port.address_width)
+        aggressor_freq_sig = Signal(WIDTH_32_BITS)
+
+        self.comb += [
+            aggressor_addr_sig.eq(aggressor_table.addr + (self.sweep_row_csr.status << (bank_bits + col_bits))),
+            aggressor_freq_sig.eq(Mux(sweep_enable & (sweep_hammer_count != 0), sweep_hammer_count, aggressor_table.freq)),
+        ]
+
+        """
+        Fill and read check addresses
+        """
+
+        fill_engine = Fill_Engine(rw_test_port.address_width, rw_test_port.data_width, bank_bits, col_bits, num_aggressors)
+        self.submodules.fill_engine = fill_engine
+
+        read_checker = Read_Check_Engine(rw_test_port.address_width, rw_test_port.data_width, bank_bits, col_bits, num_aggressors, read_fifo_depth)
+        self.submodules.read_checker = read_checker
+
+        # The checker regenerates the data the fill wrote from the same address
+        # Aggressor rows are copied from the table while idle, for the row role patterns
+        aggressor_rows = Aggressor_Rows(rw_test_port.address_width, col_bits, num_aggressors)
+        self.submodules.aggressor_rows = aggressor_rows
+
+        self.comb += [
+            aggressor_rows.num_entries.eq(num_addrs_attack_sig),
+            aggressor_rows.table_addr.eq(aggressor_addr_sig),
+        ]
+
+        self.comb += [
+            data_sig_1.eq(Replicate(input_data_pattern_1, rw_test_port.data_width // len(input_data_pattern_1))),
+            data_sig_2.eq(Replicate(input_data_pattern_2, rw_test_port.data_width // len(input_data_pattern_2))),
+        ]
+
+        fill_pattern = Data_Pattern(fill_engine.data_addr, data_sig_1, data_sig_2, input_data_double_pattern_setting, input_data_prbs_setting, input_data_prbs_seed, input_data_pattern_mode, aggressor_rows, bank_bits, col_bits)
+        read_check_pattern = Data_Pattern(read_checker.data_addr, data_sig_1, data_sig_2, input_data_double_pattern_setting, input_data_prbs_setting, input_data_prbs_seed, input_data_pattern_mode, aggressor_rows, bank_bits, col_bits)
+        self.submodules += fill_pattern, read_check_pattern
+
+        # The search refills and checks only the rows around the aggressors
+        for addrs in [fill_engine.addrs, read_checker.addrs]:
+            self.comb += [
+                addrs.mode.eq(Mux(hc_search_enable, FILL_CHECK_NEIGHBORHOOD, fill_check_mode)),
+                addrs.window_start.eq(fill_check_window_start),
+                addrs.window_end.eq(fill_check_window_end),
+                addrs.neighborhood_rows.eq(fill_check_neighborhood_rows),
+                addrs.num_entries.eq(num_addrs_attack_sig),
+                addrs.table_addr.eq(aggressor_addr_sig),
+            ]
+
+
 
-        rh_fsm.act("RH_ATTACK_12",
-            self.feedback_state_csr.status.eq(RH_ROWHAMMER_STATE | RH_TWELFTH_STATE),
-            rw_test_port.cmd.valid.eq(1),
-            rw_test_port.cmd.we.eq(0),
-            rw_test_port.rdata.ready.eq(1),
-            If(rw_test_port.cmd.ready,
-                If((rowhammer_state_counter - 1) == 0,
-                    If((rowhammer_state_cycle_counter - 1) == 0,
-                        NextState("RH_RESET_SETTINGS"),
-                    ).Else(
-                        NextValue(rowhammer_state_cycle_counter, rowhammer_state_cycle_counter - 1),
-                        NextValue(rowhammer_state_counter, num_addrs_attack_sig),
-                        NextValue(rowhammer_attack_cmd_timer_sig, addr_1_freq_sig),
-                        NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_1_storage_sig),
-                        NextValue(self.address_csr.status, addr_1_val_sig),
-                        NextState("RH_ATTACK_1")
-                    ),
-                ).Else(
-                    NextValue(rowhammer_state_counter, rowhammer_state_counter - 1),
-                    NextValue(self.address_csr.status, addr_13_val_sig),
-                    NextState("RH_ATTACK_13"),
-                ),
-            ),
-            If(rw_test_port.cmd.ready & ~rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter + 1),   
-            ).Elif(~rw_test_port.cmd.ready & rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter - 1),         
-            ),
-        )
+        """
+        Row sweep
+        """
 
-        rh_fsm.act("RH_ATTACK_13",
-            self.feedback_state_csr.status.eq(RH_ROWHAMMER_STATE | RH_THIRTEENTH_STATE),
-            rw_test_port.cmd.valid.eq(1),
-            rw_test_port.cmd.we.eq(0),
-            rw_test_port.rdata.ready.eq(1),
-            If(rw_test_port.cmd.ready,
-                If((rowhammer_state_counter - 1) == 0,
-                    If((rowhammer_state_cycle_counter - 1) == 0,
-                        NextState("RH_RESET_SETTINGS"),
-                    ).Else(
-                        NextValue(rowhammer_state_cycle_counter, rowhammer_state_cycle_counter - 1),
-                        NextValue(rowhammer_state_counter, num_addrs_attack_sig),
-                        NextValue(rowhammer_attack_cmd_timer_sig, addr_1_freq_sig),
-                        NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_1_storage_sig),
-                        NextValue(self.address_csr.status, addr_1_val_sig),
-                        NextState("RH_ATTACK_1")
-                    ),
-                ).Else(
-                    NextValue(rowhammer_state_counter, rowhammer_state_counter - 1),
-                    NextValue(self.address_csr.status, addr_14_val_sig),
-                    NextState("RH_ATTACK_14"),
-                ),
-            ),
-            If(rw_test_port.cmd.ready & ~rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter + 1),   
-            ).Elif(~rw_test_port.cmd.ready & rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter - 1),         
-            ),
+        # One test per step, the results of every step are logged and read from the bus
+        sweep_log = Row_Sweep_Log(sweep_log_depth)
+        self.submodules.sweep_log = sweep_log
+
+        self.comb += [
+            sweep_next_row.eq(self.sweep_row_csr.status + sweep_stride),
+            sweep_last_step.eq((sweep_stride == 0) | (sweep_next_row > sweep_end_row)),
+
+            sweep_log.clear.eq(self.test_start_sig),
+            sweep_log.row.eq(self.sweep_row_csr.status),
+            sweep_log.errors_before.eq(self.rowhammer_initial_err_cnt_csr.status),
+            sweep_log.errors_after.eq(self.rowhammer_err_cnt_csr.status),
+            sweep_log.cycles.eq(sweep_step_cycles),
+            sweep_log.hc_first.eq(self.hc_first_csr.status),
+            sweep_log.tests.eq(self.hc_search_tests_csr.status),
+            sweep_log.invalid.eq(self.hc_search_invalid_csr.status),
+        ]
+
+        """
+        HC_first search
+        """
+
+        # Every test of the search plays the aggressor table hc_search_plays times,
+        # the check after the attack stops at the first mismatch as a single flip
+        # is enough. The check before the attack runs through, so every address
+        # already failing is counted.
+        self.comb += [
+            hc_search_enable.eq(hc_search_mode != HC_SEARCH_OFF),
+            hc_search_mid.eq((hc_search_lo + hc_search_hi) >> 1),
+            hc_search_double.eq(hc_search_plays << 1),
+            read_checker.stop_on_error.eq(hc_search_enable & self.before_after_rh_csr.status),
+        ]
+
+        """
+        Row Hammer FSM
+        """
+
+        rh_fsm = FSM(reset_state="RH_IDLE")
+        self.submodules.rh_fsm = rh_fsm
+
+        # Idle state, wait here until user turns on row hammer tester
+        rh_fsm.act("RH_IDLE",
+            self.feedback_state_csr.status.eq(RH_IDLE_STATE),
+            aggressor_table.adr.eq(aggressor_rows.table_adr),
+            If(rowhammer_start_sig & ~self.config_commit_pending_csr.status & ~self.input_data_role_overflow_csr.status,
+                NextValue(self.sweep_row_csr.status, Mux(sweep_enable, sweep_base_row, 0)),
+                NextState("RH_STEP_START"),
+            ).Else(
+                NextState("RH_IDLE"), 
+            ) 
         )
 
-        rh_fsm.act("RH_ATTACK_14",
-            self.feedback_state_csr.status.eq(RH_ROWHAMMER_STATE | RH_FOURTEENTH_STATE),
-            rw_test_port.cmd.valid.eq(1),
-            rw_test_port.cmd.we.eq(0),
-            rw_test_port.rdata.ready.eq(1),
-            If(rw_test_port.cmd.ready,
-                If((rowhammer_state_counter - 1) == 0,
-                    If((rowhammer_state_cycle_counter - 1) == 0,
-                        NextState("RH_RESET_SETTINGS"),
-                    ).Else(
-                        NextValue(rowhammer_state_cycle_counter, rowhammer_state_cycle_counter - 1),
-                        NextValue(rowhammer_state_counter, num_addrs_attack_sig),
-                        NextValue(rowhammer_attack_cmd_timer_sig, addr_1_freq_sig),
-                        NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_1_storage_sig),
-                        NextValue(self.address_csr.status, addr_1_val_sig),
-                        NextState("RH_ATTACK_1")
-                    ),
-                ).Else(
-                    NextValue(rowhammer_state_counter, rowhammer_state_counter - 1),
-                    NextValue(self.address_csr.status, addr_15_val_sig),
-                    NextState("RH_ATTACK_15"),
-                ),
-            ),
-            If(rw_test_port.cmd.ready & ~rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter + 1),   
-            ).Elif(~rw_test_port.cmd.ready & rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter - 1),         
-            ),
+        # Start of a step of a row sweep (or of the only step), the search
+        # starts over with the whole range of plays
+        rh_fsm.act("RH_STEP_START",
+            self.feedback_state_csr.status.eq(RH_WRITE_FILL_INIT_STATE | RH_THIRD_STATE),
+            NextValue(rows_copy_timer, 0),
+            NextValue(hc_search_lo, Mux(hc_search_min == 0, 1, hc_search_min)),
+            NextValue(hc_search_hi, hc_search_max),
+            NextValue(hc_search_plays, Mux(hc_search_min == 0, 1, hc_search_min)),
+            NextValue(hc_search_exp, hc_search_mode == HC_SEARCH_EXPONENTIAL),
+            NextValue(self.hc_first_csr.status, 0),
+            NextValue(self.hc_search_tests_csr.status, 0),
+            NextValue(self.hc_search_invalid_csr.status, 0),
+            If(hc_search_enable,
+                NextState("RH_SEARCH_NEXT"),
+            ).Else(
+                NextState("RH_STEP_INIT"),
+            )
         )
 
-        rh_fsm.act("RH_ATTACK_15",
-            self.feedback_state_csr.status.eq(RH_ROWHAMMER_STATE | RH_FIFTEENTH_STATE),
-            rw_test_port.cmd.valid.eq(1),
-            rw_test_port.cmd.we.eq(0),
-            rw_test_port.rdata.ready.eq(1),
-            If(rw_test_port.cmd.ready,
-                If((rowhammer_state_counter - 1) == 0,
-                    If((rowhammer_state_cycle_counter - 1) == 0,
-                        NextState("RH_RESET_SETTINGS"),
-                    ).Else(
-                        NextValue(rowhammer_state_cycle_counter, rowhammer_state_cycle_counter - 1),
-                        NextValue(rowhammer_state_counter, num_addrs_attack_sig),
-                        NextValue(rowhammer_attack_cmd_timer_sig, addr_1_freq_sig),
-                        NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_1_storage_sig),
-                        NextValue(self.address_csr.status, addr_1_val_sig),
-                        NextState("RH_ATTACK_1")
-                    ),
-                ).Else(
-                    NextValue(rowhammer_state_counter, rowhammer_state_counter - 1),
-                    NextValue(self.address_csr.status, addr_16_val_sig),
-                    NextState("RH_ATTACK_16"),
+        # Pick the plays of the next test of the search: the doubled plays
+        # till the first flip, then the middle of the plays left. The step
+        # is over once no plays are left, or if start goes low.
+        rh_fsm.act("RH_SEARCH_NEXT",
+            self.feedback_state_csr.status.eq(RH_INIT_SETTINGS_STATE | RH_SECOND_STATE),
+            If(~rowhammer_start_sig | (hc_search_lo > hc_search_hi),
+                NextState("RH_STEP_DONE"),
+            ).Else(
+                If(~hc_search_exp,
+                    NextValue(hc_search_plays, hc_search_mid),
                 ),
-            ),
-            If(rw_test_port.cmd.ready & ~rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter + 1),   
-            ).Elif(~rw_test_port.cmd.ready & rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter - 1),         
-            ),
+                NextValue(self.hc_search_tests_csr.status, self.hc_search_tests_csr.status + 1),
+                NextValue(rows_copy_timer, 0),
+                NextState("RH_STEP_INIT"),
+            )
         )
 
-        rh_fsm.act("RH_ATTACK_16",
-            self.feedback_state_csr.status.eq(RH_ROWHAMMER_STATE | RH_SIXTEENTH_STATE),
-            rw_test_port.cmd.valid.eq(1),
-            rw_test_port.cmd.we.eq(0),
-            rw_test_port.rdata.ready.eq(1),
-            If(rw_test_port.cmd.ready,
-                If((rowhammer_state_counter - 1) == 0,
-                    If((rowhammer_state_cycle_counter - 1) == 0,
-                        NextState("RH_RESET_SETTINGS"),
-                    ).Else(
-                        NextValue(rowhammer_state_cycle_counter, rowhammer_state_cycle_counter - 1),
-                        NextValue(rowhammer_state_counter, num_addrs_attack_sig),
-                        NextValue(rowhammer_attack_cmd_timer_sig, addr_1_freq_sig),
-                        NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_1_storage_sig),
-                        NextValue(self.address_csr.status, addr_1_val_sig),
-                        NextState("RH_ATTACK_1")
-                    ),
-                ).Else(
-                    NextValue(rowhammer_state_counter, rowhammer_state_counter - 1),
-                    NextValue(self.address_csr.status, addr_17_val_sig),
-                    NextState("RH_ATTACK_17"),
-                ),
-            ),
-            If(rw_test_port.cmd.ready & ~rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter + 1),   
-            ).Elif(~rw_test_port.cmd.ready & rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter - 1),         
-            ),
+        # Start of a test. The aggressor rows known by the data pattern are
+        # copied again, as the sweep moved them.
+        rh_fsm.act("RH_STEP_INIT",
+            self.feedback_state_csr.status.eq(RH_WRITE_FILL_INIT_STATE | RH_SECOND_STATE),
+            aggressor_table.adr.eq(aggressor_rows.table_adr),
+            NextValue(rows_copy_timer, rows_copy_timer + 1),
+            If(rows_copy_timer == (aggressor_rows.num_rows + 1),
+                fill_engine.start.eq(1),
+                NextState("RH_FILL"),
+            )
         )
 
-        rh_fsm.act("RH_ATTACK_17",
-            self.feedback_state_csr.status.eq(RH_ROWHAMMER_STATE | RH_SEVENTEENTH_STATE),
-            rw_test_port.cmd.valid.eq(1),
-            rw_test_port.cmd.we.eq(0),
-            rw_test_port.rdata.ready.eq(1),
-            If(rw_test_port.cmd.ready,
-                If((rowhammer_state_counter - 1) == 0,
-                    If((rowhammer_state_cycle_counter - 1) == 0,
-                        NextState("RH_RESET_SETTINGS"),
-                    ).Else(
-                        NextValue(rowhammer_state_cycle_counter, rowhammer_state_cycle_counter - 1),
-                        NextValue(rowhammer_state_counter, num_addrs_attack_sig),
-                        NextValue(rowhammer_attack_cmd_timer_sig, addr_1_freq_sig),
-                        NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_1_storage_sig),
-                        NextValue(self.address_csr.status, addr_1_val_sig),
-                        NextState("RH_ATTACK_1")
-                    ),
-                ).Else(
-                    NextValue(rowhammer_state_counter, rowhammer_state_counter - 1),
-                    NextValue(self.address_csr.status, addr_18_val_sig),
-                    NextState("RH_ATTACK_18"),
-                ),
-            ),
-            If(rw_test_port.cmd.ready & ~rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter + 1),   
-            ).Elif(~rw_test_port.cmd.ready & rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter - 1),         
-            ),
+        # Write the designated data pattern to the DRAM (or the part of it
+        # selected), the fill engine sends commands and write data on their
+        # own, wait till every write has its data.
+        rh_fsm.act("RH_FILL",
+            self.feedback_state_csr.status.eq(RH_WRITE_FILL_INIT_STATE | RH_FIRST_STATE),
+            aggressor_table.adr.eq(fill_engine.addrs.table_adr),
+            rw_test_port.cmd.we.eq(1),
+            rw_test_port.cmd.valid.eq(fill_engine.cmd_valid),
+            fill_engine.cmd_ready.eq(rw_test_port.cmd.ready),
+            rw_test_port.wdata.valid.eq(fill_engine.wdata_valid),
+            fill_engine.wdata_ready.eq(rw_test_port.wdata.ready),
+            If(fill_engine.done,
+                NextValue(self.rowhammer_err_cnt_csr.status, 0),
+                NextValue(self.before_after_rh_csr.status, 0),
+                read_checker.start.eq(1),
+                NextState("READ_CHECK"),
+            )
         )
 
-        rh_fsm.act("RH_ATTACK_18",
-            self.feedback_state_csr.status.eq(RH_ROWHAMMER_STATE | RH_EIGHTEENTH_STATE),
-            rw_test_port.cmd.valid.eq(1),
-            rw_test_port.cmd.we.eq(0),
-            rw_test_port.rdata.ready.eq(1),
-            If(rw_test_port.cmd.ready,
-                If((rowhammer_state_counter - 1) == 0,
-                    If((rowhammer_state_cycle_counter - 1) == 0,
-                        NextState("RH_RESET_SETTINGS"),
-                    ).Else(
-                        NextValue(rowhammer_state_cycle_counter, rowhammer_state_cycle_counter - 1),
-                        NextValue(rowhammer_state_counter, num_addrs_attack_sig),
-                        NextValue(rowhammer_attack_cmd_timer_sig, addr_1_freq_sig),
-                        NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_1_storage_sig),
-                        NextValue(self.address_csr.status, addr_1_val_sig),
-                        NextState("RH_ATTACK_1")
-                    ),
+        # Initial settings for the row hammer attack. The first entry of the
+        # aggressor table has been read out while in READ_FINISH.
+        rh_fsm.act("RH_INIT_SETTINGS",
+            # Modify refresh rate here
+            self.feedback_state_csr.status.eq(RH_INIT_SETTINGS_STATE),
+            aggressor_table.adr.eq(1),
+            If(num_addrs_attack_sig == 0,
+                NextState("RH_RESET_SETTINGS"),
+            ).Else(
+                NextState("RH_ATTACK"),
+            ),
+            # The DFI hammer path sends the REFs itself, the controller
+            # keeps refreshing so the DFI can be taken after one of them
+            If(~dfi_hammer,
+                If(refresh_enable_setting,
+                    NextValue(trefi, refresh_rate_setting),
                 ).Else(
-                    NextValue(rowhammer_state_counter, rowhammer_state_counter - 1),
-                    NextValue(self.address_csr.status, addr_19_val_sig),
-                    NextState("RH_ATTACK_19"),
+                    NextValue(refresh_enable, 0),
                 ),
             ),
-            If(rw_test_port.cmd.ready & ~rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter + 1),   
-            ).Elif(~rw_test_port.cmd.ready & rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter - 1),         
-            ),
+            NextValue(auto_precharge_setting, auto_precharge),
+            NextValue(self.address_csr.status, aggressor_addr_sig),
+            NextValue(rowhammer_attack_cmd_timer_sig, aggressor_freq_sig),
+            NextValue(aggressor_loop_sig, aggressor_table.loop),
+            NextValue(aggressor_first_addr_sig, aggressor_addr_sig),
+            NextValue(aggressor_first_freq_sig, aggressor_freq_sig),
+            NextValue(aggressor_first_loop_sig, aggressor_table.loop),
+            NextValue(aggressor_group_addr_sig, aggressor_addr_sig),
+            NextValue(aggressor_group_freq_sig, aggressor_freq_sig),
+            NextValue(aggressor_group_loop_sig, aggressor_table.loop),
+            NextValue(aggressor_idx_sig, 0),
+            NextValue(aggressor_group_start_sig, 0),
+            NextValue(aggressor_loop_counter_sig, 0),
+            NextValue(interleave_round, 0),
+            NextValue(interleave_more, 0),
+            NextValue(rowhammer_state_cycle_counter, Mux(hc_search_enable, hc_search_plays, rowhammer_state_cycle_storage_counter)),
+            NextValue(rowhammer_port_wready_rvalid_counter, 0),
         )
 
-        rh_fsm.act("RH_ATTACK_19",
-            self.feedback_state_csr.status.eq(RH_ROWHAMMER_STATE | RH_NINETEENTH_STATE),
-            rw_test_port.cmd.valid.eq(1),
+        # Row hammer attack state, walks the aggressor table. The table read
+        # port always points at the entry after the one being hammered, so
+        # moving on to it does not cost a cycle. When interleaving, every
+        # entry of a group gets one read per round, the rounds go on till
+        # the hammer count of every entry is used up.
+        rh_fsm.act("RH_ATTACK",
+            self.feedback_state_csr.status.eq(RH_ROWHAMMER_STATE | RH_FIRST_STATE),
+                   
+            # Set command valid, unless the entry skips its turn
+            hammer_valid.eq(~hammer_interleave | interleave_read),
+            rw_test_port.cmd.valid.eq(hammer_valid & ~dfi_hammer),
+
+            # Control necessary signals for reads
             rw_test_port.cmd.we.eq(0),
             rw_test_port.rdata.ready.eq(1),
-            If(rw_test_port.cmd.ready,
-                If((rowhammer_state_counter - 1) == 0,
-                    If((rowhammer_state_cycle_counter - 1) == 0,
-                        NextState("RH_RESET_SETTINGS"),
+
+            aggressor_table.adr.eq(aggressor_idx_sig + 1),
+
+            # Control if we need to quit or move on to next entry after command execution
+            If(aggressor_step,
+                
+                # A timer containing the number of times to hammer the entry
+                If(aggressor_entry_done,
+
+                    # Next round of the interleaved group, from its first entry
+                    If(interleave_again,
+                        NextValue(interleave_round, interleave_round + 1),
+                        NextValue(interleave_more, 0),
+                        NextValue(aggressor_idx_sig, aggressor_group_start_sig),
+                        NextValue(self.address_csr.status, aggressor_group_addr_sig),
+                        NextValue(rowhammer_attack_cmd_timer_sig, aggressor_group_freq_sig),
+                        NextValue(aggressor_loop_sig, aggressor_group_loop_sig),
+                        aggressor_table.adr.eq(aggressor_group_start_sig + 1),
+
+                    # Play the current group of entries again
+                    ).Elif(aggressor_repeat_group,
+                        NextValue(interleave_round, 0),
+                        NextValue(interleave_more, 0),
+                        NextValue(aggressor_loop_counter_sig, aggressor_loop_left - 1),
+                        NextValue(aggressor_idx_sig, aggressor_group_start_sig),
+                        NextValue(self.address_csr.status, aggressor_group_addr_sig),
+                        NextValue(rowhammer_attack_cmd_timer_sig, aggressor_group_freq_sig),
+                        NextValue(aggressor_loop_sig, aggressor_group_loop_sig),
+                        aggressor_table.adr.eq(aggressor_group_start_sig + 1),
+
+                    # A timer to control when to either repeat the whole table or 
+                    # finish sending commands.
+                    ).Elif(aggressor_last_entry,
+                        NextValue(interleave_round, 0),
+                        NextValue(interleave_more, 0),
+                        If((rowhammer_state_cycle_counter - 1) == 0,
+                            NextState("RH_RESET_SETTINGS"),
+                        ).Else(
+                            NextValue(rowhammer_state_cycle_counter, rowhammer_state_cycle_counter - 1),
+                            NextValue(aggressor_loop_counter_sig, 0),
+                            NextValue(aggressor_idx_sig, 0),
+                            NextValue(aggressor_group_start_sig, 0),
+                            NextValue(aggressor_group_addr_sig, aggressor_first_addr_sig),
+                            NextValue(aggressor_group_freq_sig, aggressor_first_freq_sig),
+                            NextValue(aggressor_group_loop_sig, aggressor_first_loop_sig),
+                            NextValue(self.address_csr.status, aggressor_first_addr_sig),
+                            NextValue(rowhammer_attack_cmd_timer_sig, aggressor_first_freq_sig),
+                            NextValue(aggressor_loop_sig, aggressor_first_loop_sig),
+                            aggressor_table.adr.eq(1),
+                        ),
+
+                    # Move on to the next entry, which starts a new group if
+                    # the current entry closed one
                     ).Else(
-                        NextValue(rowhammer_state_cycle_counter, rowhammer_state_cycle_counter - 1),
-                        NextValue(rowhammer_state_counter, num_addrs_attack_sig),
-                        NextValue(rowhammer_attack_cmd_timer_sig, addr_1_freq_sig),
-                        NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_1_storage_sig),
-                        NextValue(self.address_csr.status, addr_1_val_sig),
-                        NextState("RH_ATTACK_1")
+                        NextValue(aggressor_idx_sig, aggressor_idx_sig + 1),
+                        NextValue(self.address_csr.status, aggressor_addr_sig),
+                        NextValue(rowhammer_attack_cmd_timer_sig, aggressor_freq_sig),
+                        NextValue(aggressor_loop_sig, aggressor_table.loop),
+                        NextValue(interleave_more, interleave_more | interleave_left),
+                        If(aggressor_loop_sig != 0,
+                            NextValue(interleave_round, 0),
+                            NextValue(interleave_more, 0),
+                            NextValue(aggressor_loop_counter_sig, 0),
+                            NextValue(aggressor_group_start_sig, aggressor_idx_sig + 1),
+                            NextValue(aggressor_group_addr_sig, aggressor_addr_sig),
+                            NextValue(aggressor_group_freq_sig, aggressor_freq_sig),
+                            NextValue(aggressor_group_loop_sig, aggressor_table.loop),
+                        ),
+                        aggressor_table.adr.eq(aggressor_idx_sig + 2),
                     ),
                 ).Else(
-                    NextValue(rowhammer_state_counter, rowhammer_state_counter - 1),
-                    NextValue(self.address_csr.status, addr_20_val_sig),
-                    NextState("RH_ATTACK_20"),
-                ),
-            ),
-            If(rw_test_port.cmd.ready & ~rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter + 1),   
-            ).Elif(~rw_test_port.cmd.ready & rw_test_port.rdata.valid,
-                NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter - 1),         
-            ),
-        )
-
-        rh_fsm.act("RH_ATTACK_20",
-            self.feedback_state_csr.status.eq(RH_ROWHAMMER_STATE | RH_TWENTIETH_STATE),
-            rw_test_port.cmd.valid.eq(1),
-            rw_test_port.cmd.we.eq(0),
-            rw_test_port.rdata.ready.eq(1),
-            If(rw_test_port.cmd.ready,
-                If((rowhammer_state_cycle_counter - 1) == 0,
-                    NextState("RH_RESET_SETTINGS"),
-                ).Else(
-                    NextValue(rowhammer_state_cycle_counter, rowhammer_state_cycle_counter - 1),
-                    NextValue(rowhammer_state_counter, num_addrs_attack_sig),
-                    NextValue(rowhammer_attack_cmd_timer_sig, addr_1_freq_sig),
-                    NextValue(rowhammer_two_states_counter_sig, rowhammer_two_states_counter_1_storage_sig),
-                    NextValue(self.address_csr.status, addr_1_val_sig),
-                    NextState("RH_ATTACK_1")
+                    # Stay on this entry till this freq timer finishes
+                    NextValue(rowhammer_attack_cmd_timer_sig, rowhammer_attack_cmd_timer_sig - 1)   
                 ),
             ),
-            If(rw_test_port.cmd.ready & ~rw_test_port.rdata.valid,
+            If(rw_test_port.cmd.valid & rw_test_port.cmd.ready & ~rw_test_port.rdata.valid,
                 NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter + 1),   
-            ).Elif(~rw_test_port.cmd.ready & rw_test_port.rdata.valid,
+            ).Elif(~(rw_test_port.cmd.valid & rw_test_port.cmd.ready) & rw_test_port.rdata.valid,
                 NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter - 1),         
             ),
         )
 
         rh_fsm.act("RH_RESET_SETTINGS",
             self.feedback_state_csr.status.eq(RH_RESET_SETTNGS_STATE),
-            If(rowhammer_port_wready_rvalid_counter == 0,
-                NextValue(self.burst_cntr_sig, 0),
-                NextValue(self.address_csr.status, 0),
+            If((rowhammer_port_wready_rvalid_counter == 0) & ~self.dfi_hammer_busy_sig & ~self.histogram_clear_sig,
                 NextValue(self.rowhammer_err_cnt_csr.status, 0),
                 NextValue(self.before_after_rh_csr.status, 1),
-                If(self.refresh_enable_csr.storage,
+                If(refresh_enable_setting,
                     NextValue(trefi, trefi_setting),
                 ).Else(
                     NextValue(refresh_enable, 1),
                 ),
                 NextValue(auto_precharge_setting, 0),
-                NextValue(input_data_double_pattern_setting, 0),
-                NextValue(data_sig_timer, PORT_COLS_AND_BANKS_PER_ROW_ADDR),
-                NextState("READ_CHECK_REQ"), 
+                read_checker.start.eq(1),
+                NextState("READ_CHECK"), 
             ).Elif((rw_test_port.wdata.ready | rw_test_port.rdata.valid),
                 NextValue(rowhammer_port_wready_rvalid_counter, rowhammer_port_wready_rvalid_counter - 1)
             )
         )
 
+        # End of a step, log it and move on to the next step of the sweep,
+        # stops after the current step if start goes low
+        rh_fsm.act("RH_STEP_DONE",
+            self.feedback_state_csr.status.eq(RH_READ_CHECK_STATE | RH_FIFTH_STATE),
+            sweep_log.we.eq(sweep_enable | hc_search_enable),
+            If(sweep_enable & ~sweep_last_step & rowhammer_start_sig,
+                NextValue(self.sweep_row_csr.status, sweep_next_row),
+                NextState("RH_STEP_START"),
+            ).Else(
+                NextState("RH_FINAL_CHECK"),
+            )
+        )
+
         rh_fsm.act("RH_FINAL_CHECK",
             self.feedback_state_csr.status.eq(RH_FINAL_CHECK),
             If(rowhammer_start_sig == 0,
@@ -1502,204 +2560,101 @@ class Row_Hammer_Test(Module, AutoCSR):
         # Read portion of the state machine, used at least twice
         ##########################################################
 
-        # Start sending reading commands (cmd.we is LOW)
-        rh_fsm.act("READ_CHECK_REQ",
+        # Read back and check the DRAM (or the part of it selected), the read
+        # check engine sends reads (cmd.we is LOW) and compares the data on
+        # its own, count the errors it finds till every read is compared.
+        # Errors are put in the error FIFO as they are found.
+        rh_fsm.act("READ_CHECK",
             self.feedback_state_csr.status.eq(RH_READ_CHECK_STATE | RH_FIRST_STATE),
-            rw_test_port.cmd.valid.eq(1),
-            If(self.address_csr.status == max_address_sig,
-                NextValue(self.address_csr.status, 0),  
-                NextState("READ_CHECK_REC"), 
-            ).Else(
-                NextValue(self.address_csr.status, self.address_csr.status + 1),
-                NextState("READ_CHECK_REQ_REC"),
-            )
-        )
-
-        # Both receive and request commands until we have sent them all.
-        # This also includes getting an error count, comparing data with
-        # expected data.
-        rh_fsm.act("READ_CHECK_REQ_REC",
-            self.feedback_state_csr.status.eq(RH_READ_CHECK_STATE | RH_SECOND_STATE),
-            rw_test_port.cmd.valid.eq(1),
+            aggressor_table.adr.eq(read_checker.addrs.table_adr),
+            rw_test_port.cmd.valid.eq(read_checker.cmd_valid),
+            read_checker.cmd_ready.eq(rw_test_port.cmd.ready),
             rw_test_port.rdata.ready.eq(1),
-            If(rw_test_port.rdata.valid,
-                NextValue(self.burst_cntr_sig, self.burst_cntr_sig + 1),
-                If(self.input_data_double_pattern_setting_csr.storage & input_data_double_pattern_setting,
-                    If(rw_test_port.rdata.data != data_sig_2,
-                       NextValue(self.rowhammer_err_cnt_csr.status, self.rowhammer_err_cnt_csr.status + 1),
-                    )
-                ).Else(
-                    If(rw_test_port.rdata.data != data_sig_1,
-                        NextValue(self.rowhammer_err_cnt_csr.status, self.rowhammer_err_cnt_csr.status + 1),
-                    )
-                ),
-                If((data_sig_timer - 1) == 0,
-                    NextValue(input_data_double_pattern_setting, ~input_data_double_pattern_setting),
-                    NextValue(data_sig_timer, PORT_COLS_AND_BANKS_PER_ROW_ADDR),
-                ).Else(
-                    NextValue(data_sig_timer, data_sig_timer - 1),
-                ),
+            read_checker.rdata_valid.eq(rw_test_port.rdata.valid),
+            If(read_checker.valid & read_checker.error,
+                NextValue(self.rowhammer_err_cnt_csr.status, self.rowhammer_err_cnt_csr.status + 1),
             ),
-            If(rw_test_port.cmd.ready,
-                If(self.address_csr.status == max_address_sig,
-                    NextValue(self.address_csr.status, 0),
-                    NextState("READ_CHECK_REC"),  
-                ).Else(
-                    NextValue(self.address_csr.status, self.address_csr.status + 1),
-                )
-            )
-        )
-
-        # Finish receiving all commands, counting all errors, going now to read the errors or finish.
-        rh_fsm.act("READ_CHECK_REC",
-            self.feedback_state_csr.status.eq(RH_READ_CHECK_STATE | RH_THIRD_STATE),
-            rw_test_port.rdata.ready.eq(1),
-            If(rw_test_port.rdata.valid,
-                NextValue(self.burst_cntr_sig, self.burst_cntr_sig + 1),
-
-                If((self.burst_cntr_sig + 1) >= (max_address_sig + 1),
-                    NextState("READ_FINISH"),
-                    If(self.input_data_double_pattern_setting_csr.storage & input_data_double_pattern_setting,
-                        If(rw_test_port.rdata.data != data_sig_2,
-                            NextValue(self.rowhammer_err_cnt_csr.status, self.rowhammer_err_cnt_csr.status + 1),
-                            NextValue(self.address_csr.status, 0),
-                            NextValue(input_data_double_pattern_setting, 0),
-                            NextValue(data_sig_timer, PORT_COLS_AND_BANKS_PER_ROW_ADDR),
-                            NextState("READ_CHECK_ERR_REQ"),
-                        ).Elif(self.rowhammer_err_cnt_csr.status > 0,
-                            NextValue(self.address_csr.status, 0),
-                            NextValue(input_data_double_pattern_setting, 0),
-                            NextValue(data_sig_timer, PORT_COLS_AND_BANKS_PER_ROW_ADDR),
-                            NextState("READ_CHECK_ERR_REQ"),       
-                        )
-                    ).Else(
-                        If(rw_test_port.rdata.data != data_sig_1,
-                            NextValue(self.rowhammer_err_cnt_csr.status, self.rowhammer_err_cnt_csr.status + 1),
-                            NextValue(self.address_csr.status, 0),
-                            NextValue(input_data_double_pattern_setting, 0),
-                            NextValue(data_sig_timer, PORT_COLS_AND_BANKS_PER_ROW_ADDR),
-                            NextState("READ_CHECK_ERR_REQ"),
-                        ).Elif(self.rowhammer_err_cnt_csr.status > 0,
-                            NextValue(self.address_csr.status, 0),
-                            NextValue(input_data_double_pattern_setting, 0),
-                            NextValue(data_sig_timer, PORT_COLS_AND_BANKS_PER_ROW_ADDR),
-                            NextState("READ_CHECK_ERR_REQ"),       
-                        )
-                    ),
-                ).Else(
-
-                    If(self.input_data_double_pattern_setting_csr.storage & input_data_double_pattern_setting,
-                        If(rw_test_port.rdata.data != data_sig_2,
-                            NextValue(self.rowhammer_err_cnt_csr.status, self.rowhammer_err_cnt_csr.status + 1),
-                        )
-                    ).Else(
-                        If(rw_test_port.rdata.data != data_sig_1,
-                            NextValue(self.rowhammer_err_cnt_csr.status, self.rowhammer_err_cnt_csr.status + 1),
-                        )
-                    ),
-                    If((data_sig_timer - 1) == 0,
-                        NextValue(input_data_double_pattern_setting, ~input_data_double_pattern_setting),
-                        NextValue(data_sig_timer, PORT_COLS_AND_BANKS_PER_ROW_ADDR),
-                    ).Else(
-                        NextValue(data_sig_timer, data_sig_timer - 1),
-                    ),
-                )
-            )
-        )
-
-        # Send one request for an error address
-        rh_fsm.act("READ_CHECK_ERR_REQ",
-            self.feedback_state_csr.status.eq(RH_READ_SEND_ERRORS_STATE | RH_FIRST_STATE),
-            rw_test_port.cmd.valid.eq(1),
-            If(rw_test_port.cmd.ready,
-                NextState("READ_CHECK_ERR_REC"),
+            If(read_checker.done,
+                NextState("READ_FINISH"),
             )
         )
 
-        # Receive the response
-        rh_fsm.act("READ_CHECK_ERR_REC",
-            self.feedback_state_csr.status.eq(RH_READ_SEND_ERRORS_STATE | RH_SECOND_STATE),
-            rw_test_port.rdata.ready.eq(1),
-            If(rw_test_port.rdata.valid,
-                NextValue(error_data, rw_test_port.rdata.data),
-                NextState("READ_CHECK_ERR_DISPLAY"),
-            )
-        )
 
-        # Set flag high. In this state, the complete data read back 
-        # should be stored in CSR registers.
-        # We also have a saved error counter with all the 
-        # addresses that contained errors. 
-        # User sets a one-shot signal high, can set it low again 
-        # to receive new data.
-        rh_fsm.act("READ_CHECK_ERR_DISPLAY",
-            self.feedback_state_csr.status.eq(RH_READ_SEND_ERRORS_STATE | RH_THIRD_STATE),
-
-
-            If(self.input_data_double_pattern_setting_csr.storage & input_data_double_pattern_setting,
-                If((error_data == data_sig_2) | error_ack_sig,
-                    If((self.address_csr.status + 1) == max_address_sig,
-                        NextState("READ_FINISH"),
-                        NextValue(self.address_csr.status, 0),
+        rh_fsm.act("READ_FINISH",
+            self.feedback_state_csr.status.eq(RH_READ_CHECK_STATE | RH_FOURTH_STATE),
+            NextValue(self.address_csr.status, 0),
+            If(self.before_after_rh_csr.status, 
+                If(hc_search_enable,
+                    # A flip at these plays, HC_first is at most the plays
+                    If(self.rowhammer_err_cnt_csr.status != 0,
+                        NextValue(self.hc_first_csr.status, hc_search_plays),
+                        NextValue(hc_search_hi, hc_search_plays - 1),
+                        NextValue(hc_search_exp, 0),
+
+                    # No flip, HC_first is above the plays
                     ).Else(
-                        NextValue(self.address_csr.status, self.address_csr.status + 1),
-                        If((data_sig_timer - 1) == 0,
-                            NextValue(input_data_double_pattern_setting, ~input_data_double_pattern_setting),
-                            NextValue(data_sig_timer, PORT_COLS_AND_BANKS_PER_ROW_ADDR),
-                        ).Else(
-                            NextValue(data_sig_timer, data_sig_timer - 1),
+                        NextValue(hc_search_lo, hc_search_plays + 1),
+                        If(hc_search_exp,
+                            If(hc_search_double > hc_search_hi,
+                                NextValue(hc_search_plays, hc_search_hi),
+                            ).Else(
+                                NextValue(hc_search_plays, hc_search_double),
+                            ),
+                            If(hc_search_plays >= hc_search_hi,
+                                NextValue(hc_search_exp, 0),
+                            ),
                         ),
-                        NextState("READ_CHECK_ERR_REQ"),
-                    )
+                    ),
+                    NextState("RH_SEARCH_NEXT"),
                 ).Else(
-                    self.error_found_flag_csr.status.eq(1),
+                    NextState("RH_STEP_DONE"),
                 )
             ).Else(
-                If((error_data == data_sig_1) | error_ack_sig,
-                    If((self.address_csr.status + 1) == max_address_sig,
-                        NextState("READ_FINISH"),
-                        NextValue(self.address_csr.status, 0),
-                    ).Else(
-                        NextValue(self.address_csr.status, self.address_csr.status + 1),
-                        If((data_sig_timer - 1) == 0,
-                            NextValue(input_data_double_pattern_setting, ~input_data_double_pattern_setting),
-                            NextValue(data_sig_timer, PORT_COLS_AND_BANKS_PER_ROW_ADDR),
-                        ).Else(
-                            NextValue(data_sig_timer, data_sig_timer - 1),
-                        ),
-                        NextState("READ_CHECK_ERR_REQ"),
-                    )
+                NextValue(self.rowhammer_initial_err_cnt_csr.status, self.rowhammer_err_cnt_csr.status),
+                # Errors before the attack would be taken for flips of the attack,
+                # the search of the step is stopped without a HC_first
+                If(hc_search_enable & (self.rowhammer_err_cnt_csr.status != 0),
+                    NextValue(self.rowhammer_err_cnt_csr.status, 0),
+                    NextValue(self.hc_first_csr.status, 0),
+                    NextValue(self.hc_search_invalid_csr.status, 1),
+                    NextState("RH_STEP_DONE"),
                 ).Else(
-                    self.error_found_flag_csr.status.eq(1),
+                    NextState("RH_INIT_SETTINGS"),
                 )
-            ),
+            )
+        )
 
 
-            # If((error_data == data_sig) | error_ack_sig,
-            #     If((self.address_csr.status + 1) == max_address_sig,
-            #         NextState("READ_FINISH"),
-            #         NextValue(self.address_csr.status, 0),
-            #     ).Else(
-            #         NextValue(self.address_csr.status, self.address_csr.status + 1),
-            #         NextState("READ_CHECK_ERR_REQ"),
-            #     )
-            # ).Else(
-            #     self.error_found_flag_csr.status.eq(1),
-            # )
-        )
 
 
-        rh_fsm.act("READ_FINISH",
-            self.feedback_state_csr.status.eq(RH_READ_CHECK_STATE | RH_FOURTH_STATE),
-            NextValue(self.address_csr.status, 0),
-            If(self.before_after_rh_csr.status, 
-                NextState("RH_FINAL_CHECK"),
-            ).Else(
-                NextState("RH_INIT_SETTINGS"),
-            )
-        )
+        self.comb += [
+            self.hammer_phase_start_sig.eq(rh_fsm.ongoing("RH_INIT_SETTINGS")),
+            self.hammer_phase_sig.eq(rh_fsm.ongoing("RH_ATTACK") | rh_fsm.ongoing("RH_RESET_SETTINGS")),
+            self.dfi_hammer_attack_sig.eq(rh_fsm.ongoing("RH_ATTACK") & dfi_hammer),
+            self.test_start_sig.eq(rh_fsm.ongoing("RH_IDLE") & rowhammer_start_sig),
+            aggressor_rows.enable.eq(rh_fsm.ongoing("RH_IDLE") | rh_fsm.ongoing("RH_STEP_INIT")),
+
+            # Rows past the copy would get the victim data, so such a test is not started
+            self.input_data_role_overflow_csr.status.eq((input_data_pattern_mode == PATTERN_ROLE) & ~input_data_prbs_setting & (num_addrs_attack_sig > aggressor_rows.num_rows)),
+            self.config_commit_sig.eq(rh_fsm.ongoing("RH_IDLE") & self.config_commit_pending_csr.status),
+        ]
 
+        self.sync += [
+            If(self.config_commit_csr.re,
+                self.config_commit_pending_csr.status.eq(1),
+            ).Elif(self.config_commit_sig,
+                self.config_commit_pending_csr.status.eq(0),
+            )
+        ]
 
+        # Cycles of the sweep step, from the start of the step to the end of the last check
+        self.sync += [
+            If(rh_fsm.ongoing("RH_STEP_START"),
+                sweep_step_cycles.eq(0),
+            ).Else(
+                sweep_step_cycles.eq(sweep_step_cycles + 1),
+            )
+        ]
 
 
         """
@@ -1732,26 +2687,97 @@ class Row_Hammer_Test(Module, AutoCSR):
 
 
         """
-        Error acknowledging sync block
+        Error FIFO
         """
 
-        self.sync += [
+        # Each error keeps its address, the flipped bits (XOR with the data
+        # written), the bits flipped from 0 to 1 and whether it was found before
+        # or after the rowhammer attack.
+        error_fifo = SyncFIFOBuffered(rw_test_port.address_width + (2 * rw_test_port.data_width) + ONE_BIT_WIDE, error_fifo_depth)
+        self.submodules.error_fifo = error_fifo
 
-            error_ack_buf1_sig.eq(self.error_ack_csr.storage),
-            error_ack_buf2_sig.eq(error_ack_buf1_sig),
+        read_check_xor_data = Signal(rw_test_port.data_width)
+        error_fifo_addr = Signal(rw_test_port.address_width)
+        error_fifo_after_rh = Signal(ONE_BIT_WIDE)
 
-            # Oneshot
-            If(error_ack_buf2_sig,
-                If(self.error_ack_prev_csr.status,
-                    error_ack_sig.eq(0),
-                    self.error_ack_prev_csr.status.eq(1)   
+        self.comb += [
+            read_check_xor_data.eq(read_checker.xor_data),
+
+            # Errors come out of the comparator stage of the read check engine with their address
+            error_fifo.din.eq(Cat(read_checker.addr, read_check_xor_data, read_check_xor_data & read_checker.data, self.before_after_rh_csr.status)),
+            error_fifo.we.eq(read_checker.valid & read_checker.error),
+            self.flip_found_sig.eq(read_checker.valid & read_checker.error & self.before_after_rh_csr.status),
+            Cat(error_fifo_addr, error_xor_data, error_up_data, error_fifo_after_rh).eq(error_fifo.dout),
+
+            # The FIFO output takes a cycle to refill after a pop, only show the level once it is there
+            self.error_fifo_level_csr.status.eq(Mux(error_fifo.readable, error_fifo.level, 0)),
+            self.error_fifo_addr_csr.status.eq(error_fifo_addr),
+            self.error_fifo_after_rh_csr.status.eq(error_fifo_after_rh),
+        ]
+
+        # Flips of every data bit found after the rowhammer attack
+        self.submodules.bit_histogram = Flip_Bit_Histogram(read_check_xor_data, self.flip_found_sig, self.test_start_sig)
+
+        # Flips of every row found after the rowhammer attack, read from the bus
+        self.submodules.row_histogram = Row_Flip_Histogram(read_checker.addr, read_check_xor_data, self.flip_found_sig, self.test_start_sig, bank_bits, col_bits, row_histogram_depth)
+        self.comb += self.histogram_clear_sig.eq(self.row_histogram.clearing)
+
+        ###########################################################################
+        # Error records, one per 32-bit lane with flipped bits
+        ###########################################################################
+
+        num_lanes = rw_test_port.data_width // WIDTH_32_BITS
+
+        error_lanes_flipped = Signal(num_lanes)  # Lanes of the oldest error with flipped bits
+        error_lanes_done = Signal(num_lanes)     # Lanes already popped by the CPU
+        error_lanes_left = Signal(num_lanes)
+        error_lane = Signal(max=num_lanes)
+        error_lane_xor = Signal(WIDTH_32_BITS)
+        error_record_pop = Signal(ONE_BIT_WIDE)
+
+        # Records popped by reads of the bus, or by the CSRs
+        error_records = Error_Record_Window(error_fifo_addr, self.error_record_xor_csr.status, self.error_record_up_csr.status,
+                                            self.error_record_lane_csr.status, self.error_record_popcount_csr.status, error_fifo_after_rh,
+                                            self.error_record_last_csr.status, error_fifo.readable, ~error_fifo.readable & (error_fifo.level != 0))
+        self.submodules.error_records = error_records
+
+        for i in range(num_lanes):
+            self.comb += error_lanes_flipped[i].eq(error_xor_data[WIDTH_32_BITS * i:WIDTH_32_BITS * (i + 1)] != 0)
+
+        self.comb += error_lanes_left.eq(error_lanes_flipped & ~error_lanes_done)
+
+        # Lowest lane left
+        for i in reversed(range(num_lanes)):
+            self.comb += If(error_lanes_left[i], error_lane.eq(i))
+
+        self.comb += [
+            error_lane_xor.eq(Array(error_xor_data[WIDTH_32_BITS * i:WIDTH_32_BITS * (i + 1)] for i in range(num_lanes))[error_lane]),
+            self.error_record_lane_csr.status.eq(error_lane),
+            self.error_record_xor_csr.status.eq(error_lane_xor),
+            self.error_record_up_csr.status.eq(Array(error_up_data[WIDTH_32_BITS * i:WIDTH_32_BITS * (i + 1)] for i in range(num_lanes))[error_lane]),
+            self.error_record_popcount_csr.status.eq(reduce(add, [error_lane_xor[i] for i in range(WIDTH_32_BITS)])),
+            self.error_record_last_csr.status.eq((error_lanes_left & ~(1 << error_lane)) == 0),
+
+            # Only leave the error once all its lanes have been popped
+            error_record_pop.eq(self.error_fifo_pop_csr.re | error_records.pop),
+            error_fifo.re.eq(error_record_pop & self.error_record_last_csr.status),
+        ]
+
+        self.sync += [
+            If(error_record_pop,
+                If(self.error_record_last_csr.status,
+                    error_lanes_done.eq(0),
                 ).Else(
-                    error_ack_sig.eq(1),
-                    self.error_ack_prev_csr.status.eq(1),
+                    error_lanes_done.eq(error_lanes_done | (1 << error_lane)),
                 )
-            ).Else(
-                error_ack_sig.eq(0),
-                self.error_ack_prev_csr.status.eq(0),
+            )
+        ]
+
+        self.sync += [
+            If(rh_fsm.ongoing("RH_IDLE"),
+                self.error_fifo_overflow_csr.status.eq(0),
+            ).Elif(error_fifo.we & ~error_fifo.writable,
+                self.error_fifo_overflow_csr.status.eq(self.error_fifo_overflow_csr.status + 1),
             )
         ]
 
@@ -1778,35 +2804,126 @@ class Row_Hammer_Test(Module, AutoCSR):
             # data_sig.eq(Replicate(self.input_data_pattern_csr.storage, rw_test_port.data_width // len(self.input_data_pattern_csr.storage))),
             # rw_test_port.wdata.data.eq(data_sig),
 
-            # Set the cmd address to the current value of the address signal
-            rw_test_port.cmd.addr.eq(self.address_csr.status),
+            # Set the cmd address to the row being hammered, or the next one to fill/check
+            If(rh_fsm.ongoing("RH_FILL"),
+                rw_test_port.cmd.addr.eq(fill_engine.cmd_addr),
+            ).Elif(rh_fsm.ongoing("RH_ATTACK"),
+                rw_test_port.cmd.addr.eq(self.address_csr.status),
+            ).Else(
+                rw_test_port.cmd.addr.eq(read_checker.cmd_addr),
+            ),
+
+            # Reads of the attack go to the DFI hammer path when it is there and enabled
+            dfi_hammer.eq(dfi_hammer_enable & self.dfi_hammer_available_sig),
+            hammer_ready.eq(Mux(dfi_hammer, self.dfi_hammer_ready_sig, rw_test_port.cmd.ready)),
 
-            # Get the max address possible in fpga
-            max_address_sig.eq(~0),
+            # The second data pattern goes in every other row
+            fill_engine.wdata_data.eq(fill_pattern.data),
+            rw_test_port.wdata.data.eq(fill_engine.wdata_data),
 
             # Set the write-enable data signal to all ones in case
             # byte-enabled writes are supported
             rw_test_port.wdata.we.eq(~0),
+
+            # Compare the data read back with what was written
+            read_checker.expected.eq(read_check_pattern.data),
+            read_checker.rdata_data.eq(rw_test_port.rdata.data),
             
         ]
 
-        # Set the data CSR registers to rdata.data
-        for i in range(1, 19):
-            if (i * WIDTH_32_BITS) <= rw_test_port.data_width:
-                self.comb += getattr(self, "output_data_pattern{index}_csr".format(index = i)).status.eq(error_data[WIDTH_32_BITS * (i - 1):WIDTH_32_BITS * (i)])
-
-            else:
-                self.comb += getattr(self, "output_data_pattern{index}_csr".format(index = i)).status.eq(0)
+        # Aggressor table walker decisions. A loop count of 0 chains the entry
+        # to the next one, a loop count of N closes the group of entries since
+        # the previous closing entry, which is then played N times.
+        self.comb += [
+            aggressor_last_entry.eq(((aggressor_idx_sig + 1) >= num_addrs_attack_sig) | (aggressor_idx_sig == (num_aggressors - 1))),
+            aggressor_loop_left.eq(Mux(aggressor_loop_counter_sig == 0, aggressor_loop_sig, aggressor_loop_counter_sig)),
+            aggressor_repeat_group.eq((aggressor_loop_sig != 0) & (aggressor_loop_left != 1)),
+            aggressor_group_end.eq((aggressor_loop_sig != 0) | aggressor_last_entry),
+            aggressor_step.eq(hammer_ready | ~hammer_valid),
+            aggressor_entry_done.eq(hammer_interleave | ((rowhammer_attack_cmd_timer_sig - 1) == 0)),
+
+            # The timer holds the hammer count of the entry when interleaving
+            interleave_read.eq(interleave_round < rowhammer_attack_cmd_timer_sig),
+            interleave_left.eq(hammer_interleave & ((interleave_round + 1) < rowhammer_attack_cmd_timer_sig)),
+            interleave_again.eq(hammer_interleave & aggressor_group_end & (interleave_more | interleave_left)),
+        ]
 
+        # Reads of the attack per bank, cleared when the hammer phase starts
+        self.submodules.bank_hammers = Bank_Hammer_Counters(rw_test_port.cmd.addr, hammer_valid & hammer_ready, self.hammer_phase_start_sig, bank_bits, col_bits)
 
+        # Cycles of every phase of the test and stalls of the port, read as one snapshot
+        perf_counters = Perf_Counters()
+        self.submodules.perf_counters = perf_counters
 
+        checking = Signal(ONE_BIT_WIDE)
 
+        self.comb += [
+            checking.eq(rh_fsm.ongoing("READ_CHECK") | rh_fsm.ongoing("READ_FINISH")),
+            perf_counters.fill.eq(rh_fsm.ongoing("RH_FILL")),
+            perf_counters.initial_check.eq(checking & ~self.before_after_rh_csr.status),
+            perf_counters.init.eq(rh_fsm.ongoing("RH_STEP_START") | rh_fsm.ongoing("RH_SEARCH_NEXT") | rh_fsm.ongoing("RH_STEP_INIT") | rh_fsm.ongoing("RH_INIT_SETTINGS")),
+            perf_counters.attack.eq(rh_fsm.ongoing("RH_ATTACK")),
+            perf_counters.drain.eq(rh_fsm.ongoing("RH_RESET_SETTINGS")),
+            perf_counters.post_check.eq((checking & self.before_after_rh_csr.status) | rh_fsm.ongoing("RH_STEP_DONE")),
+            perf_counters.readout.eq(rh_fsm.ongoing("RH_FINAL_CHECK") & error_fifo.readable),
+            perf_counters.cmd_stall.eq(rw_test_port.cmd.valid & ~rw_test_port.cmd.ready),
+            perf_counters.wdata_stall.eq(rw_test_port.wdata.valid & ~rw_test_port.wdata.ready),
+        ]
 
+        # Every state change of the row hammer FSM with its cycle, read from the bus after the run
+        self.submodules.state_trace = State_Trace(self.feedback_state_csr.status, self.address_csr.status, perf_counters.cycles, self.test_start_sig, state_trace_depth)
 
+        """
+        Events
+        """
 
+        # Interrupts, so the CPU can sleep during the test instead of polling the state
+        self.submodules.ev = EventManager()
+        self.ev.phase = EventSourcePulse(description="The row hammer FSM changed state")
+        self.ev.errors = EventSourceLevel(description="Errors are waiting in the error FIFO")
+        self.ev.errors_half = EventSourceLevel(description="The error FIFO is at least half full")
+        self.ev.done = EventSourcePulse(description="The test is done, the results can be read")
 
+        self.comb += [
+            self.ev.phase.trigger.eq(self.state_trace.changed),
+            self.ev.errors.trigger.eq(error_fifo.readable),
+            self.ev.errors_half.trigger.eq(error_fifo.level >= (error_fifo_depth // 2)),
+            self.ev.done.trigger.eq(self.state_trace.changed & rh_fsm.ongoing("RH_FINAL_CHECK")),
+        ]
 
 
+    def add_live_config(self, csr):
+        """
+        Add a live register for the shadow setting csr, loaded from it on a
+        commit and readable as <name>_live_csr. Returns the live signal.
+        """
+        name = csr.name[:-len("_csr")] + "_live_csr"
+        live_csr = CSRStatus(len(csr.storage), reset=csr.storage.reset.value, name=name, description="Live (committed) value of " + csr.name)
+        setattr(self, name, live_csr)
+        self.sync += If(self.config_commit_sig, live_csr.status.eq(csr.storage))
+        return live_csr.status
 
+    def add_cmd_counters(self, dfi):
+        """
+        Count the DRAM commands sent during the hammer phase, dfi is the
+        interface between the controller and the PHY (sdram.dfii.master).
+        """
+        self.submodules.cmd_counters = DRAM_Cmd_Counters(dfi, self.hammer_phase_sig, self.hammer_phase_start_sig, self.trefi_setting)
 
-        
\ No newline at end of file
+    def add_dfi_hammer(self, dfii, phy_settings, timing_settings, sys_clk_freq):
+        """
+        Add the DFI hammer path, dfii is the DFI injector of the LiteDRAM core
+        (sdram.dfii), its external DFI sends the attack straight to the PHY
+        while dfi_hammer_enable_csr is set. timing_settings are the timings of
+        the controller (sdram.controller.settings.timing), in clock cycles.
+        """
+        burst_length = phy_settings.nphases * (1 if phy_settings.memtype == "SDR" else 2)
+        trtp = max(ceil(DFI_HAMMER_TRTP_NS * 1e-9 * sys_clk_freq), ceil(DFI_HAMMER_TRTP_CK / phy_settings.nphases))
+        self.submodules.dfi_hammer = DFI_Hammer(dfii.ext_dfi, dfii.ext_dfi_sel, dfii.slave, phy_settings.rdphase, timing_settings, trtp,
+            self.rw_test_port.cmd.addr, self.hammer_valid_sig, self.dfi_hammer_attack_sig, self.controller_refresh_sig,
+            self.refresh_enable_live_csr.status, self.refresh_rate_live_csr.status, self.bank_bits, self.col_bits, log2_int(burst_length))
+        self.comb += [
+            self.dfi_hammer_available_sig.eq(1),
+            self.dfi_hammer_ready_sig.eq(self.dfi_hammer.ready),
+            self.dfi_hammer_busy_sig.eq(self.dfi_hammer.busy),
+        ]